@@ -26,10 +26,8 @@ import re
 import gzip
 import os.path
 import time
-from .sixext.moves import urllib_request, urllib_parse, urllib_error # TODO: Replace with urllib2 (urllib is deprecated in Python 3.0)
 import io
 from io import BytesIO
-from .sixext.moves import http_client
 import struct
 import string
 import time
@@ -43,7 +41,15 @@ from . import status
 from . import pml
 from . import status
 from prnt import pcl, ldl, cups
-from . import models, mdns, slp, avahi
+from . import models, ipc
+from .lazy import lazyImport, isAvailable
+
+# Only needed for network probing, EWS pages and dbus
+mdns = lazyImport('.mdns', __package__)
+slp = lazyImport('.slp', __package__)
+avahi = lazyImport('.avahi', __package__)
+probecache = lazyImport('.probecache', __package__)
+localopener = lazyImport('.localopener', __package__)
 from .strings import *
 from .sixext import PY3, to_bytes_utf8, to_unicode, to_string_latin, to_string_utf8, xStringIO
 
@@ -65,13 +71,12 @@ else:
     except AttributeError:
         MAX_BUFFER = 8192
 
-dbus_avail = False
 dbus_disabled = False
-try:
-    import dbus
-    from dbus import lowlevel, SessionBus
-    dbus_avail = True
-except ImportError:
+dbus_avail = isAvailable('dbus')
+if dbus_avail:
+    dbus = lazyImport('dbus')
+    lowlevel = lazyImport('dbus.lowlevel')
+else:
     log.warn("python-dbus not installed.")
 
 import warnings
@@ -88,7 +93,6 @@ VALID_FILTERS = ('print', 'scan', 'fax', 'pcard', 'copy')
 DEFAULT_BE_FILTER = ('hp',)
 
 pat_deviceuri = re.compile(r"""(.*):/(.*?)/(\S*?)\?(?:serial=(\S*)|device=(\S*)|ip=(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}[^&]*)|zc=(\S+)|hostname=(\S+))(?:&port=(\d))?""", re.IGNORECASE)
-http_pat_url = re.compile(r"""/(.*?)/(\S*?)\?(?:serial=(\S*)|device=(\S*))&loc=(\S*)""", re.IGNORECASE)
 direct_pat = re.compile(r'direct (.*?) "(.*?)" "(.*?)" "(.*?)"', re.IGNORECASE)
 
 # Pattern to check for ; at end of CTR fields
@@ -151,6 +155,18 @@ class Event(object):
                 return False
 
 
+    def send_via_ipc(self, fd, recipient='hpssd'):
+        """ Framed message (see base/ipc.py), used between hpssd, hpdio and hp-systray. """
+        if fd is not None:
+            log.debug("Sending event %d to %s (via ipc %d)..." % (self.event_code, recipient, fd))
+            try:
+                ipc.sendEvent(fd, self)
+                return True
+            except (OSError, ipc.IPCError):
+                log.debug("Failed.")
+                return False
+
+
     def send_via_dbus(self, session_bus, interface='com.hplip.StatusService'):
         if session_bus is not None and dbus_avail:
             log.debug("Sending event %d to %s (via dbus)..." % (self.event_code, interface))
@@ -447,6 +463,11 @@ def queryModelByModel(model):
     return model_dat[model]
 
 
+def queryModelCapsByModel(model):
+    model = models.normalizeModelName(model).lower()
+    return model_dat.capabilities(model)
+
+
 def queryModelByURI(device_uri):
     try:
         back_end, is_hp, bus, model, \
@@ -464,9 +485,10 @@ def queryModelByURI(device_uri):
 
 def probeDevices(bus=DEFAULT_PROBE_BUS, timeout=10,
                  ttl=4, filter=DEFAULT_FILTER,  search='', net_search='slp',
-                 back_end_filter=('hp',)):
+                 back_end_filter=('hp',), use_cache=True):
 
     num_devices, ret_devices = 0, {}
+    model_filter = __modelFilter(filter)
 
     if search:
         try:
@@ -529,19 +551,7 @@ def probeDevices(bus=DEFAULT_PROBE_BUS, timeout=10,
                                 else:
                                     device_uri = 'hp:/net/%s?zc=%s&port=%d' % (model, hn, (port + 1))
 
-                            include = True
-                            mq = queryModelByModel(model)
-
-                            if not mq:
-                                log.debug("Not found.")
-                                include = False
-
-                            elif int(mq.get('support-type', SUPPORT_TYPE_NONE)) == SUPPORT_TYPE_NONE:
-                                log.debug("Not supported.")
-                                include = False
-
-                            elif filter not in (None, 'print', 'print-type'):
-                                include = __checkFilter(filter, mq)
+                            include = __includeModel(model, model_filter)
 
                             if include:
                                 ret_devices[device_uri] = (model, model, hn)
@@ -552,7 +562,17 @@ def probeDevices(bus=DEFAULT_PROBE_BUS, timeout=10,
             else:
                 bn = hpmudext.HPMUD_BUS_USB
 
-            result_code, data = hpmudext.probe_devices(bn)
+            data = None
+            if use_cache:
+                data = probecache.getProbeCache().get(b)
+
+            if data is not None:
+                result_code = hpmudext.HPMUD_R_OK
+            else:
+                result_code, data = hpmudext.probe_devices(bn)
+                if result_code == hpmudext.HPMUD_R_OK and use_cache:
+                    probecache.getProbeCache().set(b, data)
+
             if result_code == hpmudext.HPMUD_R_OK:
                 for x in data.splitlines():
                     m = direct_pat.match(x)
@@ -575,18 +595,7 @@ def probeDevices(bus=DEFAULT_PROBE_BUS, timeout=10,
                     include = True
 
                     if mdl and uri and is_hp:
-                        mq = queryModelByModel(model)
-
-                        if not mq:
-                            log.debug("Not found.")
-                            include = False
-
-                        elif int(mq.get('support-type', SUPPORT_TYPE_NONE)) == SUPPORT_TYPE_NONE:
-                            log.debug("Not supported.")
-                            include = False
-
-                        elif filter not in (None, 'print', 'print-type'):
-                            include = __checkFilter(filter, mq)
+                        include = __includeModel(model, model_filter)
 
                         if include:
                             ret_devices[uri] = (mdl, desc, devid) # model w/ _'s, mdl w/o
@@ -610,19 +619,7 @@ def probeDevices(bus=DEFAULT_PROBE_BUS, timeout=10,
                     if not is_hp:
                         continue
 
-                    include = True
-                    mq = queryModelByModel(model)
-
-                    if not mq:
-                        include = False
-                        log.debug("Not found.")
-
-                    elif int(mq.get('support-type', SUPPORT_TYPE_NONE)) == SUPPORT_TYPE_NONE:
-                        log.debug("Not supported.")
-                        include = False
-
-                    elif filter not in (None, 'print', 'print-type'):
-                        include = __checkFilter(filter, mq)
+                    include = __includeModel(model, model_filter)
 
                     if include:
                         ret_devices[device_uri] = (model, model, '')
@@ -652,6 +649,7 @@ def probeDevices(bus=DEFAULT_PROBE_BUS, timeout=10,
 
 def getSupportedCUPSDevices(back_end_filter=['hp'], filter=DEFAULT_FILTER):
     devices = {}
+    model_filter = __modelFilter(filter)
     printers = cups.getPrinters()
     log.debug(printers)
 
@@ -667,19 +665,7 @@ def getSupportedCUPSDevices(back_end_filter=['hp'], filter=DEFAULT_FILTER):
             ('hpaio' in back_end_filter and back_end == 'hp')) and \
             model and is_hp:
 
-            include = True
-            mq = queryModelByModel(model)
-
-            if not mq:
-                log.debug("Not found.")
-                include = False
-
-            elif int(mq.get('support-type', SUPPORT_TYPE_NONE)) == SUPPORT_TYPE_NONE:
-                log.debug("Not supported.")
-                include = False
-
-            elif filter not in (None, 'print', 'print-type'):
-                include = __checkFilter(filter, mq)
+            include = __includeModel(model, model_filter)
 
             if include:
                 if 'hpaio' in back_end_filter:
@@ -699,6 +685,7 @@ def getSupportedCUPSDevices(back_end_filter=['hp'], filter=DEFAULT_FILTER):
 
 def getSupportedCUPSPrinters(back_end_filter=['hp'], filter=DEFAULT_FILTER):
     printer_list = []
+    model_filter = __modelFilter(filter)
     printers = cups.getPrinters()
 
     for p in printers:
@@ -710,19 +697,7 @@ def getSupportedCUPSPrinters(back_end_filter=['hp'], filter=DEFAULT_FILTER):
             continue
 
         if (back_end_filter == '*' or back_end in back_end_filter) and model and is_hp:
-            include = True
-            mq = queryModelByModel(model)
-
-            if not mq:
-                log.debug("Not found.")
-                include = False
-
-            elif int(mq.get('support-type', SUPPORT_TYPE_NONE)) == SUPPORT_TYPE_NONE:
-                log.debug("Not supported.")
-                include = False
-
-            elif filter not in (None, 'print', 'print-type'):
-                include = __checkFilter(filter, mq)
+            include = __includeModel(model, model_filter)
 
             if include:
                 printer_list.append(p)
@@ -741,22 +716,21 @@ def getDeviceURIByPrinterName(printer_name, scan_uri_flag=False):
         return None
 
     device_uri = None
-    printers = cups.getPrinters()
+    p = cups.getPrinter(printer_name)
 
-    for p in printers:
+    if p is not None:
         try:
             back_end, is_hp, bus, model, serial, dev_file, host, zc, port = \
                 parseDeviceURI(p.device_uri)
 
         except Error:
-            continue
+            return None
 
-        if is_hp and p.name == printer_name:
+        if is_hp:
             if scan_uri_flag:
                 device_uri = p.device_uri.replace('hp:', 'hpaio:')
             else:
                 device_uri = p.device_uri
-            break
 
     return device_uri
 
@@ -874,14 +848,25 @@ def isNetwork(bus):
 # Misc
 #
 
-def __checkFilter(filter, mq):
-    for f, p in list(filter.items()):
-        if f is not None:
-            op, val = p
-            if not op(mq[f], val):
-                return False
+def __modelFilter(filter):
+    if filter in (None, 'print', 'print-type'):
+        return models.ModelFilter(None)
 
-    return True
+    return models.ModelFilter(filter)
+
+
+def __includeModel(model, model_filter):
+    caps = queryModelCapsByModel(model)
+
+    if caps is None:
+        log.debug("Not found.")
+        return False
+
+    if not caps.supported():
+        log.debug("Not supported.")
+        return False
+
+    return model_filter.match(caps)
 
 
 def validateBusList(bus, allow_cups=True):
@@ -996,17 +981,14 @@ class Device(object):
 
         self.last_event = None # Used in devmgr if dbus is disabled
 
-        printers = cups.getPrinters()
-
         if device_uri is None and printer_name is not None:
-            for p in printers:
-                if p.name.lower() == printer_name.lower():
-                    device_uri = p.device_uri
-                    log.debug("Device URI: %s" % device_uri)
-                    break
-            else:
+            p = cups.getPrinter(printer_name, match_case=False)
+            if p is None:
                 raise Error(ERROR_DEVICE_NOT_FOUND)
 
+            device_uri = p.device_uri
+            log.debug("Device URI: %s" % device_uri)
+
         self.device_uri = device_uri
         self.callback = callback
         self.device_type = DEVICE_TYPE_UNKNOWN
@@ -1052,6 +1034,7 @@ class Device(object):
         self.icon = "default_printer"
         self.cups_printers = []
         self.channels = {} # { 'SERVICENAME' : channel_id, ... }
+        self.pml_multi = True # False once the device fails a multi-object PML request
         self.device_id = -1
         self.r_values = None # ( r_value, r_value_str, rg, rr )
         self.deviceID = ''
@@ -1588,14 +1571,12 @@ class Device(object):
     def updateCUPSPrinters(self):
         self.cups_printers = []
         log.debug("Re-reading CUPS printer queue information.")
-        printers = cups.getPrinters()
-        for p in printers:
-            if self.device_uri == p.device_uri:
-                self.cups_printers.append(p.name)
-                self.state = p.state # ?
+        for p in cups.getPrintersByDeviceURI(self.device_uri):
+            self.cups_printers.append(p.name)
+            self.state = p.state # ?
 
-                if self.io_state == IO_STATE_NON_HP:
-                    self.model = p.makemodel.split(',')[0]
+            if self.io_state == IO_STATE_NON_HP:
+                self.model = p.makemodel.split(',')[0]
 
         self.dq.update({'cups-printers' : self.cups_printers})
 
@@ -1986,6 +1967,103 @@ class Device(object):
         channel_id = self.openPML()
         result_code, data, typ, pml_result_code = \
             hpmudext.get_pml(self.device_id, channel_id, pml.PMLToSNMP(oid[0]), oid[1])
+        return self.__convertPML(oid, pml_result_code, data, desired_int_size)
+
+
+    def getPMLMulti(self, oids, desired_int_size=pml.INT_SIZE_INT): # oids => [ ( 'dotted oid value', pml type ), ... ]
+        """ getPML() for several objects, up to pml.MAX_OBJECTS in each request to the device.
+            desired_int_size is one size for all the objects or a list of them.
+            Returns [ (pml_result_code, value), ... ] in the order of oids.
+        """
+        if not isinstance(desired_int_size, (list, tuple)):
+            desired_int_size = [desired_int_size] * len(oids)
+
+        results = [None] * len(oids)
+
+        if self.pml_multi:
+            # 0. OIDs are SNMP only
+            batch = [i for i, oid in enumerate(oids) if self.bus == 'net' or not oid[0].startswith('0.')]
+
+            for start in range(0, len(batch), pml.MAX_OBJECTS):
+                chunk = batch[start : start + pml.MAX_OBJECTS]
+                if len(chunk) < 2 or not self.pml_multi:
+                    break
+
+                replies = self.__getPMLObjects([oids[i] for i in chunk])
+                if replies is None:
+                    continue
+
+                for i, (pml_result_code, data) in zip(chunk, replies):
+                    results[i] = self.__convertPML(oids[i], pml_result_code, data, desired_int_size[i])
+
+        for i, r in enumerate(results):
+            if r is None:
+                results[i] = self.getPML(oids[i], desired_int_size[i])
+
+        return results
+
+
+    def __getPMLObjects(self, oids):
+        # One request. Returns [ (pml_result_code, data), ... ], None if the
+        # reply does not say how each object went.
+        channel_id = self.openPML()
+
+        if self.bus == 'net':
+            result_code, objects = hpmudext.get_pml_multi(self.device_id, channel_id,
+                                                          [pml.PMLToSNMP(oid[0]) for oid in oids])
+
+            if result_code != hpmudext.HPMUD_R_OK or len(objects) != len(oids):
+                log.debug("PML/SNMP multi-object GET failed (result code = %d)" % result_code)
+                self.pml_multi = False
+                return None
+
+            return [(pml_result_code, data) for data, typ, pml_result_code in objects]
+
+        result_code, bytes_written = hpmudext.write_channel(self.device_id, channel_id,
+                                                            pml.buildPMLGetPacketMulti([oid[0] for oid in oids]))
+        if result_code != hpmudext.HPMUD_R_OK:
+            return self.__failPMLMulti("write", result_code)
+
+        result_code, data = hpmudext.read_channel(self.device_id, channel_id, pml.MAX_PACKET_LEN, pml.TIMEOUT)
+        if result_code != hpmudext.HPMUD_R_OK:
+            return self.__failPMLMulti("read", result_code)
+
+        reply, error_code, objects = pml.parsePMLPacketMulti(data)
+
+        if reply != pml.GET_REPLY or [o[0] for o in objects] != [oid[0] for oid in oids]:
+            if reply != pml.GET_REPLY or error_code <= pml.ERROR_MAX_OK or \
+                error_code in (pml.ERROR_UNKNOWN_REQUEST, pml.ERROR_SYNTAX, pml.ERROR_BUFFER_OVERFLOW):
+                log.debug("PML multi-object GET not supported (reply = %s, error code = 0x%x)" % (reply, error_code))
+                self.pml_multi = False
+
+            return None
+
+        replies = []
+        for o, data, typ, object_error_code in objects:
+            if object_error_code is not None:
+                replies.append((object_error_code, data))
+
+            elif error_code > pml.ERROR_MAX_OK: # can't tell which object(s) failed
+                return None
+
+            else:
+                replies.append((error_code, data))
+
+        return replies
+
+
+    def __failPMLMulti(self, op, result_code):
+        # A device that does not answer a multi-object GET would cost every
+        # later poll another pml.TIMEOUT, and a late reply left on the channel
+        # would be read as the reply to the next single GET. Go back to single
+        # GETs on a new channel.
+        log.debug("PML multi-object GET %s failed (result code = %d)" % (op, result_code))
+        self.pml_multi = False
+        self.closePML()
+        return None
+
+
+    def __convertPML(self, oid, pml_result_code, data, desired_int_size):
         if pml_result_code > pml.ERROR_MAX_OK:
             log.debug("PML/SNMP GET %s failed (result code = 0x%x)" % (oid[0], pml_result_code))
             return pml_result_code, None
@@ -2502,7 +2580,7 @@ Content-length: %d\r
                 data = None
 
             log.debug("Opening: %s" % url2)
-            opener = LocalOpener({})
+            opener = localopener.LocalOpener({})
             try:
                 f = opener.open(url2, data)
                 
@@ -2524,7 +2602,7 @@ Content-length: %d\r
         try:
             url2 = "%s&loc=%s" % (self.device_uri.replace('hpfax:', 'hp:'), url)
             data = self
-            opener = LocalOpenerEWS_LEDM({})
+            opener = localopener.LocalOpenerEWS_LEDM({})
             try:
                 if footer:
                     return opener.open_hp(url2, data, footer)
@@ -2539,7 +2617,7 @@ Content-length: %d\r
         try:
             url2 = "%s&loc=%s" % (self.device_uri.replace('hpfax:', 'hp:'), url)
             data = self
-            opener = LocalOpener_LEDM({})
+            opener = localopener.LocalOpener_LEDM({})
             try:
                 if footer:
                     return opener.open_hp(url2, data, footer)
@@ -2641,90 +2719,3 @@ Content-length: %d\r
             log.error("Firmware file '%s' not found." % filename)
 
         return ok
-
-
-
-    
-
-
-# URLs: hp:/usb/HP_LaserJet_3050?serial=00XXXXXXXXXX&loc=/hp/device/info_device_status.xml
-class LocalOpener(urllib_request.URLopener):
-    def open_hp(self, url, dev):
-        log.debug("open_hp(%s)" % url)
-
-        match_obj = http_pat_url.search(url)
-        bus = match_obj.group(1) or ''
-        model = match_obj.group(2) or ''
-        serial = match_obj.group(3) or ''
-        device = match_obj.group(4) or ''
-        loc = match_obj.group(5) or ''
-
-        dev.openEWS()
-        dev.writeEWS("""GET %s HTTP/1.0\nContent-Length:0\nHost:localhost\nUser-Agent:hplip\n\n""" % loc)
-
-        reply = xStringIO()
-        while dev.readEWS(8192, reply, timeout=1):
-            pass
-
-        reply.seek(0)
-        log.log_data(reply.getvalue())
-        
-        response = http_client.HTTPResponse(reply)
-        response.begin()
-
-        if response.status != http_client.OK:
-            raise Error(ERROR_DEVICE_STATUS_NOT_AVAILABLE)
-        else:
-            return response#.fp
-
-# URLs: hp:/usb/HP_OfficeJet_7500?serial=00XXXXXXXXXX&loc=/hp/device/info_device_status.xml
-class LocalOpenerEWS_LEDM(urllib_request.URLopener):
-    def open_hp(self, url, dev, foot=""):
-        log.debug("open_hp(%s)" % url)
-
-        match_obj = http_pat_url.search(url)
-        loc = url.split("=")[url.count("=")]
-
-        dev.openEWS_LEDM()
-        if foot:
-            if "PUT" in foot:
-                dev.writeEWS_LEDM("""%s""" % foot)
-            else:
-                dev.writeEWS_LEDM("""POST %s HTTP/1.1\r\nContent-Type:text/xml\r\nContent-Length:%s\r\nAccept-Encoding: UTF-8\r\nHost:localhost\r\nUser-Agent:hplip\r\n\r\n """ % (loc, len(foot)))
-                dev.writeEWS_LEDM("""%s""" % foot)
-        else:
-            dev.writeEWS_LEDM("""GET %s HTTP/1.1\r\nAccept: text/plain\r\nHost:localhost\r\nUser-Agent:hplip\r\n\r\n""" % loc)
-
-        reply = xStringIO()
-
-        dev.readLEDMData(dev.readEWS_LEDM,reply)
-
-        reply.seek(0)
-        return reply.getvalue()
-
-
-# URLs: hp:/usb/HP_OfficeJet_7500?serial=00XXXXXXXXXX&loc=/hp/device/info_device_status.xml
-class LocalOpener_LEDM(urllib_request.URLopener):
-    def open_hp(self, url, dev, foot=""):
-        log.debug("open_hp(%s)" % url)
-
-        match_obj = http_pat_url.search(url)
-        loc = url.split("=")[url.count("=")]
-
-        dev.openLEDM()
-        if foot:
-            if "PUT" in foot:
-                dev.writeLEDM("""%s""" % foot)
-            else:
-                dev.writeLEDM("""POST %s HTTP/1.1\r\nContent-Type:text/xml\r\nContent-Length:%s\r\nAccept-Encoding: UTF-8\r\nHost:localhost\r\nUser-Agent:hplip\r\n\r\n """ % (loc, len(foot)))
-                dev.writeLEDM("""%s""" % foot)
-        else:
-            dev.writeLEDM("""GET %s HTTP/1.1\r\nAccept: text/plain\r\nHost:localhost\r\nUser-Agent:hplip\r\n\r\n""" % loc)
-
-        reply = xStringIO()
-
-       
-        dev.readLEDMData(dev.readLEDM,reply)
-
-        reply.seek(0)
-        return reply.getvalue()
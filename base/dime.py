@@ -32,13 +32,21 @@ TYPE_T_URI = 0x02
 DIME_VERSION = 1
 PAD_SIZE = 4
 
+CHUNK_SIZE = 8192
+
 
 class Record(object):
-    def __init__(self, id, typ, typ_code, payload):
+    def __init__(self, id, typ, typ_code, payload, length=None):
+        # payload is a byte string, or a file to read length bytes of (from
+        # where it is when the message is written)
         self.id = id
         self.typ = typ
         self.typ_code = typ_code
         self.payload = payload
+
+        if length is None:
+            length = len(payload)
+        self.length = length
         
 
 class Message(object):
@@ -49,39 +57,71 @@ class Message(object):
         self.records.append(rec)
         
     def generate(self, output): # output is a stream type
+        for data in self.chunks():
+            output.write(data)
+
+
+    def size(self):
+        """ The number of bytes generate() and chunks() write. """
+        return sum([len(self.__header(i)) + self.bytes_needed(r.length)
+                    for i, r in enumerate(self.records)])
+
+
+    def chunks(self, chunk_size=CHUNK_SIZE, head=b''):
+        """ Yields head and the message in pieces of chunk_size bytes (the
+            last one may be shorter). File payloads are read as they are
+            needed, so only about a chunk is held at a time.
+        """
+        buf = bytearray(head)
         for i, r in enumerate(self.records):
             log.debug("Processing record %d (%s)" % (i, r.id))
-            mb = me = cf = 0
-            if i == 0: mb = 1
-            if i == len(self.records)-1: me = 1
-                
-            output.write(struct.pack("!B", ((DIME_VERSION & 0x1f) << 3 |
-                                            (mb & 0x01) << 2 |
-                                            (me & 0x01) << 1 |
-                                            (cf & 0x01))))
-                   
-            output.write(struct.pack("!B", ((r.typ_code & 0xf) << 4) & 0xf0))
-    
-            output.write(struct.pack("!H", 0)) # Options length
-            
-            id_len = self.bytes_needed(len(r.id))
-            output.write(struct.pack("!H", len(r.id))) # ID length
-            
-            typ_len = self.bytes_needed(len(r.typ))
-            output.write(struct.pack("!H", len(r.typ))) # Type length
-            
-            data_len = self.bytes_needed(len(r.payload))
-            output.write(struct.pack("!I", len(r.payload))) # Data length
-            
-            if id_len:
-                output.write(struct.pack("%ds" % id_len, r.id))
-                
-            if typ_len:
-                output.write(struct.pack("%ds" % typ_len, r.typ))
-            
-            if data_len:
-                output.write(struct.pack("%ds" % data_len, r.payload))
-        
+            buf.extend(self.__header(i))
+
+            pos = 0
+            while True:
+                while len(buf) >= chunk_size:
+                    yield bytes(buf[:chunk_size])
+                    del buf[:chunk_size]
+
+                if pos == r.length:
+                    break
+
+                n = min(r.length - pos, chunk_size - len(buf))
+                if hasattr(r.payload, 'read'):
+                    data = r.payload.read(n)
+                else:
+                    data = r.payload[pos:pos + n]
+
+                if not data:
+                    log.error("Record %d (%s) is short of data" % (i, r.id))
+                    raise Error(ERROR_INTERNAL)
+
+                buf.extend(data)
+                pos += len(data)
+
+            buf.extend(b'\0' * (self.bytes_needed(r.length) - r.length))
+
+        while buf:
+            yield bytes(buf[:chunk_size])
+            del buf[:chunk_size]
+
+
+    def __header(self, i):
+        r = self.records[i]
+        mb = me = cf = 0
+        if i == 0: mb = 1
+        if i == len(self.records)-1: me = 1
+
+        return struct.pack("!BBHHHI", ((DIME_VERSION & 0x1f) << 3 |
+                                       (mb & 0x01) << 2 |
+                                       (me & 0x01) << 1 |
+                                       (cf & 0x01)),
+                           ((r.typ_code & 0xf) << 4) & 0xf0,
+                           0, # Options length
+                           len(r.id), len(r.typ), r.length) + \
+               struct.pack("%ds" % self.bytes_needed(len(r.id)), r.id) + \
+               struct.pack("%ds" % self.bytes_needed(len(r.typ)), r.typ)
+
     
     def bytes_needed(self, data_len, block_size=PAD_SIZE):
         if data_len % block_size == 0:
@@ -96,16 +136,13 @@ if __name__ == "__main__":
     log.set_level("debug")
     import io
     m = Message()
-    m.add_record(Record("cid:id0", "http://schemas.xmlsoap.org/soap/envelope/", 
-                        TYPE_T_URI, "<test>test</test>"))
+    m.add_record(Record(b"cid:id0", b"http://schemas.xmlsoap.org/soap/envelope/", 
+                        TYPE_T_URI, b"<test>test</test>"))
     
-    m.add_record(Record("test2", "text/xml", TYPE_T_MIME, "<test>test2</test>"))
+    m.add_record(Record(b"test2", b"text/xml", TYPE_T_MIME, b"<test>test2</test>"))
     
-    output = io.StringIO()
+    output = io.BytesIO()
     
     m.generate(output)
     
     log.log_data(output.getvalue())
-
-
-
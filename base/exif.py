@@ -1,4 +1,3 @@
-import collections
 # Library to extract EXIF information in digital camera image files
 #
 # Contains code from "exifdump.py" originally written by Thierry Bousch
@@ -65,6 +64,15 @@ import collections
 # To do:
 # * Better printing of ratios
 
+import struct
+
+# bytes read from the file at a time
+BLOCK_SIZE=4096
+
+# struct formats of the field types, indexed like FIELD_TYPES (a ratio is
+# two of its format)
+FIELD_FORMATS=(None, 'B', 's', 'H', 'I', 'I', 'b', 'B', 'h', 'i', 'i')
+
 # field type descriptions as (length, abbreviation, full name) tuples
 FIELD_TYPES=(
     (0, 'X',  'Proprietary'), # no such type
@@ -633,19 +641,47 @@ MAKERNOTE_CANON_TAG_0x004={
 # extract multibyte integer in Motorola format (little endian)
 def s2n_motorola(str):
     x=0
-    for c in str:
-        x=(x << 8) | ord(c)
+    for c in bytearray(str):
+        x=(x << 8) | c
     return x
 
 # extract multibyte integer in Intel format (big endian)
 def s2n_intel(str):
     x=0
-    y=to_long(0)
-    for c in str:
-        x=x | (ord(c) << y)
+    y=0
+    for c in bytearray(str):
+        x=x | (c << y)
         y=y+8
     return x
 
+# tag name and printable value of a field, from the tag dictionary
+def describe_tag(tag, field_type, values, dict=EXIF_TAGS):
+    if field_type != 2 and len(values) == 1:
+        printable=str(values[0])
+    else:
+        printable=str(values)
+    tag_entry=dict.get(tag)
+    if not tag_entry:
+        return 'Tag 0x%04X' % tag, printable
+    if len(tag_entry) != 1:
+        # optional 2nd tag element is present
+        if callable(tag_entry[1]):
+            # call mapping function
+            printable=tag_entry[1](values)
+        else:
+            # use LUT for this tag
+            printable=''.join([tag_entry[1].get(i, repr(i)) for i in values])
+    return tag_entry[0], printable
+
+# tag number of a tag name, as describe_tag() names it
+def tag_number(name, dict=EXIF_TAGS):
+    if name.startswith('Tag 0x'):
+        return int(name[6:], 16)
+    for tag, tag_entry in dict.items():
+        if tag_entry[0] == name:
+            return tag
+    return None
+
 # ratio object that eventually will be able to reduce itself to lowest
 # common denominator for printing
 def gcd(a, b):
@@ -705,12 +741,40 @@ class EXIF_header:
         self.offset=offset
         self.debug=debug
         self.tags={}
+        self.blocks={} # { file offset // BLOCK_SIZE : data, ... }
+
+    # struct byte order
+    def order(self):
+        if self.endian == 'I':
+            return '<'
+        return '>'
+
+    # read length bytes at offset, a block of the file at a time
+    def read(self, offset, length):
+        start=self.offset+offset
+        if length <= 0:
+            return b''
+        n, skip=divmod(start, BLOCK_SIZE)
+        if skip+length <= BLOCK_SIZE and n in self.blocks:
+            return self.blocks[n][skip:skip+length]
+        data=[]
+        for n in range(start // BLOCK_SIZE, (start+length-1) // BLOCK_SIZE + 1):
+            block=self.blocks.get(n)
+            if block is None:
+                self.file.seek(n*BLOCK_SIZE)
+                block=self.blocks[n]=self.file.read(BLOCK_SIZE)
+            data.append(block)
+            if len(block) < BLOCK_SIZE:
+                break
+        skip=start % BLOCK_SIZE
+        return b''.join(data)[skip:skip+length]
 
     # convert slice to integer, based on sign and endian flags
     def s2n(self, offset, length, signed=0):
-        self.file.seek(self.offset+offset)
-        slice=self.file.read(length)
-        if self.endian == 'I':
+        slice=self.read(offset, length)
+        if length in (1, 2, 4) and len(slice) == length:
+            val=struct.unpack(self.order()+FIELD_FORMATS[{1: 1, 2: 3, 4: 4}[length]], slice)[0]
+        elif self.endian == 'I':
             val=s2n_intel(slice)
         else:
             val=s2n_motorola(slice)
@@ -751,67 +815,49 @@ class EXIF_header:
             i=self.next_IFD(i)
         return a
 
-    # return list of entries in this IFD
-    def dump_IFD(self, ifd, ifd_name, dict=EXIF_TAGS):
+    # decode an IFD entry: returns (tag, field type, values, field offset,
+    # field length)
+    def read_entry(self, entry):
+        tag, field_type, count=struct.unpack(self.order()+'HHI', self.read(entry, 8))
+        if not 0 < field_type < len(FIELD_TYPES):
+            # unknown field type
+            raise ValueError('unknown type %d in tag 0x%04X' % (field_type, tag))
+        length=count*FIELD_TYPES[field_type][0]
+        offset=entry+8
+        if length > 4:
+            # not the value, it's a pointer to the value
+            offset=self.s2n(offset, 4)
+        data=self.read(offset, length)
+        if len(data) != length:
+            raise ValueError('tag 0x%04X is past the end of the file' % tag)
+        if field_type == 2:
+            # special case: null-terminated ASCII string
+            values=data.strip().replace(b'\x00', b'')
+            if not isinstance(values, str):
+                values=values.decode('latin-1')
+        else:
+            if field_type in (5, 10):
+                # ratios
+                values=struct.unpack('%s%d%s' % (self.order(), 2*count, FIELD_FORMATS[field_type]), data)
+                values=[Ratio(values[i], values[i+1]) for i in range(0, len(values), 2)]
+            else:
+                values=list(struct.unpack('%s%d%s' % (self.order(), count, FIELD_FORMATS[field_type]), data))
+        return tag, field_type, values, offset, length
+
+    # return list of entries in this IFD, only the tags in wanted if given
+    def dump_IFD(self, ifd, ifd_name, dict=EXIF_TAGS, wanted=None):
         entries=self.s2n(ifd, 2)
+        tags=struct.unpack(self.order()+'H10x'*entries, self.read(ifd+2, 12*entries))
         for i in range(entries):
             entry=ifd+2+12*i
-            tag=self.s2n(entry, 2)
-            field_type=self.s2n(entry+2, 2)
-            if not 0 < field_type < len(FIELD_TYPES):
-                # unknown field type
-                raise ValueError('unknown type %d in tag 0x%04X' % (field_type, tag))
-            typelen=FIELD_TYPES[field_type][0]
-            count=self.s2n(entry+4, 4)
-            offset=entry+8
-            if count*typelen > 4:
-                # not the value, it's a pointer to the value
-                offset=self.s2n(offset, 4)
-            field_offset=offset
-            if field_type == 2:
-                # special case: null-terminated ASCII string
-                if count != 0:
-                    self.file.seek(self.offset+offset)
-                    values=self.file.read(count).strip().replace('\x00','')
-                else:
-                    values=''
-            else:
-                values=[]
-                signed=(field_type in [6, 8, 9, 10])
-                for j in range(count):
-                    if field_type in (5, 10):
-                        # a ratio
-                        value_j=Ratio(self.s2n(offset,   4, signed),
-                                      self.s2n(offset+4, 4, signed))
-                    else:
-                        value_j=self.s2n(offset, typelen, signed)
-                    values.append(value_j)
-                    offset=offset+typelen
-            # now "values" is either a string or an array
-            if count == 1 and field_type != 2:
-                printable=str(values[0])
-            else:
-                printable=str(values)
-            # figure out tag name
-            tag_entry=dict.get(tag)
-            if tag_entry:
-                tag_name=tag_entry[0]
-                if len(tag_entry) != 1:
-                    # optional 2nd tag element is present
-                    if isinstance(tag_entry[1], collections.Callable):
-                        # call mapping function
-                        printable=tag_entry[1](values)
-                    else:
-                        printable=''
-                        for i in values:
-                            # use LUT for this tag
-                            printable+=tag_entry[1].get(i, repr(i))
-            else:
-                tag_name='Tag 0x%04X' % tag
+            if wanted is not None and tags[i] not in wanted:
+                continue
+            tag, field_type, values, field_offset, field_length=self.read_entry(entry)
+            tag_name, printable=describe_tag(tag, field_type, values, dict)
             self.tags[ifd_name+' '+tag_name]=IFD_Tag(printable, tag,
                                                      field_type,
                                                      values, field_offset,
-                                                     count*typelen)
+                                                     field_length)
             if self.debug:
                 print('    %s: %s' % (tag_name,
                                       repr(self.tags[ifd_name+' '+tag_name])))
@@ -945,36 +991,43 @@ class EXIF_header:
             self.tags['MakerNote '+name]=IFD_Tag(str(val), None, 0, None,
                                                  None, None)
 
+# find the EXIF header of a TIFF or JPEG file: returns (endian, offset) or
+# None
+def find_header(file):
+    file.seek(0)
+    data=file.read(12)
+    if data[0:4] in (b'II*\x00', b'MM\x00*'):
+        # it's a TIFF file
+        return data[0:1].decode('latin-1'), 0
+    if data[0:2] != b'\xFF\xD8':
+        # file format not recognized
+        return None
+    # it's a JPEG file: skip to the APP1 segment with the EXIF header,
+    # passing over JFIF and other application segments
+    offset=2
+    while len(data) == 12 and data[2:3] == b'\xFF':
+        marker=bytearray(data[3:4])[0]
+        if data[6:12] == b'Exif\x00\x00':
+            # detected EXIF header
+            offset+=10
+            file.seek(offset)
+            return file.read(1).decode('latin-1'), offset
+        if not (0xE0 <= marker <= 0xEF or marker == 0xFE):
+            break
+        offset+=2+struct.unpack('>H', data[4:6])[0]
+        file.seek(offset)
+        data=b'\xFF\xD8'+file.read(10)
+    # no EXIF information
+    return None
+
 # process an image file (expects an open file object)
 # this is the function that has to deal with all the arbitrary nasty bits
 # of the EXIF standard
 def process_file(file, debug=0):
-    # determine whether it's a JPEG or TIFF
-    data=file.read(12)
-    if data[0:4] in ['II*\x00', 'MM\x00*']:
-        # it's a TIFF file
-        file.seek(0)
-        endian=file.read(1)
-        file.read(1)
-        offset=0
-    elif data[0:2] == '\xFF\xD8':
-        # it's a JPEG file
-        # skip JFIF style header(s)
-        while data[2] == '\xFF' and data[6:10] in ('JFIF', 'JFXX', 'OLYM'):
-            length=ord(data[4])*256+ord(data[5])
-            file.read(length-8)
-            # fake an EXIF beginning of file
-            data='\xFF\x00'+file.read(10)
-        if data[2] == '\xFF' and data[6:10] == 'Exif':
-            # detected EXIF header
-            offset=file.tell()
-            endian=file.read(1)
-        else:
-            # no EXIF information
-            return {}
-    else:
-        # file format not recognized
+    header=find_header(file)
+    if header is None:
         return {}
+    endian, offset=header
 
     # deal with the EXIF info we found
     if debug:
@@ -1041,6 +1094,96 @@ def process_file(file, debug=0):
 
     return hdr.tags
 
+# tags a photo card browse view needs
+BROWSE_TAGS=('Image Orientation', 'Image DateTime', 'EXIF DateTimeOriginal',
+             'Thumbnail JPEGInterchangeFormat',
+             'Thumbnail JPEGInterchangeFormatLength')
+
+# IFD name prefixes and their tag dictionaries
+IFD_TAGS=(('EXIF Interoperability', INTR_TAGS), ('Image', EXIF_TAGS),
+          ('Thumbnail', EXIF_TAGS), ('EXIF', EXIF_TAGS), ('GPS', GPS_TAGS))
+
+# { tag names : { IFD name : set of tag numbers }, ... }
+wanted_cache={}
+
+# the IFDs and tags process_file_tags() reads for the names
+def wanted_tags(names):
+    wanted=wanted_cache.get(names)
+    if wanted is not None:
+        return wanted
+
+    wanted={} # { IFD name : set of tag numbers }
+    for name in names:
+        if name == 'JPEGThumbnail':
+            wanted.setdefault('Thumbnail', set()).update((0x0201, 0x0202))
+            continue
+        if name == 'TIFFThumbnail':
+            wanted.setdefault('Thumbnail', set()).update((0x0103, 0x0111, 0x0117))
+            continue
+        for ifd_name, tag_dict in IFD_TAGS:
+            if name.startswith(ifd_name+' '):
+                tag=tag_number(name[len(ifd_name)+1:], tag_dict)
+                if tag is not None:
+                    wanted.setdefault(ifd_name, set()).add(tag)
+                break
+
+    # sub IFDs are found through pointer tags
+    if 'EXIF Interoperability' in wanted:
+        wanted.setdefault('EXIF', set()).add(0xA005)
+    if 'EXIF' in wanted:
+        wanted.setdefault('Image', set()).add(0x8769)
+    if 'GPS' in wanted:
+        wanted.setdefault('Image', set()).add(0x8825)
+
+    wanted_cache[names]=wanted
+    return wanted
+
+# process only the tags named (as process_file() names them) in an image
+# file. Only the IFDs holding them are read, so for the browse tags this is
+# a few KB at the start of the file. 'JPEGThumbnail' and 'TIFFThumbnail'
+# read the thumbnail too. MakerNote tags are not supported.
+def process_file_tags(file, names=BROWSE_TAGS, debug=0):
+    header=find_header(file)
+    if header is None:
+        return {}
+    endian, offset=header
+
+    wanted=wanted_tags(tuple(names))
+
+    hdr=EXIF_header(file, endian, offset, debug)
+    ifd=hdr.first_IFD()
+    if ifd and 'Image' in wanted:
+        hdr.dump_IFD(ifd, 'Image', wanted=wanted['Image'])
+        exif_off=hdr.tags.get('Image ExifOffset')
+        if exif_off and 'EXIF' in wanted:
+            hdr.dump_IFD(exif_off.values[0], 'EXIF', wanted=wanted['EXIF'])
+            intr_off=hdr.tags.get('EXIF InteroperabilityOffset')
+            if intr_off and 'EXIF Interoperability' in wanted:
+                hdr.dump_IFD(intr_off.values[0], 'EXIF Interoperability',
+                             dict=INTR_TAGS,
+                             wanted=wanted['EXIF Interoperability'])
+        gps_off=hdr.tags.get('Image GPSInfo')
+        if gps_off and 'GPS' in wanted:
+            hdr.dump_IFD(gps_off.values[0], 'GPS', dict=GPS_TAGS,
+                         wanted=wanted['GPS'])
+
+    if ifd and 'Thumbnail' in wanted:
+        thumb_ifd=hdr.next_IFD(ifd)
+        if thumb_ifd:
+            hdr.dump_IFD(thumb_ifd, 'Thumbnail', wanted=wanted['Thumbnail'])
+
+            thumb=hdr.tags.get('Thumbnail Compression')
+            if 'TIFFThumbnail' in names and thumb and \
+               thumb.printable == 'Uncompressed TIFF':
+                hdr.extract_TIFF_thumbnail(thumb_ifd)
+
+            thumb_off=hdr.tags.get('Thumbnail JPEGInterchangeFormat')
+            if 'JPEGThumbnail' in names and thumb_off:
+                size=hdr.tags['Thumbnail JPEGInterchangeFormatLength'].values[0]
+                hdr.tags['JPEGThumbnail']=hdr.read(thumb_off.values[0], size)
+
+    return dict([(name, hdr.tags[name]) for name in names if name in hdr.tags])
+
 # library test/debug function (dump given files)
 if __name__ == '__main__':
     import sys
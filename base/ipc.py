@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Framed messages on the pipes between hpssd, hpdio and hp-systray.
+#
+# Each message is a header (payload length, message type) followed by the
+# payload. Events are packed field by field with length prefixed strings,
+# so long URIs and titles are not cut off. Device query results go across
+# as deltas against the last ones sent for the same device: the keys that
+# changed and the keys that went away.
+#
+
+# Std Lib
+import os
+import struct
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+
+# Local
+from .g import *
+from .sixext import PY3, to_unicode
+
+# Message types
+MSG_EVENT = 1
+MSG_DQ_DELTA = 2
+
+HEADER_FMT = "!IB" # payload length, message type
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+
+# event_code, job_id, timedate, then the byte lengths of
+# device_uri, printer_name, username and title
+EVENT_FMT = "!IId4H"
+EVENT_SIZE = struct.calcsize(EVENT_FMT)
+
+READ_SIZE = 65536
+
+# Value tags
+TAG_NONE = b'N'
+TAG_TRUE = b'T'
+TAG_FALSE = b'F'
+TAG_INT = b'i'
+TAG_LONG = b'q'
+TAG_FLOAT = b'f'
+TAG_STR = b's'
+TAG_SHORT_STR = b'S'
+TAG_BYTES = b'b'
+TAG_LIST = b'l'
+TAG_TUPLE = b't'
+TAG_DICT = b'd'
+TAG_PICKLE = b'p'
+
+if PY3:
+    text_type, int_types = str, (int,)
+else:
+    text_type, int_types = unicode, (int, long)
+
+
+class IPCError(Exception):
+    pass
+
+
+#
+# Values (dq contents)
+#
+
+def __packValue(v, out):
+    if v is None:
+        out.append(TAG_NONE)
+
+    elif v is True:
+        out.append(TAG_TRUE)
+
+    elif v is False:
+        out.append(TAG_FALSE)
+
+    elif isinstance(v, int_types) and -0x80000000 <= v <= 0x7fffffff:
+        out.append(TAG_INT + struct.pack("!i", v))
+
+    elif isinstance(v, int_types) and -0x8000000000000000 <= v <= 0x7fffffffffffffff:
+        out.append(TAG_LONG + struct.pack("!q", v))
+
+    elif isinstance(v, float):
+        out.append(TAG_FLOAT + struct.pack("!d", v))
+
+    elif isinstance(v, text_type) or (not PY3 and isinstance(v, bytes)):
+        # On Python 2 str is sent as text too
+        if isinstance(v, text_type):
+            v = v.encode('utf-8')
+
+        if len(v) < 256:
+            out.append(TAG_SHORT_STR + struct.pack("!B", len(v)))
+        else:
+            out.append(TAG_STR + struct.pack("!I", len(v)))
+        out.append(v)
+
+    elif isinstance(v, bytes):
+        out.append(TAG_BYTES + struct.pack("!I", len(v)))
+        out.append(v)
+
+    elif isinstance(v, (list, tuple)):
+        out.append((TAG_LIST if isinstance(v, list) else TAG_TUPLE) + struct.pack("!I", len(v)))
+        for x in v:
+            __packValue(x, out)
+
+    elif isinstance(v, dict):
+        out.append(TAG_DICT + struct.pack("!I", len(v)))
+        for k, x in v.items():
+            __packValue(k, out)
+            __packValue(x, out)
+
+    else:
+        s = dumps(v, HIGHEST_PROTOCOL)
+        out.append(TAG_PICKLE + struct.pack("!I", len(s)))
+        out.append(s)
+
+
+def __unpackValue(data, pos):
+    tag = data[pos:pos+1]
+    pos += 1
+
+    if tag == TAG_NONE:
+        return None, pos
+
+    elif tag == TAG_TRUE:
+        return True, pos
+
+    elif tag == TAG_FALSE:
+        return False, pos
+
+    elif tag == TAG_INT:
+        return struct.unpack_from("!i", data, pos)[0], pos + 4
+
+    elif tag == TAG_LONG:
+        return struct.unpack_from("!q", data, pos)[0], pos + 8
+
+    elif tag == TAG_FLOAT:
+        return struct.unpack_from("!d", data, pos)[0], pos + 8
+
+    elif tag == TAG_SHORT_STR:
+        n = struct.unpack_from("!B", data, pos)[0]
+        pos += 1
+        return bytes(data[pos:pos+n]).decode('utf-8'), pos + n
+
+    n = struct.unpack_from("!I", data, pos)[0]
+    pos += 4
+
+    if tag == TAG_STR:
+        return bytes(data[pos:pos+n]).decode('utf-8'), pos + n
+
+    elif tag == TAG_BYTES:
+        return bytes(data[pos:pos+n]), pos + n
+
+    elif tag in (TAG_LIST, TAG_TUPLE):
+        v = []
+        for i in range(n):
+            x, pos = __unpackValue(data, pos)
+            v.append(x)
+
+        if tag == TAG_TUPLE:
+            v = tuple(v)
+        return v, pos
+
+    elif tag == TAG_DICT:
+        v = {}
+        for i in range(n):
+            k, pos = __unpackValue(data, pos)
+            v[k], pos = __unpackValue(data, pos)
+        return v, pos
+
+    elif tag == TAG_PICKLE:
+        return loads(bytes(data[pos:pos+n])), pos + n
+
+    raise IPCError("Invalid value tag %r" % tag)
+
+
+def packValues(*values):
+    out = []
+    for v in values:
+        __packValue(v, out)
+    return b''.join(out)
+
+
+def unpackValues(data):
+    values, pos = [], 0
+    while pos < len(data):
+        v, pos = __unpackValue(data, pos)
+        values.append(v)
+    return values
+
+
+#
+# Events
+#
+
+def packEvent(event):
+    """ event is a device.Event, only its first 7 fields (see Event.as_tuple()) are sent. """
+    device_uri, printer_name, event_code, username, job_id, title, timedate = event.as_tuple()[:7]
+    strings = [to_unicode(s).encode('utf-8') for s in (device_uri, printer_name, username, title)]
+
+    for s in strings:
+        if len(s) > 0xffff:
+            raise IPCError("Event field too long (%d bytes)" % len(s))
+
+    return b''.join([struct.pack(EVENT_FMT, event_code, job_id, timedate, *[len(s) for s in strings])] + strings)
+
+
+def unpackEvent(data):
+    """ Returns the arguments for device.Event(). """
+    event_code, job_id, timedate, l1, l2, l3, l4 = struct.unpack_from(EVENT_FMT, data)
+    strings, pos = [], EVENT_SIZE
+    for n in (l1, l2, l3, l4):
+        strings.append(bytes(data[pos:pos+n]).decode('utf-8'))
+        pos += n
+
+    device_uri, printer_name, username, title = strings
+    return (device_uri, printer_name, event_code, username, job_id, title, timedate)
+
+
+#
+# Frames
+#
+
+def writeFrame(fd, msg_type, payload):
+    """ Writes one message, returns the number of bytes written. """
+    header = struct.pack(HEADER_FMT, len(payload), msg_type)
+    total = HEADER_SIZE + len(payload)
+
+    if not hasattr(os, 'writev'): # Python 2
+        data = header + payload
+        written = 0
+        while written < total:
+            written += os.write(fd, data[written:])
+        return total
+
+    bufs = [header, memoryview(payload)]
+    written = 0
+    while bufs:
+        n = os.writev(fd, bufs)
+        written += n
+        while bufs and n >= len(bufs[0]):
+            n -= len(bufs[0])
+            bufs.pop(0)
+        if n:
+            bufs[0] = memoryview(bufs[0])[n:]
+
+    return written
+
+
+def sendEvent(fd, event):
+    return writeFrame(fd, MSG_EVENT, packEvent(event))
+
+
+class FrameReader(object):
+    """ Collects bytes read from a pipe and splits them into messages. """
+    def __init__(self, fd):
+        self.fd = fd
+        self.buf = bytearray()
+
+
+    def read(self):
+        """ One os.read() from the pipe. Returns False at end of file. """
+        data = os.read(self.fd, READ_SIZE)
+        if not data:
+            return False
+
+        self.buf.extend(data)
+        return True
+
+
+    def frames(self):
+        """ Returns [(msg_type, payload), ...] for the complete messages read so far. """
+        frames, pos = [], 0
+        while len(self.buf) - pos >= HEADER_SIZE:
+            n, msg_type = struct.unpack_from(HEADER_FMT, self.buf, pos)
+            if len(self.buf) - pos - HEADER_SIZE < n:
+                break
+
+            pos += HEADER_SIZE
+            frames.append((msg_type, bytes(self.buf[pos:pos+n])))
+            pos += n
+
+        if pos:
+            del self.buf[:pos]
+
+        return frames
+
+
+#
+# Device query (dq) deltas
+#
+
+class DQSender(object):
+    """ Keeps the last dq sent for each device and sends only what changed. """
+    def __init__(self, fd):
+        self.fd = fd
+        self.sent = {} # { 'device_uri' : dq, ... }
+
+
+    def send(self, device_uri, dq):
+        """ Returns the number of bytes written. """
+        last = self.sent.get(device_uri, {})
+        changed = {}
+        for k, v in dq.items():
+            if k not in last or last[k] != v:
+                changed[k] = v
+
+        removed = [k for k in last if k not in dq]
+
+        self.sent[device_uri] = dq.copy()
+        return writeFrame(self.fd, MSG_DQ_DELTA, packValues(device_uri, changed, removed))
+
+
+class DQReceiver(object):
+    """ Rebuilds the full dq of each device from the deltas. """
+    def __init__(self):
+        self.dqs = {} # { 'device_uri' : dq, ... }
+
+
+    def apply(self, payload):
+        """ Returns (device_uri, dq, changed keys). """
+        device_uri, changed, removed = unpackValues(payload)
+        dq = self.dqs.setdefault(device_uri, {})
+        dq.update(changed)
+        for k in removed:
+            dq.pop(k, None)
+
+        return device_uri, dq, list(changed.keys())
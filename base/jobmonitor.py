@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Waiting between device queries in the fax send and copy threads.
+#
+# A JobMonitor waits on one selector for a cancel (or any other event) put
+# on the UI event queue, for files registered by the thread and for the
+# next device query to be due. The time between queries depends on the
+# phase of the job. It is shortest right after the device state changes and
+# backs off while the state stays the same. Until a fax is transmitting it
+# never goes past the second the threads used to sleep. A transmission lasts
+# tens of seconds and its end is not urgent, so it backs off to 2 seconds.
+#
+
+# Std Lib
+import os
+import time
+import errno
+import fcntl
+import select
+import threading
+
+try:
+    import selectors
+except ImportError: # Python 2
+    selectors = None
+
+# Local
+from .g import *
+from .sixext.moves import queue
+
+# Job phases
+PHASE_SETUP = 1    # waiting for the device to take a request
+PHASE_ACTIVE = 2   # dialing, sending, copying
+PHASE_TRANSMIT = 3 # the device is transmitting a fax
+
+# { phase : (first interval, longest interval) } in seconds
+INTERVALS = {PHASE_SETUP : (0.2, 0.5),
+             PHASE_ACTIVE : (0.5, 1.0),
+             PHASE_TRANSMIT : (0.5, 2.0),
+            }
+
+BACKOFF = 1.5 # interval growth while the device state does not change
+QUEUE_POLL = 0.1 # seconds, for event queues that can't wake the monitor
+
+
+class EventQueue(queue.Queue):
+    """ Queue of UI events for a job thread. put() wakes the JobMonitors waiting on it. """
+    def __init__(self, maxsize=0):
+        queue.Queue.__init__(self, maxsize)
+        self.monitors = []
+        self.monitors_lock = threading.Lock()
+
+
+    def put(self, item, block=True, timeout=None):
+        queue.Queue.put(self, item, block, timeout)
+
+        with self.monitors_lock:
+            monitors = self.monitors[:]
+
+        for m in monitors:
+            m.wake()
+
+
+    def addMonitor(self, monitor):
+        with self.monitors_lock:
+            self.monitors.append(monitor)
+
+
+    def removeMonitor(self, monitor):
+        with self.monitors_lock:
+            try:
+                self.monitors.remove(monitor)
+            except ValueError:
+                pass
+
+
+
+class JobMonitor(object):
+    def __init__(self, event_queue=None, is_cancel=None, phase=PHASE_SETUP, intervals=INTERVALS):
+        """ is_cancel(event) tells the cancel events on event_queue from the others. """
+        self.event_queue = event_queue
+        self.is_cancel = is_cancel
+        self.intervals = intervals
+        self.phase = phase
+        self.interval = intervals[phase][0]
+        self.state = None
+        self.files = {} # { fileobj : fd, ... }
+        self.stats = {'waits' : 0, 'wakeups' : 0, 'queries' : 0, 'waited' : 0.0}
+
+        self.wake_r, self.wake_w = os.pipe()
+        for fd in (self.wake_r, self.wake_w):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+        if selectors is not None:
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.wake_r, selectors.EVENT_READ)
+        else:
+            self.selector = None
+
+        # A plain Queue can't wake us, it is checked every QUEUE_POLL seconds
+        self.queue_wakes = isinstance(event_queue, EventQueue)
+        if self.queue_wakes:
+            event_queue.addMonitor(self)
+
+
+    def close(self):
+        if self.wake_r < 0:
+            return
+
+        if self.queue_wakes:
+            self.event_queue.removeMonitor(self)
+
+        if self.selector is not None:
+            self.selector.close()
+
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+        self.wake_r = self.wake_w = -1
+
+
+    def wake(self):
+        """ Ends a wait() in progress (or the next one). Safe from any thread. """
+        try:
+            os.write(self.wake_w, b'\0')
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EBADF): # already woken, closed
+                raise
+
+
+    def register(self, fileobj):
+        """ wait() returns when fileobj (a file or fd) can be read. """
+        fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        self.files[fileobj] = fd
+        if self.selector is not None:
+            self.selector.register(fd, selectors.EVENT_READ, fileobj)
+
+
+    def unregister(self, fileobj):
+        fd = self.files.pop(fileobj, None)
+        if fd is not None and self.selector is not None:
+            self.selector.unregister(fd)
+
+
+    def setPhase(self, phase):
+        if phase != self.phase:
+            log.debug("Job monitor phase %d -> %d" % (self.phase, phase))
+            self.phase = phase
+            self.interval = self.intervals[phase][0]
+
+
+    def changed(self, state):
+        """ Call with each device state read. Returns True if it changed since the last one. """
+        self.stats['queries'] += 1
+        first, longest = self.intervals[self.phase]
+
+        if state != self.state:
+            self.state = state
+            self.interval = first
+            return True
+
+        self.interval = min(self.interval * BACKOFF, longest)
+        return False
+
+
+    def wait(self, timeout=None):
+        """ Waits timeout seconds (default: the current query interval).
+            Returns early, with the files that can be read ([] for a queue event or
+            wake()), else returns None.
+        """
+        if timeout is None:
+            timeout = self.interval
+
+        self.stats['waits'] += 1
+        start = time.time()
+        end_time = start + timeout
+
+        try:
+            while True:
+                if not self.queue_wakes and self.event_queue is not None and self.event_queue.qsize():
+                    self.stats['wakeups'] += 1
+                    return []
+
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    return None
+
+                if not self.queue_wakes and self.event_queue is not None:
+                    remaining = min(remaining, QUEUE_POLL)
+
+                ready = self.__select(remaining)
+                if ready is not None:
+                    self.stats['wakeups'] += 1
+                    return ready
+
+        finally:
+            self.stats['waited'] += time.time() - start
+
+
+    def canceled(self):
+        """ Takes all the events off the queue. True if one of them was a cancel. """
+        canceled = False
+        if self.event_queue is None:
+            return canceled
+
+        while self.event_queue.qsize():
+            try:
+                event = self.event_queue.get(0)
+            except queue.Empty:
+                break
+
+            if self.is_cancel is not None and self.is_cancel(event):
+                canceled = True
+                log.debug("Cancel pressed!")
+
+        return canceled
+
+
+    def __select(self, timeout):
+        # Returns the readable files ([] if only woken), None on timeout
+        if self.selector is not None:
+            ready = [key.data for key, mask in self.selector.select(timeout)]
+        else:
+            fds = [self.wake_r] + list(self.files.values())
+            try:
+                r, w, x = select.select(fds, [], [], timeout)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    return None
+                raise
+            ready = [f for f, fd in self.files.items() if fd in r]
+            if self.wake_r in r:
+                ready.append(None)
+
+        if not ready:
+            return None
+
+        if None in ready: # the wake up pipe
+            ready.remove(None)
+            try:
+                while os.read(self.wake_r, 64):
+                    pass
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+
+        return ready
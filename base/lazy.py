@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# On demand imports for the modules only some commands need.
+#
+# lazyImport() returns a stand-in that imports the real module the first
+# time one of its attributes is used, so the command line tools do not pay
+# for dbus, pexpect, urllib or the network probing code unless they use them.
+#
+
+# Std Lib
+import sys
+import types
+import threading
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    """ Stands in for a module until one of its attributes is used. """
+    def __init__(self, name, load):
+        types.ModuleType.__init__(self, name)
+        self.__dict__['_lazy_load'] = load
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+
+    def __load(self):
+        d = self.__dict__
+        module = d['_lazy_module']
+        if module is None:
+            with d['_lazy_lock']:
+                module = d['_lazy_module']
+                if module is None:
+                    module = d['_lazy_load']()
+                    d['_lazy_module'] = module
+
+        return module
+
+
+    def __getattr__(self, attr):
+        return getattr(self.__load(), attr)
+
+
+    def __setattr__(self, attr, value):
+        setattr(self.__load(), attr, value)
+
+
+    def __dir__(self):
+        return dir(self.__load())
+
+
+    def __repr__(self):
+        if self.__dict__['_lazy_module'] is None:
+            return "<lazy module '%s'>" % self.__name__
+
+        return repr(self.__dict__['_lazy_module'])
+
+
+
+def lazyImport(name, package=None):
+    """ name and package as for importlib.import_module(). """
+    full_name = package + name if name.startswith('.') else name
+    if full_name in sys.modules:
+        return sys.modules[full_name]
+
+    return LazyModule(full_name, lambda: importlib.import_module(name, package))
+
+
+def lazyMove(name):
+    """ A module from sixext.moves, e.g. lazyMove('urllib_request'). """
+    def load():
+        from .sixext import moves
+        return getattr(moves, name)
+
+    return LazyModule(name, load)
+
+
+def isAvailable(name):
+    """ True if the module can be found, without importing it. """
+    if name in sys.modules:
+        return sys.modules[name] is not None
+
+    try:
+        from importlib.util import find_spec
+    except ImportError: # Python 2
+        import imp
+        try:
+            imp.find_module(name)
+        except ImportError:
+            return False
+        return True
+
+    try:
+        return find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
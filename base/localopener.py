@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2003-2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# URL openers for the embedded web server of local (USB) devices.
+#
+# Kept out of device.py so that urllib and http.client are only imported
+# when a device status page is actually read (see Device.getEWSUrl()).
+#
+
+# Std Lib
+import re
+
+# Local
+from .g import *
+from .sixext.moves import urllib_request, http_client
+from .sixext import xStringIO
+
+
+http_pat_url = re.compile(r"""/(.*?)/(\S*?)\?(?:serial=(\S*)|device=(\S*))&loc=(\S*)""", re.IGNORECASE)
+
+
+# URLs: hp:/usb/HP_LaserJet_3050?serial=00XXXXXXXXXX&loc=/hp/device/info_device_status.xml
+class LocalOpener(urllib_request.URLopener):
+    def open_hp(self, url, dev):
+        log.debug("open_hp(%s)" % url)
+
+        match_obj = http_pat_url.search(url)
+        bus = match_obj.group(1) or ''
+        model = match_obj.group(2) or ''
+        serial = match_obj.group(3) or ''
+        device = match_obj.group(4) or ''
+        loc = match_obj.group(5) or ''
+
+        dev.openEWS()
+        dev.writeEWS("""GET %s HTTP/1.0\nContent-Length:0\nHost:localhost\nUser-Agent:hplip\n\n""" % loc)
+
+        reply = xStringIO()
+        while dev.readEWS(8192, reply, timeout=1):
+            pass
+
+        reply.seek(0)
+        log.log_data(reply.getvalue())
+        
+        response = http_client.HTTPResponse(reply)
+        response.begin()
+
+        if response.status != http_client.OK:
+            raise Error(ERROR_DEVICE_STATUS_NOT_AVAILABLE)
+        else:
+            return response#.fp
+
+# URLs: hp:/usb/HP_OfficeJet_7500?serial=00XXXXXXXXXX&loc=/hp/device/info_device_status.xml
+class LocalOpenerEWS_LEDM(urllib_request.URLopener):
+    def open_hp(self, url, dev, foot=""):
+        log.debug("open_hp(%s)" % url)
+
+        match_obj = http_pat_url.search(url)
+        loc = url.split("=")[url.count("=")]
+
+        dev.openEWS_LEDM()
+        if foot:
+            if "PUT" in foot:
+                dev.writeEWS_LEDM("""%s""" % foot)
+            else:
+                dev.writeEWS_LEDM("""POST %s HTTP/1.1\r\nContent-Type:text/xml\r\nContent-Length:%s\r\nAccept-Encoding: UTF-8\r\nHost:localhost\r\nUser-Agent:hplip\r\n\r\n """ % (loc, len(foot)))
+                dev.writeEWS_LEDM("""%s""" % foot)
+        else:
+            dev.writeEWS_LEDM("""GET %s HTTP/1.1\r\nAccept: text/plain\r\nHost:localhost\r\nUser-Agent:hplip\r\n\r\n""" % loc)
+
+        reply = xStringIO()
+
+        dev.readLEDMData(dev.readEWS_LEDM,reply)
+
+        reply.seek(0)
+        return reply.getvalue()
+
+
+# URLs: hp:/usb/HP_OfficeJet_7500?serial=00XXXXXXXXXX&loc=/hp/device/info_device_status.xml
+class LocalOpener_LEDM(urllib_request.URLopener):
+    def open_hp(self, url, dev, foot=""):
+        log.debug("open_hp(%s)" % url)
+
+        match_obj = http_pat_url.search(url)
+        loc = url.split("=")[url.count("=")]
+
+        dev.openLEDM()
+        if foot:
+            if "PUT" in foot:
+                dev.writeLEDM("""%s""" % foot)
+            else:
+                dev.writeLEDM("""POST %s HTTP/1.1\r\nContent-Type:text/xml\r\nContent-Length:%s\r\nAccept-Encoding: UTF-8\r\nHost:localhost\r\nUser-Agent:hplip\r\n\r\n """ % (loc, len(foot)))
+                dev.writeLEDM("""%s""" % foot)
+        else:
+            dev.writeLEDM("""GET %s HTTP/1.1\r\nAccept: text/plain\r\nHost:localhost\r\nUser-Agent:hplip\r\n\r\n""" % loc)
+
+        reply = xStringIO()
+
+       
+        dev.readLEDMData(dev.readLEDM,reply)
+
+        reply.seek(0)
+        return reply.getvalue()
@@ -25,11 +25,9 @@ import sys
 from .sixext.moves import _thread
 from .sixext import binary_type
 import syslog
-import traceback
 import string
 import os
 import re
-import pprint
 
 #maketrans = ''.maketrans
 #identity = maketrans('','')
@@ -355,6 +353,7 @@ class Logger(object):
 
 
     def exception(self):
+        import traceback
         typ, value, tb = sys.exc_info()
         body = "Traceback (innermost last):\n"
         lst = traceback.format_tb(tb) + traceback.format_exception_only(typ, value)
@@ -545,4 +544,5 @@ class Logger(object):
 
 
     def pprint(self, data):
+        import pprint
         self.info(pprint.pformat(data))
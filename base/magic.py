@@ -926,7 +926,8 @@ magic = [
     [0, 'string', '=', b'ZyXEL\002', 'ZyXEL voice data'],
     ]
 
-magicNumbers = []
+magicNumbers = [] # magicTest()s for the magic table, built on first use (see getMagicNumbers())
+magicNumbersBuilt = False
 hexdigits = '0123456789abcdefABCDEF'
 
 
@@ -1225,7 +1226,7 @@ def load(file):
 
 
 def whatis(data):
-    for test in magicNumbers:
+    for test in getMagicNumbers():
         m = test.compare(data)
 
         if m:
@@ -1264,5 +1265,11 @@ def mime_type(f):
         return ''
 
 
-for m in magic:
-    magicNumbers.append(magicTest(m[0], m[1], m[2], m[3], m[4]))
+def getMagicNumbers():
+    global magicNumbersBuilt
+    if not magicNumbersBuilt:
+        # Tests added by load() go after the built in ones
+        magicNumbers[:0] = [magicTest(m[0], m[1], m[2], m[3], m[4]) for m in magic]
+        magicNumbersBuilt = True
+
+    return magicNumbers
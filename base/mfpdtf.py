@@ -124,7 +124,7 @@ def parseImageVariantHeader(buffer, data_type):
         pass
 
 def parseRecord(buffer):
-    record_type = struct.unpack("<B", buffer[0])[0]
+    record_type = struct.unpack("<B", buffer[0:1])[0]
 
     if record_type == RT_START_PAGE:
         fmt = "<BBHHHIIIHHIII"
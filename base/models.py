@@ -288,6 +288,81 @@ def normalizeModelName(model):
     return utils.xstrip(model.replace(' ', '_').replace('__', '_').replace('~','').replace('/', '_'), '_')
 
 
+# Capability records
+#
+# The fields the device filters test (probeDevices(filter=...) and friends).
+# Their values are small integers, kept per model in a ModelCapabilities
+# record, so a filter is compiled once into bitmasks over the possible
+# values instead of being evaluated on the model dict for every device.
+CAP_FIELDS = ('support-type', 'scan-type', 'fax-type', 'pcard-type', 'copy-type',
+              'status-type', 'clean-type', 'align-type', 'color-cal-type',
+              'linefeed-cal-type', 'pq-diag-type', 'fw-download', 'power-settings',
+              'wifi-config')
+
+CAP_INDEX = dict((f, i) for i, f in enumerate(CAP_FIELDS))
+
+# Values from CAP_VALUE_MIN (COPY_TYPE_NOT_SUPPORTED is -1) up are tested
+# with a bitmask, anything outside the range with the filter's operator
+CAP_VALUE_MIN = -8
+CAP_VALUE_BITS = 64
+
+
+class ModelCapabilities(object):
+    __slots__ = ('data', 'values')
+
+    def __init__(self, data):
+        self.data = data # the model's dict
+        self.values = tuple(int(data.get(f, 0) or 0) for f in CAP_FIELDS)
+
+
+    def supported(self):
+        return self.values[0] > 0 # support-type
+
+
+
+class ModelFilter(object):
+    """ A device filter, { 'field' : (operator, value), ... }, compiled once. """
+    def __init__(self, filter):
+        self.tests = [] # [ (CAP_FIELDS index, accepted values bitmask, op, val), ... ]
+        self.others = [] # [ (field, op, val), ... ] fields that are not in CAP_FIELDS
+
+        for f, p in list((filter or {}).items()):
+            if f is None:
+                continue
+
+            op, val = p
+            try:
+                i = CAP_INDEX[f]
+            except KeyError:
+                self.others.append((f, op, val))
+            else:
+                mask = 0
+                for b in range(CAP_VALUE_BITS):
+                    if op(b + CAP_VALUE_MIN, val):
+                        mask |= 1 << b
+
+                self.tests.append((i, mask, op, val))
+
+
+    def match(self, caps):
+        values = caps.values
+        for i, mask, op, val in self.tests:
+            b = values[i] - CAP_VALUE_MIN
+            if 0 <= b < CAP_VALUE_BITS:
+                if not (mask >> b) & 1:
+                    return False
+
+            elif not op(values[i], val):
+                return False
+
+        for f, op, val in self.others:
+            if not op(caps.data[f], val):
+                return False
+
+        return True
+
+
+
 class ModelData:
     def __init__(self, root_path=None):
         if root_path is None:
@@ -296,6 +371,8 @@ class ModelData:
             self.root_path = root_path
 
         self.__cache = {}
+        self.__caps = {} # { model : ModelCapabilities, ... }
+        self.__missing = set() # models in neither .dat file
         self.reset_includes()
         self.sec = re.compile(r'^\[(.*)\]')
         self.inc = re.compile(r'^\%include (.*)', re.I)
@@ -423,6 +500,9 @@ class ModelData:
             if self.unreleased_dat is not None and os.path.exists(self.unreleased_dat):
                 self.read_section(self.unreleased_dat )
 
+        self.__missing.clear()
+        self.__caps.clear() # made again from the new dicts on first use
+
         return self.__cache
 
 
@@ -529,6 +609,9 @@ class ModelData:
         try:
             return self.__cache[model]
         except:
+            if model in self.__missing:
+                return {}
+
             log.debug("Cache miss: %s" % model)
 
             log.debug("Reading file: %s" % self.released_dat)
@@ -542,9 +625,25 @@ class ModelData:
                 if self.read_section(self.unreleased_dat, model):
                     return self.__cache[model]
 
+            self.__missing.add(model)
             return {}
 
 
+    def capabilities(self, model):
+        """ Returns the ModelCapabilities of the model, None if it is not in the .dat files. """
+        model = model.lower()
+
+        try:
+            return self.__caps[model]
+        except KeyError:
+            data = self[model]
+            if not data:
+                return None
+
+            caps = self.__caps[model] = ModelCapabilities(data)
+            return caps
+
+
     def all_models(self):
         return self.__cache
 
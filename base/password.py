@@ -116,7 +116,8 @@ class Password(object):
             self.__ui_toolkit = 'qt4'
             
             
-        for s in utils.EXPECT_WORD_LIST:
+        self.__expectWordList = utils.getExpectWordList()
+        for s in self.__expectWordList:
             try:
                 p = re.compile(s, re.I)
             except TypeError:
@@ -226,7 +227,7 @@ class Password(object):
 
                     else: # password
                         if(self.__password_prompt_str == ""): 
-                            self.__password_prompt_str = utils.EXPECT_WORD_LIST[i]
+                            self.__password_prompt_str = self.__expectWordList[i]
                             log.debug("Updating password prompt string [%s]"%self.__password_prompt_str)
 
                         child.sendline(self.__password)
@@ -86,6 +86,11 @@ INT_SIZE_BYTE = struct.calcsize('b')
 INT_SIZE_WORD = struct.calcsize('h')
 INT_SIZE_INT = struct.calcsize('i')
 
+# Multi-object requests
+MAX_OBJECTS = 16 # objects in one request (HPMUD_PML_MAX_OBJECTS)
+MAX_PACKET_LEN = 16384 # HPMUD_BUFFER_SIZE
+TIMEOUT = 45 # seconds, as hpmud_get_pml()
+
 
 def buildPMLGetPacket(oid): # String dotted notation
     oid = ''.join([chr(int(b.strip())) for b in oid.split('.')])
@@ -298,6 +303,52 @@ def parsePMLPacket(p, expected_data_type=TYPE_UNKNOWN):
 
 
 
+def buildPMLGetPacketMulti(oids): # [ 'dotted oid', ... ] PML dotted notation (not SNMP)
+    p = bytearray([GET_REQUEST])
+
+    for oid in oids:
+        oid = bytearray([int(b.strip()) for b in oid.split('.')])
+        p.extend([TYPE_OBJECT_IDENTIFIER, len(oid)])
+        p.extend(oid)
+
+    return bytes(p)
+
+
+def parsePMLPacketMulti(p):
+    """ Parses the reply to a multi-object request.
+        Returns (reply, error_code, [ ( 'dotted oid', data, data_type, object_error_code ), ... ]).
+        data is the raw value (as from hpmudext.get_pml()), object_error_code None unless the
+        device sent an error code for that object.
+    """
+    p = bytearray(p)
+    if len(p) < 2:
+        return None, ERROR_UNKNOWN_REQUEST, []
+
+    reply, error_code = p[0], p[1]
+    objects, pos, object_error = [], 2, None
+
+    while pos + 2 <= len(p):
+        # type in the high 6 bits, 10 bit length
+        data_type, length = p[pos] & TYPE_MASK, (p[pos] & 0x03) << 8 | p[pos + 1]
+        pos += 2
+        data = bytes(p[pos : pos + length])
+        pos += length
+
+        if data_type == TYPE_ERROR_CODE:
+            object_error = bytearray(data)[0] if data else ERROR_UNKNOWN_REQUEST
+
+        elif data_type == TYPE_OBJECT_IDENTIFIER:
+            oid = '.'.join([str(b) for b in bytearray(data)])
+            objects.append([oid, b'', TYPE_NULL_VALUE, object_error])
+            object_error = None
+
+        elif objects:
+            objects[-1][1], objects[-1][2] = data, data_type
+
+    return reply, error_code, [tuple(o) for o in objects]
+
+
+
 def HPToSNMP(oid): # 1.
     return '.'.join(['1.3.6.1.4.1.11.2.3.9.4.2', oid, '0'])
 
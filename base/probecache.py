@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Cache for local (USB/parallel) probe results.
+#
+# hpmudext.probe_devices() walks every USB device through libusb and reads
+# the IEEE-1284 device ID of each printer interface. The result only changes
+# when the bus topology changes, so results are cached keyed by a topology
+# signature built from sysfs (no USB control transfers). The cache is
+# dropped early on kernel uevents (netlink) for the usb/parport subsystems.
+# When netlink is not available, the sysfs signature alone is used.
+#
+
+# Std Lib
+import os
+import os.path
+import socket
+import json
+
+# Local
+from .g import *
+
+USB_DEVICES_DIR = 'bus/usb/devices'
+PARPORT_DIRS = ('class/ppdev', 'class/parport', 'bus/parport/devices')
+
+# Attributes that change whenever a USB device is plugged/unplugged/reset
+USB_ATTRS = ('busnum', 'devnum', 'idVendor', 'idProduct')
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_SUBSYSTEMS = {'usb' : 'usb', 'par' : 'parport'}
+UEVENT_ACTIONS = ('add', 'remove', 'change', 'bind', 'unbind')
+
+CACHE_FILE_VERSION = 1
+
+
+class ProbeCache(object):
+    def __init__(self, sysfs_root='/sys', cache_file=None, use_uevents=True):
+        self.sysfs_root = sysfs_root
+        self.cache_file = cache_file
+        self.entries = {} # { bus : (signature, data) }
+        self.uevent_sock = None
+
+        if use_uevents:
+            self.uevent_sock = self.__openUEventSocket()
+
+        self.__load()
+
+
+    def __openUEventSocket(self):
+        try:
+            s = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            s.bind((os.getpid(), 1))
+            s.setblocking(False)
+        except (AttributeError, socket.error, OSError) as e:
+            log.debug("Kernel uevents not available (%s). Using sysfs signatures only." % e)
+            return None
+
+        log.debug("Listening for kernel uevents.")
+        return s
+
+
+    def __drainUEvents(self):
+        # Returns the set of buses that saw a hotplug event since the last call
+        buses = set()
+        if self.uevent_sock is None:
+            return buses
+
+        while True:
+            try:
+                msg = self.uevent_sock.recv(16384)
+            except socket.error:
+                break
+
+            if not msg:
+                break
+
+            fields = msg.split(b'\0')
+            action, subsystem = '', ''
+            for f in fields[1:]:
+                if f.startswith(b'ACTION='):
+                    action = f[7:].decode('ascii', 'replace')
+                elif f.startswith(b'SUBSYSTEM='):
+                    subsystem = f[10:].decode('ascii', 'replace')
+
+            if action in UEVENT_ACTIONS:
+                for bus, subsys in list(UEVENT_SUBSYSTEMS.items()):
+                    if subsystem == subsys:
+                        log.debug("uevent: %s %s" % (action, subsystem))
+                        buses.add(bus)
+
+        return buses
+
+
+    def __readAttr(self, path):
+        try:
+            f = open(path, 'r')
+            try:
+                return f.read().strip()
+            finally:
+                f.close()
+        except (IOError, OSError):
+            return ''
+
+
+    def signature(self, bus):
+        """Cheap description of the current topology of bus, read from sysfs."""
+        sig = []
+
+        if bus == 'usb':
+            top = os.path.join(self.sysfs_root, USB_DEVICES_DIR)
+            try:
+                names = sorted(os.listdir(top))
+            except OSError:
+                return None
+
+            for name in names:
+                if ':' in name: # interface, not a device
+                    continue
+
+                path = os.path.join(top, name)
+                sig.append([name] + [self.__readAttr(os.path.join(path, a)) for a in USB_ATTRS])
+
+        elif bus == 'par':
+            for d in PARPORT_DIRS:
+                top = os.path.join(self.sysfs_root, d)
+                try:
+                    names = sorted(os.listdir(top))
+                except OSError:
+                    continue
+
+                for name in names:
+                    try:
+                        st = os.stat(os.path.join(top, name))
+                    except OSError:
+                        continue
+
+                    sig.append([d, name, int(st.st_ctime)])
+
+        else:
+            return None
+
+        return sig
+
+
+    def get(self, bus):
+        for b in self.__drainUEvents():
+            self.invalidate(b)
+
+        try:
+            sig, data = self.entries[bus]
+        except KeyError:
+            return None
+
+        if sig is None or sig != self.signature(bus):
+            log.debug("Probe cache for bus %s is stale." % bus)
+            self.invalidate(bus)
+            return None
+
+        log.debug("Using cached probe results for bus %s." % bus)
+        return data
+
+
+    def set(self, bus, data):
+        sig = self.signature(bus)
+        if sig is None: # Unable to describe topology, don't cache
+            return
+
+        self.entries[bus] = (sig, data)
+        self.__save()
+
+
+    def invalidate(self, bus=None):
+        if bus is None:
+            self.entries.clear()
+        else:
+            try:
+                del self.entries[bus]
+            except KeyError:
+                return
+
+        self.__save()
+
+
+    def __load(self):
+        if self.cache_file is None:
+            return
+
+        try:
+            f = open(self.cache_file, 'r')
+            try:
+                c = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return
+
+        if not isinstance(c, dict) or c.get('version') != CACHE_FILE_VERSION:
+            return
+
+        for bus, e in list(c.get('entries', {}).items()):
+            try:
+                self.entries[bus] = (e['signature'], e['data'])
+            except (KeyError, TypeError):
+                continue
+
+
+    def __save(self):
+        if self.cache_file is None:
+            return
+
+        c = {'version' : CACHE_FILE_VERSION, 'entries' : {}}
+        for bus, (sig, data) in list(self.entries.items()):
+            c['entries'][bus] = {'signature' : sig, 'data' : data}
+
+        temp_file = self.cache_file + '.%d' % os.getpid()
+        try:
+            f = open(temp_file, 'w')
+            try:
+                json.dump(c, f)
+            finally:
+                f.close()
+            os.rename(temp_file, self.cache_file)
+        except (IOError, OSError):
+            log.debug("Unable to write probe cache %s." % self.cache_file)
+
+
+
+probe_cache = None
+
+def getProbeCache():
+    global probe_cache
+    if probe_cache is None:
+        cache_file = None
+        if prop.user_dir and os.path.isdir(prop.user_dir) and os.access(prop.user_dir, os.W_OK):
+            cache_file = os.path.join(prop.user_dir, 'probe.cache')
+
+        probe_cache = ProbeCache(cache_file=cache_file)
+
+    return probe_cache
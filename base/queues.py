@@ -24,6 +24,7 @@
 import sys
 import os
 import re
+import threading
 
 # Local
 from .g import *
@@ -46,6 +47,7 @@ NET_ZC_PATTERN = re.compile(r'''zc=(.*)''',re.IGNORECASE)
 NET_OTHER_PATTERN = re.compile(r'''(.*)://(.*)''',re.IGNORECASE)
 USB_PATTERN = re.compile(r'''serial=(.*)''',re.IGNORECASE)
 LPSTAT_PATTERN = re.compile(r"""(\S*): (.*)""", re.IGNORECASE)
+PPD_READ_SIZE = 4096
 #BACK_END_PATTERN = re.compile(r'''(.*):(.*)''',re.IGNORECASE)
 
 
@@ -53,6 +55,8 @@ LPSTAT_PATTERN = re.compile(r"""(\S*): (.*)""", re.IGNORECASE)
 ##### Global variables ###
 mapofDevices={}
 Error_Found = False
+ppd_nickname_cache = {} # { 'ppd_file' : (mtime, size, nickname) }
+ppd_nickname_cache_lock = threading.Lock()
 ####### Device class ########
 class DetectedDevice:
     def __init__(self, Printer_Name,Device_URI,Device_Type, ppdType, PPDFileError = False, IsEnabled=True ):
@@ -80,36 +84,70 @@ def addToDeviceList(Key, printer_name, device_uri,back_end, ppd_fileType,PPDFile
     else:
         log.warn("%s is not HP Device." %(printer_name))
 
+# Returns the *NickName of a PPD, reading only as far as the line it is on.
+# Raises IOError if the file can not be read.
+def getPPDNickName(ppd_file):
+    st = os.stat(ppd_file)
+    with ppd_nickname_cache_lock:
+        cached = ppd_nickname_cache.get(ppd_file)
+    if cached is not None and cached[:2] == (st.st_mtime, st.st_size):
+        return cached[2]
+
+    nickname = ''
+    buf = b''
+    f = open(ppd_file, 'rb')
+    try:
+        while True:
+            data = f.read(PPD_READ_SIZE)
+            buf += data
+            # Only complete lines, the *NickName line may be split between reads
+            end = buf.rfind(b'\n') + 1 if data else len(buf)
+            match = NICKNAME_PATTERN.search(buf, 0, end)
+            if match is not None:
+                nickname = to_string_utf8(match.group(1))
+                break
+            if not data:
+                break
+            buf = buf[end:]
+    finally:
+        f.close()
+
+    with ppd_nickname_cache_lock:
+        ppd_nickname_cache[ppd_file] = (st.st_mtime, st.st_size, nickname)
+
+    return nickname
+
+
+# The parts of a queue check that do not depend on the other queues, run concurrently
+def inspectQueue(printer):
+    ppd_file = os.path.join('/etc/cups/ppd', printer.name + '.ppd')
+    try:
+        desc = getPPDNickName(ppd_file)
+    except (IOError, OSError):
+        desc = None
+
+    return ppd_file, os.path.exists(ppd_file), desc
+
+
 #Validate all the Queues
 def parseQueues(mode):
     is_hpcups_installed = to_bool(sys_conf.get('configure', 'hpcups-install', '0'))
     is_hpijs_installed = to_bool(sys_conf.get('configure', 'hpijs-install', '0'))
-    st, output = utils.run('lpstat -v')
     status = True
 
-    cups_printers = []
-    if output.find("No destinations added") != -1 or output.find("lpstat:") != -1:
+    # One CUPS-Get-Printers request for the names, device URIs, states and models of all the queues
+    cups_printers = cups.getPrinters()
+    if not cups_printers:
         log.info("No Queue added")
-    else:
-        for p in output.splitlines():
-            try:
-                match = LPSTAT_PATTERN.search(p)
-                printer_name = match.group(1)
-                device_uri = match.group(2)
-                cups_printers.append((printer_name, device_uri))
-            except AttributeError:
-                pass
-
-    log.debug(cups_printers)
+
+    log.debug([(p.name, p.device_uri) for p in cups_printers])
     log.debug("HPCups installation=%d  HPIJS installation =%d" %(is_hpcups_installed, is_hpijs_installed))
     if cups_printers:
-        for p in cups_printers:
-            printer_name, device_uri = p
+        cups_printers = [p for p in cups_printers
+                         if not p.device_uri.startswith("cups-pdf:/") and not p.device_uri.startswith("ipp:/")]
 
-            if device_uri.startswith("cups-pdf:/"):
-                continue
-            if device_uri.startswith("ipp:/"):
-                continue
+        for p, (ppd_file, ppd_exists, desc) in zip(cups_printers, utils.parallel_map(inspectQueue, cups_printers)):
+            printer_name, device_uri = p.name, p.device_uri
 
             log.debug(log.bold(printer_name))
             log.debug(log.bold('-'*len(printer_name)))
@@ -122,17 +160,15 @@ def parseQueues(mode):
                     is_hp = True
 
             log.debug("Device URI: %s" % device_uri)
-            ppd_file = os.path.join('/etc/cups/ppd', printer_name + '.ppd')
             ppd_fileType = None
             PPDFileError = False
-            if not os.path.exists(ppd_file):
+            if not ppd_exists:
                 log.error("PPD %s file not found" % ppd_file)
                 addToDeviceList(HPOTHER,printer_name, device_uri,back_end, ppd_fileType, PPDFileError, True)
             else:
                 log.debug("PPD: %s" % ppd_file)
-            try:
-                fileptr = open(ppd_file, 'rb').read()
-            except IOError:
+
+            if desc is None:
                 log.warn("Fail to read ppd=%s file"%ppd_file)
                 if os.access(ppd_file,os.R_OK):
                     log.debug("File %s has read permissions" %ppd_file)
@@ -141,16 +177,12 @@ def parseQueues(mode):
                     status = False
                     return mapofDevices,status
                 desc=''
-            else:
-                try:
-                    desc = to_string_utf8( NICKNAME_PATTERN.search(fileptr).group(1) )
-                except AttributeError:
-                    desc = ''
+            elif not desc and p.makemodel:
+                # CUPS copies the *NickName of the PPD to printer-make-and-model
+                desc = p.makemodel
 
             log.debug("PPD Description: %s" % desc)
-            cmd= 'lpstat -p%s' % printer_name
-            st, output = utils.run(cmd)
-            log.debug("Printer status: %s" % output.replace("\n", ""))
+            log.debug("Printer state: %d" % p.state)
 
             #### checking for USb devices ####
             if USB_PATTERN.search(device_uri):
@@ -174,7 +206,7 @@ def parseQueues(mode):
 
             if Key is not None:
                 Is_Print_Q_Enabled= True
-                if output.find('Paused') !=  -1:
+                if p.state == cups.IPP_PRINTER_STATE_STOPPED:
                     Is_Print_Q_Enabled= False
                 Key=Key+"_"+back_end
                 log.debug("Key'%s': deviceType '%s' is_hp '%s' bus '%s' model '%s' serial '%s' dev_file '%s' host '%s' zc '%s' port '%s' Enabled'%d'"\
@@ -30,7 +30,7 @@ from .sixext import BytesIO, to_bytes_utf8, to_bytes_latin, to_string_latin, to_
 from .g import *
 import xml.parsers.expat as expat
 import re
-import cupsext
+from prnt.cups import cupsext # Loaded on first use
 
 try:
     from xml.etree import ElementTree
@@ -449,10 +449,11 @@ def StatusType3( dev, parsedID ): # LaserJet Status (PML/SNMP)
         dev.openPML()
         #result_code, on_off_line = dev.getPML( pml.OID_ON_OFF_LINE, pml.INT_SIZE_BYTE )
         #result_code, sleep_mode = dev.getPML( pml.OID_SLEEP_MODE, pml.INT_SIZE_BYTE )
-        result_code, printer_status = dev.getPML( pml.OID_PRINTER_STATUS, pml.INT_SIZE_BYTE )
-        result_code, device_status = dev.getPML( pml.OID_DEVICE_STATUS, pml.INT_SIZE_BYTE )
-        result_code, cover_status = dev.getPML( pml.OID_COVER_STATUS, pml.INT_SIZE_BYTE )
-        result_code, value = dev.getPML( pml.OID_DETECTED_ERROR_STATE )
+        (result_code, printer_status), (result_code, device_status), \
+            (result_code, cover_status), (result_code, value) = \
+            dev.getPMLMulti([pml.OID_PRINTER_STATUS, pml.OID_DEVICE_STATUS,
+                             pml.OID_COVER_STATUS, pml.OID_DETECTED_ERROR_STATE],
+                            [pml.INT_SIZE_BYTE, pml.INT_SIZE_BYTE, pml.INT_SIZE_BYTE, pml.INT_SIZE_INT])
     except Error:
        dev.closePML()
 
@@ -494,18 +495,23 @@ def StatusType3( dev, parsedID ): # LaserJet Status (PML/SNMP)
 
         # TODO: Deal with printers that return -1 and -2 for level and max (LJ3380)
 
-        log.debug("OID_MARKER_SUPPLIES_LEVEL_%d:" % x)
-        oid = ( pml.OID_MARKER_SUPPLIES_LEVEL_x % x, pml.OID_MARKER_SUPPLIES_LEVEL_x_TYPE )
-        result_code, agent_level = dev.getPML( oid )
+        # The rest of the supply's objects (but the colorant value, which
+        # needs the colorant index) in one request
+        log.debug("OID_MARKER_SUPPLIES_LEVEL/MAX/COLORANT_INDEX_%d, OID_MARKER_STATUS_%d:" % (x, x))
+        level, maximum, index, marker_status = dev.getPMLMulti(
+            [( pml.OID_MARKER_SUPPLIES_LEVEL_x % x, pml.OID_MARKER_SUPPLIES_LEVEL_x_TYPE ),
+             ( pml.OID_MARKER_SUPPLIES_MAX_x % x, pml.OID_MARKER_SUPPLIES_MAX_x_TYPE ),
+             ( pml.OID_MARKER_SUPPLIES_COLORANT_INDEX_x % x, pml.OID_MARKER_SUPPLIES_COLORANT_INDEX_x_TYPE ),
+             ( pml.OID_MARKER_STATUS_x % x, pml.OID_MARKER_STATUS_x_TYPE )])
+
+        result_code, agent_level = level
 
         if result_code != ERROR_SUCCESS:
             log.debug("Failed")
             break
 
         log.debug( 'agent%d-level: %d' % ( x, agent_level ) )
-        log.debug("OID_MARKER_SUPPLIES_MAX_%d:" % x)
-        oid = ( pml.OID_MARKER_SUPPLIES_MAX_x % x, pml.OID_MARKER_SUPPLIES_MAX_x_TYPE )
-        result_code, agent_max = dev.getPML( oid )
+        result_code, agent_max = maximum
 
         if agent_max == 0: agent_max = 1
 
@@ -514,9 +520,7 @@ def StatusType3( dev, parsedID ): # LaserJet Status (PML/SNMP)
             break
 
         log.debug( 'agent%d-max: %d' % ( x, agent_max ) )
-        log.debug("OID_MARKER_SUPPLIES_COLORANT_INDEX_%d:" % x)
-        oid = ( pml.OID_MARKER_SUPPLIES_COLORANT_INDEX_x % x, pml.OID_MARKER_SUPPLIES_COLORANT_INDEX_x_TYPE )
-        result_code, colorant_index = dev.getPML( oid )
+        result_code, colorant_index = index
 
         if result_code != ERROR_SUCCESS: # 3080, 3055 will fail here
             log.debug("Failed")
@@ -574,9 +578,7 @@ def StatusType3( dev, parsedID ): # LaserJet Status (PML/SNMP)
                             else:
                                 agent_type = AGENT_TYPE_UNSPECIFIED
 
-        log.debug("OID_MARKER_STATUS_%d:" % x)
-        oid = ( pml.OID_MARKER_STATUS_x % x, pml.OID_MARKER_STATUS_x_TYPE )
-        result_code, agent_status = dev.getPML( oid )
+        result_code, agent_status = marker_status
 
         if result_code != ERROR_SUCCESS:
             log.debug("Failed")
@@ -921,15 +923,14 @@ def getFaxStatus(dev):
         try:
             dev.openPML()
 
-            result_code, tx_state = dev.getPML(pml.OID_FAXJOB_TX_STATUS)
+            (result_code, tx_state), (rx_result_code, rx_state) = \
+                dev.getPMLMulti([pml.OID_FAXJOB_TX_STATUS, pml.OID_FAXJOB_RX_STATUS])
 
             if result_code == ERROR_SUCCESS and tx_state:
                 if tx_state not in (pml.FAXJOB_TX_STATUS_IDLE, pml.FAXJOB_TX_STATUS_DONE):
                     tx_active = True
 
-            result_code, rx_state = dev.getPML(pml.OID_FAXJOB_RX_STATUS)
-
-            if result_code == ERROR_SUCCESS and rx_state:
+            if rx_result_code == ERROR_SUCCESS and rx_state:
                 if rx_state not in (pml.FAXJOB_RX_STATUS_IDLE, pml.FAXJOB_RX_STATUS_DONE):
                     rx_active = True
 
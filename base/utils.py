@@ -35,18 +35,26 @@ import socket
 import struct
 import select
 import time
+import threading
 import fcntl
 import errno
 import stat
 import string
 import glob
 import re
+import shlex
 import datetime
 from .g import *
 import locale
-from .sixext.moves import html_entities, urllib2_request, urllib2_parse, urllib2_error
 from .sixext import PY3, to_unicode, to_bytes_utf8, to_string_utf8, BytesIO, StringIO, subprocess
 from . import os_utils
+from .lazy import lazyImport, lazyMove, isAvailable
+
+html_entities = lazyMove('html_entities')
+urllib2_request = lazyMove('urllib2_request')
+urllib2_parse = lazyMove('urllib2_parse')
+urllib2_error = lazyMove('urllib2_error')
+
 try:
     import xml.parsers.expat as expat
     xml_expat_avail = True
@@ -59,12 +67,10 @@ try:
 except ImportError:
     platform_avail = False
 
-try:
-    import dbus
-    from dbus import SystemBus, lowlevel
-    dbus_avail=True
-except ImportError:
-    dbus_avail=False
+dbus_avail = isAvailable('dbus')
+if dbus_avail:
+    dbus = lazyImport('dbus')
+    lowlevel = lazyImport('dbus.lowlevel')
 
 try:
     import hashlib # new in 2.5
@@ -84,7 +90,8 @@ except ImportError:
 # Local
 from .g import *
 from .codes import *
-from . import pexpect
+
+pexpect = lazyImport('.pexpect', __package__)
 
 
 BIG_ENDIAN = 0
@@ -107,9 +114,9 @@ ERROR_DIGITAL_SIGN_BAD =3
 MAJ_VER = sys.version_info[0]
 MIN_VER = sys.version_info[1]
 
-EXPECT_WORD_LIST = [
-    pexpect.EOF, # 0
-    pexpect.TIMEOUT, # 1
+# Prompts answered by run(), they follow pexpect.EOF and pexpect.TIMEOUT
+# in the expect list (see getExpectWordList()).
+EXPECT_PROMPTS = [
     u"Continue?", # 2 (for zypper)
     u"passwor[dt]:", # en/de/it/ru
     u"kennwort", # de?
@@ -125,14 +132,24 @@ EXPECT_WORD_LIST = [
 ]
 
 
-EXPECT_LIST = []
-for s in EXPECT_WORD_LIST:
-    try:
-        p = re.compile(s, re.I)
-    except TypeError:
-        EXPECT_LIST.append(s)
-    else:
-        EXPECT_LIST.append(p)
+EXPECT_LIST = [] # Filled in by the first run() that needs pexpect
+
+
+def getExpectWordList():
+    return [pexpect.EOF, pexpect.TIMEOUT] + EXPECT_PROMPTS
+
+
+def __initExpectList():
+    if EXPECT_LIST:
+        return
+
+    for s in getExpectWordList():
+        try:
+            p = re.compile(s, re.I)
+        except TypeError:
+            EXPECT_LIST.append(s)
+        else:
+            EXPECT_LIST.append(p)
 
 
 def get_cups_systemgroup_list():
@@ -1253,8 +1270,121 @@ def getEndian():
 # Function: run()
 #   Note:- to run su/sudo commands, caller needs to pass passwordObj.
 #          password object can be created from base.password.py
+#
+#   Commands that can not prompt (no su/sudo, not zypper) are run on plain
+#   pipes, see run_fast(). The rest go through pexpect so that the password
+#   and zypper prompts can be answered.
+
+RUN_MANY_WORKERS = 8
+
+PROMPT_COMMANDS = ('su', 'sudo', 'kdesudo', 'gksu', 'gksudo', 'gnomesu', 'zypper')
+
+run_cache = None # { 'cmd' : (status, output) } while a run cache is active
+run_cache_lock = threading.Lock()
+
+
+def start_run_cache():
+    """ Remember the results of run_fast() until stop_run_cache() is called,
+        for tools like hp-check that run the same commands several times. """
+    global run_cache
+    with run_cache_lock:
+        if run_cache is None:
+            run_cache = {}
+
+
+def stop_run_cache():
+    global run_cache
+    with run_cache_lock:
+        run_cache = None
+
+
+def __promptPossible(cmd):
+    # Any word of the command, quoted or after a ';', '&&' or '|', can be one
+    return any(os.path.basename(w) in PROMPT_COMMANDS for w in re.split(r"""[\s"';&|()]+""", cmd))
+
+
+def run_fast(cmd, log_output=True, spinner=True, cache=True):
+    """ Runs a non-interactive command on pipes, stderr is merged into stdout
+        like it is on the pexpect pty. Returns (exit status, output). """
+    if cache:
+        with run_cache_lock:
+            if run_cache is not None and cmd in run_cache:
+                log.debug("Using cached output of '%s'" % cmd)
+                return run_cache[cmd]
+
+    devnull = open(os.devnull, 'rb')
+    try:
+        try:
+            child = Popen(shlex.split(cmd), stdin=devnull, stdout=PIPE,
+                          stderr=subprocess.STDOUT, close_fds=True)
+        except (OSError, ValueError, IndexError) as e:
+            log.debug("Unable to run '%s': %s" % (cmd, e))
+            return -1, ''
+
+        if spinner:
+            update_spinner()
+
+        data = child.communicate()[0]
+    finally:
+        devnull.close()
+
+    if spinner:
+        cleanup_spinner()
+
+    output = data.decode('utf-8', 'replace')
+    if log_output and output:
+        log.debug(output)
+
+    # pexpect reports None when the command was killed by a signal
+    status = child.returncode if child.returncode >= 0 else None
+
+    if cache:
+        with run_cache_lock:
+            if run_cache is not None:
+                run_cache[cmd] = (status, output)
+
+    return status, output
+
+
+def parallel_map(func, items, max_workers=RUN_MANY_WORKERS):
+    """ Calls func on each of items from a few threads.
+        Returns the results in the order of items. """
+    items = list(items)
+    results = [None] * len(items)
+    pending = list(range(len(items)))
+    pending.reverse()
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                i = pending.pop()
+
+            results[i] = func(items[i])
+
+    threads = [threading.Thread(target=worker) for i in range(min(max_workers, len(items)))]
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    for t in threads:
+        t.join()
+
+    return results
+
+
+def run_many(cmds, log_output=True, max_workers=RUN_MANY_WORKERS):
+    """ Runs independent non-interactive commands in parallel.
+        Returns [(exit status, output), ...] in the order of cmds. """
+    return parallel_map(lambda cmd: run_fast(cmd, log_output, spinner=False), cmds, max_workers)
+
 
 def run(cmd, passwordObj = None, pswd_msg='', log_output=True, spinner=True, timeout=1):
+    if not __promptPossible(cmd):
+        return run_fast(cmd, log_output, spinner)
+
     import io
     output = io.StringIO()
 
@@ -1269,6 +1399,8 @@ def run(cmd, passwordObj = None, pswd_msg='', log_output=True, spinner=True, tim
             if(passwd == ""):
                return 127, ""
 
+    __initExpectList()
+
     try:
         child = pexpect.spawnu(cmd, timeout=timeout)
     except pexpect.ExceptionPexpect as e:
@@ -2083,7 +2215,7 @@ def sendEvent(event_code,device_uri, printer_name, username="", job_id=0, title=
     args = [device_uri, printer_name, event_code, username, job_id, title, pipe_name]
     msg = lowlevel.SignalMessage('/', DBUS_SERVICE, 'Event')
     msg.append(signature='ssisiss', *args)
-    SystemBus().send_message(msg)
+    dbus.SystemBus().send_message(msg)
     log.debug("send_message() returning")
 
 def expand_list(File_exp):
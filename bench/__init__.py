@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Transport simulator and benchmark harness for the HPLIP I/O paths.
+#
+# The simulator replaces the hpmudext, cupsext and scanext extensions with
+# in-process stand-ins driven by a trace (see trace.py), so the Python side
+# of device I/O, status parsing, scanning and faxing can be measured on a
+# machine without printers. Run from the top of the source tree:
+#
+#   python -m bench.harness [--trace=FILE] [--json=FILE] [--iterations=N] [BENCHMARK...]
+#
+# The hpcups raster filter is measured separately, in pages per minute:
+#
+#   python -m bench.hpcups --ppd=FILE [--threads=0,1,2,3] [RASTER_FILE...]
+#
+# hp-check wall time, and the commands it runs on a pty and on pipes:
+#
+#   python -m bench.check [--iterations=N] [--commands-only]
+#
+# Start up and import time of the command line tools (-X importtime):
+#
+#   python -m bench.imports [--iterations=N] [--top=N] [TOOL...]
+#
+# Device queries and cancel reaction time of the fax and copy job threads:
+#
+#   python -m bench.jobmonitor [--scale=F] [--cancel-at=S]
+#
+# Time to first page of the pstotiff fax filter, with a stand-in ghostscript:
+#
+#   python -m bench.pstotiff [--pages=N] [--page-time=S] [--strip-size=N]
+#
+# Photo card unload throughput against a FAT image, with the pcardext extension:
+#
+#   python -m bench.unload [--files=N] [--size=BYTES] [--delay=S]
+#
+# Photo card directory browsing, with the directory index and without:
+#
+#   python -m bench.pcardbrowse [--dirs=N] [--files=N] [--delay=S]
+#
+# Photo card writes for deleting photos, a file at a time and together:
+#
+#   python -m bench.pcardrm [--files=N] [--size=BYTES] [--delay=S]
+#
+# Fax page coding in pages per second, Python and with the hpipext extension:
+#
+#   python -m bench.g3codec [--file=FILE] [--iterations=N]
+#
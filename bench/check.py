@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Wall time benchmark for hp-check and the commands it runs.
+#
+# First the system commands hp-check runs are timed one by one through
+# utils.run() on a pexpect pty (the old path, used now only for su, sudo and
+# zypper, which can prompt), on plain pipes, and all together through
+# utils.run_many(). Then hp-check itself is run and its wall time reported.
+#
+
+# Std Lib
+import os
+import sys
+import time
+import getopt
+import shutil
+import tempfile
+import subprocess
+
+USAGE = """hp-bench-check: Measure hp-check wall time.
+
+Usage: python -m bench.check [OPTIONS]
+
+  --iterations=N       Runs of each measurement, the best is reported (default: 3)
+  --hp-check=PATH      hp-check to run (default: check.py in the source tree)
+  --commands-only      Only time the individual commands
+"""
+
+COMMANDS = ["uname -r -v -o", "uname -n", "lpstat -v", "scanimage -L", "lsusb -d03f0:"]
+
+
+def runPty(utils, cmd):
+    # utils.run() as if the command could prompt, so it is run with pexpect.
+    # None of the commands are run through su or sudo, nothing is asked for.
+    prompt_possible = getattr(utils, '__promptPossible')
+    setattr(utils, '__promptPossible', lambda cmd: True)
+    try:
+        return utils.run(cmd, log_output=False, spinner=False)
+    finally:
+        setattr(utils, '__promptPossible', prompt_possible)
+
+
+def best(f, iterations):
+    t = None
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - t0
+        if t is None or elapsed < t:
+            t = elapsed
+    return t
+
+
+def commands(utils):
+    cmds = [c for c in COMMANDS if utils.which(c.split()[0])]
+
+    status, output = utils.run_fast('lpstat -v', log_output=False, cache=False)
+    for line in output.splitlines():
+        if line.startswith('device for '):
+            cmds.append('lpstat -p%s' % line[11:].split(':', 1)[0])
+
+    return cmds
+
+
+def timeCommands(utils, iterations):
+    cmds = commands(utils)
+    pty_total, pipe_total = 0.0, 0.0
+
+    sys.stdout.write("%-40s %12s %12s\n" % ('command', 'pty (s)', 'pipes (s)'))
+    for cmd in cmds:
+        pty = best(lambda: runPty(utils, cmd), iterations)
+        pipe = best(lambda: utils.run_fast(cmd, log_output=False, spinner=False, cache=False), iterations)
+        pty_total += pty
+        pipe_total += pipe
+        sys.stdout.write("%-40s %12.4f %12.4f\n" % (cmd[:40], pty, pipe))
+
+    parallel = best(lambda: utils.run_many(cmds, log_output=False), iterations)
+    sys.stdout.write("%-40s %12.4f %12.4f\n" % ('total (%d commands)' % len(cmds), pty_total, pipe_total))
+    sys.stdout.write("%-40s %12s %12.4f\n" % ('run_many()', '-', parallel))
+
+
+def timeCheck(hp_check, iterations):
+    if hp_check.endswith('.py'):
+        args = [sys.executable, hp_check, '-s', '-t']
+    else:
+        args = [hp_check, '-s', '-t']
+
+    # hp-check writes hp-check.log into the current directory
+    work = tempfile.mkdtemp(prefix='hp-check-bench-')
+    try:
+        def run():
+            devnull = open(os.devnull, 'wb')
+            try:
+                subprocess.call(args, cwd=work, stdout=devnull, stderr=devnull)
+            finally:
+                devnull.close()
+
+        t = best(run, iterations)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    sys.stdout.write("\n%-40s %12.3f s\n" % ('hp-check wall time', t))
+
+
+def main(args):
+    try:
+        opts, args = getopt.getopt(args, 'h', ['help', 'iterations=', 'hp-check=', 'commands-only'])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s" % (e, USAGE))
+        return 1
+
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    iterations, hp_check, commands_only = 3, os.path.join(top, 'check.py'), False
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif o == '--iterations':
+            iterations = max(1, int(a))
+        elif o == '--hp-check':
+            hp_check = a
+        elif o == '--commands-only':
+            commands_only = True
+
+    if top not in sys.path:
+        sys.path.insert(0, top)
+
+    from base import utils
+
+    timeCommands(utils, iterations)
+    if not commands_only:
+        timeCheck(hp_check, iterations)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# In-process stand-ins for the hpmudext, cupsext, scanext and pcardext
+# extensions.
+#
+# The API and result codes follow io/mudext/hpmudext.c, prnt/cupsext/cupsext.c,
+# scan/scanext/scanext.c and pcard/pcardext/pcardext.c. Every call is counted in 'calls' so benchmarks
+# can report device round trips and IPP requests.
+#
+
+# Std Lib
+import sys
+import time
+import types
+import collections
+
+# Local
+from .responder import HTTPResponder, PMLResponder
+
+# enum HPMUD_RESULT
+HPMUD_R_OK = 0
+HPMUD_R_INVALID_DEVICE = 2
+HPMUD_R_INVALID_DESCRIPTOR = 3
+HPMUD_R_INVALID_URI = 4
+HPMUD_R_INVALID_LENGTH = 8
+HPMUD_R_IO_ERROR = 12
+HPMUD_R_DEVICE_BUSY = 21
+HPMUD_R_INVALID_SN = 28
+HPMUD_R_INVALID_CHANNEL_ID = 30
+HPMUD_R_INVALID_STATE = 31
+HPMUD_R_INVALID_DEVICE_OPEN = 37
+HPMUD_R_INVALID_DEVICE_NODE = 38
+HPMUD_R_INVALID_IP = 45
+HPMUD_R_INVALID_IP_PORT = 46
+HPMUD_R_INVALID_TIMEOUT = 47
+HPMUD_R_DATFILE_ERROR = 48
+HPMUD_R_IO_TIMEOUT = 49
+HPMUD_R_INVALID_MDNS = 50
+
+HPMUD_BUFFER_SIZE = 16384
+
+PML_ERROR_UNKNOWN_OID = 0x83
+PML_MAX_OBJECTS = 16
+
+PML_CHANNEL = 'HP-MESSAGE'
+
+HTTP_CHANNELS = ('HP-EWS', 'HP-EWS-LEDM', 'HP-LEDM-SCAN', 'HP-SOAP-SCAN', 'HP-SOAP-FAX',
+                 'HP-MARVELL-EWS', 'HP-DEVMGMT', 'HP-WIFICONFIG')
+
+
+class Channel(object):
+    def __init__(self, name, trace):
+        self.name = name
+        self.responder = None
+        self.pending = b''
+        self.bytes_written = 0
+
+        if name in HTTP_CHANNELS:
+            self.responder = HTTPResponder(trace)
+            self.pattern, self.remaining = b'', 0
+        elif name == PML_CHANNEL:
+            self.responder = PMLResponder(trace)
+            self.pattern, self.remaining = b'', 0
+        else:
+            self.pattern, self.remaining = trace.channel(name)
+
+        self.pos = 0
+
+
+    def read(self, n):
+        if self.pending:
+            data, self.pending = self.pending[:n], self.pending[n:]
+            return data
+
+        if not self.remaining or not self.pattern:
+            return b''
+
+        n = min(n, self.remaining)
+        p = self.pattern
+        start = self.pos % len(p)
+        data = p[start:start+n]
+        while len(data) < n:
+            data += p[:n-len(data)]
+
+        self.pos += n
+        self.remaining -= n
+        return data
+
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        if self.responder is not None:
+            reply = self.responder.write(data)
+            if reply is not None:
+                self.pending += reply
+
+
+
+class FakeHPMUD(types.ModuleType):
+    def __init__(self, trace, name='hpmudext'):
+        types.ModuleType.__init__(self, name)
+        self.trace = trace
+        self.calls = collections.Counter()
+        self.devices = {} # { dd : uri }
+        self.channels = {} # { (dd, cd) : Channel }
+        self.next_dd, self.next_cd = 1, 1
+
+        for k, v in list(globals().items()):
+            if k.startswith('HPMUD_'):
+                setattr(self, k, v)
+
+        self.HPMUD_UNI_MODE, self.HPMUD_RAW_MODE, self.HPMUD_DOT4_MODE = 0, 1, 3
+        self.HPMUD_DOT4_PHOENIX_MODE, self.HPMUD_DOT4_BRIDGE_MODE = 4, 5
+        self.HPMUD_MLC_GUSHER_MODE, self.HPMUD_MLC_MISER_MODE = 6, 7
+        self.HPMUD_BUS_NA, self.HPMUD_BUS_USB, self.HPMUD_BUS_PARALLEL, self.HPMUD_BUS_ALL = 0, 1, 2, 3
+
+        for c in ('PRINT', 'PML:HP-MESSAGE', 'SCAN:HP-SCAN', 'FAX_SEND:HP-FAX-SEND',
+                  'CONFIG_UPLOAD:HP-CONFIGURATION-UPLOAD', 'CONFIG_DOWNLOAD:HP-CONFIGURATION-DOWNLOAD',
+                  'MEMORY_CARD:HP-CARD-ACCESS', 'EWS:HP-EWS', 'EWS_LEDM:HP-EWS-LEDM',
+                  'MARVELL_FAX:HP-MARVELL-FAX', 'WIFI:HP-WIFICONFIG', 'MARVELL_EWS:HP-MARVELL-EWS',
+                  'DEVMGMT:HP-DEVMGMT'):
+            attr, sep, value = c.partition(':')
+            setattr(self, 'HPMUD_S_%s_CHANNEL' % attr, value or attr)
+
+        self.HPMUD_S_SOAP_SCAN = 'HP-SOAP-SCAN'
+        self.HPMUD_S_SOAP_FAX = 'HP-SOAP-FAX'
+        self.HPMUD_S_LEDM_SCAN = 'HP-LEDM-SCAN'
+
+
+    def __delay(self, what):
+        t = self.trace.latency(what)
+        if t:
+            time.sleep(t)
+
+
+    def open_device(self, uri, io_mode):
+        self.calls['open_device'] += 1
+        dd, self.next_dd = self.next_dd, self.next_dd + 1
+        self.devices[dd] = uri
+        return HPMUD_R_OK, dd
+
+
+    def close_device(self, dd):
+        self.calls['close_device'] += 1
+        for k in [k for k in self.channels if k[0] == dd]:
+            del self.channels[k]
+        return HPMUD_R_OK if self.devices.pop(dd, None) is not None else HPMUD_R_INVALID_DEVICE
+
+
+    def get_device_id(self, dd):
+        self.calls['get_device_id'] += 1
+        self.__delay('pml')
+        return HPMUD_R_OK, self.trace.deviceID()
+
+
+    def probe_devices(self, bus):
+        self.calls['probe_devices'] += 1
+        name = {self.HPMUD_BUS_USB : 'usb', self.HPMUD_BUS_PARALLEL : 'par'}.get(bus, '')
+        return HPMUD_R_OK, self.trace.probe(name)
+
+
+    def open_channel(self, dd, name):
+        self.calls['open_channel'] += 1
+        if dd not in self.devices:
+            return HPMUD_R_INVALID_DEVICE, -1
+
+        cd, self.next_cd = self.next_cd, self.next_cd + 1
+        self.channels[(dd, cd)] = Channel(name, self.trace)
+        return HPMUD_R_OK, cd
+
+
+    def close_channel(self, dd, cd):
+        self.calls['close_channel'] += 1
+        return HPMUD_R_OK if self.channels.pop((dd, cd), None) is not None else HPMUD_R_INVALID_CHANNEL_ID
+
+
+    def write_channel(self, dd, cd, data, timeout=30):
+        self.calls['write_channel'] += 1
+        try:
+            c = self.channels[(dd, cd)]
+        except KeyError:
+            return HPMUD_R_INVALID_CHANNEL_ID, 0
+
+        if not isinstance(data, bytes):
+            data = bytes(data) if not isinstance(data, str) else data.encode('utf-8')
+
+        if c.name == PML_CHANNEL: # a PML request, one device round trip
+            self.calls['pml_request'] += 1
+            self.__delay('pml')
+        else:
+            self.__delay('write')
+
+        c.write(data)
+        return HPMUD_R_OK, len(data)
+
+
+    def read_channel(self, dd, cd, bytes_to_read, timeout=30):
+        self.calls['read_channel'] += 1
+        if bytes_to_read > HPMUD_BUFFER_SIZE:
+            return HPMUD_R_INVALID_LENGTH, b''
+
+        try:
+            c = self.channels[(dd, cd)]
+        except KeyError:
+            return HPMUD_R_INVALID_CHANNEL_ID, b''
+
+        self.__delay('read')
+        return HPMUD_R_OK, c.read(bytes_to_read)
+
+
+    def get_pml(self, dd, cd, oid, typ):
+        self.calls['get_pml'] += 1
+        self.__delay('pml')
+        e = self.trace.pml(oid)
+        if e is None:
+            return HPMUD_R_OK, b'', typ, PML_ERROR_UNKNOWN_OID
+
+        pml_result_code, typ, data = e
+        return HPMUD_R_OK, data, typ, pml_result_code
+
+
+    def get_pml_multi(self, dd, cd, oids):
+        # One SNMP get for all the objects (see hpmud_get_pml_multi())
+        self.calls['get_pml_multi'] += 1
+        if not 0 < len(oids) <= PML_MAX_OBJECTS:
+            return HPMUD_R_INVALID_LENGTH, []
+
+        self.__delay('pml')
+        objects = []
+        for oid in oids:
+            e = self.trace.pml(oid)
+            if e is None:
+                objects.append((b'', 0, PML_ERROR_UNKNOWN_OID))
+            else:
+                pml_result_code, typ, data = e
+                objects.append((data, typ, pml_result_code))
+
+        return HPMUD_R_OK, objects
+
+
+    def set_pml(self, dd, cd, oid, typ, data):
+        self.calls['set_pml'] += 1
+        self.__delay('pml')
+        self.trace.setPML(oid, typ, data)
+        return HPMUD_R_OK, 0
+
+
+    def make_usb_uri(self, busnum, devnum):
+        return HPMUD_R_INVALID_URI, ''
+
+    make_par_uri = lambda self, devnode: (HPMUD_R_INVALID_URI, '')
+    make_net_uri = lambda self, ip, port: (HPMUD_R_INVALID_URI, '')
+    make_zc_uri = lambda self, hn, port: (HPMUD_R_INVALID_URI, '')
+    get_zc_ip_address = lambda self, hn: (HPMUD_R_INVALID_URI, '')
+
+
+
+class Printer(object):
+    def __init__(self, device_uri, printer_uri, name, location, makemodel, info, state, accepting):
+        self.device_uri = device_uri
+        self.printer_uri = printer_uri
+        self.name = name
+        self.location = location
+        self.makemodel = makemodel
+        self.info = info
+        self.state = state
+        self.accepting = accepting
+
+
+
+class FakeCupsExt(types.ModuleType):
+    def __init__(self, trace, name='cupsext'):
+        types.ModuleType.__init__(self, name)
+        self.trace = trace
+        self.calls = collections.Counter()
+        self.Printer = Printer
+
+
+    def getPrinters(self):
+        self.calls['getPrinters'] += 1
+        return [Printer(p.get('device-uri', ''), 'ipp://localhost/printers/%s' % p['name'],
+                        p['name'], p.get('location', ''), p.get('make-and-model', ''),
+                        p.get('info', ''), p.get('state', 3), p.get('accepting', 1))
+                for p in self.trace.get('cups', {}).get('printers', [])]
+
+
+    def getPrinterChangeTimes(self):
+        self.calls['getPrinterChangeTimes'] += 1
+        return [(p['name'], 0, 0) for p in self.trace.get('cups', {}).get('printers', [])]
+
+
+    def getJobs(self, my_job=0, completed=0):
+        self.calls['getJobs'] += 1
+        return []
+
+
+    def getDefaultPrinter(self):
+        self.calls['getDefaultPrinter'] += 1
+        printers = self.trace.get('cups', {}).get('printers', [])
+        return printers[0]['name'] if printers else None
+
+
+    def getVersion(self):
+        return 2.2
+
+    def getVersionTuple(self):
+        return (2, 2, 0)
+
+    def getServer(self):
+        return 'localhost'
+
+
+    def __getattr__(self, attr):
+        # Everything else (PPD handling, options, admin operations) is a no-op
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+
+        def stub(*args, **kwargs):
+            self.calls[attr] += 1
+            return 0
+
+        return stub
+
+
+
+# scanext constants (scan/scanext/scanext.c)
+SCANEXT_CONSTANTS = {
+    'FRAME_GRAY' : 0, 'FRAME_RGB' : 1,
+    'SANE_STATUS_GOOD' : 0, 'SANE_STATUS_DEVICE_BUSY' : 3, 'SANE_STATUS_EOF' : 5,
+    'TYPE_BOOL' : 0, 'TYPE_INT' : 1, 'TYPE_FIXED' : 2, 'TYPE_STRING' : 3,
+    'TYPE_BUTTON' : 4, 'TYPE_GROUP' : 5,
+    'UNIT_NONE' : 0, 'UNIT_PIXEL' : 1, 'UNIT_BIT' : 2, 'UNIT_MM' : 3, 'UNIT_DPI' : 4,
+    'UNIT_PERCENT' : 5, 'UNIT_MICROSECOND' : 6,
+    'INFO_RELOAD_OPTIONS' : 2,
+}
+
+
+class ScanError(Exception):
+    pass
+
+
+
+class FakeScanExt(types.ModuleType):
+    def __init__(self, trace, name='scanext'):
+        types.ModuleType.__init__(self, name)
+        self.trace = trace
+        self.calls = collections.Counter()
+        self.error = ScanError
+        for k, v in list(SCANEXT_CONSTANTS.items()):
+            setattr(self, k, v)
+
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+
+        def stub(*args, **kwargs):
+            self.calls[attr] += 1
+            return 0
+
+        return stub
+
+
+
+class FakeScanDevice(object):
+    """Stands in for scan.sane.ScanDevice: a page described by trace['scan']."""
+
+    def __init__(self, trace):
+        s = trace.get('scan', {})
+        self.format = s.get('format', SCANEXT_CONSTANTS['FRAME_RGB'])
+        self.depth = s.get('depth', 8)
+        self.pixels_per_line = s.get('pixels-per-line', 2550)
+        self.lines = s.get('lines', 3300)
+
+        if self.format == SCANEXT_CONSTANTS['FRAME_RGB']:
+            self.bytes_per_line = self.pixels_per_line * 3
+        elif self.depth == 1:
+            self.bytes_per_line = (self.pixels_per_line + 7) // 8
+        else:
+            self.bytes_per_line = self.pixels_per_line
+
+        self.line = b'\x7f' * self.bytes_per_line
+        self.lines_left = self.lines
+
+
+    def getParameters(self):
+        return (self.format, '', 1, self.pixels_per_line, self.lines,
+                self.depth, self.bytes_per_line)
+
+
+    def readScan(self, bytes_to_read):
+        if not self.lines_left:
+            raise ScanError(SCANEXT_CONSTANTS['SANE_STATUS_EOF'])
+
+        self.lines_left -= 1
+        return SCANEXT_CONSTANTS['SANE_STATUS_GOOD'], self.line
+
+
+
+class FakePCardExt(types.ModuleType):
+    """Photo card with the files in trace['pcard']['files'] ({ name : size }) in
+       its current directory. File data is a fixed byte pattern, after the
+       bytes in heads[name] if a benchmark has set them."""
+
+    PATTERN = bytes(bytearray(range(251)))
+
+    def __init__(self, trace, name='pcard.pcardext'):
+        types.ModuleType.__init__(self, name)
+        self.trace = trace
+        self.calls = collections.Counter()
+        self.files = dict(trace.get('pcard', {}).get('files', {}))
+        self.heads = {} # { name : bytes, ... }
+
+
+    def ls(self):
+        self.calls['ls'] += 1
+        return [(n, '-', size) for n, size in self.files.items()]
+
+
+    def read(self, name, offset, length):
+        self.calls['read'] += 1
+        t = self.trace.latency('pcard')
+        if t:
+            time.sleep(t)
+
+        size = self.files.get(name.lower())
+        if size is None or offset < 0 or offset + length > size:
+            return ''
+
+        self.calls['read-bytes'] += length
+        head = self.heads.get(name.lower(), b'')
+        data = head[offset:offset + length]
+        if len(data) < length:
+            start = (offset + len(data)) % len(self.PATTERN)
+            n = length - len(data)
+            data += (self.PATTERN * ((start + n) // len(self.PATTERN) + 1))[start:start + n]
+        return data
+
+
+
+def install(trace):
+    """Put the stand-ins in sys.modules. Must run before base.device is imported."""
+    mods = {'hpmudext' : FakeHPMUD(trace),
+            'cupsext' : FakeCupsExt(trace),
+            'scanext' : FakeScanExt(trace),
+            'pcardext' : FakePCardExt(trace)}
+
+    for m in list(mods.values()):
+        if m.__name__ in sys.modules and not isinstance(sys.modules[m.__name__], type(m)):
+            raise RuntimeError("%s is already loaded" % m.__name__)
+        sys.modules[m.__name__] = m
+
+    return mods
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Fax page coding throughput of fax/g3.py, in pages per second, with the
+# Python codec and with the codec in ip/xfax.c through the hpipext
+# extension (native). Without the extension only the Python column is
+# measured.
+#
+# The pages are the pages of the --file G3 files, or a letter page of
+# made up text at fine resolution. Each is decoded, encoded and re-encoded
+# (MH to MMR and back), and with the extension scaled to standard
+# resolution and made into a thumbnail. The results of the two codecs are
+# checked to be the same.
+#
+
+# Std Lib
+import os
+import sys
+import time
+import random
+import getopt
+
+USAGE = """hp-bench-g3codec: Measure fax page coding throughput, Python and native.
+
+Usage: python -m bench.g3codec [OPTIONS]
+
+  --file=FILE          An HPLIP G3 fax file to take the pages from, repeatable
+  --iterations=N       Times each page is coded (default: 3)
+"""
+
+PAGE_WIDTH = 1728
+PAGE_ROWS = 2200 # letter at 196 dpi
+
+
+def textPage(seed=1):
+    """ A page of made up text, as rows of changing elements. """
+    rnd = random.Random(seed)
+    page = []
+    line = []
+    for r in range(PAGE_ROWS):
+        if r % 48 == 0:
+            # A line of words, each column of a letter is on in some rows of the line
+            line, x = [], 120
+            while x < PAGE_WIDTH - 140:
+                word = rnd.randint(20, 90)
+                line.append([(x + k, rnd.randint(2, 6), rnd.random()) for k in range(0, word, 9)])
+                x += word + 14
+
+        if 100 <= r < PAGE_ROWS - 100 and r % 48 < 28:
+            changes = []
+            for word in line:
+                for x, w, p in word:
+                    if rnd.random() < p:
+                        changes.extend((x, x + w))
+            page.append(changes)
+        else:
+            page.append([])
+
+    return page
+
+
+def timed(f, *args):
+    t = time.time()
+    result = f(*args)
+    return result, time.time() - t
+
+
+def main(args):
+    try:
+        opts, args = getopt.getopt(args, 'h', ['help', 'file=', 'iterations='])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s" % (e, USAGE))
+        return 1
+
+    files, iterations = [], 3
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif o == '--file':
+            files.append(a)
+        elif o == '--iterations':
+            iterations = int(a)
+
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if top not in sys.path:
+        sys.path.insert(0, top)
+
+    from fax import g3
+
+    native = g3.hpipext
+    codecs = [None, native] if native else [None]
+    MH, MMR = g3.ENCODING_MH, g3.ENCODING_MMR
+
+    # [(pixels per row, rows, MH data), ...]
+    pages = []
+    for f in files:
+        header, file_pages = g3.readFile(f)
+        for page, data in file_pages:
+            if header[7] != MH:
+                data = g3.transcode(data, page[1], page[2], header[7], MH)
+            pages.append((page[1], page[2], data))
+
+    if not pages:
+        pages.append((PAGE_WIDTH, PAGE_ROWS, g3.encodePage(textPage(), PAGE_WIDTH, MH)))
+
+    # { operation : [Python seconds, native seconds], ... }
+    times = {}
+    operations = ['decode MH', 'encode MH', 'MH to MMR', 'MMR to MH', 'scale', 'thumbnail']
+
+    def add(op, i, delta):
+        times.setdefault(op, [0.0, 0.0])[i] += delta
+
+    for n in range(iterations):
+        for width, rows, mh in pages:
+            raster = {}
+            mmr = {}
+
+            for i, codec in enumerate(codecs):
+                g3.hpipext = codec # decodeRaster() and friends use Python without it
+
+                raster[i], delta = timed(g3.decodeRaster, mh, width, rows, MH)
+                add('decode MH', i, delta)
+
+                out, delta = timed(g3.encodeRaster, raster[i], width, MH)
+                add('encode MH', i, delta)
+
+                mmr[i], delta = timed(g3.transcode, mh, width, rows, MH, MMR)
+                add('MH to MMR', i, delta)
+
+                out, delta = timed(g3.transcode, mmr[i], width, rows, MMR, MH)
+                add('MMR to MH', i, delta)
+
+                if codec is not None:
+                    out, delta = timed(g3.scalePage, mmr[i], width, rows, MMR, 1.0, 0.5)
+                    add('scale', i, delta)
+
+                    out, delta = timed(g3.thumbnail, mmr[i], width, rows, MMR)
+                    add('thumbnail', i, delta)
+
+            g3.hpipext = native
+
+            if native and (raster[0] != raster[1] or mmr[0] != mmr[1]):
+                raise ValueError("the native codec differs from the Python codec")
+
+    count = iterations * len(pages)
+
+    def rate(t):
+        return "%12.1f" % (count / t) if t else "%12s" % '-'
+
+    sys.stdout.write("%d pages, %s\n" % (len(pages), "native codec" if native else "no hpipext extension"))
+    sys.stdout.write("%-12s %12s %12s\n" % ('pages/s', 'python', 'native'))
+    for op in operations:
+        if op in times:
+            sys.stdout.write("%-12s %s %s\n" % (op, rate(times[op][0]), rate(times[op][1])))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
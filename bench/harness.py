@@ -0,0 +1,580 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Benchmark harness for the HPLIP I/O paths.
+#
+# Each benchmark runs a real HPLIP code path against the transport simulator
+# and reports throughput (MB/s), per-iteration latency percentiles, device
+# round trips and Python allocations (tracemalloc, measured in a separate
+# pass so it does not skew the timings).
+#
+
+# Std Lib
+import os
+import sys
+import gc
+import time
+import json
+import struct
+import getopt
+import tempfile
+import tracemalloc
+
+# Local
+from . import fakehpmud
+from .trace import Trace, defaultTrace
+
+USAGE = """hp-bench: Benchmark HPLIP I/O paths against the transport simulator.
+
+Usage: python -m bench.harness [OPTIONS] [BENCHMARK...]
+
+  --trace=FILE         Device trace (JSON) to replay (default: built-in synthetic trace)
+  --size=BYTES         Data size for the built-in trace (default: 4194304)
+  --iterations=N       Timed iterations per benchmark (default: 10)
+  --json=FILE          Write results as JSON to FILE ('-' for stdout)
+  --list               List benchmarks and exit
+"""
+
+DEVICE_URI = 'hp:/usb/HP_Color_LaserJet_2840?serial=CN0000000'
+
+BENCHMARKS = {} # { name : (subsystem, class) }
+
+
+def benchmark(name, subsystem):
+    def register(cls):
+        BENCHMARKS[name] = (subsystem, cls)
+        cls.name = name
+        return cls
+    return register
+
+
+
+class Environment(object):
+    """Installs the simulator and imports the HPLIP modules under test."""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.mods = fakehpmud.install(trace)
+        self.hpmudext = self.mods['hpmudext']
+        self.cupsext = self.mods['cupsext']
+
+        top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if top not in sys.path:
+            sys.path.insert(0, top)
+
+        from base.g import prop, log
+        if not os.path.exists(os.path.join(prop.models_dir, 'models.dat')):
+            prop.models_dir = os.path.join(top, 'data', 'models')
+
+        log.set_level('error')
+
+
+    def device(self, device_uri=DEVICE_URI):
+        from base import device
+        return device.Device(device_uri, disable_dbus=True)
+
+
+    def calls(self):
+        c = {}
+        for name, m in list(self.mods.items()):
+            for k, v in list(m.calls.items()):
+                c['%s.%s' % (name, k)] = v
+        return c
+
+
+
+class Benchmark(object):
+    """setup() once, run() per iteration returning bytes processed, teardown() once."""
+
+    def __init__(self, env):
+        self.env = env
+
+    def setup(self):
+        pass
+
+    def run(self):
+        return 0
+
+    def teardown(self):
+        pass
+
+
+
+class Sink(object):
+    # Write-only stream that only counts bytes
+    def __init__(self):
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+
+    def seek(self, *args):
+        pass
+
+    def truncate(self, *args):
+        pass
+
+
+
+class ChannelReadBenchmark(Benchmark):
+    reader = None
+
+    def setup(self):
+        self.dev = self.env.device()
+
+    def run(self):
+        self.dev.close() # fresh channel data per iteration
+        sink = Sink()
+        read = getattr(self.dev, self.reader)
+        while read(self.env.hpmudext.HPMUD_BUFFER_SIZE, sink, allow_short_read=True):
+            pass
+        return sink.count
+
+    def teardown(self):
+        self.dev.close()
+
+
+@benchmark('device-read-print', 'device')
+class ReadPrintBenchmark(ChannelReadBenchmark):
+    reader = 'readPrint'
+
+
+@benchmark('device-read-pcard', 'device')
+class ReadPCardBenchmark(ChannelReadBenchmark):
+    reader = 'readPCard'
+
+
+@benchmark('device-read-fax', 'device')
+class ReadFaxBenchmark(ChannelReadBenchmark):
+    reader = 'readFax'
+
+
+
+@benchmark('mfpdtf-read', 'scan')
+class MFPDTFBenchmark(Benchmark):
+    # readChannelToStream() expects a device with readChannel() returning one
+    # MFPDTF block per call, as the old hpiod transport did.
+    def setup(self):
+        self.dev = self.env.device()
+
+    def readChannel(self, channel_id):
+        hpmudext = self.env.hpmudext
+        r, head = hpmudext.read_channel(self.dev.device_id, channel_id, 8)
+        if len(head) < 8:
+            return None, head
+
+        block_len = int.from_bytes(head[:4], 'little')
+        data = [head]
+        remaining = block_len - 8
+        while remaining > 0:
+            r, d = hpmudext.read_channel(self.dev.device_id, channel_id, min(remaining, hpmudext.HPMUD_BUFFER_SIZE))
+            if not d:
+                break
+            data.append(d)
+            remaining -= len(d)
+
+        return None, b''.join(data)
+
+    def run(self):
+        from base import mfpdtf
+        self.dev.close()
+        self.dev.open()
+        channel_id = self.dev.openChannel(self.env.hpmudext.HPMUD_S_SCAN_CHANNEL)
+        sink = Sink()
+        mfpdtf.readChannelToStream(self, channel_id, sink, single_read=False)
+        return sink.count
+
+    def teardown(self):
+        self.dev.close()
+
+
+
+@benchmark('scan-thread', 'scan')
+class ScanThreadBenchmark(Benchmark):
+    def run(self):
+        from scan import sane
+        from base.sixext.moves import queue
+        t = sane.ScanThread(fakehpmud.FakeScanDevice(self.env.trace), 'BGRA', None, queue.Queue())
+        try:
+            t.run() # in this thread, so timings don't include thread start-up
+            return t.total_read
+        finally:
+            t.buffer.close()
+            os.remove(t.buffer_path)
+
+
+
+@benchmark('status-pml', 'status')
+class PMLStatusBenchmark(Benchmark):
+    def setup(self):
+        from base import device
+        self.dev = self.env.device()
+        self.parsed_id = device.parseDeviceID(self.env.trace.deviceID())
+
+    def run(self):
+        from base import status
+        status.StatusType3(self.dev, self.parsed_id)
+        self.dev.closePML()
+        return 0
+
+    def teardown(self):
+        self.dev.close()
+
+
+
+@benchmark('status-pml-single', 'status')
+class PMLSingleStatusBenchmark(PMLStatusBenchmark):
+    # One object per PML request, as with devices that reject multi-object gets
+    def setup(self):
+        PMLStatusBenchmark.setup(self)
+        self.dev.pml_multi = False
+
+
+
+@benchmark('fax-status-pml', 'status')
+class PMLFaxStatusBenchmark(Benchmark):
+    def setup(self):
+        from base.codes import IO_MODE_MLC_GUSHER
+        self.dev = self.env.device()
+        self.dev.io_mode = IO_MODE_MLC_GUSHER # the 2840 over USB has no PML fax status
+
+    def run(self):
+        from base import status
+        status.getFaxStatus(self.dev)
+        self.dev.closePML()
+        return 0
+
+    def teardown(self):
+        self.dev.close()
+
+
+
+@benchmark('fax-send-pml', 'fax')
+class PMLFaxSendBenchmark(Benchmark):
+    # PMLFaxSendThread.run() sending an already rendered hplip_g3 file of
+    # made up text pages to one recipient: token, download state and job
+    # status are PML objects of the trace, the MFPDTF stream goes to the
+    # fax channel.
+    pages = 4
+
+    def setup(self):
+        from fax import fax, g3
+        from .g3codec import textPage, PAGE_WIDTH
+
+        rows = textPage()
+        page = g3.encodePage(rows, PAGE_WIDTH, g3.ENCODING_MH)
+        header = (b'hplip_g3', 1, 0, g3.NATIVE_DPI[0], g3.NATIVE_DPI[1], 1, 1, g3.ENCODING_MH, 0, 0)
+
+        fd, self.fax_file = tempfile.mkstemp(suffix='.g3')
+        os.write(fd, g3.fileData(header, [(PAGE_WIDTH, len(rows), page)] * self.pages))
+        os.close(fd)
+
+        self.size = os.path.getsize(self.fax_file)
+        self.dev = fax.getFaxDevice(DEVICE_URI, disable_dbus=True)
+
+    def run(self):
+        from fax import fax, pmlfax
+        from base import jobmonitor
+        from base.sixext.moves import queue
+
+        update_queue = queue.Queue()
+        t = pmlfax.PMLFaxSendThread(self.dev, None, [{'name' : 'Bench', 'fax' : '5550100'}],
+                                    [(self.fax_file, 'application/hplip-fax', 'HP Fax', 'Bench', self.pages)],
+                                    update_queue=update_queue, event_queue=jobmonitor.EventQueue())
+        t.run() # in this thread, as for scan-thread
+
+        updates = []
+        while not update_queue.empty():
+            updates.append(update_queue.get())
+
+        if (fax.STATUS_COMPLETED, 0, '') not in updates:
+            raise RuntimeError("fax not sent: %s" % updates[-1:])
+
+        return self.size
+
+    def teardown(self):
+        self.dev.close()
+        os.remove(self.fax_file)
+
+
+
+@benchmark('status-ledm', 'status')
+class LEDMStatusBenchmark(Benchmark):
+    def setup(self):
+        self.dev = self.env.device()
+
+    def run(self):
+        from base import status
+        s = status.StatusType10(self.dev.getEWSUrl_LEDM)
+        return 0
+
+    def teardown(self):
+        self.dev.close()
+
+
+
+@benchmark('status-device-id', 'status')
+class DeviceIDStatusBenchmark(Benchmark):
+    def setup(self):
+        from base import device
+        self.device = device
+
+    def run(self):
+        from base import status
+        device_id = self.env.trace.deviceID()
+        for i in range(1000):
+            status.parseStatus(self.device.parseDeviceID(device_id))
+        return len(device_id) * 1000
+
+
+
+@benchmark('pcard-file-read', 'pcard')
+class PCardFileReadBenchmark(Benchmark):
+    # The reads an EXIF parse and a preview make on a large RAW file: small
+    # reads in the header, a thumbnail further in and a block from the middle.
+    def setup(self):
+        from pcard import photocard
+        self.photocard = photocard
+        self.pc = photocard.PhotoCard(self.env.device())
+        self.pc.ls(True, '*', False)
+        self.name, self.size = self.pc.current_dir[0][0], self.pc.current_dir[0][2]
+
+    def run(self):
+        f = self.photocard.PhotoCardFile(self.pc, self.name)
+        total = 0
+        try:
+            for offset, length in [(0, 12), (12, 2), (20, 8), (30, 12)] * 8 + [(0x4000, 96), (0x6000, 0x8000)]:
+                f.seek(offset)
+                total += len(f.read(length))
+
+            f.seek(self.size // 2)
+            total += len(f.read(256*1024))
+            f.seek(-4096, 2)
+            total += len(f.read())
+        finally:
+            f.close()
+        return total
+
+    def teardown(self):
+        self.pc.device.close()
+
+
+
+def exifHeader(n):
+    """JPEG start with an EXIF header: orientation, dates, 40 more EXIF tags
+       as a camera writes them and an 8 KB thumbnail."""
+    def ifd(offset, entries, next_ifd):
+        # entries are (tag, type, count, value or out of line data)
+        data_offset = offset + 6 + 12 * len(entries)
+        out, data = [struct.pack('>H', len(entries))], b''
+        for tag, typ, count, value in entries:
+            if isinstance(value, bytes):
+                out.append(struct.pack('>HHII', tag, typ, count, data_offset + len(data)))
+                data += value
+            elif typ == 3:
+                out.append(struct.pack('>HHIHH', tag, typ, count, value, 0))
+            else:
+                out.append(struct.pack('>HHII', tag, typ, count, value))
+        out.append(struct.pack('>I', next_ifd))
+        return b''.join(out) + data
+
+    date = ('2015:10:%02d %02d:%02d:00' % (n % 28 + 1, n % 24, n % 60)).encode('ascii') + b'\x00'
+    thumb = b'\xff\xd8' + b'\x00' * 8188 + b'\xff\xd9'
+    ifd0_entries = lambda exif_ifd: [(0x010F, 2, 3, b'HP\x00\x00'), (0x0112, 3, 1, n % 8 + 1),
+                                     (0x0132, 2, len(date), date), (0x8769, 4, 1, exif_ifd)]
+    exif_entries = [(0x9003, 2, len(date), date)] + [(0xA401 + i, 3, 1, i) for i in range(40)]
+    exif_ifd = 8 + len(ifd(8, ifd0_entries(0), 0))
+    ifd1 = exif_ifd + len(ifd(exif_ifd, exif_entries, 0))
+    thumb_offset = ifd1 + len(ifd(ifd1, [(0x0201, 4, 1, 0), (0x0202, 4, 1, 0)], 0))
+
+    tiff = (b'MM\x00*' + struct.pack('>I', 8) + ifd(8, ifd0_entries(exif_ifd), ifd1) +
+            ifd(exif_ifd, exif_entries, 0) +
+            ifd(ifd1, [(0x0201, 4, 1, thumb_offset), (0x0202, 4, 1, len(thumb))], 0) + thumb)
+
+    return b'\xff\xd8\xff\xe1' + struct.pack('>H', len(tiff) + 8) + b'Exif\x00\x00' + tiff
+
+
+class PCardExifBenchmark(Benchmark):
+    # A card directory of 1000 3 MB JPEGs
+    files = 1000
+
+    def setup(self):
+        from pcard import photocard
+        self.photocard = photocard
+        pcardext = self.env.mods['pcardext']
+        self.saved = pcardext.files, pcardext.heads
+        pcardext.files = dict(('hpim%04d.jpg' % i, 3*1024*1024) for i in range(self.files))
+        pcardext.heads = dict(('hpim%04d.jpg' % i, exifHeader(i)) for i in range(self.files))
+
+        self.pc = photocard.PhotoCard(self.env.device())
+        self.pc.ls(True, '*', False)
+
+    def teardown(self):
+        self.env.mods['pcardext'].files, self.env.mods['pcardext'].heads = self.saved
+        self.pc.device.close()
+
+
+@benchmark('pcard-exif-index', 'pcard')
+class PCardExifIndexBenchmark(PCardExifBenchmark):
+    def run(self):
+        index = self.pc.get_exif_index()
+        return sum(len(t) for t in index.values())
+
+
+@benchmark('pcard-exif-full', 'pcard')
+class PCardExifFullBenchmark(PCardExifBenchmark):
+    # The per file process_file() parse the index replaces
+    def run(self):
+        return sum(len(self.pc.get_exif(name)) for name, attr, size in self.pc.current_dir)
+
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+def runBenchmark(env, name, iterations):
+    subsystem, cls = BENCHMARKS[name]
+    b = cls(env)
+    b.setup()
+    try:
+        b.run() # warm up
+
+        for m in env.mods.values():
+            m.calls.clear()
+
+        times, total_bytes = [], 0
+        gc.collect()
+        for i in range(iterations):
+            t0 = time.perf_counter()
+            total_bytes += b.run()
+            times.append(time.perf_counter() - t0)
+
+        calls = env.calls()
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            b.run()
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        diff = after.compare_to(before, 'filename')
+        alloc_blocks = sum(s.count_diff for s in diff if s.count_diff > 0)
+    finally:
+        b.teardown()
+
+    elapsed = sum(times)
+    return {'name' : name,
+            'subsystem' : subsystem,
+            'iterations' : iterations,
+            'bytes' : total_bytes,
+            'mb-per-sec' : (total_bytes / elapsed / 1e6) if elapsed and total_bytes else 0.0,
+            'latency-ms' : {'p50' : percentile(times, 50) * 1000,
+                            'p90' : percentile(times, 90) * 1000,
+                            'p99' : percentile(times, 99) * 1000,
+                            'max' : max(times) * 1000},
+            'calls-per-iteration' : dict((k, float(v) / iterations) for k, v in list(calls.items())),
+            'alloc-peak-kb' : peak / 1024.0,
+            'alloc-blocks' : alloc_blocks,
+           }
+
+
+def roundTrips(r):
+    # PML requests sent to the device per iteration, single and multi-object
+    c = r['calls-per-iteration']
+    return sum(c.get('hpmudext.%s' % k, 0.0) for k in ('get_pml', 'set_pml', 'get_pml_multi', 'pml_request'))
+
+
+def report(results, out=sys.stdout):
+    out.write("%-20s %-8s %10s %10s %10s %10s %12s %10s %10s\n" %
+              ('benchmark', 'subsys', 'MB/s', 'p50 ms', 'p90 ms', 'p99 ms', 'peak KB', 'blocks', 'pml reqs'))
+    for r in results:
+        out.write("%-20s %-8s %10.2f %10.3f %10.3f %10.3f %12.1f %10d %10.1f\n" %
+                  (r['name'], r['subsystem'], r['mb-per-sec'], r['latency-ms']['p50'],
+                   r['latency-ms']['p90'], r['latency-ms']['p99'], r['alloc-peak-kb'],
+                   r['alloc-blocks'], roundTrips(r)))
+
+
+def main(args):
+    try:
+        opts, names = getopt.getopt(args, 'h', ['help', 'trace=', 'size=', 'iterations=', 'json=', 'list'])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s" % (e, USAGE))
+        return 1
+
+    trace_file, size, iterations, json_file = None, 4*1024*1024, 10, None
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif o == '--trace':
+            trace_file = a
+        elif o == '--size':
+            size = int(a)
+        elif o == '--iterations':
+            iterations = max(1, int(a))
+        elif o == '--json':
+            json_file = a
+        elif o == '--list':
+            for n in sorted(BENCHMARKS):
+                sys.stdout.write("%-20s %s\n" % (n, BENCHMARKS[n][0]))
+            return 0
+
+    for n in names:
+        if n not in BENCHMARKS:
+            sys.stderr.write("Unknown benchmark: %s\n" % n)
+            return 1
+
+    # The built-in trace needs base.pml, which is safe to import before the
+    # simulator is installed.
+    if trace_file is not None:
+        trace = Trace.load(trace_file)
+    else:
+        trace = defaultTrace(size)
+
+    env = Environment(trace)
+    results = [runBenchmark(env, n, iterations) for n in (names or sorted(BENCHMARKS))]
+
+    report(results, sys.stderr if json_file == '-' else sys.stdout)
+
+    if json_file is not None:
+        doc = {'python' : sys.version.split()[0], 'time' : time.time(), 'results' : results}
+        if json_file == '-':
+            json.dump(doc, sys.stdout, indent=1, sort_keys=True)
+        else:
+            f = open(json_file, 'w')
+            try:
+                json.dump(doc, f, indent=1, sort_keys=True)
+            finally:
+                f.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Throughput benchmark for the hpcups raster filter.
+#
+# Feeds CUPS raster files through hpcups once per pipeline thread count
+# (the hp-pipeline-threads job option) and reports pages per minute. The
+# output of every threaded run is checked against the serial run, it has to
+# be byte-identical.
+#
+
+# Std Lib
+import os
+import sys
+import time
+import struct
+import random
+import getopt
+import hashlib
+import tempfile
+import subprocess
+
+USAGE = """hp-bench-hpcups: Measure hpcups throughput in pages per minute.
+
+Usage: python -m bench.hpcups --ppd=FILE [OPTIONS] [RASTER_FILE...]
+
+  --ppd=FILE           hpcups PPD for the printer to emulate (required)
+  --filter=PATH        hpcups binary (default: ./hpcups, then the CUPS filter dir)
+  --threads=N,N,...    Pipeline thread counts to run (default: 0,1,2,3)
+  --iterations=N       Runs per thread count, the best is reported (default: 3)
+  --pages=N            Pages in the generated raster (default: 4)
+  --res=DPI            Resolution of the generated raster (default: 600)
+  --mode=NAME          Print mode name (cupsString[0]) of the generated raster
+  --gray               Generate a grayscale (CUPS_CSPACE_K) raster
+
+Without RASTER_FILE a synthetic letter size text/graphics raster is generated.
+"""
+
+FILTER_PATHS = ['./hpcups', '/usr/lib/cups/filter/hpcups', '/usr/libexec/cups/filter/hpcups']
+
+CUPS_CSPACE_RGB = 1
+CUPS_CSPACE_K = 3
+
+HEADER_SIZE = 1796 # cups_page_header2_t
+
+
+def pageHeader(width, height, res, color, mode=''):
+    bpp = 24 if color else 8
+    bpl = width * bpp // 8
+    h = b''.join([b'\0' * 64,                                        # MediaClass
+                  b'\0' * 64,                                        # MediaColor
+                  b'\0' * 64,                                        # MediaType
+                  b'\0' * 64])                                       # OutputType
+    h += struct.pack('<41I',
+                     0, 0, 0, 0, 0,                                  # AdvanceDistance .. Duplex
+                     res, res,                                       # HWResolution
+                     0, 0, width * 72 // res, height * 72 // res,    # ImagingBoundingBox
+                     0, 0, 0, 0, 0, 0, 0, 0, 0, 0,                   # InsertSheet .. NegativePrint
+                     1, 0, 0,                                        # NumCopies, Orientation, OutputFaceUp
+                     width * 72 // res, height * 72 // res,          # PageSize
+                     0, 0, 0,                                        # Separations, TraySwitch, Tumble
+                     width, height, 0, 8, bpp, bpl,                  # cupsWidth .. cupsBytesPerLine
+                     0,                                              # cupsColorOrder (chunky)
+                     CUPS_CSPACE_RGB if color else CUPS_CSPACE_K,
+                     0, 0, 0, 0)                                     # cupsCompression .. cupsRowStep
+    h += struct.pack('<I', 3 if color else 1)                        # cupsNumColors
+    h += b'\0' * (4 * (1 + 2 + 4 + 16 + 16))                         # scaling, sizes, cupsInteger, cupsReal
+    h += mode.encode('utf-8')[:63].ljust(64, b'\0')                  # cupsString[0]
+    h += b'\0' * (64 * 15 + 64 * 3)                                  # cupsString[1..], marker, intent, size name
+    assert len(h) == HEADER_SIZE
+    return h, bpl
+
+
+def rowPatterns(bpl, color, seed=0):
+    # A handful of row types, mixed on the page like text lines, rules and
+    # images so that every pipeline phase has real work to do.
+    r = random.Random(seed)
+    white = b'\xff' * bpl
+    rows = [white]
+    for i in range(12):
+        row = bytearray(white)
+        x = r.randrange(bpl // 16)
+        while x < bpl:
+            n = r.randrange(4, 40) * (3 if color else 1)
+            for k in range(x, min(x + n, bpl)):
+                row[k] = r.randrange(0, 160)
+            x += n + r.randrange(8, 60) * (3 if color else 1)
+        rows.append(bytes(row))
+    rows.append(bytes(bytearray(r.randrange(256) for i in range(bpl)))) # photo
+    return rows
+
+
+def writeRaster(f, pages, res, color, mode=''):
+    width, height = 17 * res // 2, 11 * res
+    header, bpl = pageHeader(width, height, res, color, mode)
+    rows = rowPatterns(bpl, color)
+    line_height = max(1, res // 6)
+
+    f.write(b'RaS3')
+    for page in range(pages):
+        f.write(header)
+        for y in range(height):
+            band = y // line_height
+            if band % 2:
+                f.write(rows[0])
+            elif band % 7 == 3:
+                f.write(rows[-1])
+            else:
+                f.write(rows[1 + (band + page) % (len(rows) - 2)])
+    return pages
+
+
+def countPages(f):
+    # Pages printed, from the 'PAGE:' lines hpcups writes to stderr
+    n = 0
+    for line in f:
+        if line.startswith(b'PAGE:'):
+            n += 1
+    return n
+
+
+def findFilter(path=None):
+    if path is not None:
+        return path
+    for p in FILTER_PATHS:
+        if os.access(p, os.X_OK):
+            return p
+    return None
+
+
+def runFilter(filter_path, ppd, raster, threads):
+    """Runs hpcups once. Returns (seconds, pages, output size, output sha1)."""
+    env = dict(os.environ)
+    env['PPD'] = ppd
+    options = 'hp-pipeline-threads=%d' % threads
+    args = [filter_path, '1', 'bench', 'hp-bench', '1', options, raster]
+
+    sha1 = hashlib.sha1()
+    size = 0
+    log = tempfile.TemporaryFile()
+    try:
+        t0 = time.perf_counter()
+        p = subprocess.Popen(args, env=env, stdout=subprocess.PIPE, stderr=log)
+        while True:
+            data = p.stdout.read(65536)
+            if not data:
+                break
+            sha1.update(data)
+            size += len(data)
+        status = p.wait()
+        elapsed = time.perf_counter() - t0
+
+        log.seek(0)
+        if status != 0:
+            sys.stderr.write("%s exited with %d:\n" % (filter_path, status))
+            sys.stderr.write(log.read()[-2000:].decode('utf-8', 'replace'))
+            return None
+
+        log.seek(0)
+        pages = countPages(log)
+    finally:
+        log.close()
+
+    return elapsed, pages, size, sha1.hexdigest()
+
+
+def main(args):
+    try:
+        opts, rasters = getopt.getopt(args, 'h', ['help', 'ppd=', 'filter=', 'threads=', 'iterations=',
+                                                  'pages=', 'res=', 'mode=', 'gray'])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s" % (e, USAGE))
+        return 1
+
+    ppd, filter_path, threads, iterations = None, None, [0, 1, 2, 3], 3
+    pages, res, mode, color = 4, 600, '', True
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif o == '--ppd':
+            ppd = a
+        elif o == '--filter':
+            filter_path = a
+        elif o == '--threads':
+            threads = [int(t) for t in a.split(',')]
+        elif o == '--iterations':
+            iterations = max(1, int(a))
+        elif o == '--pages':
+            pages = max(1, int(a))
+        elif o == '--res':
+            res = int(a)
+        elif o == '--mode':
+            mode = a
+        elif o == '--gray':
+            color = False
+
+    if ppd is None:
+        sys.stderr.write("--ppd is required\n%s" % USAGE)
+        return 1
+
+    filter_path = findFilter(filter_path)
+    if filter_path is None:
+        sys.stderr.write("hpcups not found, use --filter\n")
+        return 1
+
+    generated = None
+    if not rasters:
+        fd, generated = tempfile.mkstemp(prefix='hpcups-bench-', suffix='.ras')
+        f = os.fdopen(fd, 'wb')
+        try:
+            writeRaster(f, pages, res, color, mode)
+        finally:
+            f.close()
+        rasters = [generated]
+
+    failed = False
+    try:
+        sys.stdout.write("%-24s %8s %6s %10s %10s %12s  %s\n" %
+                         ('raster', 'threads', 'pages', 'seconds', 'ppm', 'bytes', 'output'))
+        for raster in rasters:
+            reference = None
+            for t in threads:
+                best = None
+                for i in range(iterations):
+                    r = runFilter(filter_path, ppd, raster, t)
+                    if r is None:
+                        return 1
+                    if best is None or r[0] < best[0]:
+                        best = r
+
+                elapsed, n, size, digest = best
+                if reference is None:
+                    reference = digest
+                    check = 'reference'
+                elif digest == reference:
+                    check = 'identical'
+                else:
+                    check = 'DIFFERS'
+                    failed = True
+
+                sys.stdout.write("%-24s %8d %6d %10.3f %10.1f %12d  %s\n" %
+                                 (os.path.basename(raster)[:24], t, n, elapsed,
+                                  n * 60.0 / elapsed if elapsed else 0.0, size, check))
+    finally:
+        if generated is not None:
+            os.remove(generated)
+
+    return 2 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Start up time of the command line tools.
+#
+# Each tool is started with --help-desc, which exits right after the
+# imports and the option parsing, under 'python -X importtime'. The report
+# has the best wall time of each tool, the time spent importing, and the
+# modules that took longest (self time, summed over all the tools).
+#
+
+# Std Lib
+import os
+import sys
+import time
+import getopt
+import subprocess
+
+USAGE = """hp-bench-imports: Measure start up and import time of the HPLIP tools.
+
+Usage: python -m bench.imports [OPTIONS] [TOOL...]
+
+  --iterations=N       Runs per tool, the best is reported (default: 5)
+  --top=N              Modules to list by import time (default: 20)
+
+TOOL is the name of a script in the source tree, e.g. info or levels
+(default: %s).
+"""
+
+TOOLS = ['info', 'levels', 'probe', 'scan', 'clean', 'query', 'timedate', 'testpage']
+
+
+def runTool(path, importtime=True):
+    """ Returns (wall seconds, { module : (self us, cumulative us, indent) }). """
+    args = [sys.executable]
+    if importtime:
+        args += ['-X', 'importtime']
+    args += [path, '--help-desc']
+
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    t0 = time.perf_counter()
+    p = subprocess.Popen(args, cwd=os.path.dirname(path), env=env,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    elapsed = time.perf_counter() - t0
+
+    modules = {}
+    for line in err.decode('utf-8', 'replace').splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+
+        fields = line[12:].split('|')
+        try:
+            self_us, cumulative = int(fields[0]), int(fields[1])
+        except ValueError: # the header line
+            continue
+
+        modules[fields[2].strip()] = (self_us, cumulative, len(fields[2]) - len(fields[2].lstrip()))
+
+    return elapsed, modules
+
+
+def main(args):
+    try:
+        opts, tools = getopt.getopt(args, 'h', ['help', 'iterations=', 'top='])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s" % (e, USAGE % ', '.join(TOOLS)))
+        return 1
+
+    iterations, top = 5, 20
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            sys.stdout.write(USAGE % ', '.join(TOOLS))
+            return 0
+        elif o == '--iterations':
+            iterations = max(1, int(a))
+        elif o == '--top':
+            top = int(a)
+
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    importtime = sys.version_info >= (3, 7)
+    totals = {} # { module : self us, ... }
+
+    sys.stdout.write("%-12s %12s %12s %10s\n" % ('tool', 'wall (ms)', 'import (ms)', 'modules'))
+    for tool in tools or TOOLS:
+        path = os.path.join(src, tool if tool.endswith('.py') else tool + '.py')
+        if not os.path.exists(path):
+            sys.stderr.write("%s not found\n" % path)
+            return 1
+
+        runTool(path, importtime) # compiles the modules, fills the page cache
+        best, best_modules = None, {}
+        for i in range(iterations):
+            elapsed, modules = runTool(path, importtime)
+            if best is None or elapsed < best:
+                best, best_modules = elapsed, modules
+
+        # Top level imports (no indent) add up to the total
+        imported = sum(c for s, c, indent in best_modules.values() if indent == 1)
+        for m, (s, c, indent) in best_modules.items():
+            totals[m] = totals.get(m, 0) + s
+
+        sys.stdout.write("%-12s %12.1f %12s %10d\n" % (tool, best * 1000.0,
+                         '%.1f' % (imported / 1000.0) if importtime else '-', len(best_modules)))
+
+    if totals and top:
+        sys.stdout.write("\n%-40s %12s\n" % ('module', 'self (ms)'))
+        for m, s in sorted(totals.items(), key=lambda x: x[1], reverse=True)[:top]:
+            sys.stdout.write("%-40s %12.1f\n" % (m, s / 1000.0))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
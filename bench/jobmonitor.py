@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Device queries and reaction times of the fax and copy job threads.
+#
+# A simulated job waits for its render job, then goes through the states of
+# a PML fax send on a fixed timeline. It is followed once with the old loops
+# (query, sleep a second, check the event queue) and once with a
+# base.jobmonitor.JobMonitor, woken when the render job is done. The report has the device queries made, how
+# late on average each state change was seen and how long a cancel pressed
+# part way through took to be noticed. Times are in job seconds, the job
+# itself runs --scale times faster.
+#
+
+# Std Lib
+import os
+import sys
+import time
+import getopt
+import threading
+
+USAGE = """hp-bench-jobmonitor: Measure device queries and reaction times of the job threads.
+
+Usage: python -m bench.jobmonitor [OPTIONS]
+
+  --scale=F            Job time per real second (default: 20)
+  --cancel-at=S        Job second to press cancel at in the cancel run (default: 47.5)
+"""
+
+# (job second the state starts at, state)
+TIMELINE = [(0.0, 'rendering'), (20.4, 'request'), (21.7, 'dialing'),
+            (30.2, 'connecting'), (34.9, 'transmitting'), (64.6, 'done')]
+
+CANCEL = 'cancel'
+
+
+class Job(object):
+    def __init__(self, scale):
+        self.scale = scale
+        self.start = time.time()
+        self.queries = 0
+        self.seen = {} # { state : job second first seen, ... }
+
+    def now(self): # job seconds
+        return (time.time() - self.start) * self.scale
+
+    def state(self):
+        self.queries += 1
+        t, current = self.now(), None
+        for start, state in TIMELINE:
+            if t >= start:
+                current = state
+        self.seen.setdefault(current, t)
+        return current
+
+    def late(self):
+        # Mean time from each state change to its first query
+        lates = [self.seen[state] - start for start, state in TIMELINE[1:] if state in self.seen]
+        return sum(lates) / len(lates) if lates else 0.0
+
+
+
+def sleepLoop(job, event_queue, scale):
+    # As the threads did: query, sleep a second, check for a cancel
+    while True:
+        if job.state() == 'done':
+            return 'done'
+
+        time.sleep(1.0 / scale)
+
+        while event_queue.qsize():
+            if event_queue.get(0) == CANCEL:
+                return CANCEL
+
+
+def monitorLoop(job, event_queue, scale):
+    from base import jobmonitor
+    intervals = dict((phase, (first / scale, longest / scale))
+                     for phase, (first, longest) in jobmonitor.INTERVALS.items())
+    phases = {'request' : jobmonitor.PHASE_SETUP,
+              'dialing' : jobmonitor.PHASE_ACTIVE,
+              'connecting' : jobmonitor.PHASE_ACTIVE,
+              'transmitting' : jobmonitor.PHASE_TRANSMIT}
+
+    monitor = jobmonitor.JobMonitor(event_queue, lambda event: event == CANCEL,
+                                    jobmonitor.PHASE_SETUP, intervals)
+
+    # As fax.RenderScheduler: the render thread wakes the monitor when the file is ready
+    rendered = threading.Timer(TIMELINE[1][0] / scale, monitor.wake)
+    rendered.start()
+    try:
+        while True:
+            state = job.state()
+            if state == 'done':
+                return 'done'
+
+            if state == 'rendering':
+                monitor.wait(300.0 / scale)
+            else:
+                monitor.setPhase(phases[state])
+                monitor.changed(state)
+                monitor.wait()
+
+            if monitor.canceled():
+                return CANCEL
+    finally:
+        rendered.cancel()
+        monitor.close()
+
+
+def run(loop, scale, cancel_at=None):
+    from base import jobmonitor
+    event_queue = jobmonitor.EventQueue()
+    job = Job(scale)
+
+    if cancel_at is not None:
+        t = threading.Timer(cancel_at / scale, event_queue.put, (CANCEL,))
+        t.start()
+
+    result = loop(job, event_queue, scale)
+
+    if cancel_at is not None:
+        t.cancel()
+        return job.queries, job.now() - cancel_at
+
+    return job.queries, job.late()
+
+
+def main(args):
+    try:
+        opts, args = getopt.getopt(args, 'h', ['help', 'scale=', 'cancel-at='])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s" % (e, USAGE))
+        return 1
+
+    scale, cancel_at = 20.0, 47.5
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif o == '--scale':
+            scale = float(a)
+        elif o == '--cancel-at':
+            cancel_at = float(a)
+
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if top not in sys.path:
+        sys.path.insert(0, top)
+
+    sys.stdout.write("%-12s %10s %16s %10s %16s\n" % ('loop', 'queries', 'state seen (s)',
+                                                      'queries', 'cancel seen (s)'))
+    for name, loop in (('sleep', sleepLoop), ('jobmonitor', monitorLoop)):
+        queries, late = run(loop, scale)
+        cancel_queries, cancel_late = run(loop, scale, cancel_at)
+        sys.stdout.write("%-12s %10d %16.2f %10d %16.2f\n" % (name, queries, late, cancel_queries, cancel_late))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Photo card directory browsing, with a FAT16 image file standing in for
+# the card (pcard.photocard.PhotoCardImage). Needs the pcardext extension.
+#
+# An hp-unload session on a card with --dirs directories of --files photos:
+# into each directory, ls, a glob and back out, then the unload list, the
+# tree and the preview info of some photos. The session runs once with the
+# directory index dropped before every command, so directories are read
+# from the card each time they are used, and once with the index kept for
+# the mount. The report has the card read commands and sectors each took,
+# and the sectors pcardext asked for, most of them from the sector cache.
+#
+
+# Std Lib
+import os
+import sys
+import time
+import getopt
+import shutil
+import struct
+import tempfile
+
+from .unload import makeImage, SECTOR_SIZE
+
+USAGE = """hp-bench-pcardbrowse: Measure photo card directory browsing against a FAT image.
+
+Usage: python -m bench.pcardbrowse [OPTIONS]
+
+  --dirs=N             Photo directories on the card (default: 20)
+  --files=N            Photos in each directory (default: 200)
+  --delay=S            Seconds each card read or write command takes (default: 0.002)
+"""
+
+READ_CMD = 0x0010
+
+
+def mount(photocard, image, delay, counts):
+    dev = photocard.PhotoCardImage(image)
+    write = dev.writePCard
+
+    def countingWrite(request):
+        cmd, nsector = struct.unpack('!HH', request[:4])
+        if cmd == READ_CMD:
+            counts[0] += 1
+            counts[1] += nsector
+        if delay:
+            time.sleep(delay)
+        return write(request)
+
+    dev.writePCard = countingWrite
+
+    pc = photocard.PhotoCard(dev)
+    read = pc._read
+
+    def countingRead(sector, nsector):
+        counts[2] += nsector
+        return read(sector, nsector)
+
+    pc._read = countingRead # before the mount hands it to pcardext
+    pc.mount()
+    return pc
+
+
+def session(pc, dirs, photos, reread):
+    # Returns the entries seen, to check both runs saw the same card
+    seen = []
+
+    def command(f, *args):
+        if reread:
+            pc.index_reset()
+        return f(*args)
+
+    for d in dirs:
+        command(pc.cd, '/')
+        command(pc.cd, 'dcim')
+        command(pc.cd, d)
+        seen.append(sorted(command(pc.ls)))
+        seen.append(sorted(command(pc.match_files, '*.jpg')))
+        seen.append(command(pc.lookup, '/dcim/%s/..' % d))
+        command(pc.cdup)
+        command(pc.cdup)
+
+    seen.append(sorted(command(pc.get_unload_list)))
+    seen.append(command(pc.tree))
+
+    for card_path, data in photos[::max(1, len(photos) // 20)]:
+        command(pc.get_exif_path, '/' + card_path)
+        seen.append(command(pc.lookup, '/' + card_path))
+
+    return seen
+
+
+def main(args):
+    try:
+        opts, args = getopt.getopt(args, 'h', ['help', 'dirs=', 'files=', 'delay='])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s" % (e, USAGE))
+        return 1
+
+    dirs, files, delay = 20, 200, 0.002
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif o == '--dirs':
+            dirs = int(a)
+        elif o == '--files':
+            files = int(a)
+        elif o == '--delay':
+            delay = float(a)
+
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if top not in sys.path:
+        sys.path.insert(0, top)
+
+    from pcard import photocard
+
+    work = tempfile.mkdtemp(prefix='pcardbrowse-bench-')
+    results = []
+    try:
+        image = os.path.join(work, 'card.img')
+        photos = makeImage(image, files, SECTOR_SIZE, dirs)
+        dir_names = ['%03dhpaio' % (100 + d) for d in range(dirs)]
+
+        seen = []
+        for name, reread in (('reread', True), ('indexed', False)):
+            counts = [0, 0, 0]
+            pc = mount(photocard, image, delay, counts)
+            counts[:] = [0, 0, 0] # the mount's reads are the same either way
+            t = time.time()
+            seen.append(session(pc, dir_names, photos, reread))
+            results.append((name, counts[0], counts[1], counts[2], time.time() - t))
+            pc.umount()
+
+        if seen[0] != seen[1]:
+            raise ValueError("the indexed session saw a different card")
+    finally:
+        shutil.rmtree(work, True)
+
+    sys.stdout.write("%-10s %14s %14s %16s %10s\n" % ('session', 'card reads', 'sectors', 'pcardext reads', 'seconds'))
+    for name, reads, sectors, lookups, delta in results:
+        sys.stdout.write("%-10s %14d %14d %16d %10.2f\n" % (name, reads, sectors, lookups, delta))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Photo card writes for deleting photos, with a FAT16 image file standing
+# in for the card (pcard.photocard.PhotoCardImage). Needs the pcardext
+# extension.
+#
+# The --files photos in DCIM/100HPAIO are deleted from one copy of the
+# image with PhotoCard.rm() a file at a time, and from another with
+# PhotoCard.rm_multiple(), which holds the writes back to one commit. The
+# report has the card write commands and sectors each took. The two images
+# are checked to be the same afterwards, and to have no photos left.
+#
+
+# Std Lib
+import os
+import sys
+import time
+import getopt
+import shutil
+import struct
+import tempfile
+
+from .unload import makeImage
+
+USAGE = """hp-bench-pcardrm: Measure photo card writes for deleting photos against a FAT image.
+
+Usage: python -m bench.pcardrm [OPTIONS]
+
+  --files=N            Photos to delete (default: 200)
+  --size=BYTES         Bytes per photo (default: 65536)
+  --delay=S            Seconds each card read or write command takes (default: 0.002)
+"""
+
+WRITE_CMD = 0x0020
+
+
+def mount(photocard, image, delay, counts):
+    dev = photocard.PhotoCardImage(image)
+    write = dev.writePCard
+
+    def countingWrite(request):
+        cmd, nsector = struct.unpack('!HH', request[:4])
+        if cmd == WRITE_CMD:
+            counts[0] += 1
+            counts[1] += nsector
+        if delay:
+            time.sleep(delay)
+        return write(request)
+
+    dev.writePCard = countingWrite
+
+    pc = photocard.PhotoCard(dev)
+    pc.mount()
+    return pc
+
+
+def main(args):
+    try:
+        opts, args = getopt.getopt(args, 'h', ['help', 'files=', 'size=', 'delay='])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s" % (e, USAGE))
+        return 1
+
+    files, size, delay = 200, 65536, 0.002
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif o == '--files':
+            files = int(a)
+        elif o == '--size':
+            size = int(a)
+        elif o == '--delay':
+            delay = float(a)
+
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if top not in sys.path:
+        sys.path.insert(0, top)
+
+    from pcard import photocard
+
+    work = tempfile.mkdtemp(prefix='pcardrm-bench-')
+    results = []
+    try:
+        images = [os.path.join(work, 'one-at-a-time.img'), os.path.join(work, 'together.img')]
+        photos = makeImage(images[0], files, size)
+        shutil.copyfile(images[0], images[1])
+        names = [os.path.basename(card_path) for card_path, data in photos]
+
+        for image in images:
+            counts = [0, 0]
+            pc = mount(photocard, image, delay, counts)
+            pc.cd('dcim/100hpaio', False)
+            counts[:] = [0, 0] # the mount's write protect check is the same either way
+
+            t = time.time()
+            if image == images[0]:
+                for name in names:
+                    pc.rm(name, False)
+            else:
+                pc.rm_multiple(names)
+            results.append((os.path.basename(image)[:-4], counts[0], counts[1], time.time() - t))
+            pc.umount()
+
+            pc = mount(photocard, image, 0, [0, 0])
+            pc.cd('dcim/100hpaio', False)
+            if pc.current_files():
+                raise ValueError("%s still has photos" % image)
+            pc.umount()
+
+        if open(images[0], 'rb').read() != open(images[1], 'rb').read():
+            raise ValueError("the images differ")
+    finally:
+        shutil.rmtree(work, True)
+
+    sys.stdout.write("%-14s %14s %14s %10s\n" % ('rm', 'card writes', 'sectors', 'seconds'))
+    for name, writes, sectors, delta in results:
+        sys.stdout.write("%-14s %14d %14d %10.2f\n" % (name, writes, sectors, delta))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
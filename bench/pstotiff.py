@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Time to first page of the pstotiff fax filter.
+#
+# The filter is run with a stand-in for ghostscript that writes its page
+# TIFFs the way libtiff does (strip, out-of-line values, directory, then the
+# header's IFD offset) at a fixed time per page. The report has when the
+# first page had fully arrived on the filter's output, when the output ended
+# and when ghostscript finished, which is as early as a filter that waits
+# for the whole document could start writing. The output is checked to be
+# one TIFF with every page's strip in it.
+#
+
+# Std Lib
+import os
+import sys
+import time
+import struct
+import getopt
+import shutil
+import tempfile
+import subprocess
+
+USAGE = """hp-bench-pstotiff: Measure time to first page of the pstotiff fax filter.
+
+Usage: python -m bench.pstotiff [OPTIONS]
+
+  --pages=N            Pages in the document (default: 10)
+  --page-time=S        Seconds the stand-in ghostscript takes per page (default: 0.3)
+  --strip-size=N       Bytes of G4 data per page (default: 30000)
+  --filter=PATH        pstotiff filter (default: fax/filters/pstotiff)
+"""
+
+STAND_IN = r'''
+import sys, time, struct
+
+pages, page_time, strip_size = %d, %f, %d
+output = [a[len("-sOutputFile="):] for a in sys.argv if a.startswith("-sOutputFile=")][0]
+
+for page in range(1, pages + 1):
+    time.sleep(page_time)
+    f = open(output %% page, "wb")
+    f.write(b"II*\0" + struct.pack("<I", 0))
+    f.write(bytes(bytearray([page %% 256])) * strip_size)
+    f.flush()
+
+    rationals = f.tell()
+    f.write(struct.pack("<IIII", 204, 1, 196, 1))
+    tags = [(256, 3, 1, 1728), (257, 3, 1, 2200), (259, 3, 1, 4), (262, 3, 1, 0),
+            (273, 4, 1, 8), (278, 4, 1, 2200), (279, 4, 1, strip_size),
+            (282, 5, 1, rationals), (283, 5, 1, rationals + 8), (296, 3, 1, 2)]
+    ifd = f.tell()
+    f.write(struct.pack("<H", len(tags)))
+    for tag, typ, n, value in tags:
+        f.write(struct.pack("<HHI", tag, typ, n) +
+                (struct.pack("<HH", value, 0) if typ == 3 else struct.pack("<I", value)))
+    f.write(struct.pack("<I", 0))
+    f.flush()
+
+    f.seek(4)
+    f.write(struct.pack("<I", ifd))
+    f.close()
+'''
+
+
+def readOutput(path):
+    """Walks the IFD chain. Returns [(IFD offset, entries, strip offset, strip size), ...]."""
+    data = open(path, 'rb').read()
+    if data[:4] != b'II*\0':
+        raise ValueError("not a little endian TIFF")
+
+    pages = []
+    ifd = struct.unpack('<I', data[4:8])[0]
+    while ifd:
+        count = struct.unpack('<H', data[ifd:ifd + 2])[0]
+        tags = {}
+        for i in range(count):
+            tag, typ, n, value = struct.unpack('<HHII', data[ifd + 2 + 12 * i:ifd + 14 + 12 * i])
+            tags[tag] = (typ, n, value & 0xffff if typ == 3 else value)
+
+        offset, size = tags[273][2], tags[279][2]
+        strip = data[offset:offset + size]
+        if strip != bytes(bytearray([(len(pages) + 1) % 256])) * size:
+            raise ValueError("page %d strip is wrong" % (len(pages) + 1))
+
+        x = tags[282][2]
+        if struct.unpack('<II', data[x:x + 8]) != (204, 1):
+            raise ValueError("page %d XResolution is wrong" % (len(pages) + 1))
+
+        pages.append((ifd, count))
+        ifd = struct.unpack('<I', data[ifd + 2 + 12 * count:ifd + 6 + 12 * count])[0]
+
+    return pages
+
+
+def run(filter_path, pages, page_time, strip_size):
+    work = tempfile.mkdtemp(prefix='pstotiff-bench-')
+    try:
+        gs = os.path.join(work, 'gs')
+        f = open(gs, 'w')
+        f.write("#!%s\n%s" % (sys.executable, STAND_IN % (pages, page_time, strip_size)))
+        f.close()
+        os.chmod(gs, 0o755)
+
+        source = open(filter_path).read()
+        if 'GS = "/usr/bin/gs"' not in source:
+            raise ValueError("%s does not set GS" % filter_path)
+
+        filter_copy = os.path.join(work, 'pstotiff')
+        f = open(filter_copy, 'w')
+        f.write(source.replace('GS = "/usr/bin/gs"', 'GS = %r' % gs, 1))
+        f.close()
+
+        output = os.path.join(work, 'out.tif')
+        out = open(output, 'wb')
+        arrivals = [] # (seconds, bytes so far)
+        size = 0
+
+        start = time.time()
+        p = subprocess.Popen([sys.executable, filter_copy, '1', 'bench', 'hp-bench', '1', '', '/dev/null'],
+                             stdout=subprocess.PIPE, stderr=open(os.devnull, 'w'))
+        while True:
+            data = os.read(p.stdout.fileno(), 65536)
+            if not data:
+                break
+            size += len(data)
+            arrivals.append((time.time() - start, size))
+            out.write(data)
+
+        status = p.wait()
+        total = time.time() - start
+        out.close()
+
+        if status != 0:
+            raise ValueError("filter exited with %d" % status)
+
+        written = readOutput(output)
+        if len(written) != pages:
+            raise ValueError("%d pages out of %d" % (len(written), pages))
+
+        # The first page is there once its directory is
+        ifd, count = written[0]
+        first = [t for t, n in arrivals if n >= ifd + 2 + 12 * count][0]
+
+        return first, total, pages * page_time
+    finally:
+        shutil.rmtree(work, True)
+
+
+def main(args):
+    try:
+        opts, args = getopt.getopt(args, 'h', ['help', 'pages=', 'page-time=', 'strip-size=', 'filter='])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s" % (e, USAGE))
+        return 1
+
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    pages, page_time, strip_size = 10, 0.3, 30000
+    filter_path = os.path.join(top, 'fax', 'filters', 'pstotiff')
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif o == '--pages':
+            pages = int(a)
+        elif o == '--page-time':
+            page_time = float(a)
+        elif o == '--strip-size':
+            strip_size = int(a)
+        elif o == '--filter':
+            filter_path = a
+
+    try:
+        first, total, gs_time = run(filter_path, pages, page_time, strip_size)
+    except (ValueError, IOError, OSError) as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+
+    sys.stdout.write("%8s %16s %16s %16s\n" % ('pages', 'first page (s)', 'last byte (s)', 'gs done (s)'))
+    sys.stdout.write("%8d %16.2f %16.2f %16.2f\n" % (pages, first, total, gs_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
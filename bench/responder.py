@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# HTTP responder for the EWS/LEDM/SOAP channels of the transport simulator,
+# and a PML responder for multi-object requests on the PML channel.
+#
+
+# Std Lib
+import re
+
+# Local
+from .trace import unb64
+
+request_pat = re.compile(br"""^(GET|POST|PUT)\s+(\S+)\s+HTTP/\d\.\d""", re.I)
+content_length_pat = re.compile(br"""^content-length:\s*(\d+)""", re.I | re.M)
+
+STATUS_TEXT = {200 : b'OK', 201 : b'Created', 404 : b'Not Found', 500 : b'Internal Server Error'}
+
+
+class HTTPResponder(object):
+    def __init__(self, trace):
+        self.trace = trace
+        self.pending = b''
+        self.requests = 0
+
+
+    def write(self, data):
+        """Feed request bytes. Returns a complete reply once a whole request has arrived."""
+        self.pending += data
+
+        # Older EWS requests use bare '\n' line ends
+        for sep in (b'\r\n\r\n', b'\n\n'):
+            i = self.pending.find(sep)
+            if i != -1:
+                head, body = self.pending[:i], self.pending[i+len(sep):]
+                break
+        else:
+            return None
+
+        m = content_length_pat.search(head)
+        if m is not None and len(body.strip()) < int(m.group(1)):
+            return None # wait for the body
+
+        self.pending = b''
+        m = request_pat.match(head.lstrip())
+        if m is None:
+            return self.reply(500, b'')
+
+        self.requests += 1
+        e = self.trace.http(m.group(2).decode('latin-1'))
+        if e is None:
+            return self.reply(404, b'')
+
+        return self.reply(e.get('status', 200), unb64(e.get('body', '')),
+                          e.get('chunked', False), e.get('content-type', 'text/xml'))
+
+
+    def reply(self, status, body, chunked=False, content_type='text/xml'):
+        head = [b'HTTP/1.1 ' + str(status).encode('ascii') + b' ' + STATUS_TEXT.get(status, b''),
+                b'Server: hplip-bench',
+                b'Content-Type: ' + content_type.encode('ascii')]
+
+        if chunked:
+            head.append(b'Transfer-Encoding: chunked')
+            chunks, pos = [], 0
+            while pos < len(body):
+                c = body[pos:pos+1024]
+                chunks.append(('%x\r\n' % len(c)).encode('ascii') + c + b'\r\n')
+                pos += len(c)
+            chunks.append(b'0\r\n\r\n')
+            body = b''.join(chunks)
+        else:
+            head.append(b'Content-Length: ' + str(len(body)).encode('ascii'))
+
+        return b'\r\n'.join(head) + b'\r\n\r\n' + body
+
+
+
+class PMLResponder(object):
+    """Answers multi-object PML get requests (base/pml.py) from the trace's PML objects."""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.requests = 0
+
+
+    def write(self, data):
+        from base import pml
+
+        p = bytearray(data)
+        if not p or p[0] != pml.GET_REQUEST:
+            return bytes(bytearray([p[0] | 0x80 if p else 0x80, pml.ERROR_UNKNOWN_REQUEST]))
+
+        self.requests += 1
+        objects, pos = [], 1
+        while pos + 2 <= len(p):
+            n = p[pos + 1]
+            objects.append(bytes(p[pos + 2 : pos + 2 + n]))
+            pos += 2 + n
+
+        reply, error_code = bytearray(), pml.ERROR_OK
+        for oid in objects:
+            e = self.trace.pml(pml.PMLToSNMP('.'.join([str(b) for b in bytearray(oid)])))
+            if e is None:
+                e = (pml.ERROR_UNKNOWN_OID, pml.TYPE_NULL_VALUE, b'')
+
+            result, data_type, value = e
+            if result > pml.ERROR_MAX_OK:
+                # The object's own error code, in front of its OID
+                reply.extend([pml.TYPE_ERROR_CODE, 1, result])
+                if error_code == pml.ERROR_OK:
+                    error_code = result
+                data_type, value = pml.TYPE_NULL_VALUE, b''
+
+            reply.extend([pml.TYPE_OBJECT_IDENTIFIER, len(oid)])
+            reply.extend(oid)
+            reply.extend([data_type | (len(value) >> 8), len(value) & 0xff])
+            reply.extend(value)
+
+        return bytes(bytearray([pml.GET_REPLY, error_code]) + reply)
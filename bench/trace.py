@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Device traces for the transport simulator.
+#
+# A trace is a JSON document:
+#
+# {
+#   "device-id" : "MFG:HP;MDL:...;",
+#   "probe" : { "usb" : "direct hp:/usb/... \"...\" \"...\" \"...\"\n" },
+#   "pml" : { "<snmp oid>" : { "type" : 16, "data" : "<base64>", "result" : 0 } },
+#   "pml-set" : { "<snmp oid>" : { "<base64 value set>" : "<base64 value read back>" } },
+#   "http" : { "/DevMgmt/ProductStatusDyn.xml" : { "status" : 200, "body" : "<base64>",
+#                                                  "chunked" : false } },
+#   "channels" : { "PRINT" : { "data" : "<base64 pattern>", "size" : 1048576 } },
+#   "scan" : { "format" : 1, "depth" : 8, "pixels-per-line" : 2550, "lines" : 3300 },
+#   "cups" : { "printers" : [ { "name" : "...", "device-uri" : "...", ... } ] },
+#   "pcard" : { "files" : { "hpim0001.nef" : 20971520 } },
+#   "latency" : { "pml" : 0.0, "read" : 0.0, "write" : 0.0, "http" : 0.0, "pcard" : 0.0 }
+# }
+#
+# A PML set changes the object in the trace, so it is read back as set or,
+# for the values in "pml-set", as the state the device goes to (a fax
+# download asked to start reads back as active).
+#
+# Traces can be recorded from a real device with TraceRecorder, which wraps
+# the real hpmudext module.
+#
+
+# Std Lib
+import json
+import base64
+import struct
+
+MFPDTF_FIXED_HEADER = "<IHBB"
+MFPDTF_RASTER_RECORD = "<BBH"
+
+
+def b64(data):
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return base64.b64encode(data).decode('ascii')
+
+
+def unb64(s):
+    return base64.b64decode(s.encode('ascii'))
+
+
+
+class Trace(object):
+    def __init__(self, d=None):
+        self.d = d or {}
+
+
+    @staticmethod
+    def load(path):
+        f = open(path, 'r')
+        try:
+            return Trace(json.load(f))
+        finally:
+            f.close()
+
+
+    def save(self, path):
+        f = open(path, 'w')
+        try:
+            json.dump(self.d, f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+
+
+    def get(self, key, default=None):
+        return self.d.get(key, default)
+
+
+    def deviceID(self):
+        return self.d.get('device-id', '')
+
+
+    def probe(self, bus):
+        return self.d.get('probe', {}).get(bus, '')
+
+
+    def pml(self, oid):
+        # Returns (pml_result_code, type, data) or None if the OID is unknown
+        try:
+            e = self.d['pml'][oid]
+        except KeyError:
+            return None
+
+        return e.get('result', 0), e['type'], unb64(e.get('data', ''))
+
+
+    def setPML(self, oid, data_type, data):
+        data = b64(data)
+        data = self.d.get('pml-set', {}).get(oid, {}).get(data, data)
+        self.d.setdefault('pml', {})[oid] = {'type' : data_type, 'data' : data, 'result' : 0}
+
+
+    def http(self, path):
+        return self.d.get('http', {}).get(path)
+
+
+    def channel(self, name):
+        # Returns (pattern, total size) for bulk data channels
+        try:
+            e = self.d['channels'][name]
+        except KeyError:
+            return b'', 0
+
+        return unb64(e['data']), e['size']
+
+
+    def latency(self, what):
+        return self.d.get('latency', {}).get(what, 0.0)
+
+
+
+def pmlEntry(data_type, data, result=0):
+    return {'type' : data_type, 'data' : b64(data), 'result' : result}
+
+
+def httpEntry(body, status=200, chunked=False, content_type='text/xml'):
+    return {'status' : status, 'body' : b64(body), 'chunked' : chunked,
+            'content-type' : content_type}
+
+
+def mfpdtfStream(page_bytes, block_size=8192):
+    # A simple MFPDTF stream (see base/mfpdtf.py): one scanned-image block
+    # with a raster record per block_size payload bytes, followed by an
+    # end-of-stream block.
+    out, pos = [], 0
+    payload = b'\x80' * block_size
+    while pos < page_bytes:
+        n = min(block_size, page_bytes - pos)
+        out.append(struct.pack(MFPDTF_FIXED_HEADER, 8 + 4 + n, 8, 2, 0))
+        out.append(struct.pack(MFPDTF_RASTER_RECORD, 1, 0, n))
+        out.append(payload[:n])
+        pos += n
+
+    out.append(struct.pack(MFPDTF_FIXED_HEADER, 8, 8, 2, 0x10))
+    return b''.join(out)
+
+
+def defaultTrace(size=4*1024*1024):
+    """Synthetic trace for a PML LaserJet MFP with LEDM status pages."""
+    from base import pml
+
+    def snmp(oid):
+        return pml.PMLToSNMP(oid)
+
+    def enum(v):
+        return struct.pack('>i', v).lstrip(b'\x00') or b'\x00'
+
+    d = {'device-id' : 'MFG:HP;MDL:HP Color LaserJet 2840;CMD:PCL,PJL,POSTSCRIPT;CLS:PRINTER;SN:CN0000000;S:0380008000000000000000000000000;',
+         'probe' : {'usb' : 'direct hp:/usb/HP_Color_LaserJet_2840?serial=CN0000000 "HP Color LaserJet 2840" "HP Color LaserJet 2840 USB CN0000000 HPLIP" "MFG:HP;MDL:HP Color LaserJet 2840;SN:CN0000000;"\n',
+                    'par' : ''},
+         'pml' : {},
+         'http' : {},
+         'channels' : {},
+         'scan' : {'format' : 1, 'depth' : 8, 'pixels-per-line' : 2550, 'lines' : 3300},
+         'cups' : {'printers' : [{'name' : 'HP_Color_LaserJet_2840',
+                                  'device-uri' : 'hp:/usb/HP_Color_LaserJet_2840?serial=CN0000000',
+                                  'make-and-model' : 'HP Color LaserJet 2840 hpijs',
+                                  'state' : 3, 'accepting' : 1}]},
+         'pcard' : {'files' : {'hpim0001.nef' : 20*1024*1024}},
+         'latency' : {},
+        }
+
+    p = d['pml']
+    p[snmp(pml.OID_PRINTER_STATUS[0])] = pmlEntry(pml.OID_PRINTER_STATUS[1], enum(1))
+    p[snmp(pml.OID_DEVICE_STATUS[0])] = pmlEntry(pml.OID_DEVICE_STATUS[1], enum(2))
+    p[snmp(pml.OID_COVER_STATUS[0])] = pmlEntry(pml.OID_COVER_STATUS[1], enum(4))
+    p[snmp(pml.OID_DETECTED_ERROR_STATE[0])] = pmlEntry(pml.OID_DETECTED_ERROR_STATE[1], b'\x00')
+
+    for x, kind in enumerate((3, 3, 3, 3, 9), 1): # 4 toners, fuser
+        p[snmp(pml.OID_MARKER_SUPPLIES_TYPE_x % x)] = pmlEntry(pml.OID_MARKER_SUPPLIES_TYPE_x_TYPE, enum(kind))
+        p[snmp(pml.OID_MARKER_SUPPLIES_LEVEL_x % x)] = pmlEntry(pml.OID_MARKER_SUPPLIES_LEVEL_x_TYPE, enum(20 * x))
+        p[snmp(pml.OID_MARKER_SUPPLIES_MAX_x % x)] = pmlEntry(pml.OID_MARKER_SUPPLIES_MAX_x_TYPE, enum(100))
+        p[snmp(pml.OID_MARKER_SUPPLIES_COLORANT_INDEX_x % x)] = pmlEntry(pml.OID_MARKER_SUPPLIES_COLORANT_INDEX_x_TYPE, enum(x))
+        p[snmp(pml.OID_MARKER_COLORANT_VALUE_x % x)] = pmlEntry(pml.OID_MARKER_COLORANT_VALUE_x_TYPE, ('black', 'cyan', 'magenta', 'yellow', 'black')[x-1])
+        p[snmp(pml.OID_MARKER_STATUS_x % x)] = pmlEntry(pml.OID_MARKER_STATUS_x_TYPE, enum(0))
+        p[snmp(pml.OID_MARKER_SUPPLIES_DESCRIPTION_x % x)] = pmlEntry(pml.OID_MARKER_SUPPLIES_DESCRIPTION_x_TYPE, b'\x00\x00HP Q3960A')
+
+    p[snmp(pml.OID_FAXJOB_TX_STATUS[0])] = pmlEntry(pml.OID_FAXJOB_TX_STATUS[1], enum(pml.FAXJOB_TX_STATUS_IDLE))
+    p[snmp(pml.OID_FAXJOB_RX_STATUS[0])] = pmlEntry(pml.OID_FAXJOB_RX_STATUS[1], enum(pml.FAXJOB_RX_STATUS_IDLE))
+    p[snmp(pml.OID_FAX_DOWNLOAD[0])] = pmlEntry(pml.OID_FAX_DOWNLOAD[1], enum(pml.UPDN_STATE_IDLE))
+    p[snmp(pml.OID_FAX_TOKEN[0])] = pmlEntry(pml.OID_FAX_TOKEN[1], b'\x00' * 16)
+    p[snmp(pml.OID_FAX_STATION_NAME[0])] = pmlEntry(pml.OID_FAX_STATION_NAME[1], b'\x00\x0eHPLIP')
+    p[snmp(pml.OID_FAX_LOCAL_PHONE_NUM[0])] = pmlEntry(pml.OID_FAX_LOCAL_PHONE_NUM[1], b'\x00\x0e5551234')
+
+    reqstart = pml.ConvertToPMLDataFormat(pml.UPDN_STATE_REQSTART, pml.OID_FAX_DOWNLOAD[1])
+    d['pml-set'] = {snmp(pml.OID_FAX_DOWNLOAD[0]) : {b64(reqstart) : b64(enum(pml.UPDN_STATE_XFERACTIVE))}}
+
+    agents = ''.join(["""<ccdyn:ConsumableInfo><dd:ConsumableLabelCode>%s</dd:ConsumableLabelCode>
+<dd:ConsumableLifeState><dd:ConsumableState>ok</dd:ConsumableState></dd:ConsumableLifeState>
+<dd:ConsumablePercentageLevelRemaining>%d</dd:ConsumablePercentageLevelRemaining>
+<dd:ConsumableTypeEnum>toner</dd:ConsumableTypeEnum><dd:ProductNumber>CE31%dA</dd:ProductNumber>
+</ccdyn:ConsumableInfo>""" % (c, 20 * i, i) for i, c in enumerate('KCMY', 1)])
+
+    h = d['http']
+    h['/DevMgmt/ConsumableConfigDyn.xml'] = httpEntry("""<?xml version="1.0" encoding="UTF-8"?>
+<ccdyn:ConsumableConfigDyn xmlns:ccdyn="x" xmlns:dd="y">%s</ccdyn:ConsumableConfigDyn>""" % agents, chunked=True)
+    h['/DevMgmt/MediaHandlingDyn.xml'] = httpEntry("""<?xml version="1.0" encoding="UTF-8"?>
+<mhdyn:MediaHandlingDyn xmlns:mhdyn="x" xmlns:dd="y"><mhdyn:InputTray><dd:InputBin>Tray1</dd:InputBin></mhdyn:InputTray>
+<mhdyn:Accessories><dd:MediaHandlingDeviceFunctionType>autoDuplexor</dd:MediaHandlingDeviceFunctionType></mhdyn:Accessories>
+</mhdyn:MediaHandlingDyn>""")
+    h['/DevMgmt/ProductStatusDyn.xml'] = httpEntry("""<?xml version="1.0" encoding="UTF-8"?>
+<psdyn:ProductStatusDyn xmlns:psdyn="x" xmlns:pscat="y"><psdyn:Status><pscat:StatusCategory>ready</pscat:StatusCategory></psdyn:Status>
+</psdyn:ProductStatusDyn>""")
+
+    pattern = bytes(bytearray(range(256))) * 64
+    c = d['channels']
+    for name in ('PRINT', 'HP-CARD-ACCESS', 'HP-FAX-SEND'):
+        c[name] = {'data' : b64(pattern), 'size' : size}
+
+    scan = mfpdtfStream(size)
+    c['HP-SCAN'] = {'data' : b64(scan), 'size' : len(scan)}
+
+    return Trace(d)
+
+
+
+class TraceRecorder(object):
+    """Wraps the real hpmudext module and records what the device returns."""
+
+    def __init__(self, hpmudext):
+        self.hpmudext = hpmudext
+        self.trace = Trace({'pml' : {}, 'http' : {}, 'probe' : {}, 'channels' : {}})
+        self.channel_names = {} # { (dd, cd) : name }
+        self.requests = {} # { (dd, cd) : [path, [reply data, ...]] }
+
+
+    def __getattr__(self, attr):
+        return getattr(self.hpmudext, attr)
+
+
+    def get_device_id(self, dd):
+        result_code, data = self.hpmudext.get_device_id(dd)
+        if result_code == self.hpmudext.HPMUD_R_OK:
+            if isinstance(data, bytes):
+                data = data.decode('latin-1')
+            self.trace.d['device-id'] = data
+        return result_code, data
+
+
+    def probe_devices(self, bus):
+        result_code, data = self.hpmudext.probe_devices(bus)
+        if result_code == self.hpmudext.HPMUD_R_OK:
+            name = {self.hpmudext.HPMUD_BUS_USB : 'usb', self.hpmudext.HPMUD_BUS_PARALLEL : 'par'}.get(bus, str(bus))
+            self.trace.d['probe'][name] = data
+        return result_code, data
+
+
+    def get_pml(self, dd, cd, oid, typ):
+        result_code, data, typ, pml_result_code = self.hpmudext.get_pml(dd, cd, oid, typ)
+        if result_code == self.hpmudext.HPMUD_R_OK:
+            self.trace.d['pml'][oid] = pmlEntry(typ, data, pml_result_code)
+        return result_code, data, typ, pml_result_code
+
+
+    def get_pml_multi(self, dd, cd, oids):
+        result_code, objects = self.hpmudext.get_pml_multi(dd, cd, oids)
+        if result_code == self.hpmudext.HPMUD_R_OK:
+            for oid, (data, typ, pml_result_code) in zip(oids, objects):
+                self.trace.d['pml'][oid] = pmlEntry(typ, data, pml_result_code)
+        return result_code, objects
+
+
+    def open_channel(self, dd, name):
+        result_code, cd = self.hpmudext.open_channel(dd, name)
+        self.channel_names[(dd, cd)] = name
+        return result_code, cd
+
+
+    def write_channel(self, dd, cd, data, *args):
+        self.__flush(dd, cd)
+        if isinstance(data, bytes):
+            text = data.decode('latin-1')
+        else:
+            text = data
+
+        words = text.split(None, 2)
+        if len(words) >= 2 and words[0] in ('GET', 'POST', 'PUT'):
+            self.requests[(dd, cd)] = [words[1], []]
+
+        return self.hpmudext.write_channel(dd, cd, data, *args)
+
+
+    def read_channel(self, dd, cd, bytes_to_read, *args):
+        result_code, data = self.hpmudext.read_channel(dd, cd, bytes_to_read, *args)
+        if (dd, cd) in self.requests and data:
+            self.requests[(dd, cd)][1].append(data)
+        return result_code, data
+
+
+    def close_channel(self, dd, cd):
+        self.__flush(dd, cd)
+        return self.hpmudext.close_channel(dd, cd)
+
+
+    def __flush(self, dd, cd):
+        try:
+            path, replies = self.requests.pop((dd, cd))
+        except KeyError:
+            return
+
+        reply = b''.join(replies)
+        head, sep, body = reply.partition(b'\r\n\r\n')
+        status = 200
+        try:
+            status = int(head.split()[1])
+        except (IndexError, ValueError):
+            pass
+
+        chunked = b'chunked' in head.lower()
+        if chunked:
+            body = self.__dechunk(body)
+
+        self.trace.d['http'][path] = httpEntry(body, status, chunked)
+
+
+    def __dechunk(self, data):
+        out = []
+        while data:
+            line, sep, data = data.partition(b'\r\n')
+            try:
+                size = int(line.split(b';')[0], 16)
+            except ValueError:
+                break
+            if not size:
+                break
+            out.append(data[:size])
+            data = data[size+2:]
+
+        return b''.join(out)
+
+
+    def save(self, path):
+        self.trace.save(path)
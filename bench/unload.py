@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Photo card unload throughput, with a FAT16 image file standing in for
+# the card (pcard.photocard.PhotoCardImage). Needs the pcardext extension.
+#
+# The image has --files photos in DCIM/100HPAIO. They are unloaded once a
+# file at a time with pcardext.cp(), as PhotoCard.unload() used to, and
+# once with the unload pipeline. The pipeline is then cancelled half way
+# through a fresh directory and run again, to show what the resume reads
+# from the card. Every copy is checked against the card data.
+#
+
+# Std Lib
+import os
+import sys
+import time
+import getopt
+import shutil
+import struct
+import hashlib
+import tempfile
+
+USAGE = """hp-bench-unload: Measure photo card unload throughput against a FAT image.
+
+Usage: python -m bench.unload [OPTIONS]
+
+  --files=N            Photos on the card (default: 40)
+  --size=BYTES         Bytes per photo (default: 2097152)
+  --delay=S            Seconds each card read or write command takes (default: 0.002)
+"""
+
+SECTOR_SIZE = 512
+SECTORS_PER_CLUSTER = 8
+ROOT_ENTRIES = 512
+
+
+def photoData(n, size):
+    # Distinct from the first byte, so no two photos share a head
+    block = hashlib.sha1(('photo %d' % n).encode('ascii')).digest() * 3277
+    return (block * (size // len(block) + 1))[:size]
+
+
+def dirEntry(name, ext, attr, cluster, size):
+    return struct.pack('<8s3sB10xHHHI', name.encode('ascii').ljust(8), ext.encode('ascii').ljust(3),
+                       attr, 0, 0, cluster, size)
+
+
+def makeImage(path, files, size, dirs=1):
+    """FAT16 image with DCIM/100HPAIO/HPIM0001.JPG ..., files photos in each
+       of dirs directories. Returns [(card path, data), ...]."""
+    cluster_size = SECTORS_PER_CLUSTER * SECTOR_SIZE
+    file_clusters = (size + cluster_size - 1) // cluster_size
+    dir_clusters = ((files + 2) * 32 + cluster_size - 1) // cluster_size
+    dcim_clusters = ((dirs + 2) * 32 + cluster_size - 1) // cluster_size
+    clusters = max(4085 + 16, 2 + dcim_clusters + dirs * (dir_clusters + files * file_clusters) + 16) # FAT16 has 4085 or more
+
+    fat_sectors = ((clusters + 2) * 2 + SECTOR_SIZE - 1) // SECTOR_SIZE
+    root_sectors = ROOT_ENTRIES * 32 // SECTOR_SIZE
+    data_start = 1 + 2 * fat_sectors + root_sectors
+    total = data_start + clusters * SECTORS_PER_CLUSTER
+
+    fat = [0xfff8, 0xffff] + [0] * clusters
+    next_cluster = [2]
+
+    def allocate(n):
+        first = next_cluster[0]
+        for c in range(first, first + n):
+            fat[c] = c + 1
+        fat[first + n - 1] = 0xffff
+        next_cluster[0] += n
+        return first
+
+    f = open(path, 'wb')
+    try:
+        boot = struct.pack('<3s8sHBHBHHBHHHIIBBBI11s8s', b'\xeb\x3c\x90', b'HPLIP   ', SECTOR_SIZE,
+                           SECTORS_PER_CLUSTER, 1, 2, ROOT_ENTRIES, total if total < 65536 else 0,
+                           0xf8, fat_sectors, 32, 64, 0, total if total >= 65536 else 0,
+                           0x80, 0, 0x29, 0x12345678, b'HPLIP CARD ', b'FAT16   ')
+        f.write(boot.ljust(SECTOR_SIZE - 2, b'\0') + b'\x55\xaa')
+
+        def writeCluster(cluster, data):
+            f.seek((data_start + (cluster - 2) * SECTORS_PER_CLUSTER) * SECTOR_SIZE)
+            f.write(data)
+
+        dcim = allocate(dcim_clusters)
+        dcim_entries = [dirEntry('.', '', 0x10, dcim, 0), dirEntry('..', '', 0x10, 0, 0)]
+        out = []
+        n = 0
+        for d in range(dirs):
+            dir_name = '%03dHPAIO' % (100 + d)
+            photos = allocate(dir_clusters)
+            dcim_entries.append(dirEntry(dir_name, '', 0x10, photos, 0))
+
+            entries = [dirEntry('.', '', 0x10, photos, 0), dirEntry('..', '', 0x10, dcim, 0)]
+            for i in range(files):
+                n += 1
+                data = photoData(n, size)
+                cluster = allocate(file_clusters)
+                writeCluster(cluster, data)
+                entries.append(dirEntry('HPIM%04d' % n, 'JPG', 0x20, cluster, size))
+                out.append(('dcim/%s/hpim%04d.jpg' % (dir_name.lower(), n), data))
+
+            writeCluster(photos, b''.join(entries))
+
+        writeCluster(dcim, b''.join(dcim_entries))
+
+        fat_data = struct.pack('<%dH' % len(fat), *fat).ljust(fat_sectors * SECTOR_SIZE, b'\0')
+        f.seek(SECTOR_SIZE)
+        f.write(fat_data + fat_data)
+        f.write(dirEntry('DCIM', '', 0x10, dcim, 0).ljust(root_sectors * SECTOR_SIZE, b'\0'))
+
+        f.seek(total * SECTOR_SIZE - 1)
+        f.write(b'\0')
+    finally:
+        f.close()
+
+    return out
+
+
+def mount(photocard, image, delay):
+    dev = photocard.PhotoCardImage(image)
+    if delay:
+        write = dev.writePCard
+        def slowWrite(request):
+            time.sleep(delay)
+            return write(request)
+        dev.writePCard = slowWrite
+
+    pc = photocard.PhotoCard(dev)
+    pc.mount()
+    return pc
+
+
+def check(directory, photos):
+    for card_path, data in photos:
+        local = os.path.join(directory, os.path.basename(card_path))
+        if open(local, 'rb').read() != data:
+            raise ValueError("%s differs from the card" % local)
+
+
+def main(args):
+    try:
+        opts, args = getopt.getopt(args, 'h', ['help', 'files=', 'size=', 'delay='])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s" % (e, USAGE))
+        return 1
+
+    files, size, delay = 40, 2*1024*1024, 0.002
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif o == '--files':
+            files = int(a)
+        elif o == '--size':
+            size = int(a)
+        elif o == '--delay':
+            delay = float(a)
+
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if top not in sys.path:
+        sys.path.insert(0, top)
+
+    from pcard import photocard
+
+    work = tempfile.mkdtemp(prefix='unload-bench-')
+    cwd = os.getcwd()
+    try:
+        image = os.path.join(work, 'card.img')
+        photos = makeImage(image, files, size)
+        unload_list = [(card_path, size, 'image', 'jpeg') for card_path, data in photos]
+        pc = mount(photocard, image, delay)
+
+        results = []
+
+        # A file at a time, as the old unload did
+        os.mkdir(os.path.join(work, 'sequential'))
+        os.chdir(os.path.join(work, 'sequential'))
+        t = time.time()
+        pc.cd('/', False)
+        for d in ('dcim', '100hpaio'):
+            pc.cd(d, False)
+        for card_path, data in photos:
+            pc.cp(os.path.basename(card_path), os.path.basename(card_path), False)
+        results.append(('sequential', files * size, time.time() - t))
+        check(os.getcwd(), photos)
+
+        # The pipeline
+        os.mkdir(os.path.join(work, 'pipeline'))
+        os.chdir(os.path.join(work, 'pipeline'))
+        total, delta, was_cancelled = pc.unload(unload_list, None, None, True)
+        results.append(('pipeline', total, delta))
+        check(os.getcwd(), photos)
+
+        # Cancelled half way, then resumed
+        os.mkdir(os.path.join(work, 'resume'))
+        os.chdir(os.path.join(work, 'resume'))
+        done = []
+        def cancelHalfWay(src, trg, size):
+            if size:
+                done.append(src)
+            return len(done) >= files // 2
+
+        pc.unload(unload_list, cancelHalfWay, None, True)
+        total, delta, was_cancelled = pc.unload(unload_list, None, None, True)
+        results.append(('resumed', total, delta))
+        check(os.getcwd(), photos)
+
+        pc.umount()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, True)
+
+    sys.stdout.write("%-12s %16s %10s %10s\n" % ('unload', 'card bytes read', 'seconds', 'MB/s'))
+    for name, total, delta in results:
+        sys.stdout.write("%-12s %16d %10.2f %10.2f\n" % (name, total, delta, files * size / delta / 1e6))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
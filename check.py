@@ -311,9 +311,8 @@ class DependenciesCheck(CoreInstall):
                      %(self.distro_name, self.distro_version, self.distro_name, supported_distro_vrs)))
           
         tui.header("SYSTEM INFO")
-        Sts, Kernel_info =utils.run("uname -r -v -o")
-        Sts, Host_info =utils.run("uname -n")
-        Sts, Proc_info =utils.run("uname -r -v -o")
+        (Sts, Kernel_info), (Sts, Host_info) = utils.run_many(["uname -r -v -o", "uname -n"])
+        Proc_info = Kernel_info
         log.info(" Kernel: %s Host: %s Proc: %s Distribution: %s %s"\
              %(Kernel_info,Host_info,Proc_info,self.distro_name, self.distro_version))
         log.info(" Bitness: %s bit\n"%utils.getBitness())
@@ -459,6 +458,9 @@ class DependenciesCheck(CoreInstall):
 
                 log.debug(cups_printers)
                 if cups_printers:
+                    printer_states = dict(zip([printer_name for printer_name, device_uri in cups_printers],
+                                              utils.run_many(['lpstat -p%s' % printer_name for printer_name, device_uri in cups_printers])))
+
                     #non_hp = False
                     for p in cups_printers:
                         printer_name, device_uri = p
@@ -514,7 +516,7 @@ class DependenciesCheck(CoreInstall):
 
                             log.info("PPD Description: %s" % desc)
 
-                            status, output = utils.run('lpstat -p%s' % printer_name)
+                            status, output = printer_states[printer_name]
                             log.info("Printer status: %s" % output.replace("\n", ""))
 
                             if back_end == 'hpfax' and not 'HP Fax' in desc and desc != '':
@@ -672,7 +674,7 @@ class DependenciesCheck(CoreInstall):
                                     if getfacl:
                                        # log.debug("%s %s" % (getfacl, devnode))
                                         status, output = utils.run("%s %s" % (getfacl, devnode))
-                                        getfacl_out_list = output.split('\r\n')
+                                        getfacl_out_list = output.splitlines()
 
                                         out =''
                                         for g in getfacl_out_list:
@@ -851,6 +853,8 @@ if __name__ == "__main__":
 
         show_title()
         ui_toolkit = sys_conf.get('configure','ui-toolkit')
+        # The dependency checks and the queue checks run many of the same commands
+        utils.start_run_cache()
         core =  DependenciesCheck(MODE_CHECK,INTERACTIVE_MODE,ui_toolkit)
         core.init()
         num_errors, num_warns = core.validate(time_flag, is_quiet_mode)
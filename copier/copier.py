@@ -27,13 +27,12 @@ import os
 import os.path
 import time
 import threading
-from base.sixext.moves import queue
 from io import StringIO
 
 # Local
 from base.g import *
 from base.codes import *
-from base import device, utils, status, pml
+from base import device, utils, status, pml, jobmonitor
 
 # Event queue values (UI ==> Copy thread)
 COPY_CANCELED = 1
@@ -102,9 +101,18 @@ class PMLCopyThread(threading.Thread):
         self.update_queue = update_queue
         self.prev_update = ''
         self.copy_type = self.dev.copy_type
+        self.monitor = None # JobMonitor, for the time run() runs
         log.debug("Copy-type = %d" % self.copy_type)
 
     def run(self):
+        self.monitor = jobmonitor.JobMonitor(self.event_queue, lambda event: event == COPY_CANCELED)
+        try:
+            self.__run()
+        finally:
+            self.monitor.close()
+
+
+    def __run(self):
         STATE_DONE = 0
         STATE_ERROR = 5
         STATE_ABORTED = 10
@@ -290,6 +298,7 @@ class PMLCopyThread(threading.Thread):
                 if self.copy_type == COPY_TYPE_DEVICE:
                     while True:
                         result_code, copy_state = self.dev.getPML(pml.OID_COPIER_JOB)
+                        self.monitor.changed(copy_state)
 
                         if self.check_for_cancel():
                             self.dev.setPML(pml.OID_COPIER_JOB, pml.COPIER_JOB_IDLE) # cancel
@@ -298,13 +307,15 @@ class PMLCopyThread(threading.Thread):
 
                         if copy_state == pml.COPIER_JOB_START:
                             log.debug("state = start")
-                            time.sleep(1)
+                            self.monitor.setPhase(jobmonitor.PHASE_SETUP)
+                            self.monitor.wait()
                             continue
 
                         if copy_state == pml.COPIER_JOB_ACTIVE:
                             self.write_queue(STATUS_ACTIVE)
                             log.debug("state = active")
-                            time.sleep(2)
+                            self.monitor.setPhase(jobmonitor.PHASE_ACTIVE)
+                            self.monitor.wait()
                             continue
 
                         elif copy_state == pml.COPIER_JOB_ABORTING:
@@ -320,6 +331,7 @@ class PMLCopyThread(threading.Thread):
                 elif self.copy_type == COPY_TYPE_AIO_DEVICE:
                     while True:
                         result_code, copy_state = self.dev.getPML(pml.OID_SCAN_TO_PRINTER)
+                        self.monitor.changed(copy_state)
 
                         if self.check_for_cancel():
                             self.dev.setPML(pml.OID_SCAN_TO_PRINTER, pml.SCAN_TO_PRINTER_IDLE) # cancel
@@ -328,13 +340,15 @@ class PMLCopyThread(threading.Thread):
 
                         if copy_state == pml.SCAN_TO_PRINTER_START:
                             log.debug("state = start")
-                            time.sleep(1)
+                            self.monitor.setPhase(jobmonitor.PHASE_SETUP)
+                            self.monitor.wait()
                             continue
 
                         if copy_state == pml.SCAN_TO_PRINTER_ACTIVE:
                             self.write_queue(STATUS_ACTIVE)
                             log.debug("state = active")
-                            time.sleep(2)
+                            self.monitor.setPhase(jobmonitor.PHASE_ACTIVE)
+                            self.monitor.wait()
                             continue
 
                         elif copy_state == pml.SCAN_TO_PRINTER_ABORTED:
@@ -357,22 +371,12 @@ class PMLCopyThread(threading.Thread):
                     log.error("Unable to release copier token.")
 
                 self.dev.close() # Close the device.
-                
+
                 state = STATE_DONE
 
 
     def check_for_cancel(self):
-        canceled = False
-        while self.event_queue.qsize():
-            try:
-                event = self.event_queue.get(0)
-                if event == COPY_CANCELED:
-                    canceled = True
-                    log.debug("Cancel pressed!")
-            except queue.Empty:
-                break
-
-        return canceled
+        return self.monitor.canceled()
 
     def write_queue(self, message):
         if self.update_queue is not None and message != self.prev_update:
@@ -22,11 +22,12 @@ import warnings
 warnings.simplefilter("ignore", DeprecationWarning)
 warnings.simplefilter("ignore", SyntaxWarning)
 from reportlab.platypus.paragraph import Paragraph
-from reportlab.platypus.flowables import Preformatted, Image, HRFlowable
+from reportlab.platypus.flowables import Flowable, Preformatted, Image, HRFlowable
 from reportlab.platypus.doctemplate import *
 #from reportlab.rl_config import TTFSearchPath
 from reportlab.platypus import SimpleDocTemplate, Spacer
 from reportlab.platypus.tables import Table, TableStyle
+from reportlab.pdfgen.canvas import Canvas
 from reportlab.lib.pagesizes import letter, legal, A4
 from reportlab.lib.units import inch
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
@@ -34,6 +35,7 @@ from reportlab.lib import colors
 #from reportlab.pdfbase import pdfmetrics
 #from reportlab.pdfbase.ttfonts import TTFont
 from time import localtime, strftime
+import math
 #import warnings
 warnings.simplefilter('default', DeprecationWarning)
 warnings.simplefilter("default", SyntaxWarning)
@@ -49,11 +51,98 @@ PAGE_SIZE_LETTER = 'letter'
 PAGE_SIZE_LEGAL = 'legal'
 PAGE_SIZE_A4 = 'a4'
 
+PAGE_SIZES = {PAGE_SIZE_LETTER : letter, PAGE_SIZE_LEGAL : legal, PAGE_SIZE_A4 : A4}
+
+FIELD_MARGIN = 3 # points around each field on the field pages
+FIELD_STEP = 36 # points, field values are moved by multiples of half an inch, a whole
+                # number of pixel rows at every fax resolution
+
 
 def escape(s):
     return s.replace("&", "&amp;").replace(">", "&gt;").replace("<", "&lt;")
 
 
+class Field(Flowable):
+    """ Stands in for a recipient field in a cover page template.
+
+        Takes up one line of text in style and draws nothing. Where it went is
+        recorded in fields[name] as (x, top, width, height, style), in points
+        from the top left of the page.
+    """
+    def __init__(self, fields, name, style):
+        Flowable.__init__(self)
+        self.fields = fields
+        self.name = name
+        self.style = style
+
+
+    def wrap(self, availWidth, availHeight):
+        self.width, self.height = availWidth, self.style.leading
+        return self.width, self.height
+
+
+    def draw(self):
+        x, y = self.canv.absolutePosition(0, 0)
+        top = self.canv._pagesize[1] - y - self.height
+        self.fields[self.name] = (x, top, self.width, self.height, self.style)
+
+
+def fieldText(fields, name, value, style):
+    if fields is None:
+        return Paragraph(escape(value[:64]), style)
+
+    return Field(fields, name, style)
+
+
+def createFieldPages(fields, values, page_size=PAGE_SIZE_LETTER, output=None):
+    """ Draws recipient field values, for cover pages made from a template.
+
+        fields is as filled in by a create*CoverPage(fields={}) and values a
+        list of (field name, value). Each value is drawn at the x of its field
+        in the template, one below the other and a whole number of FIELD_STEPs
+        above or below the field. Returns (file name,
+        { (field name, value) : (page number, top), ... }) with top in points
+        from the top of the page. Values that do not fit in one line of their
+        field are left out.
+    """
+    pgsz = PAGE_SIZES.get(page_size, A4)
+
+    if output is None:
+        f_fd, f = utils.make_temp_file()
+    else:
+        f = output
+
+    canv = Canvas(f, pagesize=pgsz)
+    slots, page, bottom = {}, 0, 0
+
+    for name, value in values:
+        if not value or name not in fields or (name, value) in slots:
+            continue
+
+        x, field_top, width, height, style = fields[name]
+        p = Paragraph(escape(value[:64]), style)
+        w, h = p.wrap(width, pgsz[1])
+        if h > height or p.minWidth() > width:
+            log.debug("Cover page field %s does not fit: %s" % (name, value))
+            continue
+
+        # The first place below the last value that is a whole number of steps from the field
+        top = field_top + FIELD_STEP * math.ceil((bottom + FIELD_MARGIN - field_top) / float(FIELD_STEP))
+        if top + height + FIELD_MARGIN > pgsz[1]:
+            canv.showPage()
+            page, bottom = page + 1, 0
+            top = field_top + FIELD_STEP * math.ceil((FIELD_MARGIN - field_top) / float(FIELD_STEP))
+
+        p.drawOn(canv, x, pgsz[1] - top - height)
+        slots[(name, value)] = (page, top)
+        bottom = top + height + FIELD_MARGIN
+
+    canv.showPage()
+    canv.save()
+
+    return f, slots
+
+
 def createStandardCoverPage(page_size=PAGE_SIZE_LETTER,
                             total_pages=1,
                             recipient_name='',
@@ -66,7 +155,8 @@ def createStandardCoverPage(page_size=PAGE_SIZE_LETTER,
                             regarding='',
                             message='',
                             preserve_formatting=False,
-                            output=None):
+                            output=None,
+                            fields=None):
 
     s = getSampleStyleSheet()
 
@@ -95,10 +185,10 @@ def createStandardCoverPage(page_size=PAGE_SIZE_LETTER,
                         fontSize=12)
 
     recipient_name_label = Paragraph("To:", ps)
-    recipient_name_text = Paragraph(escape(recipient_name[:64]), ps)
+    recipient_name_text = fieldText(fields, 'recipient_name', recipient_name, ps)
 
     recipient_fax_label = Paragraph("Fax:", ps)
-    recipient_fax_text = Paragraph(escape(recipient_fax[:64]), ps)
+    recipient_fax_text = fieldText(fields, 'recipient_fax', recipient_fax, ps)
 
     recipient_phone_label = Paragraph("Phone:", ps)
     recipient_phone_text = Paragraph(escape(recipient_phone[:64]), ps)
@@ -192,7 +282,8 @@ def createConfidentialCoverPage(page_size=PAGE_SIZE_LETTER,
                             regarding='',
                             message='',
                             preserve_formatting=False,
-                            output=None):
+                            output=None,
+                            fields=None):
 
     s = getSampleStyleSheet()
 
@@ -209,10 +300,10 @@ def createConfidentialCoverPage(page_size=PAGE_SIZE_LETTER,
                         fontSize=12)
 
     recipient_name_label = Paragraph("To:", ps)
-    recipient_name_text = Paragraph(escape(recipient_name[:64]), ps)
+    recipient_name_text = fieldText(fields, 'recipient_name', recipient_name, ps)
 
     recipient_fax_label = Paragraph("Fax:", ps)
-    recipient_fax_text = Paragraph(escape(recipient_fax[:64]), ps)
+    recipient_fax_text = fieldText(fields, 'recipient_fax', recipient_fax, ps)
 
     recipient_phone_label = Paragraph("Phone:", ps)
     recipient_phone_text = Paragraph(escape(recipient_phone[:64]), ps)
@@ -318,7 +409,8 @@ def createGenericCoverPage(page_size=PAGE_SIZE_LETTER,
                             regarding='',
                             message='',
                             preserve_formatting=False,
-                            output=None):
+                            output=None,
+                            fields=None):
 
     s = getSampleStyleSheet()
 
@@ -337,10 +429,10 @@ def createGenericCoverPage(page_size=PAGE_SIZE_LETTER,
                         fontSize=12)
 
     recipient_name_label = Paragraph("To:", ps)
-    recipient_name_text = Paragraph(escape(recipient_name[:64]), ps)
+    recipient_name_text = fieldText(fields, 'recipient_name', recipient_name, ps)
 
     recipient_fax_label = Paragraph("Fax:", ps)
-    recipient_fax_text = Paragraph(escape(recipient_fax[:64]), ps)
+    recipient_fax_text = fieldText(fields, 'recipient_fax', recipient_fax, ps)
 
     recipient_phone_label = Paragraph("Phone:", ps)
     recipient_phone_text = Paragraph(escape(recipient_phone[:64]), ps)
@@ -447,7 +539,8 @@ def createUrgentCoverPage(page_size=PAGE_SIZE_LETTER,
                             regarding='',
                             message='',
                             preserve_formatting=False,
-                            output=None):
+                            output=None,
+                            fields=None):
 
     s = getSampleStyleSheet()
 
@@ -465,10 +558,10 @@ def createUrgentCoverPage(page_size=PAGE_SIZE_LETTER,
                         fontSize=12)
 
     recipient_name_label = Paragraph("To:", ps)
-    recipient_name_text = Paragraph(escape(recipient_name[:64]), ps)
+    recipient_name_text = fieldText(fields, 'recipient_name', recipient_name, ps)
 
     recipient_fax_label = Paragraph("Fax:", ps)
-    recipient_fax_text = Paragraph(escape(recipient_fax[:64]), ps)
+    recipient_fax_text = fieldText(fields, 'recipient_fax', recipient_fax, ps)
 
     recipient_phone_label = Paragraph("Phone:", ps)
     recipient_phone_text = Paragraph(escape(recipient_phone[:64]), ps)
@@ -27,16 +27,19 @@ import os
 import threading
 import pickle
 import time
+import math
 import struct
+import hashlib
 
 # Local
 from base.g import *
 from base.codes import *
 from base.ldif import LDIFParser
-from base import device, utils, vcard
+from base import device, utils, vcard, jobmonitor
 from prnt import cups
 from base.sixext import BytesIO
 from base.sixext import to_bytes_utf8, to_long, to_unicode
+from . import g3
 try:
     from . import coverpages
 except ImportError:
@@ -541,6 +544,342 @@ def getFaxDevice(device_uri=None, printer_name=None,
         raise Error(ERROR_DEVICE_DOES_NOT_SUPPORT_OPERATION)
 
 # **************************************************************************** #
+# Rendering files to G3 through the CUPS fax queue
+#
+# The files are all sent to the queue at once. hpssd keeps each fax the hpfax
+# backend renders (EVENT_FAX_RENDER_COMPLETE) and WaitForFaxes() returns as
+# soon as one of ours is in, so the send thread sleeps until then or until a
+# cancel. With an older hpssd, CheckForWaitingFax() is asked once a second.
+
+RENDER_TIMEOUT = 300.0 # seconds, for the next file to render
+RENDER_WAIT = 10.0 # seconds, longest single WaitForFaxes() call
+
+PRETTYPRINT_MIME_TYPES = ["application/x-cshell",
+                          "application/x-perl",
+                          "application/x-python",
+                          "application/x-shell",
+                          "application/x-sh",
+                          "text/plain",]
+
+
+class RenderScheduler(object):
+    def __init__(self, service, device_uri, printer_name, monitor=None, check_for_cancel=None):
+        """ service is the hpssd dbus proxy. monitor (a jobmonitor.JobMonitor) and
+            check_for_cancel() are the send thread's, if there is one.
+        """
+        self.service = service
+        self.device_uri = device_uri
+        self.printer_name = printer_name
+        self.own_monitor = monitor is None
+        self.monitor = monitor if monitor is not None else jobmonitor.JobMonitor()
+        self.check_for_cancel = check_for_cancel
+        self.job_ids = [] # in submit order, <= 0 if the file could not be sent
+        self.results = {} # { job_id : (fax_file, title), ... }
+        self.lock = threading.Lock()
+        self.stop = False
+        self.error = False
+
+
+    def submit(self, path, title, mime_type='', prettyprint=True, force_single_page=False):
+        """ Sends one file to the fax queue. Returns the CUPS job ID. """
+        cups.resetOptions()
+
+        if prettyprint and mime_type in PRETTYPRINT_MIME_TYPES:
+            cups.addOption('prettyprint')
+
+        if force_single_page:
+            cups.addOption('page-ranges=1') # Force coverpage to 1 page
+
+        job_id = cups.printFile(self.printer_name, path, title)
+        cups.resetOptions()
+
+        if job_id > 0:
+            log.debug("Rendering %s (job %d)..." % (path, job_id))
+        else:
+            log.error("Unable to send %s to the fax queue %s." % (path, self.printer_name))
+
+        self.job_ids.append(job_id)
+        return job_id
+
+
+    def wait(self, timeout=RENDER_TIMEOUT):
+        """ Waits for all the submitted files, up to timeout seconds for each next one
+            (the deadline moves on each time a file is rendered).
+            Returns ([ (fax_file, title), ... ] in submit order, canceled). fax_file is
+            '' for the files that did not render (timeout, cancel or error); their jobs are
+            canceled.
+        """
+        pending = set([j for j in self.job_ids if j > 0])
+        canceled = False
+
+        if pending:
+            t = threading.Thread(target=self.__waitForFaxes, args=(list(pending),))
+            t.daemon = True
+            t.start()
+
+        end_time = time.time() + timeout
+
+        try:
+            while pending:
+                with self.lock:
+                    done = [j for j in pending if j in self.results]
+
+                for j in done:
+                    log.debug("Fax file for job %d: %s" % (j, self.results[j][0]))
+                    pending.discard(j)
+
+                if done:
+                    end_time = time.time() + timeout
+
+                if not pending or self.error:
+                    break
+
+                if self.check_for_cancel is not None and self.check_for_cancel():
+                    log.error("Render canceled.")
+                    canceled = True
+                    break
+
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    log.error("Timeout waiting for rendering.")
+                    break
+
+                self.monitor.wait(remaining)
+
+        finally:
+            self.stop = True
+            if self.own_monitor:
+                self.monitor.close()
+
+        for j in [j for j in self.job_ids if j in pending]:
+            log.error("Canceling job #%d..." % j)
+            cups.cancelJob(j)
+
+        return [self.results.get(j, ('', '')) for j in self.job_ids], canceled
+
+
+    def __waitForFaxes(self, job_ids):
+        poll = False # older hpssd, no WaitForFaxes()
+
+        try:
+            while job_ids and not self.stop:
+                try:
+                    if poll:
+                        faxes = [r for r in [self.service.CheckForWaitingFax(self.device_uri, prop.username, j)
+                                             for j in job_ids] if r[7]]
+                        if not faxes:
+                            time.sleep(1)
+                    else:
+                        faxes = self.service.WaitForFaxes(self.device_uri, prop.username, job_ids, RENDER_WAIT,
+                                                          timeout=RENDER_WAIT + 30.0)
+
+                except dbus.exceptions.DBusException as e:
+                    if not poll and e.get_dbus_name() == 'org.freedesktop.DBus.Error.UnknownMethod':
+                        log.debug("hpssd has no WaitForFaxes(), checking for rendered faxes every second.")
+                        poll = True
+                        continue
+
+                    log.error("Cannot communicate with hp-systray (%s). Canceling..." % e)
+                    return
+
+                if not faxes:
+                    continue
+
+                with self.lock:
+                    for r in faxes:
+                        job_id = int(r[4])
+                        self.results[job_id] = (str(r[7]), r[5])
+                        if job_id in job_ids:
+                            job_ids.remove(job_id)
+
+                self.monitor.wake()
+
+        finally:
+            if job_ids and not self.stop:
+                self.error = True
+                self.monitor.wake()
+
+# **************************************************************************** #
+# Cover pages from one rendered template
+#
+# The cover page is rendered once per job with the recipient fields left
+# blank, and the field values of all the recipients are drawn on field pages
+# rendered along with it (coverpages.createFieldPages()). Each recipient's
+# cover is then put together in-process: the pages are decoded to packed rows
+# (g3.decodeRaster()), the values are OR-ed from the field pages into the
+# template rows under the fields and the page is encoded again
+# (g3.encodeRaster()). Covers are kept by a hash of their field values. Recipients
+# whose values do not fit in one line of the fields get a cover rendered
+# through the queue, as do cover_funcs not in coverpages.COVERPAGES and
+# color (JPEG) faxes.
+
+# [(cover page field, recipient key), ...]
+COVER_FIELDS = [('recipient_name', 'name'), ('recipient_fax', 'fax')]
+
+
+class CoverPageCache(object):
+    def __init__(self, scheduler, cover_func, cover_args):
+        """ scheduler is a RenderScheduler for the template and the field pages.
+            cover_args are passed to cover_func, all but the recipient fields.
+        """
+        self.scheduler = scheduler
+        self.cover_func = cover_func
+        self.cover_args = cover_args
+        self.header = None # G3 file header of the template, None if there is no template
+        self.raster = b'' # template page, packed rows (g3.decodeRaster())
+        self.width = 0
+        self.fields = {} # { field : (x, top, width, height, style), ... } in points
+        self.boxes = {} # { field : ([(byte in row, bit mask), ...], first row, rows), ... }
+        self.field_pages = [] # [ packed rows, ... ]
+        self.slots = {} # { (field, value) : (field page, top), ... } top in points
+        self.covers = {} # { hash of the field values : fax file, ... }
+
+
+    def prepare(self, recipients):
+        """ Renders the template and the fields of recipients. Returns True if canceled. """
+        if self.cover_func not in [f for f, thumbnail in coverpages.COVERPAGES.values()]:
+            log.debug("No cover page template for %s" % self.cover_func)
+            return False
+
+        page_size = self.cover_args.get('page_size', coverpages.PAGE_SIZE_LETTER)
+        template_pdf = self.cover_func(recipient_name='', recipient_fax='',
+                                       fields=self.fields, **self.cover_args)
+
+        if [field for field, key in COVER_FIELDS if field not in self.fields]:
+            log.debug("Cover page fields are not on the first page.")
+            os.remove(template_pdf)
+            return False
+
+        values = [(field, a[key]) for a in recipients for field, key in COVER_FIELDS]
+        fields_pdf, self.slots = coverpages.createFieldPages(self.fields, values, page_size)
+
+        self.scheduler.submit(template_pdf, 'Cover Page', "application/pdf", force_single_page=True)
+        if self.slots:
+            self.scheduler.submit(fields_pdf, 'Cover Page Fields', "application/pdf")
+
+        results, canceled = self.scheduler.wait()
+        fax_files = [f for f, title in results]
+
+        for f in [template_pdf, fields_pdf]:
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+
+        try:
+            if not canceled and all(fax_files):
+                self.__load(*fax_files)
+        except Error:
+            self.header = None
+        finally:
+            for f in [f for f in fax_files if f]:
+                try:
+                    os.remove(f)
+                except OSError:
+                    pass
+
+        if self.header is None:
+            log.warn("Cover pages will be rendered for each recipient.")
+
+        return canceled
+
+
+    def cover(self, a):
+        """ Returns the G3 file of the cover for recipient a, '' if it can't be made from the template. """
+        values = [(field, a[key]) for field, key in COVER_FIELDS]
+
+        if self.header is None or [v for v in values if v[1] and v not in self.slots]:
+            return ''
+
+        key = hashlib.sha1(to_bytes_utf8(repr(values))).hexdigest()
+        if key in self.covers:
+            log.debug("Using cached cover page %s" % key)
+            return self.covers[key]
+
+        raster = bytearray(self.raster)
+        n = g3.rowBytes(self.width)
+        rows = len(raster) // n
+
+        for field, value in values:
+            if not value:
+                continue
+
+            masks, r0, count = self.boxes[field]
+            page, top = self.slots[(field, value)]
+            src = self.field_pages[page]
+            s0 = r0 + int(round((top - self.fields[field][1]) * self.header[4] / 72.0))
+
+            for i in range(min(count, len(src) // n - s0, rows - r0)):
+                d, s = (r0 + i) * n, (s0 + i) * n
+                for b, m in masks:
+                    raster[d + b] |= src[s + b] & m
+
+        data = g3.fileData(self.header, [(self.width, rows, g3.encodeRaster(bytes(raster), self.width, self.header[7]))])
+
+        fd, fax_file = utils.make_temp_file()
+        os.write(fd, data)
+        os.close(fd)
+
+        log.debug("Cover page %s: %s" % (key, fax_file))
+        self.covers[key] = fax_file
+        return fax_file
+
+
+    def close(self):
+        for f in self.covers.values():
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+
+        self.covers = {}
+
+
+    def __row(self, top):
+        return max(0, int(top * self.header[4] / 72.0))
+
+
+    def __load(self, template_file, fields_file=None):
+        header, pages = g3.readFile(template_file)
+        page, data = pages[0]
+        encoding = header[7]
+        self.width = page[1]
+
+        self.header = header
+        self.raster = bytearray(g3.decodeRaster(data, self.width, page[2], encoding))
+        n = g3.rowBytes(self.width)
+
+        for field, (x, top, width, height, style) in self.fields.items():
+            x0 = int(x * header[3] / 72.0)
+            x1 = min(self.width, int(math.ceil((x + width) * header[3] / 72.0)))
+            r0 = self.__row(top - coverpages.FIELD_MARGIN)
+            count = int(math.ceil((height + 2 * coverpages.FIELD_MARGIN) * header[4] / 72.0))
+
+            # the bits of columns x0..x1 - 1 in each byte of a packed row, first pixel high
+            masks = [(b, (0xff >> max(0, x0 - 8 * b)) & (0xff << max(0, 8 * b + 8 - x1)) & 0xff)
+                     for b in range(x0 // 8, (x1 + 7) // 8)]
+            self.boxes[field] = (masks, r0, count)
+
+            # The fields must be blank in the template, else the page isn't where we think it is
+            if [r for r in range(r0, min(r0 + count, page[2])) for b, m in masks if self.raster[r * n + b] & m]:
+                log.error("Cover page template field %s is not blank." % field)
+                raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+        if fields_file is not None:
+            fields_header, pages = g3.readFile(fields_file)
+            if fields_header[3:8] != header[3:8] or [p for p, d in pages if p[1] != self.width]:
+                log.error("Cover page fields do not match the template.")
+                raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+            self.field_pages = [bytearray(g3.decodeRaster(d, p[1], p[2], encoding)) for p, d in pages]
+
+        if [s for s in self.slots.values() if s[0] >= len(self.field_pages)]:
+            log.error("Cover page fields are missing pages.")
+            raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+        log.debug("Cover page template: %d rows, %d field pages" % (page[2], len(self.field_pages)))
+
+# **************************************************************************** #
 
 
 
@@ -593,6 +932,8 @@ class FaxSendThread(threading.Thread):
         self.job_page_size = 0
         self.job_resolution = 0
         self.job_encoding = 0
+        self.monitor = None # JobMonitor, for the time run() runs (new_monitor())
+        self.cover_cache = None # CoverPageCache, made at the first cover page
 
 
     def pre_render(self, state):
@@ -702,13 +1043,13 @@ class FaxSendThread(threading.Thread):
 
     def decode_fax_header(self, header):
         try:
-            return struct.unpack(">8sBIHHBBBII", header)
+            return struct.unpack(g3.FILE_HEADER_FORMAT, header)
         except struct.error:
             return -1, -1, -1, -1, -1, -1, -1, -1, -1, -1
 
     def decode_page_header(self, header):
         try:
-            return struct.unpack(">IIIIII", header)
+            return struct.unpack(g3.PAGE_HEADER_FORMAT, header)
         except struct.error:
             return -1, -1, -1, -1, -1, -1
 
@@ -855,101 +1196,49 @@ class FaxSendThread(threading.Thread):
 
 
     def render_file(self, path, title, mime_type, force_single_page=False):
-        all_pages = True
-        page_range = ''
-        page_set = 0
-        nup = 1
-
-        cups.resetOptions()
-
-        if mime_type in ["application/x-cshell",
-                         "application/x-perl",
-                         "application/x-python",
-                         "application/x-shell",
-                         "application/x-sh",
-                         "text/plain",]:
+        scheduler = RenderScheduler(self.service, self.dev.device_uri, self.current_printer,
+                                    self.monitor, self.check_for_cancel)
 
-            cups.addOption('prettyprint')
-
-        if nup > 1:
-            cups.addOption('number-up=%d' % nup)
-
-        if force_single_page:
-            cups.addOption('page-ranges=1') # Force coverpage to 1 page
-
-        sent_job_id = cups.printFile(self.current_printer, path, title)
-        cups.resetOptions()
-
-        log.debug("Job ID=%d" % sent_job_id)
-        job_id = 0
-
-        time.sleep(1)
-
-        fax_file = ''
-        complete = False
-
-        end_time = time.time() + 300.0 # wait for 5 min. max
-        while time.time() < end_time:
-            log.debug("Waiting for fax... type =%s"%type(self.dev.device_uri))
-
-            result = list(self.service.CheckForWaitingFax(self.dev.device_uri, prop.username, sent_job_id))
-
-            fax_file = str(result[7])
-            log.debug("Fax file=%s" % fax_file)
-
-            if fax_file:
-                break
+        if scheduler.submit(path, title, mime_type, force_single_page=force_single_page) <= 0:
+            return '', False
 
-            if self.check_for_cancel():
-                log.error("Render canceled. Canceling job #%d..." % sent_job_id)
-                cups.cancelJob(sent_job_id)
-                return '', True
+        results, canceled = scheduler.wait()
+        fax_file = results[0][0]
+        log.debug("Fax file=%s" % fax_file)
 
-            time.sleep(1)
+        return fax_file, canceled
 
-        else:
-            log.error("Timeout waiting for rendering. Canceling job #%d..." % sent_job_id)
-            cups.cancelJob(sent_job_id)
-            return '', False
 
-        return fax_file, False
+    def new_monitor(self):
+        """ A JobMonitor on the event queue. run() makes it and closes it when it ends. """
+        return jobmonitor.JobMonitor(self.event_queue, lambda event: event[0] == EVENT_FAX_SEND_CANCELED)
 
 
     def check_for_cancel(self):
-        canceled = False
-        while self.event_queue.qsize():
-            try:
-                event = self.event_queue.get(0)
-                if event[0] == EVENT_FAX_SEND_CANCELED:
-                    canceled = True
-                    log.debug("Cancel pressed!")
-            except Queue.Empty:
-                break
-
-        return canceled
+        return self.monitor.canceled()
 
     def render_cover_page(self, a):
         log.debug("Creating cover page...")
 
-        #Read file again just before creating the coverpage, so that we get updated voice_phone and email_address from /hplip.conf file
-        #hplip.conf file get updated, whenever user changes coverpage info from hp-faxsetup window.
-        user_conf.read()
+        if self.cover_cache is None:
+            #Read file again just before creating the coverpages, so that we get updated voice_phone and email_address from /hplip.conf file
+            #hplip.conf file get updated, whenever user changes coverpage info from hp-faxsetup window.
+            user_conf.read()
 
-        pdf = self.cover_func(page_size=coverpages.PAGE_SIZE_LETTER,
-                              total_pages=self.job_total_pages,
+            scheduler = RenderScheduler(self.service, self.dev.device_uri, self.current_printer,
+                                        self.monitor, self.check_for_cancel)
 
-                              recipient_name=a['name'],
-                              recipient_phone='', # ???
-                              recipient_fax=a['fax'],
+            self.cover_cache = CoverPageCache(scheduler, self.cover_func, self.cover_args())
+            if self.cover_cache.prepare(self.phone_num_list):
+                return '', True
 
-                              sender_name=self.sender_name,
-                              sender_phone=user_conf.get('fax', 'voice_phone'),
-                              sender_fax=self.sender_fax,
-                              sender_email=user_conf.get('fax', 'email_address'),
+        fax_file = self.cover_cache.cover(a)
+        if fax_file:
+            return fax_file, False
 
-                              regarding=self.cover_re,
-                              message=self.cover_message,
-                              preserve_formatting=self.preserve_formatting)
+        pdf = self.cover_func(recipient_name=a['name'],
+                              recipient_fax=a['fax'],
+                              **self.cover_args())
 
         log.debug("PDF File=%s" % pdf)
         fax_file, canceled = self.render_file(pdf, 'Cover Page', "application/pdf",
@@ -963,6 +1252,21 @@ class FaxSendThread(threading.Thread):
         return fax_file, canceled
 
 
+    def cover_args(self):
+        # cover_func() arguments, all but the recipient's
+        return {'page_size' : coverpages.PAGE_SIZE_LETTER,
+                'total_pages' : self.job_total_pages,
+                'recipient_phone' : '', # ???
+                'sender_name' : self.sender_name,
+                'sender_phone' : user_conf.get('fax', 'voice_phone'),
+                'sender_fax' : self.sender_fax,
+                'sender_email' : user_conf.get('fax', 'email_address'),
+                'regarding' : self.cover_re,
+                'message' : self.cover_message,
+                'preserve_formatting' : self.preserve_formatting,
+               }
+
+
     def write_queue(self, message):
         if self.update_queue is not None and message != self.prev_update:
             self.update_queue.put(message)
@@ -0,0 +1,550 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Reading, writing and re-encoding HPLIP G3 fax files.
+#
+# Pages are decoded to rows of changing elements: the positions where the
+# color changes from the pixel before, the first pixel of a row counting as
+# following a white one. Even entries start a black run, odd ones a white
+# run. The encoder writes what the X_FAX_ENCODE transform in ip/xfax.c
+# writes for hpcupsfax: MH rows each start with an EOL and are padded to a
+# byte, a page ends with 6 EOLs; MMR pages end with 2 EOLs (EOFB).
+#
+# With the hpipext extension, pages can also go through the codec in
+# ip/xfax.c itself (PageCodec), as rasters of packed rows: 1=black, the
+# first pixel in the high bit, (width + 7) // 8 bytes a row. The GIL is
+# released while it runs, and pages can be streamed a strip at a time.
+# It also changes the resolution of pages (X_SCALE) and makes thumbnails
+# (X_THUMB). The raster functions fall back on the Python codec without
+# the extension.
+#
+
+# Std Lib
+import re
+import struct
+import binascii
+from bisect import bisect_right
+
+# Local
+from base.g import *
+from base.codes import *
+
+try:
+    import hpipext
+except ImportError:
+    hpipext = None
+
+FILE_HEADER_FORMAT = ">8sBIHHBBBII"
+PAGE_HEADER_FORMAT = ">IIIIII"
+FILE_HEADER_SIZE = 28
+PAGE_HEADER_SIZE = 24
+
+# File header encoding
+ENCODING_MH = 2
+ENCODING_MMR = 4
+ENCODING_JPEG = 7
+
+EOL = '000000000001'
+
+# (bits, length) for run-length = index, index is in 0..63
+WHITE_RUNS = [
+   (0x35, 8), (0x7, 6), (0x7, 4), (0x8, 4), (0xb, 4), (0xc, 4), (0xe, 4), (0xf, 4),
+   (0x13, 5), (0x14, 5), (0x7, 5), (0x8, 5), (0x8, 6), (0x3, 6), (0x34, 6), (0x35, 6),
+   (0x2a, 6), (0x2b, 6), (0x27, 7), (0xc, 7), (0x8, 7), (0x17, 7), (0x3, 7), (0x4, 7),
+   (0x28, 7), (0x2b, 7), (0x13, 7), (0x24, 7), (0x18, 7), (0x2, 8), (0x3, 8), (0x1a, 8),
+   (0x1b, 8), (0x12, 8), (0x13, 8), (0x14, 8), (0x15, 8), (0x16, 8), (0x17, 8), (0x28, 8),
+   (0x29, 8), (0x2a, 8), (0x2b, 8), (0x2c, 8), (0x2d, 8), (0x4, 8), (0x5, 8), (0xa, 8),
+   (0xb, 8), (0x52, 8), (0x53, 8), (0x54, 8), (0x55, 8), (0x24, 8), (0x25, 8), (0x58, 8),
+   (0x59, 8), (0x5a, 8), (0x5b, 8), (0x4a, 8), (0x4b, 8), (0x32, 8), (0x33, 8), (0x34, 8),
+]
+
+BLACK_RUNS = [
+   (0x37, 10), (0x2, 3), (0x3, 2), (0x2, 2), (0x3, 3), (0x3, 4), (0x2, 4), (0x3, 5),
+   (0x5, 6), (0x4, 6), (0x4, 7), (0x5, 7), (0x7, 7), (0x4, 8), (0x7, 8), (0x18, 9),
+   (0x17, 10), (0x18, 10), (0x8, 10), (0x67, 11), (0x68, 11), (0x6c, 11), (0x37, 11), (0x28, 11),
+   (0x17, 11), (0x18, 11), (0xca, 12), (0xcb, 12), (0xcc, 12), (0xcd, 12), (0x68, 12), (0x69, 12),
+   (0x6a, 12), (0x6b, 12), (0xd2, 12), (0xd3, 12), (0xd4, 12), (0xd5, 12), (0xd6, 12), (0xd7, 12),
+   (0x6c, 12), (0x6d, 12), (0xda, 12), (0xdb, 12), (0x54, 12), (0x55, 12), (0x56, 12), (0x57, 12),
+   (0x64, 12), (0x65, 12), (0x52, 12), (0x53, 12), (0x24, 12), (0x37, 12), (0x38, 12), (0x27, 12),
+   (0x28, 12), (0x58, 12), (0x59, 12), (0x2b, 12), (0x2c, 12), (0x5a, 12), (0x66, 12), (0x67, 12),
+]
+
+# run-length = 64*(index+1), index is in 0..26
+WHITE_MAKEUP = [
+   (0x1b, 5), (0x12, 5), (0x17, 6), (0x37, 7), (0x36, 8), (0x37, 8), (0x64, 8), (0x65, 8),
+   (0x68, 8), (0x67, 8), (0xcc, 9), (0xcd, 9), (0xd2, 9), (0xd3, 9), (0xd4, 9), (0xd5, 9),
+   (0xd6, 9), (0xd7, 9), (0xd8, 9), (0xd9, 9), (0xda, 9), (0xdb, 9), (0x98, 9), (0x99, 9),
+   (0x9a, 9), (0x18, 6), (0x9b, 9),
+]
+
+BLACK_MAKEUP = [
+   (0xf, 10), (0xc8, 12), (0xc9, 12), (0x5b, 12), (0x33, 12), (0x34, 12), (0x35, 12), (0x6c, 13),
+   (0x6d, 13), (0x4a, 13), (0x4b, 13), (0x4c, 13), (0x4d, 13), (0x72, 13), (0x73, 13), (0x74, 13),
+   (0x75, 13), (0x76, 13), (0x77, 13), (0x52, 13), (0x53, 13), (0x54, 13), (0x55, 13), (0x5a, 13),
+   (0x5b, 13), (0x64, 13), (0x65, 13),
+]
+
+# run-length = 64*(index+28), index is in 0..12, both colors
+EXT_MAKEUP = [
+   (0x8, 11), (0xc, 11), (0xd, 11), (0x12, 12), (0x13, 12), (0x14, 12), (0x15, 12), (0x16, 12),
+   (0x17, 12), (0x1c, 12), (0x1d, 12), (0x1e, 12), (0x1f, 12),
+]
+
+# 2-D modes
+MODE_PASS = 'P'
+MODE_HORIZ = 'H'
+
+MODE_CODES = {'0001' : MODE_PASS, '001' : MODE_HORIZ, '1' : 0,
+              '011' : 1, '000011' : 2, '0000011' : 3,
+              '010' : -1, '000010' : -2, '0000010' : -3,
+             }
+
+VERT_CODES = dict((d, code) for code, d in MODE_CODES.items() if d not in (MODE_PASS, MODE_HORIZ))
+
+BYTE_BITS = [format(i, '08b') for i in range(256)]
+
+TRANSITION = re.compile('(?=01|10)')
+
+
+def __code(bits, length):
+    return format(bits, '0%db' % length)
+
+
+def __codes(runs, makeup):
+    # { code : run-length, ... }
+    codes = dict((__code(*c), i) for i, c in enumerate(runs))
+    codes.update((__code(*c), 64 * (i + 1)) for i, c in enumerate(makeup))
+    codes.update((__code(*c), 64 * (i + 28)) for i, c in enumerate(EXT_MAKEUP))
+    return codes
+
+
+# Indexed by color, 0=white, 1=black
+RUN_CODES = [__codes(WHITE_RUNS, WHITE_MAKEUP), __codes(BLACK_RUNS, BLACK_MAKEUP)]
+RUN_CODE_LENGTHS = [range(min(len(c) for c in codes), max(len(c) for c in codes) + 1)
+                    for codes in RUN_CODES]
+
+TERMINATING = [[__code(*c) for c in WHITE_RUNS], [__code(*c) for c in BLACK_RUNS]]
+MAKEUP = [[__code(*c) for c in WHITE_MAKEUP], [__code(*c) for c in BLACK_MAKEUP]]
+EXT = [__code(*c) for c in EXT_MAKEUP]
+
+run_cache = [{}, {}] # { run-length : code, ... } for each color
+
+
+def runCode(color, run):
+    """ The makeup and terminating codes for a run (as a string of 0's and 1's). """
+    try:
+        return run_cache[color][run]
+    except KeyError:
+        pass
+
+    code, left = [], run
+    while left >= 1792:
+        i = min((left >> 6) - 28, 12)
+        code.append(EXT[i])
+        left -= (i + 28) << 6
+
+    if left >= 64:
+        code.append(MAKEUP[color][(left >> 6) - 1])
+        left &= 63
+
+    code.append(TERMINATING[color][left])
+    code = ''.join(code)
+    run_cache[color][run] = code
+    return code
+
+
+
+# File
+
+def readFile(file_name):
+    """ Returns (file header, [(page header, image data), ...]), the headers
+        as unpacked from FILE_HEADER_FORMAT and PAGE_HEADER_FORMAT. Thumbnails
+        are skipped.
+    """
+    f = open(file_name, 'rb')
+    try:
+        try:
+            header = struct.unpack(FILE_HEADER_FORMAT, f.read(FILE_HEADER_SIZE))
+        except struct.error:
+            raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+        if header[0] != b'hplip_g3':
+            log.error("Invalid file header. Bad magic.")
+            raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+        pages = []
+        for p in range(header[2]):
+            try:
+                page = struct.unpack(PAGE_HEADER_FORMAT, f.read(PAGE_HEADER_SIZE))
+            except struct.error:
+                log.error("Page header error")
+                raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+            pages.append((page, f.read(page[3])))
+            f.seek(page[4], 1)
+
+        return header, pages
+    finally:
+        f.close()
+
+
+def fileData(header, pages):
+    """ Contents of a G3 file. header is a file header from readFile() (the page
+        count is replaced), pages a list of (pixels per row, rows, image data).
+    """
+    data = [struct.pack(FILE_HEADER_FORMAT, header[0], header[1], len(pages), *header[3:])]
+
+    for page_num, (ppr, rows, image) in enumerate(pages):
+        data.append(struct.pack(PAGE_HEADER_FORMAT, page_num + 1, ppr, rows, len(image), 0, 0))
+        data.append(image)
+
+    return b''.join(data)
+
+
+
+# Rows
+
+def rowBits(changes, width):
+    """ A row as an integer, the first pixel in the highest bit, 1=black. """
+    bits = 0
+    for i in range(0, len(changes), 2):
+        start = changes[i]
+        end = changes[i + 1] if i + 1 < len(changes) else width
+        bits |= ((1 << (end - start)) - 1) << (width - end)
+
+    return bits
+
+
+def rowChanges(bits, width):
+    """ The changing elements of a row from rowBits(). """
+    return [m.start() for m in TRANSITION.finditer('0' + format(bits, '0%db' % width))]
+
+
+
+# Decoding
+
+def decodePage(data, width, rows, encoding):
+    """ Returns a list of the changing elements of each row. """
+    if encoding not in (ENCODING_MH, ENCODING_MMR):
+        log.error("Unsupported fax encoding: %d" % encoding)
+        raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+    s = ''.join([BYTE_BITS[b] for b in bytearray(data)])
+    pos, page, ref = 0, [], []
+
+    try:
+        for r in range(rows):
+            if encoding == ENCODING_MH:
+                # Skip fill and the EOL (if there is one)
+                one = s.find('1', pos)
+                if one - pos >= 11:
+                    pos = one + 1
+
+                ref, pos = __decodeRow1D(s, pos, width)
+            else:
+                ref, pos = __decodeRow2D(s, pos, ref, width)
+
+            page.append(ref)
+
+    except (IndexError, KeyError):
+        log.error("Bad fax data in row %d" % len(page))
+        raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+    return page
+
+
+def __readRun(s, pos, color):
+    codes, run = RUN_CODES[color], 0
+    while True:
+        for n in RUN_CODE_LENGTHS[color]:
+            length = codes.get(s[pos:pos + n])
+            if length is not None:
+                break
+        else:
+            raise KeyError(pos)
+
+        pos += n
+        run += length
+        if length < 64:
+            return run, pos
+
+
+def __decodeRow1D(s, pos, width):
+    changes, x, color = [], 0, 0
+    while x < width:
+        run, pos = __readRun(s, pos, color)
+        x += run
+        if x < width:
+            changes.append(x)
+        color ^= 1
+
+    return changes, pos
+
+
+def __decodeRow2D(s, pos, ref, width):
+    changes, a0, color = [], -1, 0
+    while a0 < width:
+        j = bisect_right(ref, a0)
+        if j % 2 != color:
+            j += 1
+        b1 = ref[j] if j < len(ref) else width
+        b2 = ref[j + 1] if j + 1 < len(ref) else width
+
+        for n in range(1, 8):
+            mode = MODE_CODES.get(s[pos:pos + n])
+            if mode is not None:
+                break
+        else:
+            raise KeyError(pos)
+        pos += n
+
+        if mode == MODE_PASS:
+            a0 = b2
+
+        elif mode == MODE_HORIZ:
+            run1, pos = __readRun(s, pos, color)
+            run2, pos = __readRun(s, pos, color ^ 1)
+            a1 = max(a0, 0) + run1
+            a0 = a1 + run2
+            for a in (a1, a0):
+                if a < width:
+                    changes.append(a)
+
+        else: # vertical
+            a1 = b1 + mode
+            if a1 < max(a0, 0) or a1 > width:
+                raise IndexError(a1)
+            if a1 < width:
+                changes.append(a1)
+            a0 = a1
+            color ^= 1
+
+    return changes, pos
+
+
+
+# Encoding
+
+def encodePage(page, width, encoding):
+    """ Encodes rows of changing elements (as from decodePage()). """
+    out, ref = [], []
+
+    for changes in page:
+        if encoding == ENCODING_MH:
+            row = EOL + __encodeRow1D(changes, width)
+            out.append(row + '0' * (-len(row) % 8))
+        elif encoding == ENCODING_MMR:
+            out.append(__encodeRow2D(changes, ref, width))
+            ref = changes
+        else:
+            log.error("Unsupported fax encoding: %d" % encoding)
+            raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+    out.append(EOL * (6 if encoding == ENCODING_MH else 2))
+    s = ''.join(out)
+    s += '0' * (-len(s) % 8)
+
+    if not s:
+        return b''
+
+    return binascii.unhexlify('%0*x' % (len(s) // 4, int(s, 2)))
+
+
+def __encodeRow1D(changes, width):
+    out, x, color = [], 0, 0
+    for c in changes:
+        out.append(runCode(color, c - x))
+        x, color = c, color ^ 1
+
+    out.append(runCode(color, width - x))
+    return ''.join(out)
+
+
+def __encodeRow2D(changes, ref, width):
+    out, a0, color = [], -1, 0
+    while a0 < width:
+        i = bisect_right(changes, a0)
+        a1 = changes[i] if i < len(changes) else width
+
+        j = bisect_right(ref, a0)
+        if j % 2 != color:
+            j += 1
+        b1 = ref[j] if j < len(ref) else width
+        b2 = ref[j + 1] if j + 1 < len(ref) else width
+
+        if b2 < a1:
+            out.append('0001')
+            a0 = b2
+
+        elif -3 <= a1 - b1 <= 3:
+            out.append(VERT_CODES[a1 - b1])
+            a0 = a1
+            color ^= 1
+
+        else:
+            a2 = changes[i + 1] if i + 1 < len(changes) else width
+            out.append('001')
+            out.append(runCode(color, a1 - max(a0, 0)))
+            out.append(runCode(color ^ 1, a2 - a1))
+            a0 = a2
+
+    return ''.join(out)
+
+
+
+# Native codec
+
+# Traits resolution, only the MR encoder looks at it
+NATIVE_DPI = (204, 196)
+
+THUMBNAIL_WIDTH = 128
+
+# Scaled gray pixels darker than this are black
+SCALE_THRESHOLD = 200
+
+
+def rowBytes(width):
+    return (width + 7) // 8
+
+
+class PageCodec(object):
+    """ Streams a page through the hpipext image processor: decoded from
+        encoding (or packed rows if None), scaled by h_scale and v_scale, and
+        encoded to to_encoding (or packed rows if None), or to a gray JPEG
+        thumbnail at most thumbnail_width pixels wide. write() returns the
+        output produced so far.
+    """
+    def __init__(self, width, rows, encoding=None, to_encoding=None,
+                 h_scale=1.0, v_scale=1.0, thumbnail_width=0):
+        if hpipext is None:
+            log.error("The fax page codec needs the hpipext extension.")
+            raise Error(ERROR_INTERNAL)
+
+        formats = {ENCODING_MH : hpipext.IP_FAX_MH, ENCODING_MMR : hpipext.IP_FAX_MMR}
+        if [e for e in (encoding, to_encoding) if e is not None and e not in formats]:
+            log.error("Unsupported fax encoding: %s" % [encoding, to_encoding])
+            raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+        xforms = []
+        if encoding is not None:
+            xforms.append((hpipext.X_FAX_DECODE, (formats[encoding],)))
+
+        if h_scale != 1.0 or v_scale != 1.0:
+            # X_SCALE doesn't do bi-level here, the page is scaled in gray
+            # (h_scale and v_scale in 1/4..6) and thresholded back
+            xforms.append((hpipext.X_BI_2_GRAY, (8, 0xffffff, 0)))
+            xforms.append((hpipext.X_SCALE, (int(h_scale * (1 << 24)), int(v_scale * (1 << 24)), 0)))
+            xforms.append((hpipext.X_GRAY_2_BI, (SCALE_THRESHOLD,)))
+
+        if thumbnail_width:
+            xforms.append((hpipext.X_THUMB, (thumbnail_width,)))
+            xforms.append((hpipext.X_JPG_ENCODE, (0,)))
+
+        elif to_encoding is not None:
+            xforms.append((hpipext.X_FAX_ENCODE, (formats[to_encoding],)))
+
+        try:
+            self.pipeline = hpipext.open(xforms, (width, 1, 1) + NATIVE_DPI + (rows,))
+        except hpipext.error:
+            log.error("Unable to start the fax page codec.")
+            raise Error(ERROR_INTERNAL)
+
+
+    def write(self, data):
+        try:
+            return self.pipeline.convert(data)
+        except hpipext.error:
+            log.error("Bad fax data")
+            raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+
+    def close(self):
+        """ Returns (data, pixels per row, rows), the rest of the output and its size. """
+        try:
+            try:
+                data = self.pipeline.flush()
+                traits = self.pipeline.getTraits()
+            except hpipext.error:
+                log.error("Bad fax data")
+                raise Error(ERROR_FAX_INVALID_FAX_FILE)
+        finally:
+            self.pipeline.close()
+
+        return data, traits[0], traits[5]
+
+
+
+def __native(data, width, rows, **kwds):
+    codec = PageCodec(width, rows, **kwds)
+    out = codec.write(data)
+    end, ppr, rpp = codec.close()
+    return out + end, ppr, rpp
+
+
+def decodeRaster(data, width, rows, encoding):
+    """ Returns the packed rows of a page. """
+    if hpipext is None:
+        blank = b'\0' * rowBytes(width)
+        return b''.join([binascii.unhexlify('%0*x' % (len(blank) * 2, rowBits(changes, width) << (-width % 8)))
+                         if changes else blank for changes in decodePage(data, width, rows, encoding)])
+
+    raster, ppr, rpp = __native(data, width, rows, encoding=encoding)
+    if len(raster) != rows * rowBytes(width):
+        log.error("Bad fax data, %d of %d rows" % (len(raster) // rowBytes(width), rows))
+        raise Error(ERROR_FAX_INVALID_FAX_FILE)
+
+    return raster
+
+
+def encodeRaster(raster, width, encoding):
+    """ Encodes packed rows (as from decodeRaster()). """
+    n = rowBytes(width)
+    rows = len(raster) // n
+
+    if hpipext is None:
+        blank = b'\0' * n
+        return encodePage([rowChanges(int(binascii.hexlify(raster[i:i + n]), 16) >> (-width % 8), width)
+                           if raster[i:i + n] != blank else [] for i in range(0, rows * n, n)], width, encoding)
+
+    return __native(raster[:rows * n], width, rows, to_encoding=encoding)[0]
+
+
+def transcode(data, width, rows, encoding, to_encoding):
+    """ Re-encodes a page, eg. MH to MMR. """
+    if hpipext is None:
+        return encodePage(decodePage(data, width, rows, encoding), width, to_encoding)
+
+    return __native(data, width, rows, encoding=encoding, to_encoding=to_encoding)[0]
+
+
+def scalePage(data, width, rows, encoding, h_scale, v_scale):
+    """ Returns (pixels per row, rows, image data) of the page scaled, eg.
+        v_scale=0.5 for a fine page (196 dpi) sent in standard (98 dpi).
+        Needs the hpipext extension.
+    """
+    out, ppr, rpp = __native(data, width, rows, encoding=encoding, to_encoding=encoding,
+                             h_scale=h_scale, v_scale=v_scale)
+    return ppr, rpp, out
+
+
+def thumbnail(data, width, rows, encoding, max_width=THUMBNAIL_WIDTH):
+    """ Returns (pixels per row, rows, JPEG data) of a gray thumbnail of the
+        page, at most max_width pixels wide. Needs the hpipext extension.
+    """
+    out, ppr, rpp = __native(data, width, rows, encoding=encoding, thumbnail_width=max_width)
+    return ppr, rpp, out
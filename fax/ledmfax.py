@@ -36,7 +36,7 @@ from stat import *
 # Local
 from base.g import *
 from base.codes import *
-from base import device, utils, codes, dime, status
+from base import device, utils, codes, dime, status, jobmonitor
 from base.sixext import to_bytes_utf8
 from .fax import *
 
@@ -192,6 +192,14 @@ class LEDMFaxSendThread(FaxSendThread):
         
 
     def run(self):
+        self.monitor = self.new_monitor()
+        try:
+            self.__run()
+        finally:
+            self.monitor.close()
+
+
+    def __run(self):
         
         STATE_DONE = 0
         STATE_ABORTED = 10
@@ -518,6 +526,7 @@ class LEDMFaxSendThread(FaxSendThread):
                                 break                                                    
                                                    
                             pageImageURI = self.dev.readAttributeFromXml(jobListURI,"j:job-faxpcsendstatus-resourceuri")                                
+                            self.monitor.setPhase(jobmonitor.PHASE_SETUP)
                             while(True):
                                 if self.check_for_cancel():
                                     fax_send_state = FAX_SEND_STATE_ABORT
@@ -533,6 +542,10 @@ class LEDMFaxSendThread(FaxSendThread):
                                     break
                                 elif Status == FAX_SEND_STATE_SUCCESS:
                                     break  
+
+                                # Wait for the device to be ready for the page
+                                self.monitor.changed((Status, Fax_State))
+                                self.monitor.wait()
                          
                             if fax_send_state == FAX_SEND_STATE_ABORT or fax_send_state  == FAX_SEND_STATE_ERROR:
                                 break
@@ -636,6 +649,9 @@ class LEDMFaxSendThread(FaxSendThread):
                     except OSError:
                         log.debug("Not found")
 
+                if self.cover_cache is not None:
+                    self.cover_cache.close()
+
                 state = STATE_DONE # Exit outer state machine
 
 
@@ -447,6 +447,14 @@ class MarvellFaxSendThread(FaxSendThread):
 
 
     def run(self):
+        self.monitor = self.new_monitor()
+        try:
+            self.__run()
+        finally:
+            self.monitor.close()
+
+
+    def __run(self):
 
         STATE_DONE = 0
         STATE_ABORTED = 10
@@ -895,6 +903,9 @@ class MarvellFaxSendThread(FaxSendThread):
                     except OSError:
                         log.debug("Not found")
 
+                if self.cover_cache is not None:
+                    self.cover_cache.close()
+
                 state = STATE_DONE
 
 
@@ -31,7 +31,7 @@ from io import BytesIO
 # Local
 from base.g import *
 from base.codes import *
-from base import device, utils, pml, codes
+from base import device, utils, pml, codes, jobmonitor
 from prnt import cups
 from .fax import *
 
@@ -306,6 +306,14 @@ class PMLFaxSendThread(FaxSendThread):
 
 
     def run(self):
+        self.monitor = self.new_monitor()
+        try:
+            self.__run()
+        finally:
+            self.monitor.close()
+
+
+    def __run(self):
         #results = {} # {'file' : error_code,...}
 
         STATE_DONE = 0
@@ -554,9 +562,7 @@ class PMLFaxSendThread(FaxSendThread):
                         log.debug("%s State: Check idle" % ("*"*20))
                         fax_send_state = FAX_SEND_STATE_START_REQUEST
 
-                        dl_state = self.getFaxDownloadState()
-                        tx_status = self.getFaxJobTxStatus()
-                        rx_status = self.getFaxJobRxStatus()
+                        dl_state, tx_status, rx_status = self.getFaxStates()
 
                         if ((dl_state == pml.UPDN_STATE_IDLE or \
                             dl_state == pml.UPDN_STATE_ERRORABORT or \
@@ -584,12 +590,20 @@ class PMLFaxSendThread(FaxSendThread):
                             log.debug("Try: 0")
                             log.debug("Setting to up/down state request start...")
                             self.dev.setPML(pml.OID_FAX_DOWNLOAD, pml.UPDN_STATE_REQSTART)
-                            time.sleep(1)
+                            requested = time.time()
 
                             log.debug("Waiting for active state...")
+                            self.monitor.setPhase(jobmonitor.PHASE_SETUP)
                             i = 1
 
-                            while i < 10:
+                            end_time = requested + 10.0
+                            while time.time() < end_time:
+                                self.monitor.wait()
+
+                                if self.check_for_cancel():
+                                    fax_send_state = FAX_SEND_STATE_ABORT
+                                    break
+
                                 log.debug("Try: %d" % i)
                                 try:
                                     dl_state = self.getFaxDownloadState()
@@ -601,9 +615,12 @@ class PMLFaxSendThread(FaxSendThread):
                                 if dl_state == pml.UPDN_STATE_XFERACTIVE:
                                     break
 
-                                time.sleep(1)
-                                log.debug("Setting to up/down state request start...")
-                                self.dev.setPML(pml.OID_FAX_DOWNLOAD, pml.UPDN_STATE_REQSTART)
+                                self.monitor.changed(dl_state)
+
+                                if time.time() - requested >= 1.0: # repeat the request once a second
+                                    log.debug("Setting to up/down state request start...")
+                                    self.dev.setPML(pml.OID_FAX_DOWNLOAD, pml.UPDN_STATE_REQSTART)
+                                    requested = time.time()
 
                                 i += 1
 
@@ -787,37 +804,40 @@ class PMLFaxSendThread(FaxSendThread):
                                         break
 
                                 status = self.getFaxJobTxStatus()
+                                self.monitor.setPhase(jobmonitor.PHASE_ACTIVE)
+                                self.monitor.changed(status)
+
                                 while status == pml.FAXJOB_TX_STATUS_DIALING:
                                     self.write_queue((STATUS_DIALING, 0, recipient['fax']))
-                                    time.sleep(1.0)
+                                    self.monitor.wait()
 
                                     if self.check_for_cancel():
                                         fax_send_state = FAX_SEND_STATE_ABORT
                                         break
 
-                                    dl_state = self.getFaxDownloadState()
+                                    dl_state, status, rx_status = self.getFaxStates()
                                     if dl_state == pml.UPDN_STATE_ERRORABORT:
                                         fax_send_state = FAX_SEND_STATE_ERROR
                                         break
 
-                                    status = self.getFaxJobTxStatus()
+                                    self.monitor.changed(status)
 
                                 if fax_send_state not in (FAX_SEND_STATE_ABORT, FAX_SEND_STATE_ERROR):
 
                                     while status == pml.FAXJOB_TX_STATUS_CONNECTING:
                                         self.write_queue((STATUS_CONNECTING, 0, recipient['fax']))
-                                        time.sleep(1.0)
+                                        self.monitor.wait()
 
                                         if self.check_for_cancel():
                                             fax_send_state = FAX_SEND_STATE_ABORT
                                             break
 
-                                        dl_state = self.getFaxDownloadState()
+                                        dl_state, status, rx_status = self.getFaxStates()
                                         if dl_state == pml.UPDN_STATE_ERRORABORT:
                                             fax_send_state = FAX_SEND_STATE_ERROR
                                             break
 
-                                        status = self.getFaxJobTxStatus()
+                                        self.monitor.changed(status)
 
                                 if status == pml.FAXJOB_TX_STATUS_TRANSMITTING:
                                     self.write_queue((STATUS_SENDING, page_num, recipient['fax']))
@@ -845,6 +865,7 @@ class PMLFaxSendThread(FaxSendThread):
                             fax_send_state = FAX_SEND_STATE_ERROR
 
                         monitor_state = False
+                        self.monitor.setPhase(jobmonitor.PHASE_ACTIVE)
 
 
                     elif fax_send_state == FAX_SEND_STATE_WAIT_FOR_COMPLETE: # -------------- Wait for complete (110, 150, 0)
@@ -852,8 +873,11 @@ class PMLFaxSendThread(FaxSendThread):
 
                         fax_send_state = FAX_SEND_STATE_WAIT_FOR_COMPLETE
 
-                        time.sleep(1.0)
+                        self.monitor.wait()
                         status = self.getFaxJobTxStatus()
+                        if status == pml.FAXJOB_TX_STATUS_TRANSMITTING:
+                            self.monitor.setPhase(jobmonitor.PHASE_TRANSMIT)
+                        self.monitor.changed(status)
 
                         if status == pml.FAXJOB_TX_STATUS_DIALING:
                                 self.write_queue((STATUS_DIALING, 0, recipient['fax']))
@@ -926,6 +950,9 @@ class PMLFaxSendThread(FaxSendThread):
                     except OSError:
                         log.debug("Not found")
 
+                if self.cover_cache is not None:
+                    self.cover_cache.close()
+
                 state = STATE_DONE
 
 
@@ -933,8 +960,17 @@ class PMLFaxSendThread(FaxSendThread):
 # --------------------------------- Support functions
 
 
+    def getFaxStates(self):
+        """ getFaxDownloadState(), getFaxJobTxStatus() and getFaxJobRxStatus() in one PML request. """
+        (r, state), (r, tx_status), (r, rx_status) = \
+            self.dev.getPMLMulti([pml.OID_FAX_DOWNLOAD, pml.OID_FAXJOB_TX_STATUS, pml.OID_FAXJOB_RX_STATUS])
+
+        return self.__downloadState(state), self.__txStatus(tx_status), self.__rxStatus(rx_status)
+
     def getFaxDownloadState(self):
-        result_code, state = self.dev.getPML(pml.OID_FAX_DOWNLOAD)
+        return self.__downloadState(self.dev.getPML(pml.OID_FAX_DOWNLOAD)[1])
+
+    def __downloadState(self, state):
         if state:
             log.debug("D/L State=%d (%s)" % (state, pml.UPDN_STATE_STR.get(state, 'Unknown')))
             return state
@@ -949,7 +985,9 @@ class PMLFaxSendThread(FaxSendThread):
             return pml.DN_ERROR_UNKNOWN
 
     def getFaxJobTxStatus(self):
-        result_code, status = self.dev.getPML(pml.OID_FAXJOB_TX_STATUS)
+        return self.__txStatus(self.dev.getPML(pml.OID_FAXJOB_TX_STATUS)[1])
+
+    def __txStatus(self, status):
         if status:
             log.debug("Tx Status=%d (%s)" % (status, pml.FAXJOB_TX_STATUS_STR.get(status, 'Unknown')))
             return status
@@ -957,7 +995,9 @@ class PMLFaxSendThread(FaxSendThread):
             return pml.FAXJOB_TX_STATUS_IDLE
 
     def getFaxJobRxStatus(self):
-        result_code, status = self.dev.getPML(pml.OID_FAXJOB_RX_STATUS)
+        return self.__rxStatus(self.dev.getPML(pml.OID_FAXJOB_RX_STATUS)[1])
+
+    def __rxStatus(self, status):
         if status:
             log.debug("Rx Status=%d (%s)" % (status, pml.FAXJOB_RX_STATUS_STR.get(status, 'Unknown')))
             return status
@@ -241,6 +241,14 @@ class SOAPFaxSendThread(FaxSendThread):
 
 
     def run(self):
+        self.monitor = self.new_monitor()
+        try:
+            self.__run()
+        finally:
+            self.monitor.close()
+
+
+    def __run(self):
         #results = {} # {'file' : error_code,...}
 
         STATE_DONE = 0
@@ -494,7 +502,6 @@ class SOAPFaxSendThread(FaxSendThread):
 
                     elif fax_send_state == FAX_SEND_STATE_DOWNLOADPAGES: # -------------- DownloadPages (110, 60, 0)
                         log.debug("%s State: DownloadPages" % ("*"*20))
-                        page = BytesIO()
                         for p in range(total_pages):
 
                             if self.check_for_cancel():
@@ -519,22 +526,25 @@ class SOAPFaxSendThread(FaxSendThread):
                             if ppr != PIXELS_PER_LINE:
                                 log.error("Pixels per line (width) must be %d!" % PIXELS_PER_LINE)
 
-                            page.write(ff.read(bytes_to_read))
-                            thumbnail = ff.read(thumbnail_bytes) # thrown away for now (should be 0 read)
-                            page.seek(0)
-
+                            # The page data is sent from the file as it is read
                             try:
-                                data = page.read(bytes_to_read)
-                            except IOError:
+                                page_pos = ff.tell()
+                                file_size = os.fstat(ff.fileno()).st_size
+                            except (IOError, OSError):
                                 log.error("Unable to read fax file.")
                                 fax_send_state = FAX_SEND_STATE_ERROR
                                 break
 
-                            if data == b'':
+                            if bytes_to_read == 0 or page_pos >= file_size:
                                 log.error("No data!")
                                 fax_send_state = FAX_SEND_STATE_ERROR
                                 break
 
+                            if page_pos + bytes_to_read > file_size:
+                                log.error("Unable to read fax file.")
+                                fax_send_state = FAX_SEND_STATE_ERROR
+                                break
+
                             height = rpp
                             job_id = self.job_id
 
@@ -545,18 +555,35 @@ class SOAPFaxSendThread(FaxSendThread):
                             m.add_record(dime.Record(b"cid:id0", b"http://schemas.xmlsoap.org/soap/envelope/",
                                 dime.TYPE_T_URI, to_bytes_utf8(soap)))
 
-                            m.add_record(dime.Record(b"", b"image/g4fax", dime.TYPE_T_MIME, data))
+                            m.add_record(dime.Record(b"", b"image/g4fax", dime.TYPE_T_MIME, ff, bytes_to_read))
 
-                            output = BytesIO()
-                            m.generate(output)
-                            data = self.format_http(output.getvalue(), content_type="application/dime")
+                            data = self.http_header(m.size(), content_type="application/dime")
                             log.log_data(data)
+                            debug_log = None
                             if log.is_debug():
-                                           open('downloadpages%d.log' % p, 'wb').write(data)
+                                debug_log = open('downloadpages%d.log' % p, 'wb')
                             try:
-                                self.dev.writeSoapFax(data)
-                            except Error:
+                                try:
+                                    for data in m.chunks(prop.max_message_len, data):
+                                        if debug_log is not None:
+                                            debug_log.write(data)
+                                        self.dev.writeSoapFax(data)
+                                except IOError:
+                                    log.error("Unable to read fax file.")
+                                    fax_send_state = FAX_SEND_STATE_ERROR
+                                    break
+                                except Error:
+                                    fax_send_state = FAX_SEND_STATE_ERROR
+                            finally:
+                                if debug_log is not None:
+                                    debug_log.close()
+
+                            try:
+                                ff.seek(page_pos + bytes_to_read + thumbnail_bytes) # thumbnail thrown away for now
+                            except IOError:
+                                log.error("Unable to read fax file.")
                                 fax_send_state = FAX_SEND_STATE_ERROR
+                                break
 
                             ret = BytesIO()
 
@@ -578,9 +605,6 @@ class SOAPFaxSendThread(FaxSendThread):
                                 fax_send_state = FAX_SEND_STATE_ERROR
                                 break
 
-                            page.truncate(0)
-                            page.seek(0)
-
                         else:
                             fax_send_state = FAX_SEND_STATE_ENDJOB
 
@@ -687,6 +711,9 @@ class SOAPFaxSendThread(FaxSendThread):
                     except OSError:
                         log.debug("Not found")
 
+                if self.cover_cache is not None:
+                    self.cover_cache.close()
+
                 state = STATE_DONE # Exit outer state machine
 
 
@@ -705,8 +732,11 @@ class SOAPFaxSendThread(FaxSendThread):
 
 
     def format_http(self, soap, content_type="text/xml; charset=utf-8"):
+        return self.http_header(len(soap), content_type) + soap
+
+
+    def http_header(self, soap_len, content_type="text/xml; charset=utf-8"):
         host = self.http_host
-        soap_len = len(soap)
 
         return (utils.cat(
 """POST / HTTP/1.1\r
@@ -716,7 +746,7 @@ Content-Type: $content_type\r
 Content-Length: $soap_len\r
 Connection: close\r
 SOAPAction: ""\r
-\r\n""")).encode('utf-8') + soap
+\r\n""")).encode('utf-8')
 
 
 
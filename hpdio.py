@@ -31,14 +31,15 @@ import sys
 import struct
 import os
 import time
+import errno
+import threading
 from base.sixext.moves import queue
 import select
-from pickle import dumps, HIGHEST_PROTOCOL
 
 # Local
 from base.g import *
 from base.codes import *
-from base import utils, device, status, models
+from base import utils, device, status, models, ipc
 from base.sixext import PY3
 
 # dBus
@@ -50,9 +51,14 @@ except ImportError:
 
 # Globals
 PIPE_BUF = 4096
+NUM_WORKERS = 4            # devices queried at the same time
+MAX_EXTRA_WORKERS = 4      # started to stand in for workers stuck on a device
+DEVICE_IO_TIMEOUT = 45.0   # sec, an update taking longer gets an error reply
 session_bus = None
 r2, w3 = None, None
+dq_sender = None # ipc.DQSender on w3
 devices = {} # { 'device_uri' : device.Device(), ... }
+devices_lock = threading.Lock()
 
 
 def send_message(device_uri, event_code, bytes_written=0):
@@ -62,10 +68,218 @@ def send_message(device_uri, event_code, bytes_written=0):
     SessionBus().send_message(msg)
 
 
+def send_reply(device_uri, response):
+    log.debug("Sending device update through pipe to hpssd...")
+    total_written = dq_sender.send(device_uri, response)
+    log.debug("Wrote %d bytes" % total_written)
+
+    send_message(device_uri, EVENT_DEVICE_UPDATE_REPLY, total_written)
+
+
+def get_device(device_uri):
+    with devices_lock:
+        try:
+            return devices[device_uri]
+        except KeyError:
+            dev = devices[device_uri] = device.Device(device_uri, disable_dbus=True)
+            return dev
+
+
+def query_device(device_uri, action):
+    response = {}
+    dev = get_device(device_uri)
+
+    try:
+        dev.open()
+    except Error as e:
+        log.error(e.msg)
+        response = {'error-state': ERROR_STATE_ERROR,
+                    'device-state': DEVICE_STATE_NOT_FOUND,
+                    'status-code' : EVENT_ERROR_DEVICE_IO_ERROR}
+
+    try:
+        if dev.device_state == DEVICE_STATE_NOT_FOUND:
+            dev.error_state = ERROR_STATE_ERROR
+        else:
+            if action == EVENT_DEVICE_UPDATE_REQUESTED:
+                try:
+                    dev.queryDevice()
+
+                except Error as e:
+                    log.error("Query device error (%s)." % e.msg)
+                    dev.error_state = ERROR_STATE_ERROR
+                    dev.status_code = EVENT_ERROR_DEVICE_IO_ERROR
+
+                response = dev.dq.copy()
+
+                log.debug("Device state = %d" % dev.device_state)
+                log.debug("Status code = %d" % dev.status_code)
+                log.debug("Error state = %d" % dev.error_state)
+
+            else: # EVENT_POLLING_REQUEST
+                try:
+                    dev.pollDevice()
+
+                except Error as e:
+                    log.error("Poll device error (%s)." % e.msg)
+                    dev.error_state = ERROR_STATE_ERROR
+
+                else:
+                    response = {'test' : 1}
+    finally:
+        dev.close()
+
+    return response
+
+
+
+class DeviceRequest(object):
+    def __init__(self, device_uri, action):
+        self.device_uri = device_uri
+        self.action = action
+        self.queued = time.time()
+        self.started = 0.0
+        self.finished = 0.0
+        self.queue_depth = 0
+        self.timed_out = False
+        self.response = {}
+
+
+    def stats(self):
+        return {'queue-depth' : self.queue_depth,
+                'latency' : self.finished - self.queued,
+                'io-time' : self.finished - self.started,
+                'timed-out' : int(self.timed_out)}
+
+
+
+class DeviceScheduler(object):
+    """ Runs device queries on a pool of worker threads, one at a time per device.
+        A request for a device that already has one queued or running is merged
+        into it. Finished requests are handed back to the main loop, which
+        select()s on done_pipe to wake up for them.
+    """
+    def __init__(self, num_workers=NUM_WORKERS):
+        self.lock = threading.Lock()
+        self.ready = queue.Queue()
+        self.done = queue.Queue()
+        self.queued = {}  # { 'device_uri' : DeviceRequest waiting for a worker, ... }
+        self.busy = {}    # { 'device_uri' : DeviceRequest being run, ... }
+        self.pending = {} # { 'device_uri' : update requested while a poll was running, ... }
+        self.num_workers = num_workers
+        self.workers = 0
+        self.hung = 0
+        self.done_pipe, self.wake_pipe = os.pipe()
+
+        for x in range(num_workers):
+            self.__startWorker()
+
+
+    def __startWorker(self):
+        t = threading.Thread(target=self.__worker)
+        t.daemon = True
+        t.start()
+        self.workers += 1
+
+
+    def submit(self, device_uri, action):
+        """ Returns False if the request was merged into one already queued or running. """
+        with self.lock:
+            req = self.busy.get(device_uri)
+            if req is not None:
+                if action == EVENT_DEVICE_UPDATE_REQUESTED and req.action != action:
+                    self.pending[device_uri] = action
+                return False
+
+            req = self.queued.get(device_uri)
+            if req is not None:
+                if action == EVENT_DEVICE_UPDATE_REQUESTED:
+                    req.action = action
+                return False
+
+            req = self.queued[device_uri] = DeviceRequest(device_uri, action)
+            req.queue_depth = len(self.queued) + len(self.busy)
+
+        self.ready.put(req)
+        return True
+
+
+    def __worker(self):
+        while True:
+            req = self.ready.get()
+
+            with self.lock:
+                del self.queued[req.device_uri]
+                self.busy[req.device_uri] = req
+                req.started = time.time()
+
+            try:
+                req.response = query_device(req.device_uri, req.action)
+            except Exception as e:
+                log.exception()
+                req.response = {'error-state': ERROR_STATE_ERROR,
+                                'device-state': DEVICE_STATE_NOT_FOUND,
+                                'status-code' : EVENT_ERROR_DEVICE_IO_ERROR}
+
+            with self.lock:
+                req.finished = time.time()
+                del self.busy[req.device_uri]
+                if req.timed_out:
+                    self.hung -= 1
+
+                action = self.pending.pop(req.device_uri, None)
+                retire = self.workers > self.num_workers + self.hung
+                if retire:
+                    self.workers -= 1
+
+            if action is not None:
+                self.submit(req.device_uri, action)
+
+            self.done.put(req)
+            os.write(self.wake_pipe, b'\0')
+
+            if retire:
+                break
+
+
+    def collect(self):
+        """ Returns the requests finished since the last call. """
+        os.read(self.done_pipe, PIPE_BUF)
+        finished = []
+        while True:
+            try:
+                finished.append(self.done.get_nowait())
+            except queue.Empty:
+                break
+
+        return finished
+
+
+    def expire(self):
+        """ Returns the requests that ran past DEVICE_IO_TIMEOUT since the last call.
+            Their workers are left to finish, extra workers keep the other devices going.
+        """
+        now = time.time()
+        expired = []
+        with self.lock:
+            for req in list(self.busy.values()):
+                if not req.timed_out and now - req.started > DEVICE_IO_TIMEOUT:
+                    req.timed_out = True
+                    req.finished = now
+                    self.hung += 1
+                    expired.append(req)
+
+            while self.workers < self.num_workers + min(self.hung, MAX_EXTRA_WORKERS):
+                self.__startWorker()
+
+        return expired
+
+
+
 def run(read_pipe2=None,  # pipe from hpssd
         write_pipe3=None): # pipe to hpssd
 
-    global r2, w3
+    global r2, w3, dq_sender
 #    tmp_dir = '/tmp'
     os.umask(0o111)
 
@@ -74,34 +288,59 @@ def run(read_pipe2=None,  # pipe from hpssd
         log.debug("PID=%d" % os.getpid())
 
         r2, w3 = read_pipe2, write_pipe3
+        dq_sender = ipc.DQSender(w3)
+        reader = ipc.FrameReader(r2)
 
-        fmt = "80s80sI32sI80sf" # TODO: Move to Event class
-        fmt_size = struct.calcsize(fmt)
-
-        response = {}
-        dev = None
-        m = ''
+        scheduler = DeviceScheduler()
         while True:
             try:
-                r, w, e = select.select([r2], [], [r2], 1.0)
+                r, w, e = select.select([r2, scheduler.done_pipe], [], [r2], 1.0)
             except KeyboardInterrupt:
                 break
             except select.error as e:
-                if e[0] == errno.EINTR:
+                if e.args[0] == errno.EINTR:
                     continue
                 else:
                     break
 
-            if not r: continue
             if e: break
-            m = os.read(r2, fmt_size)
-            if not m:
+
+            for req in scheduler.expire():
+                log.error("Device I/O timeout (%s)." % req.device_uri)
+                send_message(req.device_uri, EVENT_DEVICE_UPDATE_INACTIVE)
+                if req.action == EVENT_DEVICE_UPDATE_REQUESTED:
+                    response = {'error-state': ERROR_STATE_ERROR,
+                                'device-state': DEVICE_STATE_NOT_FOUND,
+                                'status-code' : EVENT_ERROR_DEVICE_IO_ERROR,
+                                'hpdio-stats' : req.stats()}
+                    send_reply(req.device_uri, response)
+
+            if scheduler.done_pipe in r:
+                for req in scheduler.collect():
+                    log.debug("%s done in %.2f sec (%.2f sec in queue)" %
+                              (req.device_uri, req.finished - req.queued, req.started - req.queued))
+
+                    send_message(req.device_uri, EVENT_DEVICE_UPDATE_INACTIVE)
+
+                    if req.action == EVENT_DEVICE_UPDATE_REQUESTED:
+                        # A late reply replaces the error sent at the timeout
+                        req.response['hpdio-stats'] = req.stats()
+                        send_reply(req.device_uri, req.response)
+
+                    elif req.action == EVENT_POLLING_REQUEST:
+                        # TODO: Translate into event: scan requested, copy requested, etc.. send as event
+                        pass
+
+            if r2 not in r: continue
+            if not reader.read():
                 break
 
-            while len(m) >= fmt_size:
-                response.clear()
-                event = device.Event(*[x.rstrip(b'\x00').decode('utf-8') if isinstance(x, bytes) else x for x in struct.unpack(fmt, m[:fmt_size])])
-                m = m[fmt_size:]
+            for msg_type, payload in reader.frames():
+                if msg_type != ipc.MSG_EVENT:
+                    log.error("Unexpected message %d from hpssd" % msg_type)
+                    continue
+
+                event = device.Event(*ipc.unpackEvent(payload))
 
                 action = event.event_code
                 if PY3:
@@ -112,64 +351,11 @@ def run(read_pipe2=None,  # pipe from hpssd
                 log.debug("Handling event...")
                 event.debug()
 
-                send_message(device_uri, EVENT_DEVICE_UPDATE_ACTIVE)
-
                 if action in (EVENT_DEVICE_UPDATE_REQUESTED, EVENT_POLLING_REQUEST):
-                    #try:
-                    if 1:
-                        #log.debug("%s starting for %s" % (ACTION_NAMES[action], device_uri))
-
-                        try:
-                            dev = devices[device_uri]
-                        except KeyError:
-                            dev = devices[device_uri] = device.Device(device_uri, disable_dbus=True)
-
-                        try:
-                            #print "Device.open()"
-                            dev.open()
-                        except Error as e:
-                            log.error(e.msg)
-                            response = {'error-state': ERROR_STATE_ERROR,
-                                        'device-state': DEVICE_STATE_NOT_FOUND,
-                                        'status-code' : EVENT_ERROR_DEVICE_IO_ERROR}
-
-                        if dev.device_state == DEVICE_STATE_NOT_FOUND:
-                            dev.error_state = ERROR_STATE_ERROR
-                        else:
-                            if action == EVENT_DEVICE_UPDATE_REQUESTED:
-                                try:
-                                    #print "Device.queryDevice()"
-                                    dev.queryDevice()
-
-                                except Error as e:
-                                    log.error("Query device error (%s)." % e.msg)
-                                    dev.error_state = ERROR_STATE_ERROR
-                                    dev.status_code = EVENT_ERROR_DEVICE_IO_ERROR
-
-                                response = dev.dq
-                                #print response
-
-                                log.debug("Device state = %d" % dev.device_state)
-                                log.debug("Status code = %d" % dev.status_code)
-                                log.debug("Error state = %d" % dev.error_state)
-
-                            else: # EVENT_POLLING_REQUEST
-                                try:
-                                    dev.pollDevice()
-
-                                except Error as e:
-                                    log.error("Poll device error (%s)." % e.msg)
-                                    dev.error_state = ERROR_STATE_ERROR
-
-                                else:
-                                    response = {'test' : 1}
-
-                    #finally:
-                    if 1:
-                        if dev is not None:
-                            dev.close()
-
-                    #thread_activity_lock.release()
+                    if scheduler.submit(device_uri, action):
+                        send_message(device_uri, EVENT_DEVICE_UPDATE_ACTIVE)
+                    else:
+                        log.debug("Request merged with the one pending for %s" % device_uri)
 
                 elif action == EVENT_USER_CONFIGURATION_CHANGED:
                     pass
@@ -178,30 +364,6 @@ def run(read_pipe2=None,  # pipe from hpssd
                     log.debug("Exiting")
                     sys.exit(1)
 
-                send_message(device_uri, EVENT_DEVICE_UPDATE_INACTIVE)
-
-                if action == EVENT_DEVICE_UPDATE_REQUESTED:
-                    #print response
-                    data = dumps(response, HIGHEST_PROTOCOL)
-
-                    log.debug("Sending data through pipe to hpssd...")
-                    total_written = 0
-                    while True:
-                        total_written += os.write(w3, data[:PIPE_BUF])
-                        data = data[PIPE_BUF:]
-                        if not data:
-                            break
-
-                    log.debug("Wrote %d bytes" % total_written)
-
-                    send_message(device_uri, EVENT_DEVICE_UPDATE_REPLY, total_written)
-
-                elif action == EVENT_POLLING_REQUEST:
-                    # TODO: Translate into event: scan requested, copy requested, etc.. send as event
-                    #try:
-                    #    os.write
-                    pass
-
 
     except KeyboardInterrupt:
         log.debug("Ctrl-C: Exiting...")
@@ -42,7 +42,7 @@ from pickle import loads, HIGHEST_PROTOCOL
 # Local
 from base.g import *
 from base.codes import *
-from base import utils, device, status, models, module, services, os_utils
+from base import utils, device, status, models, module, services, os_utils, ipc
 from base.sixext import PY3
 from base.sixext import to_bytes_utf8
 # dBus
@@ -52,11 +52,11 @@ try:
     from dbus.mainloop.glib import DBusGMainLoop
     if PY3:
         try:
-            from gi._gobject import MainLoop, timeout_add, threads_init, io_add_watch, IO_IN #python3-gi version: 3.4.0
+            from gi._gobject import MainLoop, timeout_add, source_remove, threads_init, io_add_watch, IO_IN #python3-gi version: 3.4.0
         except:
-            from gi.repository.GLib import MainLoop, timeout_add, threads_init, io_add_watch, IO_IN #python3-gi version: 3.8.0
+            from gi.repository.GLib import MainLoop, timeout_add, source_remove, threads_init, io_add_watch, IO_IN #python3-gi version: 3.8.0
     else:
-        from gobject import MainLoop, timeout_add, threads_init, io_add_watch, IO_IN
+        from gobject import MainLoop, timeout_add, source_remove, threads_init, io_add_watch, IO_IN
     dbus_loaded = True
 except ImportError:
     log.error("dbus failed to load (python-dbus ver. 0.80+ required). Exiting...")
@@ -75,7 +75,10 @@ dbus_loop, main_loop = None, None
 system_bus = None
 session_bus = None
 w1, w2, r3 = None, None, None
+hpdio_reader = None # ipc.FrameReader on r3
+hpdio_dqs = ipc.DQReceiver() # device query results as last sent by hpdio
 devices = {} # { 'device_uri' : DeviceCache, ... }
+fax_waiters = [] # WaitForFaxes() calls waiting for a fax to be rendered
 
 
 # ***********************************************************************************
@@ -95,6 +98,7 @@ class DeviceCache(object):
         self.backoff_counter = 0  # polling backoff: 0 = none, x = backed off by x intervals
         self.backoff_countdown = 0
         self.polling = False # indicates whether its in the device polling list
+        self.io_stats = {} # hpdio queue depth and timings of the last update
 
 
 #  dbus interface on session bus
@@ -136,6 +140,17 @@ class StatusService(dbus.service.Object):
             return (device_uri, t)
 
 
+    @dbus.service.method('com.hplip.StatusService', in_signature='s', out_signature='sa{sd}')
+    def GetIOStats(self, device_uri):
+        log.debug("GetIOStats('%s')" % device_uri)
+        try:
+            io_stats = devices[device_uri].io_stats
+        except KeyError:
+            return (device_uri, {})
+        else:
+            return (device_uri, dict([(k, float(v)) for k, v in io_stats.items()]))
+
+
     @dbus.service.method('com.hplip.StatusService', in_signature='ssi', out_signature='i')
     def SetCachedIntValue(self, device_uri, key, value):
         log.debug("SetCachedIntValue('%s', '%s', %d)" % (device_uri, key, value))
@@ -206,11 +221,28 @@ class StatusService(dbus.service.Object):
 
     # if CheckForWaitingFax returns a fax job, that job is removed from the cache
     def check_for_waiting_fax_return(self, d, u, j):
-        log.debug("Fax (username=%s, jobid=%d) removed from faxes and returned to caller." % (u, j))
-        r = devices[d].faxes[(u, j)].as_tuple()
-        del devices[d].faxes[(u, j)]
-        show_waiting_faxes(d)
-        return r
+        return take_waiting_fax(d, u, j)
+
+
+    # Returns the faxes for any of job_ids that are rendered, as CheckForWaitingFax()
+    # does. If there are none yet the reply is sent when the first one comes in
+    # (see handle_fax_event()), or after timeout seconds with no faxes.
+    @dbus.service.method('com.hplip.StatusService', in_signature='ssaid', out_signature='a(ssisisds)',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def WaitForFaxes(self, device_uri, username, job_ids, timeout, reply_handler, error_handler):
+        log.debug("WaitForFaxes('%s', '%s', %s, %f)" % (device_uri, username, list(job_ids), timeout))
+        send_systray_blip()
+
+        if check_device(device_uri) != ERROR_SUCCESS:
+            reply_handler([])
+            return
+
+        w = FaxWaiter(device_uri, username, [int(j) for j in job_ids], reply_handler)
+        if not w.check() and timeout > 0:
+            fax_waiters.append(w)
+            w.timer = timeout_add(int(timeout * 1000), fax_waiter_timeout, w)
+        else:
+            w.reply()
 
 
     # Alternate way to "send" an event rather than using a signal message
@@ -221,6 +253,30 @@ class StatusService(dbus.service.Object):
 
 
 
+class FaxWaiter(object):
+    def __init__(self, device_uri, username, job_ids, reply_handler):
+        self.device_uri = device_uri
+        self.username = username
+        self.job_ids = job_ids
+        self.reply_handler = reply_handler
+        self.faxes = []
+        self.timer = None
+
+
+    def check(self):
+        # Takes our faxes out of the cache. True if there were any.
+        for j in self.job_ids:
+            if (self.username, j) in devices[self.device_uri].faxes:
+                self.faxes.append(take_waiting_fax(self.device_uri, self.username, j))
+
+        return len(self.faxes) > 0
+
+
+    def reply(self):
+        self.reply_handler(self.faxes)
+
+
+
 def check_device(device_uri):
     if not PY3:
         device_uri = str(device_uri)
@@ -241,6 +297,34 @@ def check_device(device_uri):
     return ERROR_SUCCESS
 
 
+def take_waiting_fax(d, u, j):
+    log.debug("Fax (username=%s, jobid=%d) removed from faxes and returned to caller." % (u, j))
+    r = devices[d].faxes[(u, j)].as_tuple()
+    del devices[d].faxes[(u, j)]
+    show_waiting_faxes(d)
+    return r
+
+
+def fax_waiter_timeout(w):
+    if w in fax_waiters:
+        fax_waiters.remove(w)
+        w.reply()
+
+    return False # one shot
+
+
+def wake_fax_waiters(device_uri):
+    # Replies to the WaitForFaxes() calls the new fax is for. True if one took it.
+    for w in fax_waiters[:]:
+        if w.device_uri == device_uri and w.check():
+            fax_waiters.remove(w)
+            source_remove(w.timer)
+            w.reply()
+            return True
+
+    return False
+
+
 def create_history(event):
     history = devices[event.device_uri].history.get()
 
@@ -279,6 +363,9 @@ def handle_fax_event(event, pipe_name):
 
         show_waiting_faxes(event.device_uri)
 
+        if wake_fax_waiters(event.device_uri):
+            return # hp-sendfax (or the fax UI) is running and now has it
+
         try:
             os.waitpid(-1, os.WNOHANG)
         except OSError:
@@ -327,34 +414,34 @@ def show_waiting_faxes(d):
 
 
 # Qt4 only
-def handle_hpdio_event(event, bytes_written):
-    log.debug("Reading %d bytes from hpdio pipe..." % bytes_written)
-    total_read, data = 0, to_bytes_utf8('')
-
-    while True:
-        r, w, e = select.select([r3], [], [r3], 0.0)
-        if not r: break
-
-        x = os.read(r3, PIPE_BUF)
-        if not x: break
-
-        data = to_bytes_utf8('').join([data, x])
-        total_read += len(x)
+def handle_hpdio_pipe(source, condition):
+    # Device query results from hpdio, see base/ipc.py
+    if not hpdio_reader.read():
+        log.error("hpdio pipe closed")
+        return False
 
-        if total_read == bytes_written: break
+    for msg_type, payload in hpdio_reader.frames():
+        if msg_type != ipc.MSG_DQ_DELTA:
+            log.error("Unexpected message %d from hpdio" % msg_type)
+            continue
 
-    log.debug("Read %d bytes" % total_read)
+        device_uri, dq, changed = hpdio_dqs.apply(payload)
+        log.debug("Device update for %s (%d bytes), changed: %s" % (device_uri, len(payload), changed))
 
-    if total_read == bytes_written:
-        dq = loads(data)
+        dq = dq.copy()
+        io_stats = dq.pop('hpdio-stats', {})
+        log.debug("hpdio: %s" % io_stats)
 
-        if check_device(event.device_uri) == ERROR_SUCCESS:
-            devices[event.device_uri].dq = dq.copy()
+        if check_device(device_uri) == ERROR_SUCCESS:
+            devices[device_uri].dq = dq
+            devices[device_uri].io_stats = io_stats
 
-            handle_event(device.Event(event.device_uri, '',
+            handle_event(device.Event(device_uri, '',
                 dq.get('status-code', STATUS_PRINTER_IDLE), prop.username, 0, ''))
 
-            send_toolbox_event(event, EVENT_DEVICE_UPDATE_REPLY)
+            send_toolbox_event(device.Event(device_uri, '', EVENT_DEVICE_UPDATE_REPLY))
+
+    return True
 
 def handle_plugin_install():
 
@@ -495,8 +582,8 @@ def handle_event(event, more_args=None):
 
     # Qt4 only
     elif event.event_code == EVENT_DEVICE_UPDATE_REPLY:
-        bytes_written = int(more_args[1])
-        handle_hpdio_event(event, bytes_written)
+        # The results themselves are read from the hpdio pipe (handle_hpdio_pipe())
+        log.debug("hpdio sent %s bytes for %s" % (more_args[1], event.device_uri))
 
     # Qt4 only
     elif event.event_code == EVENT_CUPS_QUEUES_ADDED or event.event_code == EVENT_CUPS_QUEUES_REMOVED:
@@ -530,11 +617,11 @@ def send_event_to_systray_ui(event, event_code=None):
     if event_code is not None:
         e.event_code = event_code
 
-    e.send_via_pipe(w1, 'systemtray')
+    e.send_via_ipc(w1, 'systemtray')
 
 
 def send_event_to_hpdio(event):
-    event.send_via_pipe(w2, 'hpdio')
+    event.send_via_ipc(w2, 'hpdio')
 
 
 def send_toolbox_event(event, event_code=None):
@@ -572,7 +659,7 @@ def run(write_pipe1=None,  # write pipe to systemtray
 
     global dbus_loop, main_loop
     global system_bus, session_bus
-    global w1, w2, r3
+    global w1, w2, r3, hpdio_reader
 
     log.set_module("hp-systray(hpssd)")
     log.debug("PID=%d" % os.getpid())
@@ -581,6 +668,10 @@ def run(write_pipe1=None,  # write pipe to systemtray
     dbus_loop = DBusGMainLoop(set_as_default=True)
     main_loop = MainLoop()
 
+    if r3 is not None:
+        hpdio_reader = ipc.FrameReader(r3)
+        io_add_watch(r3, IO_IN, handle_hpdio_pipe)
+
     try:
         system_bus = SystemBus(mainloop=dbus_loop)
     except dbus.exceptions.DBusException as e:
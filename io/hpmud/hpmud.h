@@ -163,6 +163,18 @@ struct hpmud_dstat
    int mlc_up;                      /* 0 = MLC/1284.4 transport up, 1 = MLD/1284.4 transport down */
 };
 
+#define HPMUD_PML_MAX_OBJECTS 16  /* Objects in one hpmud_get_pml_multi request. */
+
+struct hpmud_pml_object
+{
+   const char *snmp_oid;            /* snmp encoded pml oid */
+   void *buf;                       /* data buffer */
+   int buf_size;                    /* data buffer size in bytes */
+   int bytes_read;
+   int type;                        /* pml data type */
+   int pml_result;
+};
+
 struct hpmud_model_attributes
 {
    enum HPMUD_IO_MODE prt_mode;        /* print only (io_mode) */
@@ -378,6 +390,25 @@ enum HPMUD_RESULT hpmud_set_pml(HPMUD_DEVICE device, HPMUD_CHANNEL channel, cons
  */
 enum HPMUD_RESULT hpmud_get_pml(HPMUD_DEVICE device, HPMUD_CHANNEL channel, const char *snmp_oid, void *buf, int buf_size, int *bytes_read, int *type, int *pml_result);
 
+/*
+ * hpmud_get_pml_multi - get several pml objects
+ *
+ * Same as hpmud_get_pml for up to HPMUD_PML_MAX_OBJECTS objects. Jetdirect connections send one snmp
+ * get with a variable binding for each object. Local connections get the objects one at a time, the
+ * python layer batches those on the pml channel itself.
+ *
+ * inputs:
+ *  dd - device descriptor
+ *  cc - channel descriptor
+ *  obj - objects to get, snmp_oid, buf and buf_size set for each
+ *  count - number of objects
+ *
+ * outputs:
+ *  obj - bytes_read, type and pml_result set for each
+ *  return value - see enum definition
+ */
+enum HPMUD_RESULT hpmud_get_pml_multi(HPMUD_DEVICE device, HPMUD_CHANNEL channel, struct hpmud_pml_object *obj, int count);
+
 /*
  * hpmud_get_model - parse device model from the IEEE 1284 device id string.
  *
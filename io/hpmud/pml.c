@@ -209,17 +209,58 @@ bugout:
    return len;
 }
 
+/* Convert one snmp variable to a pml data type and byte stream. Returns -1 for an unsupported type. */
+static int SnmpVarToPml(struct variable_list *vars, void *buffer, unsigned int size, int *type)
+{
+   unsigned int i, len=0;
+   uint32_t val;
+   unsigned char tmp[sizeof(uint32_t)];
+
+   switch (vars->type)
+   {
+      case ASN_INTEGER:
+         *type = PML_DT_SIGNED_INTEGER;
+
+         /* Convert SNMP little-endian to PML big-endian byte stream. */
+         len = (sizeof(uint32_t) < size) ? sizeof(uint32_t) : size;
+         val = *vars->val.integer;
+         for(i=len; i>0; i--)
+         {
+            tmp[i-1] = val & 0xff;
+            val >>= 8;
+         }
+
+         /* Remove any in-significant bytes. */
+         for (; tmp[i]==0 && i<len; i++)
+            ;
+         len -= i;
+
+         memcpy(buffer, tmp+i, len);
+         break;
+      case ASN_NULL:
+         *type = PML_DT_NULL_VALUE;
+         break;
+      case ASN_OCTET_STR:
+         *type = PML_DT_STRING;
+         len = (vars->val_len < size) ? vars->val_len : size;
+         memcpy(buffer, vars->val.string, len);
+         break;
+      default:
+         BUG("unable to GetSnmp: data type=%d\n", vars->type);
+         return -1;
+   }
+
+   return len;
+}
+
 int __attribute__ ((visibility ("hidden"))) GetSnmp(const char *ip, int port, const char *szoid, void *buffer, unsigned int size, int *type, int *pml_result, int *result)
 {
    struct snmp_session session, *ss=NULL;
    struct snmp_pdu *pdu=NULL;
    struct snmp_pdu *response=NULL;
-   unsigned int i, len=0;
+   int len=0;
    oid anOID[MAX_OID_LEN];
    size_t anOID_len = MAX_OID_LEN;
-   struct variable_list *vars;
-   uint32_t val;
-   unsigned char tmp[sizeof(uint32_t)];
 
    *result = HPMUD_R_IO_ERROR;
    *type = PML_DT_NULL_VALUE;
@@ -248,40 +289,10 @@ int __attribute__ ((visibility ("hidden"))) GetSnmp(const char *ip, int port, co
 
    if (response->errstat == SNMP_ERR_NOERROR) 
    {
-      vars = response->variables;
-      switch (vars->type)
+      if ((len = SnmpVarToPml(response->variables, buffer, size, type)) < 0)
       {
-         case ASN_INTEGER:
-            *type = PML_DT_SIGNED_INTEGER;
-
-            /* Convert SNMP little-endian to PML big-endian byte stream. */
-            len = (sizeof(uint32_t) < size) ? sizeof(uint32_t) : size;
-            val = *vars->val.integer;
-            for(i=len; i>0; i--)
-            {
-               tmp[i-1] = val & 0xff;
-               val >>= 8;
-            }
-
-            /* Remove any in-significant bytes. */
-            for (; tmp[i]==0 && i<len; i++)
-               ;
-            len -= i;
-
-            memcpy(buffer, tmp+i, len);
-            break;
-         case ASN_NULL:
-            *type = PML_DT_NULL_VALUE;
-            break;
-         case ASN_OCTET_STR:
-            *type = PML_DT_STRING;
-            len = (vars->val_len < size) ? vars->val_len : size;
-            memcpy(buffer, vars->val.string, len);
-            break;
-         default:
-            BUG("unable to GetSnmp: data type=%d\n", vars->type);
-            goto bugout;
-            break;
+         len = 0;
+         goto bugout;
       }
    }
 
@@ -296,6 +307,99 @@ bugout:
    return len;
 }
 
+/* Get several objects with one snmp get. Returns the number of objects with a pml_result. */
+static int GetSnmpMulti(const char *ip, int port, struct hpmud_pml_object *obj, int count, int *result)
+{
+   struct snmp_session session, *ss=NULL;
+   struct snmp_pdu *pdu=NULL;
+   struct snmp_pdu *response=NULL;
+   struct variable_list *vars;
+   oid anOID[MAX_OID_LEN];
+   size_t anOID_len;
+   int pending[HPMUD_PML_MAX_OBJECTS];
+   int i, n, len, done=0;
+
+   *result = HPMUD_R_IO_ERROR;
+
+   for (i=0; i<count; i++)
+   {
+      obj[i].bytes_read = 0;
+      obj[i].type = PML_DT_NULL_VALUE;
+      obj[i].pml_result = PML_EV_ERROR_UNKNOWN_REQUEST;
+      pending[i] = i;
+   }
+   n = count;
+
+   init_snmp("snmpapp");
+
+   snmp_sess_init(&session );                   /* set up defaults */
+   session.peername = (char *)ip;
+   session.version = SNMP_VERSION_1;
+   session.community = (unsigned char *)SnmpPort[port];
+   session.community_len = strlen((const char *)session.community);
+   session.retries = 1;
+   session.timeout = 1000000;         /* 1 second */
+   ss = snmp_open(&session);                     /* establish the session */
+   if (ss == NULL)
+      goto bugout;
+
+   while (n > 0)
+   {
+      pdu = snmp_pdu_create(SNMP_MSG_GET);
+      for (i=0; i<n; i++)
+      {
+         anOID_len = MAX_OID_LEN;
+         read_objid(obj[pending[i]].snmp_oid, anOID, &anOID_len);
+         snmp_add_null_var(pdu, anOID, anOID_len);
+      }
+
+      /* Send the request and get response. */
+      if (snmp_synch_response(ss, pdu, &response) != STAT_SUCCESS)
+         goto bugout;
+
+      if (response->errstat == SNMP_ERR_NOERROR)
+      {
+         for (i=0, vars=response->variables; i<n && vars != NULL; i++, vars=vars->next_variable)
+         {
+            if ((len = SnmpVarToPml(vars, obj[pending[i]].buf, obj[pending[i]].buf_size, &obj[pending[i]].type)) < 0)
+               continue;
+            obj[pending[i]].bytes_read = len;
+            obj[pending[i]].pml_result = PML_EV_OK;
+            done++;
+         }
+         n = 0;
+      }
+      else if (response->errindex > 0 && response->errindex <= n)
+      {
+         /* SNMPv1 fails the whole get on one bad object. Take that one out and ask for the rest again. */
+         i = response->errindex - 1;
+         obj[pending[i]].pml_result = SnmpErrorToPml(response->errstat);
+         done++;
+         memmove(&pending[i], &pending[i+1], (n-i-1) * sizeof(pending[0]));
+         n--;
+      }
+      else
+      {
+         for (i=0; i<n; i++)
+            obj[pending[i]].pml_result = SnmpErrorToPml(response->errstat);
+         done += n;
+         n = 0;
+      }
+
+      snmp_free_pdu(response);
+      response = NULL;
+   }
+
+   *result = HPMUD_R_OK;
+
+bugout:
+   if (response != NULL)
+      snmp_free_pdu(response);
+   if (ss != NULL)
+      snmp_close(ss);
+   return done;
+}
+
 #else
 
 int __attribute__ ((visibility ("hidden"))) SetSnmp(const char *ip, int port, const char *szoid, int type, void *buffer, unsigned int size, int *pml_result, int *result)
@@ -310,6 +414,13 @@ int __attribute__ ((visibility ("hidden"))) GetSnmp(const char *ip, int port, co
    return 0;
 }
 
+static int GetSnmpMulti(const char *ip, int port, struct hpmud_pml_object *obj, int count, int *result)
+{
+   BUG("no JetDirect support enabled\n");
+   *result = HPMUD_R_IO_ERROR;
+   return 0;
+}
+
 #endif /* HAVE_LIBSNMP */
 
 /* Set a PML object in the hp device. */
@@ -525,4 +636,74 @@ bugout:
    return stat;
 }
 
+/* Get several PML objects from the hp device. */
+enum HPMUD_RESULT hpmud_get_pml_multi(HPMUD_DEVICE device, HPMUD_CHANNEL channel, struct hpmud_pml_object *obj, int count)
+{
+   char ip[HPMUD_LINE_SIZE], *psz, *tail;
+   int i, result, port;
+   struct hpmud_dstat ds;
+   enum HPMUD_RESULT stat = HPMUD_R_IO_ERROR;
+
+   DBG("[%d] hpmud_get_pml_multi() dd=%d cd=%d count=%d\n", getpid(), device, channel, count);
+
+   if (count < 1 || count > HPMUD_PML_MAX_OBJECTS)
+   {
+      stat = HPMUD_R_INVALID_LENGTH;
+      goto bugout;
+   }
+
+   if ((result = hpmud_get_dstat(device, &ds)) != HPMUD_R_OK)
+   {
+      stat = result;
+      goto bugout;
+   }
+
+   if (strcasestr(ds.uri, "net/") != NULL)
+   {
+      /* Process pml via snmp, one get for all the objects. */
+
+      hpmud_get_uri_datalink(ds.uri, ip, sizeof(ip));
+
+      if ((psz = strstr(ds.uri, "port=")) != NULL)
+         port = strtol(psz+5, &tail, 10);
+      else
+         port = PORT_PUBLIC;
+
+      GetSnmpMulti(ip, port, obj, count, &result);
+      if (result != HPMUD_R_OK)
+      {
+        //Try one more time with previous default community name string ("public.1" which was used for old HP printers)
+        GetSnmpMulti(ip, PORT_PUBLIC_1, obj, count, &result);
+        if (result != HPMUD_R_OK)
+        {
+            BUG("GetPmlMulti failed ret=%d\n", result);
+            stat = result;
+            goto bugout;
+        }
+      }
+   }
+   else
+   {
+      /* Process pml via local transport. */
+
+      for (i=0; i<count; i++)
+      {
+         result = hpmud_get_pml(device, channel, obj[i].snmp_oid, obj[i].buf, obj[i].buf_size, &obj[i].bytes_read, &obj[i].type, &obj[i].pml_result);
+         if (result != HPMUD_R_OK)
+         {
+            stat = result;
+            goto bugout;
+         }
+      }
+   }
+
+   stat = HPMUD_R_OK;
+
+   for (i=0; i<count; i++)
+      DBG("get_pml_multi result oid=%s len=%d datatype=%x pmlresult=%x\n", obj[i].snmp_oid, obj[i].bytes_read, obj[i].type, obj[i].pml_result);
+
+bugout:
+   return stat;
+}
+
 
@@ -36,6 +36,14 @@ typedef int Py_ssize_t;
 #define PY_SSIZE_T_MIN INT_MIN
 #endif
 
+#if PY_MAJOR_VERSION >= 3
+  #define PML_OBJECT_FORMAT "(y#ii)"
+  #define OID_AS_STRING PyUnicode_AsUTF8
+#else
+  #define PML_OBJECT_FORMAT "(s#ii)"
+  #define OID_AS_STRING PyString_AsString
+#endif
+
 #define _STRINGIZE(x) #x
 #define STRINGIZE(x) _STRINGIZE(x)
 
@@ -65,6 +73,8 @@ result_code, pml_result_code = set_pml(dd, cd, oid, type, data)
 
 result_code, data, pml_result_code = get_pml(dd, cd, oid, type)
 
+result_code, [(data, type, pml_result_code), ...] = get_pml_multi(dd, cd, [oid, ...])
+
 result_code, uri = make_usb_uri(busnum, devnum)
 
 result_code, uri = make_net_uri(ip, port)
@@ -264,6 +274,77 @@ static PyObject *get_pml(PyObject *self, PyObject *args)
     return Py_BuildValue(FORMAT_STRING, result, buf, bytes_read, type, pml_result);
 }
 
+static PyObject *get_pml_multi(PyObject *self, PyObject *args)
+{
+    enum HPMUD_RESULT result = HPMUD_R_OK;
+    HPMUD_DEVICE dd;
+    HPMUD_CHANNEL cd;
+    PyObject *oids, *seq, *list = NULL, *item;
+    struct hpmud_pml_object obj[HPMUD_PML_MAX_OBJECTS];
+    char *buf;
+    Py_ssize_t i, count;
+
+    if (!PyArg_ParseTuple(args, "iiO", &dd, &cd, &oids))
+        return NULL;
+
+    if ((seq = PySequence_Fast(oids, "oids must be a sequence")) == NULL)
+        return NULL;
+
+    count = PySequence_Fast_GET_SIZE(seq);
+    if (count < 1 || count > HPMUD_PML_MAX_OBJECTS)
+    {
+        Py_DECREF(seq);
+        return Py_BuildValue("(i[])", HPMUD_R_INVALID_LENGTH);
+    }
+
+    if ((buf = malloc(count * HPMUD_BUFFER_SIZE)) == NULL)
+    {
+        Py_DECREF(seq);
+        return PyErr_NoMemory();
+    }
+
+    for (i = 0; i < count; i++)
+    {
+        if ((obj[i].snmp_oid = OID_AS_STRING(PySequence_Fast_GET_ITEM(seq, i))) == NULL)
+            goto bugout;
+
+        obj[i].buf = buf + i * HPMUD_BUFFER_SIZE;
+        obj[i].buf_size = HPMUD_BUFFER_SIZE;
+        obj[i].bytes_read = 0;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    result = hpmud_get_pml_multi(dd, cd, obj, count);
+    Py_END_ALLOW_THREADS
+
+    if ((list = PyList_New(0)) == NULL)
+        goto bugout;
+
+    if (result == HPMUD_R_OK)
+    {
+        for (i = 0; i < count; i++)
+        {
+            if ((item = Py_BuildValue(PML_OBJECT_FORMAT, obj[i].buf, obj[i].bytes_read, obj[i].type, obj[i].pml_result)) == NULL ||
+                PyList_Append(list, item) < 0)
+            {
+                Py_XDECREF(item);
+                Py_CLEAR(list);
+                goto bugout;
+            }
+            Py_DECREF(item);
+        }
+    }
+
+bugout:
+    free(buf);
+    Py_DECREF(seq);
+
+    if (list == NULL)
+        return NULL;
+
+    return Py_BuildValue("(iN)", result, list);
+}
+
 static PyObject *make_usb_uri(PyObject *self, PyObject *args)
 {
     char * busnum;
@@ -404,6 +485,7 @@ static PyMethodDef mudext_functions[] =
     {"close_channel",     (PyCFunction)close_channel,  METH_VARARGS },
     {"set_pml",               (PyCFunction)set_pml,  METH_VARARGS },
     {"get_pml",              (PyCFunction)get_pml,  METH_VARARGS },
+    {"get_pml_multi",        (PyCFunction)get_pml_multi,  METH_VARARGS },
     {"make_usb_uri",        (PyCFunction)make_usb_uri,  METH_VARARGS },
     {"make_net_uri",        (PyCFunction)make_net_uri,  METH_VARARGS },
     {"make_zc_uri",         (PyCFunction)make_zc_uri,  METH_VARARGS },
@@ -0,0 +1,629 @@
+/*****************************************************************************\
+ hpipext - Python extension for the HP image processor (libhpip)
+
+ (c) Copyright 2015 HP Development Company, L.P.
+
+ This program is free software; you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation; either version 2 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program; if not, write to the Free Software
+ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+Requires:
+Python 2.2+
+
+\*****************************************************************************/
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <string.h>
+#include "../hpip.h"
+
+/* Ref: PEP 353 (Python 2.5) */
+#if PY_VERSION_HEX < 0x02050000
+typedef int Py_ssize_t;
+#define PY_SSIZE_T_MAX INT_MAX
+#define PY_SSIZE_T_MIN INT_MIN
+#endif
+
+#if PY_MAJOR_VERSION >= 3
+    #define PyInt_AsLong PyLong_AsLong
+    #define PyInt_FromLong PyLong_FromLong
+    #define PyString_FromStringAndSize PyBytes_FromStringAndSize
+    #define BYTES_FORMAT "y#"
+
+    #define MOD_ERROR_VAL NULL
+    #define MOD_SUCCESS_VAL(val) val
+    #define MOD_INIT(name) PyMODINIT_FUNC PyInit_##name(void)
+    #define MOD_DEF(ob, name, doc, methods) \
+          static struct PyModuleDef moduledef = { \
+            PyModuleDef_HEAD_INIT, name, doc, -1, methods, }; \
+          ob = PyModule_Create(&moduledef);
+#else
+    #define BYTES_FORMAT "s#"
+
+    #define MOD_ERROR_VAL
+    #define MOD_SUCCESS_VAL(val)
+    #define MOD_INIT(name) void init##name(void)
+    #define MOD_DEF(ob, name, doc, methods) \
+          ob = Py_InitModule3(name, methods, doc);
+#endif
+
+
+/*
+HPIPEXT API:
+
+pipeline = open(xforms, traits, [strip_alpha])
+
+    xforms is a sequence of (xform, (info0, info1, ...)) tuples, eg.
+    ((X_SCALE, (h_factor, v_factor)), (X_JPG_ENCODE, ())). traits is
+    (pixels_per_row, bits_per_pixel, components_per_pixel, horiz_dpi,
+    vert_dpi, num_rows) of the raw raster fed to the first xform. If
+    strip_alpha is set the input is 4 bytes/pixel and the 4th byte is
+    dropped before conversion (scan buffers are RGBA).
+
+data = pipeline.convert(raster)
+
+    Feeds any number of input bytes, row boundaries need not be respected.
+    Returns the output bytes produced so far (may be empty).
+
+data = pipeline.flush()
+
+    Ends the input and returns the remaining output.
+
+seeks = pipeline.getSeeks()
+
+    [(file_pos, data), ...] - output the xforms wrote behind the current
+    file position (eg. the JPEG encoder filling in the row count when it
+    was not known up front). Apply these to the output file after flush().
+
+(pixels_per_row, bits_per_pixel, components_per_pixel, horiz_dpi, vert_dpi,
+ num_rows) = pipeline.getTraits()
+
+pipeline.close()
+
+*/
+
+#define OUT_CHUNK 65536
+
+static PyObject *ErrorObject;
+
+typedef struct
+{
+    PyObject_HEAD
+    IP_HANDLE hJob;
+    int strip_alpha;
+    int done;
+    BYTE carry[4];          /* partial RGBA pixel left over from the last convert() */
+    int carry_len;
+    DWORD pos;              /* output file position of the next sequential byte */
+    PyObject *seeks;        /* list of (pos, bytes) */
+} _Pipeline;
+
+static PyTypeObject Pipeline_type;
+
+typedef struct
+{
+    BYTE *buf;
+    DWORD len;
+    DWORD size;
+} OutBuf;
+
+
+static PyObject *raiseError(const char *str)
+{
+    PyErr_SetString(ErrorObject, str);
+    return NULL;
+}
+
+static int outbuf_reserve(OutBuf *ob, DWORD n)
+{
+    BYTE *p;
+
+    if (ob->len + n <= ob->size)
+        return 0;
+
+    ob->size = (ob->len + n) * 2;
+    if ((p = realloc(ob->buf, ob->size)) == NULL)
+        return 1;
+    ob->buf = p;
+    return 0;
+}
+
+/* Drop every 4th byte. Returns number of bytes written to dst. */
+static DWORD pack_rgb(_Pipeline *self, const BYTE *src, DWORD len, BYTE *dst)
+{
+    DWORD i = 0, n = 0;
+
+    if (self->carry_len)
+    {
+        while (self->carry_len < 4 && i < len)
+            self->carry[self->carry_len++] = src[i++];
+        if (self->carry_len < 4)
+            return 0;
+        memcpy(dst, self->carry, 3);
+        n = 3;
+        self->carry_len = 0;
+    }
+
+    for (; i + 4 <= len; i += 4, n += 3)
+    {
+        dst[n] = src[i];
+        dst[n+1] = src[i+1];
+        dst[n+2] = src[i+2];
+    }
+
+    while (i < len)
+        self->carry[self->carry_len++] = src[i++];
+
+    return n;
+}
+
+/* Sequential output goes to ob, output written behind the current position goes to self->seeks. */
+static int store_output(_Pipeline *self, OutBuf *ob, DWORD this_pos, DWORD used)
+{
+    PyObject *t;
+    DWORD behind = 0;
+
+    if (this_pos < self->pos)
+    {
+        behind = self->pos - this_pos;
+        if (behind > used)
+            behind = used;
+
+        t = Py_BuildValue("(k" BYTES_FORMAT ")", (unsigned long)this_pos, ob->buf + ob->len, (Py_ssize_t)behind);
+        if (t == NULL || PyList_Append(self->seeks, t) < 0)
+        {
+            Py_XDECREF(t);
+            return 1;
+        }
+        Py_DECREF(t);
+
+        if (behind < used)
+            memmove(ob->buf + ob->len, ob->buf + ob->len + behind, used - behind);
+    }
+
+    ob->len += used - behind;
+    self->pos = this_pos + used > self->pos ? this_pos + used : self->pos;
+    return 0;
+}
+
+/* Run ipConvert until it stops making progress. Input NULL means flush. */
+static PyObject *run_convert(_Pipeline *self, BYTE *in, DWORD in_len)
+{
+    OutBuf ob = { NULL, 0, 0 };
+    DWORD in_used, in_next_pos, out_used, out_this_pos, in_pos = 0;
+    WORD ret;
+    PyObject *data;
+
+    for (;;)
+    {
+        if (outbuf_reserve(&ob, OUT_CHUNK))
+        {
+            free(ob.buf);
+            return PyErr_NoMemory();
+        }
+
+        Py_BEGIN_ALLOW_THREADS
+        ret = ipConvert(self->hJob, in ? in_len - in_pos : 0, in ? in + in_pos : NULL,
+                        &in_used, &in_next_pos, OUT_CHUNK, ob.buf + ob.len, &out_used, &out_this_pos);
+        Py_END_ALLOW_THREADS
+
+        in_pos += in_used;
+
+        if (out_used && store_output(self, &ob, out_this_pos, out_used))
+        {
+            free(ob.buf);
+            return NULL;
+        }
+
+        if (ret & (IP_INPUT_ERROR | IP_FATAL_ERROR))
+        {
+            free(ob.buf);
+            self->done = 1;
+            return raiseError(ret & IP_INPUT_ERROR ? "Input error" : "Fatal error");
+        }
+
+        if (ret & IP_DONE)
+        {
+            self->done = 1;
+            break;
+        }
+
+        if (in_used == 0 && out_used == 0)
+        {
+            if (in == NULL)
+            {
+                /* Flushing must always make progress. */
+                free(ob.buf);
+                self->done = 1;
+                return raiseError("Pipeline stalled");
+            }
+            break;
+        }
+    }
+
+    data = PyString_FromStringAndSize((char *)ob.buf, ob.len);
+    free(ob.buf);
+    return data;
+}
+
+
+static PyObject *pipeline_convert(_Pipeline *self, PyObject *args)
+{
+    char *raster;
+    Py_ssize_t len;
+    BYTE *packed = NULL;
+    DWORD n;
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, BYTES_FORMAT, &raster, &len))
+        return NULL;
+
+    if (self->hJob == NULL || self->done)
+        return raiseError("Pipeline is closed");
+
+    if (!self->strip_alpha)
+        return run_convert(self, (BYTE *)raster, (DWORD)len);
+
+    if ((packed = malloc(len / 4 * 3 + 3)) == NULL)
+        return PyErr_NoMemory();
+
+    n = pack_rgb(self, (BYTE *)raster, (DWORD)len, packed);
+    data = n ? run_convert(self, packed, n) : PyString_FromStringAndSize("", 0);
+    free(packed);
+    return data;
+}
+
+
+static PyObject *pipeline_flush(_Pipeline *self, PyObject *args)
+{
+    if (!PyArg_ParseTuple(args, ""))
+        return NULL;
+
+    if (self->hJob == NULL)
+        return raiseError("Pipeline is closed");
+
+    if (self->done)
+        return PyString_FromStringAndSize("", 0);
+
+    return run_convert(self, NULL, 0);
+}
+
+
+static PyObject *pipeline_getSeeks(_Pipeline *self, PyObject *args)
+{
+    if (!PyArg_ParseTuple(args, ""))
+        return NULL;
+
+    Py_INCREF(self->seeks);
+    return self->seeks;
+}
+
+
+static PyObject *pipeline_getTraits(_Pipeline *self, PyObject *args)
+{
+    IP_IMAGE_TRAITS out;
+
+    if (!PyArg_ParseTuple(args, ""))
+        return NULL;
+
+    if (self->hJob == NULL)
+        return raiseError("Pipeline is closed");
+
+    /* Actual traits once the header was parsed, else the ones implied by the default input traits. */
+    if (ipGetImageTraits(self->hJob, NULL, &out) != IP_DONE &&
+        ipGetOutputTraits(self->hJob, &out) != IP_DONE)
+        return raiseError("Output traits not available");
+
+    return Py_BuildValue("(iiilll)", out.iPixelsPerRow, out.iBitsPerPixel, out.iComponentsPerPixel,
+                         out.lHorizDPI, out.lVertDPI, out.lNumRows);
+}
+
+
+static PyObject *pipeline_close(_Pipeline *self, PyObject *args)
+{
+    if (!PyArg_ParseTuple(args, ""))
+        return NULL;
+
+    if (self->hJob != NULL)
+    {
+        ipClose(self->hJob);
+        self->hJob = NULL;
+    }
+
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+
+static void deAlloc(_Pipeline *self)
+{
+    if (self->hJob != NULL)
+        ipClose(self->hJob);
+    Py_XDECREF(self->seeks);
+    PyObject_Del(self);
+}
+
+
+static PyMethodDef Pipeline_methods[] = {
+    {"convert", (PyCFunction) pipeline_convert, METH_VARARGS},
+    {"flush", (PyCFunction) pipeline_flush, METH_VARARGS},
+    {"getSeeks", (PyCFunction) pipeline_getSeeks, METH_VARARGS},
+    {"getTraits", (PyCFunction) pipeline_getTraits, METH_VARARGS},
+    {"close", (PyCFunction) pipeline_close, METH_VARARGS},
+    {NULL, NULL}
+};
+
+
+static PyTypeObject Pipeline_type =
+{
+    PyVarObject_HEAD_INIT( &PyType_Type, 0 ) /* ob_size */
+    "_Pipeline",                           /* tp_name */
+    sizeof(_Pipeline),                     /* tp_basicsize */
+    0,                                     /* tp_itemsize */
+    ( destructor ) deAlloc,                /* tp_dealloc */
+    0,                                     /* tp_print */
+    0,                                     /* tp_getattr */
+    0,                                     /* tp_setattr */
+    0,                                     /* tp_compare */
+    0,                                     /* tp_repr */
+    0,                                     /* tp_as_number */
+    0,                                     /* tp_as_sequence */
+    0,                                     /* tp_as_mapping */
+    0,                                     /* tp_hash */
+    0,                                     /* tp_call */
+    0,                                     /* tp_str */
+    PyObject_GenericGetAttr,               /* tp_getattro */
+    PyObject_GenericSetAttr,               /* tp_setattro */
+    0,                                     /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                    /* tp_flags */
+    "Image processor pipeline",            /* tp_doc */
+    0,                                     /* tp_traverse */
+    0,                                     /* tp_clear */
+    0,                                     /* tp_richcompare */
+    0,                                     /* tp_weaklistoffset */
+    0,                                     /* tp_iter */
+    0,                                     /* tp_iternext */
+    Pipeline_methods,                      /* tp_methods */
+    0,                                     /* tp_members */
+    0,                                     /* tp_getset */
+    0,                                     /* tp_base */
+    0,                                     /* tp_dict */
+    0,                                     /* tp_descr_get */
+    0,                                     /* tp_descr_set */
+    0,                                     /* tp_dictoffset */
+    0,                                     /* tp_init */
+    0,                                     /* tp_alloc */
+    0,                                     /* tp_new */
+};
+
+
+/* --------------------------------------------------------------------- */
+
+static int parse_xforms(PyObject *xforms, IP_XFORM_SPEC *spec, int *count)
+{
+    PyObject *seq, *item, *info;
+    Py_ssize_t n, i, j;
+    long xform;
+
+    if ((seq = PySequence_Fast(xforms, "xforms must be a sequence")) == NULL)
+        return 1;
+
+    n = PySequence_Fast_GET_SIZE(seq);
+    if (n < 1 || n > IP_MAX_XFORMS)
+    {
+        Py_DECREF(seq);
+        PyErr_SetString(PyExc_ValueError, "Invalid number of xforms");
+        return 1;
+    }
+
+    memset(spec, 0, sizeof(IP_XFORM_SPEC) * n);
+
+    for (i = 0; i < n; i++)
+    {
+        item = PySequence_Fast_GET_ITEM(seq, i);
+        info = NULL;
+
+        if (!PyArg_ParseTuple(item, "l|O", &xform, &info))
+            goto bugout;
+
+        if (xform < 0 || xform > X_SKEL)
+        {
+            PyErr_SetString(PyExc_ValueError, "Invalid xform");
+            goto bugout;
+        }
+
+        spec[i].eXform = (IP_XFORM)xform;
+
+        if (info != NULL)
+        {
+            PyObject *iseq = PySequence_Fast(info, "xform info must be a sequence");
+            if (iseq == NULL)
+                goto bugout;
+
+            if (PySequence_Fast_GET_SIZE(iseq) > IP_MAX_XFORM_INFO)
+            {
+                Py_DECREF(iseq);
+                PyErr_SetString(PyExc_ValueError, "Too many xform info items");
+                goto bugout;
+            }
+
+            for (j = 0; j < PySequence_Fast_GET_SIZE(iseq); j++)
+            {
+                spec[i].aXformInfo[j].dword = (DWORD)PyLong_AsUnsignedLongMask(PySequence_Fast_GET_ITEM(iseq, j));
+                if (PyErr_Occurred())
+                {
+                    Py_DECREF(iseq);
+                    goto bugout;
+                }
+            }
+            Py_DECREF(iseq);
+        }
+    }
+
+    Py_DECREF(seq);
+    *count = (int)n;
+    return 0;
+
+bugout:
+    Py_DECREF(seq);
+    return 1;
+}
+
+
+static PyObject *openPipeline(PyObject *self, PyObject *args)
+{
+    PyObject *xforms;
+    IP_XFORM_SPEC spec[IP_MAX_XFORMS];
+    IP_IMAGE_TRAITS traits;
+    int count = 0, strip_alpha = 0;
+    _Pipeline *p;
+
+    memset(&traits, 0, sizeof(traits));
+    traits.iNumPages = 1;
+    traits.iPageNum = 1;
+
+    if (!PyArg_ParseTuple(args, "O(iiilll)|i", &xforms, &traits.iPixelsPerRow, &traits.iBitsPerPixel,
+                          &traits.iComponentsPerPixel, &traits.lHorizDPI, &traits.lVertDPI,
+                          &traits.lNumRows, &strip_alpha))
+        return NULL;
+
+    if (parse_xforms(xforms, spec, &count))
+        return NULL;
+
+    if ((p = PyObject_New(_Pipeline, &Pipeline_type)) == NULL)
+        return NULL;
+
+    p->hJob = NULL;
+    p->strip_alpha = strip_alpha;
+    p->done = 0;
+    p->carry_len = 0;
+    p->pos = 0;
+    if ((p->seeks = PyList_New(0)) == NULL)
+    {
+        Py_DECREF(p);
+        return NULL;
+    }
+
+    if (ipOpen(count, spec, 0, &p->hJob) != IP_DONE)
+    {
+        p->hJob = NULL;
+        Py_DECREF(p);
+        return raiseError("ipOpen failed");
+    }
+
+    if (ipSetDefaultInputTraits(p->hJob, &traits) != IP_DONE)
+    {
+        Py_DECREF(p);
+        return raiseError("Invalid input traits");
+    }
+
+    return (PyObject *)p;
+}
+
+
+static PyMethodDef hpipext_functions[] =
+{
+    {"open", (PyCFunction)openPipeline, METH_VARARGS},
+    { NULL, NULL }
+};
+
+
+static char hpipext_documentation[] = "Python extension for the HP image processor";
+
+static void insint(PyObject *d, char *name, int value)
+{
+    PyObject *v = PyInt_FromLong((long) value);
+
+    if (!v || PyDict_SetItemString(d, name, v))
+        PyErr_Clear();
+
+    Py_XDECREF(v);
+}
+
+
+MOD_INIT(hpipext)  {
+    PyObject* mod;
+    PyObject* d;
+
+    MOD_DEF(mod, "hpipext", hpipext_documentation, hpipext_functions);
+    if (mod == NULL)
+        return MOD_ERROR_VAL;
+
+#if PY_MAJOR_VERSION >= 3
+    if (PyType_Ready(&Pipeline_type) < 0)
+        return MOD_ERROR_VAL;
+#endif
+
+    d = PyModule_GetDict(mod);
+
+    ErrorObject = PyErr_NewException("hpipext.error", NULL, NULL);
+    PyDict_SetItemString(d, "error", ErrorObject);
+
+    // enum IP_XFORM
+    insint(d, "X_FAX_ENCODE", X_FAX_ENCODE);
+    insint(d, "X_FAX_DECODE", X_FAX_DECODE);
+    insint(d, "X_JPG_ENCODE", X_JPG_ENCODE);
+    insint(d, "X_JPG_DECODE", X_JPG_DECODE);
+    insint(d, "X_PNM_ENCODE", X_PNM_ENCODE);
+    insint(d, "X_PNM_DECODE", X_PNM_DECODE);
+    insint(d, "X_SCALE", X_SCALE);
+    insint(d, "X_GRAY_2_BI", X_GRAY_2_BI);
+    insint(d, "X_BI_2_GRAY", X_BI_2_GRAY);
+    insint(d, "X_CNV_COLOR_SPACE", X_CNV_COLOR_SPACE);
+    insint(d, "X_CROP", X_CROP);
+    insint(d, "X_ROTATE", X_ROTATE);
+    insint(d, "X_PAD", X_PAD);
+    insint(d, "X_CHANGE_BPP", X_CHANGE_BPP);
+    insint(d, "X_INVERT", X_INVERT);
+    insint(d, "X_THUMB", X_THUMB);
+
+    // aXformInfo indexes
+    insint(d, "IP_SCALE_HORIZ_FACTOR", IP_SCALE_HORIZ_FACTOR);
+    insint(d, "IP_SCALE_VERT_FACTOR", IP_SCALE_VERT_FACTOR);
+    insint(d, "IP_SCALE_FAST", IP_SCALE_FAST);
+    insint(d, "IP_JPG_ENCODE_QUALITY_FACTORS", IP_JPG_ENCODE_QUALITY_FACTORS);
+    insint(d, "IP_JPG_ENCODE_SAMPLE_FACTORS", IP_JPG_ENCODE_SAMPLE_FACTORS);
+    insint(d, "IP_JPG_ENCODE_OUTPUT_DNL", IP_JPG_ENCODE_OUTPUT_DNL);
+    insint(d, "IP_FAX_FORMAT", IP_FAX_FORMAT);
+    insint(d, "IP_THUMB_SCALE_SPEC", IP_THUMB_SCALE_SPEC);
+    insint(d, "IP_BI_2_GRAY_OUTPUT_BPP", IP_BI_2_GRAY_OUTPUT_BPP);
+    insint(d, "IP_BI_2_GRAY_WHITE_PIXEL", IP_BI_2_GRAY_WHITE_PIXEL);
+    insint(d, "IP_BI_2_GRAY_BLACK_PIXEL", IP_BI_2_GRAY_BLACK_PIXEL);
+    insint(d, "IP_GRAY_2_BI_THRESHOLD", IP_GRAY_2_BI_THRESHOLD);
+    insint(d, "IP_CNV_COLOR_SPACE_WHICH_CNV", IP_CNV_COLOR_SPACE_WHICH_CNV);
+    insint(d, "IP_CNV_COLOR_SPACE_GAMMA", IP_CNV_COLOR_SPACE_GAMMA);
+    insint(d, "IP_CHANGE_BPP_OUTPUT_BPP", IP_CHANGE_BPP_OUTPUT_BPP);
+    insint(d, "IP_ROTATE_UPPER_LEFT", IP_ROTATE_UPPER_LEFT);
+    insint(d, "IP_ROTATE_UPPER_RIGHT", IP_ROTATE_UPPER_RIGHT);
+    insint(d, "IP_ROTATE_LOWER_LEFT", IP_ROTATE_LOWER_LEFT);
+    insint(d, "IP_ROTATE_OUTPUT_SIZE", IP_ROTATE_OUTPUT_SIZE);
+    insint(d, "IP_ROTATE_FAST", IP_ROTATE_FAST);
+    insint(d, "IP_PAD_LEFT", IP_PAD_LEFT);
+    insint(d, "IP_PAD_RIGHT", IP_PAD_RIGHT);
+    insint(d, "IP_PAD_TOP", IP_PAD_TOP);
+    insint(d, "IP_PAD_BOTTOM", IP_PAD_BOTTOM);
+    insint(d, "IP_PAD_VALUE", IP_PAD_VALUE);
+
+    // IP_FAX_FORMAT values
+    insint(d, "IP_FAX_MH", IP_FAX_MH);
+    insint(d, "IP_FAX_MR", IP_FAX_MR);
+    insint(d, "IP_FAX_MMR", IP_FAX_MMR);
+
+    // IP_CNV_COLOR_SPACE_WHICH_CNV values
+    insint(d, "IP_CNV_YCC_TO_SRGB", IP_CNV_YCC_TO_SRGB);
+    insint(d, "IP_CNV_SRGB_TO_YCC", IP_CNV_SRGB_TO_YCC);
+    insint(d, "IP_CNV_BGR_SWAP", IP_CNV_BGR_SWAP);
+
+    return MOD_SUCCESS_VAL(mod);
+}
+
@@ -296,6 +296,7 @@ typedef struct {
     UINT   wMinBits;     /* minimum # bits to output in each row     */
     int    iRowNum;      /* current row-number of output, 0 is first */
     BYTE  *prior_p;      /* (MR/MMR only) the prior row              */
+    BYTE  *row_p;        /* copy of the row being encoded            */
 
     /* Variables for "Outputting Bits" section */
     BYTE  *pbBufStart;   /* beginning of output buffer                  */
@@ -699,7 +700,7 @@ static void encode_row_1d (
     if (fDoingMR)
         put_bits_routine (g,1,1);  /* tag-bit after EOL means 1-dim row-data */
 
-    pbPixelRow[iPixels>>3] = 0x55u;   /* scan_to requires this */
+    pbPixelRow[(iPixels+7)>>3] = 0x55u;   /* scan_to requires this */
     iStartPos = 0;
     skip = 0;
 
@@ -866,8 +867,8 @@ static void encode_row_2d (
         put_bits_routine (g,1,0);  /* tag-bit after EOL means 2-dim row-data */
     }
 
-    pbPixelRow[iPixels>>3] = 0x55u;   /* scan_to requires this */
-    pbRefRow  [iPixels>>3] = 0x55u;   /* scan_to requires this */
+    pbPixelRow[(iPixels+7)>>3] = 0x55u;   /* scan_to requires this */
+    pbRefRow  [(iPixels+7)>>3] = 0x55u;   /* scan_to requires this */
 
     /* The imaginary pixel before the first is considered a white pixel.
      * So if the first pixel in the row is black, it is considered
@@ -1100,14 +1101,21 @@ static WORD faxEncode_getActualTraits (
     /* below, if vert dpi is unknown (negative), we use cycle-len of 2 */
     g->w12Cycle = (g->traits.lVertDPI < (150l<<16)) ? 2 : 4;
 
-    /* Allocate the prior-row buffer, if needed */
+    /* Allocate the row buffers. The encoder stores a sentinel for scan_to
+     * just past each row, so the rows are copied out of the input buffer
+     * (whose next row could be right there) into buffers with a spare byte.
+     */
+
+    inBytes = (g->iRowLen+7) / 8;
+    if (g->row_p != NULL)
+        IP_MEM_FREE (g->row_p);
+    IP_MEM_ALLOC (inBytes+1, g->row_p);
 
     if (g->wOutFmt != IP_FAX_MH) {
         if (g->prior_p != NULL)
             IP_MEM_FREE (g->prior_p);
-        inBytes = (g->iRowLen+7) / 8;
-        IP_MEM_ALLOC (inBytes, g->prior_p);
-        memset (g->prior_p, 0, inBytes);
+        IP_MEM_ALLOC (inBytes+1, g->prior_p);
+        memset (g->prior_p, 0, inBytes+1);
     }
 
     return IP_DONE | IP_READY_FOR_DATA;
@@ -1171,6 +1179,7 @@ static WORD faxEncode_convert (
     PENC_INST g;
     int       inBytes;
     int       i;
+    BYTE     *pbRow;
 
     HANDLE_TO_PTR (hXform, g);
 
@@ -1216,27 +1225,33 @@ static WORD faxEncode_convert (
     INSURE (dwInputAvail  >= (DWORD)inBytes);
     INSURE (dwOutputAvail >  0);
 
+    memcpy (g->row_p, pbInputBuf, inBytes);
+
     switch (g->wOutFmt) {
         case IP_FAX_MH:
-            encode_row_1d (g, pbInputBuf, g->iRowLen, FALSE);
+            encode_row_1d (g, g->row_p, g->iRowLen, FALSE);
             put_fill_bits (g);
         break;
 
         case IP_FAX_MR:
             if (g->iRowNum % g->w12Cycle == 0)
-                encode_row_1d (g, pbInputBuf, g->iRowLen, TRUE);
+                encode_row_1d (g, g->row_p, g->iRowLen, TRUE);
             else
-                encode_row_2d (g, pbInputBuf, g->prior_p, g->iRowLen, TRUE);
+                encode_row_2d (g, g->row_p, g->prior_p, g->iRowLen, TRUE);
             put_fill_bits (g);
         break;
 
         case IP_FAX_MMR:
-            encode_row_2d (g, pbInputBuf, g->prior_p, g->iRowLen, FALSE);
+            encode_row_2d (g, g->row_p, g->prior_p, g->iRowLen, FALSE);
         break;
     }
 
-    if (g->prior_p != NULL)
-        memcpy (g->prior_p, pbInputBuf, inBytes);
+    if (g->prior_p != NULL) {
+        /* this row is the prior row of the next one */
+        pbRow      = g->prior_p;
+        g->prior_p = g->row_p;
+        g->row_p   = pbRow;
+    }
 
     *pdwInputUsed     = inBytes;
     g->dwInNextPos   += inBytes;
@@ -1307,6 +1322,8 @@ static WORD faxEncode_closeXform (IP_XFORM_HANDLE hXform)
 
     if (g->prior_p != NULL)
         IP_MEM_FREE (g->prior_p);
+    if (g->row_p != NULL)
+        IP_MEM_FREE (g->row_p);
 
     g->dwValidChk = 0;
     IP_MEM_FREE (g);       /* free memory for the instance */
@@ -2477,8 +2494,8 @@ static WORD faxDecode_getActualTraits (
 
     if (g->prior_p != NULL)
         IP_MEM_FREE (g->prior_p);
-    IP_MEM_ALLOC (inBytes, g->prior_p);
-    memset (g->prior_p, 0, inBytes);
+    IP_MEM_ALLOC (inBytes+1, g->prior_p);   /* +1 for the scan_to sentinel */
+    memset (g->prior_p, 0, inBytes+1);
 
     return IP_DONE | IP_READY_FOR_DATA;
 
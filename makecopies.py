@@ -36,7 +36,7 @@ import operator
 
 # Local
 from base.g import *
-from base import utils, device, pml, tui, module
+from base import utils, device, pml, tui, module, jobmonitor
 from copier import copier
 from prnt import cups
 
@@ -302,7 +302,7 @@ else: # NON_INTERACTIVE_MODE
             log.debug("scan_src = %d" % scan_src)
 
             update_queue = queue.Queue()
-            event_queue = queue.Queue()
+            event_queue = jobmonitor.EventQueue()
 
             dev.copy(num_copies, contrast, reduction,
                      quality, fit_to_page, scan_src,
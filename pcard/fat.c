@@ -225,8 +225,11 @@ int UpdateFat(void)
       for (i=0; i<bpb.SectorsPerFat; i++)
       {
          if (memcmp(p12+total, da.Fat12+total, FAT_HARDSECT) != 0)
+         {
             if (writesect(da.FatStartSector+i, 1, p12+total, FAT_HARDSECT) != 0)
                goto bugout;
+            memcpy(da.Fat12+total, p12+total, FAT_HARDSECT);   /* backup is what's on the card */
+         }
          total += FAT_HARDSECT;
       }
    }
@@ -235,8 +238,11 @@ int UpdateFat(void)
       for (i=0; i<bpb.SectorsPerFat; i++)
       {
          if (memcmp(da.Fat+total, da.Fat16+total, FAT_HARDSECT) != 0)
+         {
             if (writesect(da.FatStartSector+i, 1, da.Fat+total, FAT_HARDSECT) != 0)
                goto bugout;
+            memcpy(da.Fat16+total, da.Fat+total, FAT_HARDSECT);   /* backup is what's on the card */
+         }
          total += FAT_HARDSECT;
       }
    }
@@ -352,7 +358,7 @@ int LoadFileInCWD(int filenumber)
    if (pde->Ext[0] && (pde->Ext[0] != ' '))
    {
       fa.Name[i++] = '.';
-      for (j=0; (pde->Ext[j] != ' ') && (j<sizeof(pde->Ext)); j++, i++)  /* copy charactors up to space */
+      for (j=0; (j<sizeof(pde->Ext)) && (pde->Ext[j] != ' '); j++, i++)  /* copy charactors up to space */
          fa.Name[i] = pde->Ext[j];
    }
    
@@ -420,8 +426,11 @@ int FatInit(void)
       free(da.Fat);
    if (da.Fat12 != NULL)
       free(da.Fat12);
+   if (da.Fat16 != NULL)
+      free(da.Fat16);
    da.Fat = NULL;
    da.Fat12 = NULL;
+   da.Fat16 = NULL;
 
    /* Assume no MBR and boot sector starts at first sector. */
    bootsector_startsector = 0;
@@ -508,6 +517,9 @@ bugout:
          free(da.Fat12);
       if (da.Fat16 != NULL)
          free(da.Fat16);
+      da.Fat = NULL;
+      da.Fat12 = NULL;
+      da.Fat16 = NULL;
    }
    return stat;
 }
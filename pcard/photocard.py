@@ -22,12 +22,17 @@ import struct
 import time
 import fnmatch
 import mimetypes
-import array
+import io
+import errno
+import hashlib
+import threading
+import collections
 
 # Local
 from base.g import *
 from base.codes import *
 from base import device, utils, exif
+from base.sixext.moves import queue
 
 try:
     from . import pcardext
@@ -47,64 +52,350 @@ SECTOR_SIZE = 512 # don't change this (TODO: impl. in pcardext)
 # Photocard sector cache
 MAX_CACHE = 512 # units = no. sectors 
 
-# PhotoCardFile byte cache
-# Used for thumbnails
-INITIAL_PCARDFILE_BUFFER = 20*SECTOR_SIZE 
-INCREMENTAL_PCARDFILE_BUFFER = 2*SECTOR_SIZE 
+# Photocard write-back
+WRITE_BACK_MAX_SECTORS = 3 # sectors per write command, pcardext's block size (FAT_BLKSIZE)
 
-class PhotoCardFile:    
-    # File-like interface
+# Unload pipeline
+UNLOAD_CHUNK_SIZE = 512*SECTOR_SIZE # bytes per pcardext.read() and local write
+UNLOAD_QUEUE_CHUNKS = 8 # chunks read from the card ahead of the local writes
+UNLOAD_HEAD_SIZE = 128*SECTOR_SIZE # bytes hashed to tell files apart without reading them whole
+UNLOAD_JOURNAL = '.hp-unload-journal' # in the local directory
 
-    def __init__(self, pc, name=None):
-        self.pos = 0
-        self.closed = True
-        self.file_size = 0
+# PhotoCardFile page cache
+PCARDFILE_PAGE_SIZE = 8*SECTOR_SIZE # bytes, the unit files are read from the card in
+PCARDFILE_MAX_PAGES = 64 # pages kept per open file, larger reads bypass the cache
+
+class PhotoCardFile(io.RawIOBase):
+    # Read-only, random access file on the photo card. Only the pages a
+    # read touches are read from the card, each missing run of pages
+    # with one pcardext.read(). The file is in dirs ([dir, ...] from the
+    # root), by default the current directory.
+
+    def __init__(self, pc, name, size=None, dirs=None):
+        io.RawIOBase.__init__(self)
         self.pc = pc
-        self.buffer = array.array('c') 
+        self.name = name
+        self.pos = 0
+        self.pages = collections.OrderedDict() # { page no. : data, ... } least recently used first
 
-        if name is not None:
-            self.open(name)
+        if dirs is None:
+            dirs = pc.dir_stack.as_list()
+        self.dirs = list(dirs)
 
-        self.buffer_size = INITIAL_PCARDFILE_BUFFER
-        self.buffer.fromstring(pcardext.read(self.name, 0, self.buffer_size))
+        if size is None:
+            size = pc.size(name)
+        self.file_size = size
 
 
-    def open(self, name):
-        self.closed = False
-        self.name = name
+    def readable(self):
+        return True
 
-    def seek(self, offset, whence=0):
-        if whence == 0:
-            self.pos = offset
-        elif whence == 1:
-            self.pos += offset
-        elif whence == 2:
-            self.pos = self.file_size - offset
+
+    def seekable(self):
+        return True
+
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.file_size + offset
         else:
-            return
+            raise ValueError("invalid whence (%r)" % whence)
+
+        if pos < 0:
+            raise ValueError("negative seek position %d" % pos)
+
+        self.pos = pos
+        return self.pos
 
 
     def tell(self):
+        self._checkClosed()
         return self.pos
 
 
-    def read(self, size): 
-        if size > 0:
-            if self.pos + size < self.buffer_size:
-                data = self.buffer[self.pos : self.pos + size].tostring()
-                self.pos += size
-                return data
-            else:
-                # Read some more in from the card to satisfy the request
-                while self.pos + size >= self.buffer_size:
-                    self.buffer.fromstring(pcardext.read(self.name, self.buffer_size, INCREMENTAL_PCARDFILE_BUFFER))
-                    self.buffer_size += INCREMENTAL_PCARDFILE_BUFFER
-                return self.read(size)
+    def readinto(self, b):
+        self._checkClosed()
+        size = min(len(b), self.file_size - self.pos)
+        if size <= 0:
+            return 0
+
+        b[:size] = self.read_range(self.pos, size)
+        self.pos += size
+        return size
+
+
+    def read_range(self, offset, size):
+        """ Returns size bytes at offset, which must be inside the file. """
+        first = offset // PCARDFILE_PAGE_SIZE
+        last = (offset + size - 1) // PCARDFILE_PAGE_SIZE
+
+        if last - first >= PCARDFILE_MAX_PAGES:
+            return self.__fetch(offset, size)
+
+        chunks = []
+        page = first
+        while page <= last:
+            if page in self.pages:
+                data = self.pages.pop(page)
+                self.pages[page] = data
+                chunks.append(data)
+                page += 1
+                continue
+
+            end = page + 1
+            while end <= last and end not in self.pages:
+                end += 1
+
+            start = page * PCARDFILE_PAGE_SIZE
+            data = self.__fetch(start, min(end * PCARDFILE_PAGE_SIZE, self.file_size) - start)
+
+            for i in range(0, len(data), PCARDFILE_PAGE_SIZE):
+                self.pages[page] = data[i:i + PCARDFILE_PAGE_SIZE]
+                chunks.append(self.pages[page])
+                page += 1
+
+            while len(self.pages) > PCARDFILE_MAX_PAGES:
+                self.pages.popitem(last=False)
+
+        skip = offset - first * PCARDFILE_PAGE_SIZE
+        return b''.join(chunks)[skip:skip + size]
+
+
+    def __fetch(self, offset, size):
+        self.pc._card_cd(self.dirs)
+        return read_file(self.name, offset, size)
 
 
     def close(self):
-        self.closed = True
-        self.pos = 0
+        self.pages.clear()
+        io.RawIOBase.close(self)
+
+
+def read_file(name, offset, size):
+    # pcardext.read() returns '' unless it can read all of it
+    data = pcardext.read(name, offset, size)
+    if len(data) != size:
+        raise IOError(errno.EIO, "Photo card read failed: %s at %d" % (name, offset))
+
+    log.debug("read pcard file: name=%s offset=%d len=%d" % (name, offset, size))
+    return data
+
+
+def file_sha1(path, size=None):
+    # SHA-1 of a local file, or of its first size bytes
+    h = hashlib.sha1()
+    f = open(path, 'rb')
+    try:
+        while size is None or size > 0:
+            data = f.read(UNLOAD_CHUNK_SIZE if size is None else min(size, UNLOAD_CHUNK_SIZE))
+            if not data:
+                break
+            h.update(data)
+            if size is not None:
+                size -= len(data)
+    finally:
+        f.close()
+
+    return h.hexdigest()
+
+
+class PhotoCardImage:
+    # Stands in for the device with a FAT image file standing in for the
+    # card: answers the photo card read and write commands from the image.
+    # PhotoCard(PhotoCardImage('card.img')) can then be mounted as usual.
+
+    def __init__(self, image_file, write_protect=False):
+        self.device_uri = 'file:' + os.path.abspath(image_file)
+        self.write_protect = write_protect
+        self.image = open(image_file, 'rb' if write_protect else 'r+b')
+        self.response = b''
+
+    def openPCard(self):
+        pass
+
+    def closePCard(self):
+        pass
+
+    def close(self):
+        self.image.close()
+
+    def writePCard(self, request):
+        cmd, nsector = struct.unpack('!HH', request[:4])
+
+        if cmd == READ_CMD:
+            data = []
+            for sector in struct.unpack('!' + 'I'*nsector, request[4:4 + 4*nsector]):
+                self.image.seek(sector * SECTOR_SIZE)
+                data.append(self.image.read(SECTOR_SIZE).ljust(SECTOR_SIZE, b'\0'))
+            self.response = struct.pack('!HIH', 0x0110, nsector, 0) + b''.join(data)
+
+        elif cmd == WRITE_CMD:
+            if self.write_protect:
+                self.response = struct.pack('!H', NAK)
+            else:
+                sectors = struct.unpack('!' + 'I'*nsector, request[6:6 + 4*nsector])
+                data = request[6 + 4*nsector:]
+                for i, sector in enumerate(sectors):
+                    self.image.seek(sector * SECTOR_SIZE)
+                    self.image.write(data[i*SECTOR_SIZE : (i+1)*SECTOR_SIZE])
+                self.image.flush()
+                self.response = struct.pack('!H', ACK)
+
+        return len(request)
+
+    def readPCard(self, bytes_to_read):
+        data, self.response = self.response[:bytes_to_read], self.response[bytes_to_read:]
+        return data
+
+
+class UnloadFile:
+    # A file being unloaded
+    def __init__(self, card_path, name, size, target, unique_name):
+        self.card_path = card_path
+        self.name = name # in its card directory
+        self.size = size
+        self.target = target # local path
+        self.part = os.path.join(os.path.dirname(target), '.%s.part' % os.path.basename(target))
+        self.unique_name = unique_name # True: don't replace a different local file of the same name
+        self.head = None # SHA-1 of the first UNLOAD_HEAD_SIZE bytes
+        self.offset = 0 # bytes already in the part file
+        self.local = None # local path once unloaded
+
+
+class UnloadJournal:
+    # Files unloaded to a directory, a line each, so an interrupted unload
+    # can skip them: card path, size, SHA-1 of the first UNLOAD_HEAD_SIZE
+    # bytes (to tell it from another card's file of the same name and size),
+    # local name and SHA-1.
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, UNLOAD_JOURNAL)
+        self.entries = {} # { card path : (size, head SHA-1, local name, SHA-1), ... }
+
+        try:
+            f = open(self.path, 'r')
+        except IOError:
+            return
+
+        try:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) == 5 and fields[1].isdigit():
+                    self.entries[fields[0]] = (int(fields[1]), fields[2], fields[3], fields[4])
+        finally:
+            f.close()
+
+
+    def find(self, card_path, size, head):
+        # Local path of an earlier, intact copy of the file, else None
+        entry = self.entries.get(card_path)
+        if entry is None or entry[0] != size or entry[1] != head:
+            return None
+
+        local = os.path.join(os.path.dirname(self.path), entry[2])
+        if not os.path.isfile(local) or os.path.getsize(local) != size or file_sha1(local) != entry[3]:
+            return None
+
+        return local
+
+
+    def add(self, card_path, size, head, local_name, sha1):
+        self.entries[card_path] = (size, head, local_name, sha1)
+        f = open(self.path, 'a')
+        try:
+            f.write('\t'.join([card_path, str(size), head, local_name, sha1]) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+
+
+    def remove(self):
+        # Once everything is unloaded there is nothing to resume
+        self.entries = {}
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class UnloadWriter(threading.Thread):
+    # Writes the file data the card reader queues to local files, so the
+    # next read from the card overlaps the local write. Each file goes to a
+    # part file that is renamed once complete.
+
+    def __init__(self, journal):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.journal = journal
+        self.chunks = queue.Queue(UNLOAD_QUEUE_CHUNKS) # ('file', UnloadFile), ('data', bytes), ('end'|'abort'|'quit', None)
+        self.results = queue.Queue() # (UnloadFile, None or error)
+
+
+    def run(self):
+        f = item = sha1 = None
+
+        while True:
+            cmd, arg = self.chunks.get()
+            if cmd == 'quit':
+                break
+
+            try:
+                if cmd == 'file':
+                    item, sha1 = arg, hashlib.sha1()
+                    if item.offset:
+                        # resume the part file
+                        f = open(item.part, 'r+b')
+                        sha1.update(f.read(item.offset))
+                        f.seek(item.offset)
+                        f.truncate()
+                    else:
+                        f = open(item.part, 'wb')
+
+                elif f is None:
+                    continue
+
+                elif cmd == 'data':
+                    f.write(arg)
+                    sha1.update(arg)
+
+                elif cmd == 'end':
+                    f.close()
+                    f = None
+                    self.finish(item, sha1.hexdigest())
+                    self.results.put((item, None))
+
+                elif cmd == 'abort':
+                    f.close() # keep the part file to resume from
+                    f = None
+
+            except (IOError, OSError) as e:
+                if f is not None:
+                    f.close()
+                    f = None
+                self.results.put((item, e))
+
+        if f is not None:
+            f.close()
+
+
+    def finish(self, item, sha1):
+        target = item.target
+        if item.unique_name and os.path.exists(target):
+            i = 2
+            while os.path.exists(target + " (%d)" % i):
+                i += 1
+            target += " (%d)" % i
+
+        os.rename(item.part, target)
+        item.local = target
+
+        self.journal.add(item.card_path, item.size, item.head, os.path.basename(item.local), sha1)
 
 
 class PhotoCard:
@@ -121,6 +412,8 @@ class PhotoCard:
 
         self.dir_stack = utils.Stack()
         self.current_dir = []
+        self.dir_index = {} # { (dir, ...) : [(name, attr, size), ...], ... } directories listed since mount
+        self.card_dir = [] # pcardext's working directory
         self.device_uri = self.device.device_uri
         self.pcard_mounted = False
         self.saved_pwd = []
@@ -128,10 +421,14 @@ class PhotoCard:
         self.sector_buffer_counts = {}
         self.cache_flag = True
         self.write_protect = False
+        self.write_back = False
+        self.write_back_sectors = {} # { sector : data, ... } held for commit()
+        self.fat_sectors = (0, 0) # first sector of the FATs, sector after them
 
         self.callback = None
 
         self.channel_opened = False
+        self.unload_bytes, self.unload_start = 0, time.time()
 
 
     def START_OPERATION(self, name=''):
@@ -144,7 +441,24 @@ class PhotoCard:
     def set_callback(self, callback):
         self.callback = callback
 
-    def _read(self, sector, nsector): 
+    def _read(self, sector, nsector):
+        if self.write_back_sectors:
+            sectors = range(sector, sector+nsector)
+            held = [s for s in sectors if s in self.write_back_sectors]
+            if held:
+                if len(held) == nsector:
+                    return ''.join([self.write_back_sectors[s] for s in sectors])
+
+                buffer = self.__read(sector, nsector)
+                if len(buffer) < nsector*SECTOR_SIZE:
+                    return buffer
+
+                return ''.join([self.write_back_sectors.get(s, buffer[i*SECTOR_SIZE : (i+1)*SECTOR_SIZE])
+                                for i, s in enumerate(sectors)])
+
+        return self.__read(sector, nsector)
+
+    def __read(self, sector, nsector):
         log.debug("read pcard sector: sector=%d count=%d" % (sector, nsector))
 
         if self.cache_flag:
@@ -231,6 +545,15 @@ class PhotoCard:
             return ''
 
     def _write(self, sector, nsector, buffer):
+        if self.write_back:
+            log.debug("write back pcard sector: sector=%d count=%d" % (sector, nsector))
+            for i in range(nsector):
+                self.write_back_sectors[sector+i] = buffer[i*SECTOR_SIZE : (i+1)*SECTOR_SIZE]
+            return 0
+
+        return self.__write(sector, nsector, buffer)
+
+    def __write(self, sector, nsector, buffer):
 
         #log.debug("write pcard sector: sector=%d count=%d len=%d data=\n%s" % (sector, nsector, len(buffer), repr(buffer)))
         log.debug("write pcard sector: sector=%d count=%d len=%d" % (sector, nsector, len(buffer)))
@@ -284,6 +607,59 @@ class PhotoCard:
             return 1
 
 
+    # Until commit(), sectors pcardext writes are only kept, so a sector
+    # rewritten by one rm after another goes to the card once.
+    def start_write_back(self):
+        self.write_back = True
+
+    # Writes the sectors held since start_write_back(), contiguous ones
+    # together, everything else before the FATs: a card pulled in between
+    # is left with clusters no file uses rather than files in free clusters.
+    # Returns 0, or 1 if a write failed and the rest were dropped; pcardext
+    # is then mounted again, as its FAT has the changes the card doesn't.
+    def commit(self):
+        self.write_back = False
+        held, self.write_back_sectors = self.write_back_sectors, {}
+
+        start, end = self.fat_sectors
+        sectors = sorted(held)
+        fat = [s for s in sectors if start <= s < end]
+        other = [s for s in sectors if not start <= s < end]
+
+        for run in (other, fat):
+            i = 0
+            while i < len(run):
+                j = i + 1
+                while j < len(run) and j-i < WRITE_BACK_MAX_SECTORS and run[j] == run[j-1]+1:
+                    j += 1
+
+                if self.__write(run[i], j-i, ''.join([held[s] for s in run[i:j]])) != 0:
+                    log.error("Photo card changes not written: %d sectors" % len(held))
+                    self.__remount()
+                    return 1
+
+                for s in run[i:j]:
+                    del held[s]
+                i = j
+
+        return 0
+
+    def __remount(self):
+        # Reads the FAT and the directories from the card again. pcardext
+        # is left in the root directory.
+        self.index_reset()
+        self.card_dir = []
+
+        if pcardext.mount(self._read, self._write) != 0:
+            log.error("Unable to mount photo card again")
+            self.pcard_mounted = False
+            return
+
+        self.write_protect = pcardext.info()[8]
+        if not self.channel_opened:
+            # a NAK'd write closed it
+            self.open_channel()
+
     def _check_cache(self, nsector):
         if len(self.sector_buffer) > MAX_CACHE:
             # simple minded: scan for first nsector sectors that has count of 1 and throw it away
@@ -328,27 +704,95 @@ class PhotoCard:
             self.END_OPERATION('df')
             return df
 
+    # The listing comes from the directory index, so a directory is read
+    # from the card once per mount (see index_reset())
     def ls(self, force_read=True, glob_list='*', openclose=True):
         if not glob_list:
             glob_list = '*'
         if force_read:
             self.START_OPERATION('ls')
             try:
-                self.current_dir = pcardext.ls()
+                self.current_dir = self.__listing(self.dir_stack.as_list())
             finally:
                 self.END_OPERATION('ls', openclose)
 
-        self.current_dir = [(n.lower(),a,s) for (n,a,s) in self.current_dir]
-
         if glob_list == '*':
             return self.current_dir
 
         return [fnmatch.filter(self.current_dir, x) for x in glob_list.strip().lower().split()][0]
 
+    # (name, attr, size) of a file or directory on the card, path from the
+    # root or the current directory, or None if there isn't one
+    def lookup(self, path, openclose=True):
+        entry = None
+        self.START_OPERATION('lookup')
+        try:
+            entry = self.__find(self.__path(path))
+        finally:
+            self.END_OPERATION('lookup', openclose)
+
+        return entry
+
+    def index_reset(self):
+        self.dir_index.clear()
+
+    def _card_cd(self, dirs):
+        # Puts pcardext in dirs ([dir, ...] from the root), if it isn't
+        # there already. pcardext.cd() searches the directory it is in.
+        n = len(self.card_dir)
+        if dirs[:n] != self.card_dir:
+            pcardext.cd('/')
+            n = 0
+
+        for d in dirs[n:]:
+            pcardext.cd(d)
+
+        self.card_dir = list(dirs)
+
+    def __listing(self, dirs):
+        key = tuple(dirs)
+        if key not in self.dir_index:
+            self._card_cd(dirs)
+            self.dir_index[key] = [(n.lower(),a,s) for (n,a,s) in pcardext.ls()]
+
+        return self.dir_index[key]
+
+    def __find(self, dirs):
+        entry = ('/', 'd', 0)
+        for i, name in enumerate(dirs):
+            if entry[1] != 'd':
+                return None
+
+            for e in self.__listing(dirs[:i]):
+                if e[0] == name:
+                    entry = e
+                    break
+            else:
+                return None
+
+        return entry
+
+    def __path(self, path):
+        # [dir, ..., name] from the root
+        if path.startswith('/'):
+            dirs = []
+        else:
+            dirs = self.dir_stack.as_list()[:]
+
+        for p in path.lower().split('/'):
+            if p == '..':
+                if dirs:
+                    dirs.pop()
+            elif p not in ('', '.'):
+                dirs.append(p)
+
+        return dirs
+
     def size(self, name):
-        for f in self.current_dir:
-            if f == name:
-                return self.current_dir[f][2]
+        name = name.lower()
+        for n, a, s in self.current_dir:
+            if n == name:
+                return s
         return 0
 
     def current_files(self):
@@ -380,6 +824,7 @@ class PhotoCard:
         self.START_OPERATION('cp')
         total = 0
         try:
+            self._card_cd(self.dir_stack.as_list())
             f = open(local_file, 'w');
             total = pcardext.cp(name, f.fileno())
             f.close()
@@ -393,19 +838,10 @@ class PhotoCard:
         self.START_OPERATION('cp_multiple')
         t1 = time.time()
         try:
-            for f in filelist:
-
-                size = self.cp(f, f, False)
-
-                if cp_status_callback:
-                    cp_status_callback(os.path.join(self.pwd(), f), os.path.join(os.getcwd(), f), size)
-
-                total += size
-
-
-                if remove_after_copy:
-                    pcardext.rm(f)
-
+            pwd = self.pwd().rstrip('/')
+            files = [('/'.join([pwd, f]), self.size(f)) for f in filelist]
+            total, was_cancelled = self.__unload_files(files, cp_status_callback, rm_status_callback,
+                                                       remove_after_copy, False, False)
             t2 = time.time()
             delta = t2-t1
         finally:
@@ -420,6 +856,8 @@ class PhotoCard:
         delta, total = 0, 0
         self.START_OPERATION('cp_list')
         t1 = time.time()
+        if remove_after_copy:
+            self.start_write_back()
         try:
             for f in filelist:
 
@@ -437,7 +875,7 @@ class PhotoCard:
                 total += size    
 
                 if remove_after_copy:
-                    pcardext.rm(filename)
+                    self.__rm(self.dir_stack.as_list(), filename)
 
                     if rm_status_callback is not None:
                         rm_status_callback(f)
@@ -447,6 +885,8 @@ class PhotoCard:
             t2 = time.time()
             delta = t2-t1
         finally:
+            if remove_after_copy:
+                self.commit()
             #if remove_after_copy:
             #    self.ls( True, '*', False )
             self.restore_wd()
@@ -459,6 +899,7 @@ class PhotoCard:
         total = 0
         self.START_OPERATION('cp_fd')
         try:
+            self._card_cd(self.dir_stack.as_list())
             total = pcardext.cp(name, fd)
         finally:
             self.END_OPERATION('cp_fd')
@@ -466,64 +907,162 @@ class PhotoCard:
 
 
     def unload(self, unload_list, cp_status_callback=None, rm_status_callback=None, dont_remove=False):
-        was_cancelled = False
         self.save_wd()
         self.START_OPERATION('unload')
-        total = 0
         t1 = time.time()
 
-        for f in unload_list:
-            if not was_cancelled:
-                name, size, typ, subtyp = f
+        try:
+            files = [(name, size) for name, size, typ, subtyp in unload_list]
+            total, was_cancelled = self.__unload_files(files, cp_status_callback, rm_status_callback,
+                                                       not dont_remove, True, True)
+        finally:
+            t2 = time.time()
+            self.restore_wd(False)
+            self.ls(True, '*', False)
+            self.END_OPERATION('unload')
+
+        return total, (t2-t1), was_cancelled
 
-                p = name.split('/')
-                dirs = p[:-1]
-                filename = p[-1]
-                self.cd('/', False)
 
-                if cp_status_callback is not None:
-                    if cp_status_callback(os.path.join(self.pwd(), filename), 
-                                            os.path.join(os.getcwd(), filename), 0):
-                        was_cancelled = True
-                        break
+    def unload_rate(self):
+        # bytes per second read from the card by the current or last unload
+        t = time.time() - self.unload_start
+        if t > 0:
+            return self.unload_bytes / t
+        return 0.0
 
-                if len(dirs) > 0:
-                    for d in dirs:
-                        self.cd(d, False)
 
-                if os.path.exists(os.path.join(os.getcwd(), filename)):
-                    i = 2
+    def __unload_files(self, files, cp_status_callback, rm_status_callback, remove, unique_names, announce):
+        # Copies [(card path, size), ...] to the local directory (not keeping
+        # card subdirectories). Card reads are here, local writes in an
+        # UnloadWriter. Files already unloaded (in the journal, or with the
+        # same size and head under the local name) aren't read past the head
+        # again, an interrupted copy resumes from its part file. Returns
+        # (bytes read from the card, cancelled).
+        journal = UnloadJournal(os.getcwd())
+        writer = UnloadWriter(journal)
+        writer.start()
 
-                    while True:
-                        if not os.path.exists(os.path.join(os.getcwd(), filename + " (%d)" % i)):
-                            break
+        self.unload_bytes, self.unload_start = 0, time.time()
+        unloaded = [] # UnloadFiles that can be removed from the card
+        was_cancelled = False
+
+        try:
+            for card_path, size in files:
+                p = card_path.split('/')
+                dirs, filename = [d for d in p[:-1] if d], p[-1]
+                src = '/' + '/'.join(dirs + [filename])
+                item = UnloadFile(src, filename, size, os.path.join(os.getcwd(), filename), unique_names)
+
+                if announce and cp_status_callback is not None and cp_status_callback(src, item.target, 0):
+                    was_cancelled = True
+                    break
 
-                        i += 1
+                self._card_cd(dirs)
+                data = read_file(filename, 0, min(UNLOAD_HEAD_SIZE, size))
+                self.unload_bytes += len(data)
+                item.head = hashlib.sha1(data).hexdigest()
+
+                local = journal.find(src, size, item.head)
+                if local is not None:
+                    log.debug("%s was unloaded to %s" % (src, local))
+                    item.local = local
+                    unloaded.append(item)
+                    if cp_status_callback is not None and cp_status_callback(src, local, size):
+                        was_cancelled = True
+                        break
+                    continue
+
+                if os.path.isfile(item.target) and os.path.getsize(item.target) == size and \
+                    file_sha1(item.target, UNLOAD_HEAD_SIZE) == item.head:
+                    log.debug("%s is already in %s" % (src, item.target))
+                    item.local = item.target
+                    journal.add(src, size, item.head, filename, file_sha1(item.target))
+                    unloaded.append(item)
+                    if cp_status_callback is not None and cp_status_callback(src, item.local, size):
+                        was_cancelled = True
+                        break
+                    continue
 
-                    total += self.cp(filename, filename + " (%d)" % i, False)
+                if os.path.isfile(item.part) and len(data) <= os.path.getsize(item.part) <= size and \
+                    file_sha1(item.part, len(data)) == hashlib.sha1(data).hexdigest():
+                    item.offset = os.path.getsize(item.part)
+                    log.debug("Resuming %s at %d" % (src, item.offset))
 
-                else:    
-                    total += self.cp(filename, filename, False)
+                writer.chunks.put(('file', item))
+                offset = item.offset
+                if not offset:
+                    writer.chunks.put(('data', data))
+                    offset = len(data)
 
-                if cp_status_callback is not None:
-                    if cp_status_callback(os.path.join(self.pwd(), filename), 
-                                            os.path.join(os.getcwd(), filename), size):
+                while offset < size:
+                    if self.__unload_results(writer, unloaded, cp_status_callback):
                         was_cancelled = True
                         break
 
-                if not dont_remove:
+                    self._card_cd(dirs)
+                    data = read_file(filename, offset, min(UNLOAD_CHUNK_SIZE, size - offset))
+                    writer.chunks.put(('data', data))
+                    offset += len(data)
+                    self.unload_bytes += len(data)
+
+                if was_cancelled:
+                    writer.chunks.put(('abort', None))
+                    break
+
+                writer.chunks.put(('end', None))
+                if self.__unload_results(writer, unloaded, cp_status_callback):
+                    was_cancelled = True
+                    break
+
+        except (IOError, OSError) as e:
+            log.error("Unload stopped: %s" % e)
+            writer.chunks.put(('abort', None))
+            was_cancelled = True
+
+        writer.chunks.put(('quit', None))
+        writer.join()
+
+        try:
+            if self.__unload_results(writer, unloaded, cp_status_callback):
+                was_cancelled = True
+        except (IOError, OSError) as e:
+            log.error("Unload stopped: %s" % e)
+            was_cancelled = True
+
+        if not was_cancelled:
+            journal.remove()
+
+        if remove and unloaded:
+            self.start_write_back()
+            try:
+                for item in unloaded:
                     if rm_status_callback is not None:
-                        rm_status_callback(os.path.join(self.pwd(), filename))
+                        rm_status_callback(item.card_path)
+
+                    self.__rm([d for d in item.card_path.split('/')[:-1] if d], item.name)
+            finally:
+                self.commit()
+
+        return self.unload_bytes, was_cancelled
 
-                    self.rm(filename, False, False)
 
+    def __unload_results(self, writer, unloaded, cp_status_callback):
+        # Status callbacks for the files the writer has finished. Returns
+        # True if one asks to cancel.
+        was_cancelled = False
+        while True:
+            try:
+                item, error = writer.results.get(False)
+            except queue.Empty:
+                return was_cancelled
 
-        t2 = time.time()
-        self.restore_wd(False)
-        self.ls(True, '*', False)
-        self.END_OPERATION('unload')
+            if error is not None:
+                raise error
 
-        return total, (t2-t1), was_cancelled
+            unloaded.append(item)
+            if cp_status_callback is not None and cp_status_callback(item.card_path, item.local, item.size):
+                was_cancelled = True
 
 
     def get_unload_list(self):
@@ -554,20 +1093,32 @@ class PhotoCard:
         return pcardext.info()
 
 
+    # Only moves in the directory index. pcardext follows when a file is
+    # read or removed.
     def cd(self, dirs, openclose=True):
         self.START_OPERATION('cd')
         try:
-            stat = pcardext.cd(dirs)
-            if stat:
-                if dirs == '/':
-                    self.dir_stack.clear()
+            if dirs == '/':
+                self.dir_stack.clear()
 
-                else:
-                    dirs = dirs.split('/')
-                    for d in dirs:
-                        self.dir_stack.push(d)
+            else:
+                for d in dirs.lower().split('/'):
+                    if d in ('', '.'):
+                        continue
+
+                    if d == '..':
+                        if len(self.dir_stack):
+                            self.dir_stack.pop()
+                        continue
+
+                    entry = self.__find(self.dir_stack.as_list() + [d])
+                    if entry is None or entry[1] != 'd':
+                        log.debug("No directory %s in %s" % (d, self.pwd()))
+                        break
 
-                self.ls(True, '*', False)
+                    self.dir_stack.push(d)
+
+            self.ls(True, '*', False)
 
         finally:
             self.END_OPERATION('cd', openclose)
@@ -580,11 +1131,6 @@ class PhotoCard:
         self.dir_stack.pop()
         self.START_OPERATION('cdup')
         try:
-            pcardext.cd('/')
-
-            for d in self.dir_stack.as_list():
-                pcardext.cd(d)
-
             self.ls(True, '*', False)
         finally:
             self.END_OPERATION('cdup', openclose)
@@ -592,7 +1138,7 @@ class PhotoCard:
     def rm(self, name, refresh_dir=True, openclose=True):
         self.START_OPERATION()
         try:
-            r = pcardext.rm(name)
+            r = self.__rm(self.dir_stack.as_list(), name)
 
             if refresh_dir:
                 self.ls(True, '*', False)
@@ -600,6 +1146,35 @@ class PhotoCard:
             self.END_OPERATION(openclose)
             return r
 
+    # rm multiple files in the current working directory, written to the
+    # card together at the end
+    def rm_multiple(self, filelist, rm_status_callback=None):
+        r = 0
+        self.START_OPERATION('rm_multiple')
+        self.start_write_back()
+        try:
+            for f in filelist:
+                if self.__rm(self.dir_stack.as_list(), f) != 0:
+                    r = 1
+
+                if rm_status_callback is not None:
+                    rm_status_callback(f)
+        finally:
+            if self.commit() != 0:
+                r = 1
+            self.ls(True, '*', False)
+            self.END_OPERATION('rm_multiple')
+
+        return r
+
+    def __rm(self, dirs, name):
+        # pcardext writes to the card only here, so the directory's listing
+        # is all in the index that can change
+        self._card_cd(dirs)
+        r = pcardext.rm(name)
+        self.dir_index.pop(tuple(dirs), None)
+        return r
+
     def mount(self):
         log.debug("Mounting photocard...")
         self.START_OPERATION('mount')
@@ -617,7 +1192,15 @@ class PhotoCard:
                     self.open_channel()
 
                 self.pcard_mounted = True
+                self.index_reset()
+
+                # number of FATs, from the boot sector
+                fats = ord(self._read(0, 1)[16:17])
+                self.fat_sectors = (disk_info[3], disk_info[3] + fats*disk_info[5])
+
                 pcardext.cd('/')
+                self.card_dir = []
+                self.dir_stack.clear()
 
                 self.ls(True, '*', False)
 
@@ -647,44 +1230,38 @@ class PhotoCard:
         self.START_OPERATION('tree')
         dir_tree = {}
         try:
-            self.save_wd()
-            dir_tree = self.__tree()
-            self.restore_wd(False)
+            dir_tree = self.__tree([])
         finally:
             self.END_OPERATION('tree')
             return dir_tree
 
-    def __tree(self, __d=None):
-        if __d is None:
-            __d = {}
-            pcardext.cd('/')
-
-        for f in pcardext.ls(): # True, '*', False ):
-            fname = f[0].lower()
-
+    def __tree(self, dirs):
+        __d = {}
+        for fname, attr, size in self.__listing(dirs):
             if self.callback is not None:
                 self.callback()
 
             if fname not in ('.', '..'):
-                if f[1] == 'd':
-                    self.cd(fname, False)
-                    __d[fname] = {}
-                    __d[fname] = self.__tree(__d[fname])
-                    self.cdup(False)
+                if attr == 'd':
+                    __d[fname] = self.__tree(dirs + [fname])
 
                 else:
-                    __d[fname] = f[2]
+                    __d[fname] = size
 
         return __d
 
 
-    def get_exif(self, name):
+    # all the EXIF tags of a file, or only those named (see exif.process_file_tags())
+    def get_exif(self, name, tags=None):
         exif_info = {}
         self.START_OPERATION('get_exif')
         pcf = None
         try:
             pcf = PhotoCardFile(self, name)
-            exif_info = exif.process_file(pcf)
+            if tags is None:
+                exif_info = exif.process_file(pcf)
+            else:
+                exif_info = exif.process_file_tags(pcf, tags)
         finally:    
             if pcf is not None:
                 pcf.close()
@@ -692,28 +1269,54 @@ class PhotoCard:
             return exif_info
 
 
-    def get_exif_path(self, name):
+    # as get_exif(), for a file named by its path
+    def get_exif_path(self, name, tags=None):
         exif_info = {}
         self.START_OPERATION('get_exif_path')
-        self.save_wd()
+        pcf = None
         try:
-            path_list = name.split('/')[:-1]
-            filename = name.split('/')[-1]
-
-            for p in path_list:
-                self.cd(p, False)
+            path = self.__path(name)
+            entry = self.__find(path)
 
-            pcf = PhotoCardFile(self, filename)
-            exif_info = exif.process_file(pcf)
+            if entry is not None and entry[1] != 'd':
+                pcf = PhotoCardFile(self, path[-1], entry[2], path[:-1])
+                if tags is None:
+                    exif_info = exif.process_file(pcf)
+                else:
+                    exif_info = exif.process_file_tags(pcf, tags)
 
         finally:    
-            self.restore_wd(False)
-            pcf.close()
+            if pcf is not None:
+                pcf.close()
             self.END_OPERATION('get_exif_path')
             return exif_info
 
 
 
+    # the browse tags (date taken, orientation, thumbnail offsets) of every
+    # image in the current directory, reading only the blocks holding them
+    def get_exif_index(self, tags=exif.BROWSE_TAGS, openclose=True):
+        index = {}
+        self.START_OPERATION('get_exif_index')
+        try:
+            for name, attr, size in self.current_dir:
+                if attr == 'd' or not self.classify_file(name).startswith('image/'):
+                    continue
+
+                pcf = PhotoCardFile(self, name, size)
+                try:
+                    index[name] = exif.process_file_tags(pcf, tags)
+                except (ValueError, IndexError, struct.error) as e:
+                    log.debug("No EXIF tags in %s: %s" % (name, e))
+                    index[name] = {}
+                finally:
+                    pcf.close()
+        finally:
+            self.END_OPERATION('get_exif_index', openclose)
+
+        return index
+
+
     def sector(self, sector):
         self.START_OPERATION('sector')
         try:
@@ -723,8 +1326,11 @@ class PhotoCard:
             return data
 
     def umount(self):
+        if self.write_back:
+            self.commit()
         pcardext.umount()
         self.pcard_mounted = False
+        self.index_reset()
 
     def open_channel(self):
         self.channel_opened = True
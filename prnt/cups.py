@@ -28,19 +28,17 @@ import re
 import time
 import tempfile
 import glob
+import threading
 
 # Local
 from base.g import *
 from base import utils, models, os_utils
 from base.sixext import PY3
+from base.lazy import LazyModule, isAvailable
 
 INVALID_PRINTER_NAME_CHARS = """~`!@#$%^&*()=+[]{}()\\/,.<>?'\";:| """
 
-# Handle case where cups.py (via device.py) is loaded
-# and cupsext doesn't exist yet. This happens in the
-# installer and in a fresh sandbox if the Python extensions
-# aren't installed yet.
-try:
+def __loadCupsExt():
     current_language = os.getenv("LANG")
     newlang = "C"
 
@@ -54,16 +52,26 @@ try:
 
     os.environ['LANG'] = newlang
 
-    import cupsext
+    try:
+        import cupsext
+    finally:
+        # restore the old env values
+        if current_language is not None:
+            os.environ['LANG'] = current_language
+
+    return cupsext
+
 
-    # restore the old env values
-    if current_language is not None:
-        os.environ['LANG'] = current_language
+# Handle case where cups.py (via device.py) is loaded
+# and cupsext doesn't exist yet. This happens in the
+# installer and in a fresh sandbox if the Python extensions
+# aren't installed yet.
+if not isAvailable('cupsext') and not os.getenv("HPLIP_BUILD"):
+    log.warn("CUPSEXT could not be loaded. Please check HPLIP installation.")
+    sys.exit(1)
 
-except ImportError:
-    if not os.getenv("HPLIP_BUILD"):
-        log.warn("CUPSEXT could not be loaded. Please check HPLIP installation.")
-        sys.exit(1)
+# Loaded when first used, commands that never talk to CUPS do not load libcups
+cupsext = LazyModule('cupsext', __loadCupsExt)
 
 
 IPP_PRINTER_STATE_IDLE = 3
@@ -340,26 +348,33 @@ def levenshtein_distance(a,b):
 
 number_pat = re.compile(r""".*?(\d+)""", re.IGNORECASE)
 
-STRIP_STRINGS2 = ['foomatic:', 'hp-', 'hp_', 'hp ', '.gz', '.ppd',
-                  'drv:', '-pcl', '-pcl3', '-jetready',
-                 '-zxs', '-zjs', '-ps', '-postscript',
-                 '-jr', '-lidl', '-lidil', '-ldl', '-hpijs']
+STRIP_STRINGS2 = [] # Filled in on first use, see getStripStrings()
+STRIP_STRINGS = []
 
 
-for p in list(models.TECH_CLASS_PDLS.values()):
-    pp = '-%s' % p
-    if pp not in STRIP_STRINGS2:
-        STRIP_STRINGS2.append(pp)
+def getStripStrings():
+    """ Returns (STRIP_STRINGS2, STRIP_STRINGS). """
+    if not STRIP_STRINGS2:
+        strip_strings2 = ['foomatic:', 'hp-', 'hp_', 'hp ', '.gz', '.ppd',
+                          'drv:', '-pcl', '-pcl3', '-jetready',
+                          '-zxs', '-zjs', '-ps', '-postscript',
+                          '-jr', '-lidl', '-lidil', '-ldl', '-hpijs']
 
+        for p in list(models.TECH_CLASS_PDLS.values()):
+            pp = '-%s' % p
+            if pp not in strip_strings2:
+                strip_strings2.append(pp)
 
-STRIP_STRINGS = STRIP_STRINGS2[:]
-STRIP_STRINGS.extend(['-series', ' series', '_series'])
+        STRIP_STRINGS[:] = strip_strings2 + ['-series', ' series', '_series']
+        STRIP_STRINGS2[:] = strip_strings2
+
+    return STRIP_STRINGS2, STRIP_STRINGS
 
 
 def stripModel2(model): # For new 2.8.10+ PPD find algorithm
     model = model.lower()
 
-    for x in STRIP_STRINGS2:
+    for x in getStripStrings()[0]:
         model = model.replace(x, '')
 
     return model
@@ -368,7 +383,7 @@ def stripModel2(model): # For new 2.8.10+ PPD find algorithm
 def stripModel(model): # for old PPD find algorithm (removes "series" as well)
     model = model.lower()
 
-    for x in STRIP_STRINGS:
+    for x in getStripStrings()[1]:
         model = model.replace(x, '')
 
     return model
@@ -702,7 +717,9 @@ def purge(printer_name):
 
 def controlPrinter(printer_name, cups_op):
     if cups_op in (CUPS_ACCEPT_JOBS, CUPS_REJECT_JOBS, IPP_PAUSE_PRINTER, IPP_RESUME_PRINTER, IPP_PURGE_JOBS):
-        return cupsext.controlPrinter(printer_name, cups_op)
+        r = cupsext.controlPrinter(printer_name, cups_op)
+        invalidatePrinters()
+        return r
 
     return 0;
 
@@ -727,20 +744,85 @@ def getPPDOption(option):
 def getPPDPageSize():
     return cupsext.getPPDPageSize()
 
+#
+# Printer snapshot
+#
+# One copy of the CUPS printer list is shared by the whole process, with
+# indexes by printer name and device URI. It is trusted for
+# PRINTER_SNAPSHOT_TTL seconds, after that the printer change times (a
+# small CUPS_GET_PRINTERS request) are compared before the full list is
+# read again. Changes made through this module drop it right away.
+#
+
+PRINTER_SNAPSHOT_TTL = 5.0 # sec
+
+class PrinterSnapshot(object):
+    def __init__(self, printers, change_times):
+        self.printers = printers
+        self.change_times = change_times
+        self.checked = time.time()
+        self.by_name = {}
+        self.by_lower_name = {}
+        self.by_device_uri = {}
+
+        for p in printers:
+            self.by_name[p.name] = p
+            self.by_lower_name.setdefault(p.name.lower(), p)
+            self.by_device_uri.setdefault(p.device_uri, []).append(p)
+
+
+_printer_snapshot = None
+_printer_snapshot_lock = threading.Lock()
+
+
+def __getPrinterChangeTimes():
+    try:
+        f = cupsext.getPrinterChangeTimes
+    except AttributeError: # older cupsext
+        return None
+
+    return sorted(f())
+
+
+def getPrinterSnapshot():
+    global _printer_snapshot
+    with _printer_snapshot_lock:
+        snapshot = _printer_snapshot
+        if snapshot is not None and time.time() - snapshot.checked < PRINTER_SNAPSHOT_TTL:
+            return snapshot
+
+        change_times = __getPrinterChangeTimes()
+        if snapshot is not None and change_times is not None and \
+            change_times == snapshot.change_times:
+            snapshot.checked = time.time()
+            return snapshot
+
+        log.debug("Reading CUPS printer list.")
+        _printer_snapshot = PrinterSnapshot(cupsext.getPrinters(), change_times)
+        return _printer_snapshot
+
+
+def invalidatePrinters():
+    global _printer_snapshot
+    with _printer_snapshot_lock:
+        _printer_snapshot = None
+
+
 def getPrinters():
-##    p2 = []
-##    p = cupsext.getPrinters()
-##    for pp in p:
-##        print pp
-##        try:
-##            pn = pp.name.decode('utf-8')
-##        except UnicodeError:
-##            pass
-##
-##        p2.append(pp)
-##
-##    return p2
-    return cupsext.getPrinters()
+    return list(getPrinterSnapshot().printers)
+
+
+def getPrinter(printer_name, match_case=True):
+    snapshot = getPrinterSnapshot()
+    if match_case:
+        return snapshot.by_name.get(printer_name)
+
+    return snapshot.by_lower_name.get(printer_name.lower())
+
+
+def getPrintersByDeviceURI(device_uri):
+    return list(getPrinterSnapshot().by_device_uri.get(device_uri, []))
+
 
 def getJobs(my_job=0, completed=0):
     return cupsext.getJobs(my_job, completed)
@@ -802,17 +884,23 @@ def addPrinter(printer_name, device_uri, location, ppd_file, model, info):
         log.error("PPD file '%s' not found." % ppd_file)
         return (-1, "PPD file not found")
 
-    return cupsext.addPrinter(printer_name, device_uri, location, ppd_file, model, info)
+    r = cupsext.addPrinter(printer_name, device_uri, location, ppd_file, model, info)
+    invalidatePrinters()
+    return r
 
 def delPrinter(printer_name):
     setPasswordPrompt("You do not have permission to delete a printer. You need authentication.")
-    return cupsext.delPrinter(printer_name)
+    r = cupsext.delPrinter(printer_name)
+    invalidatePrinters()
+    return r
 
 def enablePrinter(printer_name):
     setPasswordPrompt("You do not have permission to enable a printer. You need authentication.")
     cmd_full_path = utils.which('cupsenable', True)
     cmd= "%s %s" % (cmd_full_path, printer_name)
-    return os_utils.execute(cmd)
+    r = os_utils.execute(cmd)
+    invalidatePrinters()
+    return r
 
 def getGroupList():
     return cupsext.getGroupList()
@@ -368,6 +368,61 @@ abort:
 }
 
 
+/*
+ * 'getPrinterChangeTimes()' - Returns [(name, state change time, config change time), ...]
+ *  for the installed printers, used to check if a copy of getPrinters() is still current.
+ */
+PyObject * getPrinterChangeTimes( PyObject * self, PyObject * args )
+{
+    ipp_t *response = NULL;
+    ipp_attribute_t *attr = NULL;
+    const char *name;
+    int state_time, config_time;
+    PyObject * change_list;
+    PyObject * item;
+
+    change_list = PyList_New( 0 );
+
+    response = getCupsPrinterChangeTimes();
+    if ( response == NULL )
+        goto abort;
+
+    for ( attr = ippFirstAttribute( response ); attr != NULL; attr = ippNextAttribute( response ) )
+    {
+        if ( ippGetGroupTag( attr ) != IPP_TAG_PRINTER )
+            continue;
+
+        name = "";
+        state_time = config_time = 0;
+
+        while ( attr != NULL && ippGetGroupTag( attr ) == IPP_TAG_PRINTER )
+        {
+            if ( strcmp( ippGetName( attr ), "printer-name" ) == 0 && ippGetValueTag( attr ) == IPP_TAG_NAME )
+                name = ippGetString( attr, 0, NULL );
+            else if ( strcmp( ippGetName( attr ), "printer-state-change-time" ) == 0 && ippGetValueTag( attr ) == IPP_TAG_INTEGER )
+                state_time = ippGetInteger( attr, 0 );
+            else if ( strcmp( ippGetName( attr ), "printer-config-change-time" ) == 0 && ippGetValueTag( attr ) == IPP_TAG_INTEGER )
+                config_time = ippGetInteger( attr, 0 );
+
+            attr = ippNextAttribute( response );
+        }
+
+        item = Py_BuildValue( "(sii)", name, state_time, config_time );
+        PyList_Append( change_list, item );
+        Py_DECREF( item );
+
+        if ( attr == NULL )
+            break;
+    }
+
+abort:
+    if ( response != NULL )
+        ippDelete( response );
+
+    return change_list;
+}
+
+
 PyObject * addPrinter( PyObject * self, PyObject * args )
 {
     int status = 0;
@@ -1619,6 +1674,7 @@ PyObject * getPassword( PyObject * self, PyObject * args )
 static PyMethodDef cupsext_methods[] =
 {
     { "getPrinters", ( PyCFunction ) getPrinters, METH_VARARGS },
+    { "getPrinterChangeTimes", ( PyCFunction ) getPrinterChangeTimes, METH_VARARGS },
     { "addPrinter", ( PyCFunction ) addPrinter, METH_VARARGS },
     { "delPrinter", ( PyCFunction ) delPrinter, METH_VARARGS },
     { "getDefaultPrinter", ( PyCFunction ) getDefaultPrinter, METH_VARARGS },
@@ -36,6 +36,7 @@
 #include <sys/utsname.h>
 #include <time.h>
 #include "utils.h"
+#include "Utils.h"
 
 #define HP_FILE_VERSION_STR    "03.09.08.0"
 
@@ -394,6 +395,13 @@ DRIVER_ERROR HPCupsFilter::startPage (cups_page_header2_t *cups_header)
     {
         m_JA.HPSPDClass = atoi(attr->value);
     }
+
+//  Number of threads for the raster pipeline, 0 runs it on the filter thread
+    if (((attr = ppdFindAttr(m_ppd, "hpPipelineThreads", NULL)) != NULL) &&
+         (attr->value != NULL))
+    {
+        m_JA.pipeline_threads = atoi(attr->value);
+    }
     
 
 // Get the encapsulation technology from ppd
@@ -464,6 +472,11 @@ DRIVER_ERROR HPCupsFilter::startPage (cups_page_header2_t *cups_header)
         strncpy(m_JA.uuid, ptr + strlen("job-uuid=urn:uuid:"), sizeof(m_JA.uuid)-1);
     }
 
+    ptr = strstr(m_argv[5], "hp-pipeline-threads=");
+    if (ptr) {
+        m_JA.pipeline_threads = atoi(ptr + strlen("hp-pipeline-threads="));
+    }
+
     for (i = 0; i < 16; i++)
         m_JA.integer_values[i] = cups_header->cupsInteger[i];
 
@@ -603,18 +616,8 @@ bool HPCupsFilter::isBlankRaster(BYTE *input_raster, cups_page_header2_t *header
         return true;
     }
 
-    if(header->cupsColorSpace == CUPS_CSPACE_K){
-	if (*input_raster == 0x00 &&
-            !(memcmp(input_raster + 1, input_raster, length_in_bytes - 1))) {
-            return true;
-        }
-    }
-    else if (*input_raster == 0xFF &&
-             !(memcmp(input_raster + 1, input_raster, length_in_bytes - 1))) {
-            return true;
-    }
-    
-    return false;
+    BYTE white = (header->cupsColorSpace == CUPS_CSPACE_K) ? 0x00 : 0xFF;
+    return (FindFirstInk(input_raster, length_in_bytes, white) == length_in_bytes);
 }
 
 
@@ -798,16 +801,27 @@ void HPCupsFilter::extractBlackPixels(cups_page_header2_t *cups_header, BYTE *kR
     }
 
     if (cups_header->cupsColorSpace == CUPS_CSPACE_RGBW) {
-        int    k = 0;
-        BYTE   *pIn = m_pPrinterBuffer;
+        int    length = cups_header->cupsWidth * 4;
+
+//      Only the pixels between the white margins need converting, white RGBW maps to white RGB and no black
+        unsigned int first = FindFirstInk(m_pPrinterBuffer, length, 0xFF) / 4;
+        unsigned int last  = (FindLastInk(m_pPrinterBuffer, length, 0xFF) + 3) / 4;
+        if (last < first) {
+            last = first;
+        }
+
+        int    k = first % 8;
+        BYTE   *pIn = m_pPrinterBuffer + first * 4;
         BYTE   kVal = 0;
         BYTE   white=0;
-        BYTE   *rgb = rgbRaster;
-        BYTE   *black   = kRaster;
+        BYTE   *rgb = rgbRaster + first * 3;
+        BYTE   *black   = kRaster + first / 8;
         memset (kRaster, 0, cups_header->cupsWidth);
+        memset (rgbRaster, 0xFF, first * 3);
+        memset (rgbRaster + last * 3, 0xFF, (cups_header->cupsWidth - last) * 3);
 
 
-        for (unsigned int i = 0; i < cups_header->cupsWidth; i++) {
+        for (unsigned int i = first; i < last; i++) {
             rgb[0] = *pIn++;
             rgb[1] = *pIn++;
             rgb[2] = *pIn++;
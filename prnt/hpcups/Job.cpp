@@ -39,7 +39,8 @@ Job::Job() :
     m_pBlackRaster(NULL),
     m_bDataSent(false),
     m_iRaster(0),
-    m_iBlanks(0)
+    m_iBlanks(0),
+    m_iStages(0)
 {
 }
 
@@ -75,6 +76,9 @@ DRIVER_ERROR Job::Init(SystemServices *pSystemServices, JobAttributes *job_attrs
 DRIVER_ERROR Job::StartPage(JobAttributes *job_attrs)
 {
 
+    DRIVER_ERROR err = drainStages();
+    ERRCHECK;
+
     if (job_attrs) {
         memcpy(&m_job_attributes, job_attrs, sizeof(m_job_attributes));
     }
@@ -85,14 +89,14 @@ DRIVER_ERROR Job::Cleanup()
 {
     // Client isn't required to call NewPage at end of last page, so
     // we may need to eject a page now.
-    DRIVER_ERROR    err = NO_ERROR;
+    DRIVER_ERROR    err = drainStages();
 
 /*
  *  Let the encapsulator cleanup, such as sending previous page if speed mech
  *  is enabled.
  */
 
-    if (m_pEncap) {
+    if (m_pEncap && err == NO_ERROR) {
         err = m_pEncap->Cleanup();
     }
 
@@ -119,6 +123,10 @@ void Job::CancelJob()
 
 Job::~Job()
 {
+    for (int i = 0; i < m_iStages; i++) {
+        delete m_pStages[i];
+    }
+
     if (m_pBlackRaster) {
         delete [] m_pBlackRaster;
     }
@@ -175,12 +183,15 @@ DRIVER_ERROR Job::SendRasters(BYTE* BlackImageData, BYTE* ColorImageData)
     }
 
     if (skipcount > 0) {
-        m_pPipeline->Flush();
+        flushPipeline();
         err = m_pEncap->SendCAPy(skipcount);
         skipcount = 0;
     }
     m_bDataSent = true;
 
+//  The first stage's thread owns m_pPipeline->Exec->raster, the queue takes a copy of ours
+    RASTERDATA  *raster = (m_iStages > 0) ? &m_InputRaster : &(m_pPipeline->Exec->raster);
+
     if (BlackImageData || ColorImageData)
     {
         if (BlackImageData)
@@ -192,25 +203,28 @@ DRIVER_ERROR Job::SendRasters(BYTE* BlackImageData, BYTE* ColorImageData)
                 unpackBits(BlackImageData);
                 BlackImageData = m_pBlackRaster;
             }
-            m_pPipeline->Exec->raster.rastersize[COLORTYPE_BLACK] = m_job_attributes.media_attributes.printable_width;
-            m_pPipeline->Exec->raster.rasterdata[COLORTYPE_BLACK] = BlackImageData;
+            raster->rastersize[COLORTYPE_BLACK] = m_job_attributes.media_attributes.printable_width;
+            raster->rasterdata[COLORTYPE_BLACK] = BlackImageData;
         }
         else
         {
-            m_pPipeline->Exec->raster.rastersize[COLORTYPE_BLACK] = 0;
-            m_pPipeline->Exec->raster.rasterdata[COLORTYPE_BLACK] = NULL;
+            raster->rastersize[COLORTYPE_BLACK] = 0;
+            raster->rasterdata[COLORTYPE_BLACK] = NULL;
         }
         if (ColorImageData)
         {
-            m_pPipeline->Exec->raster.rastersize[COLORTYPE_COLOR] = m_job_attributes.media_attributes.printable_width * 3;
-            m_pPipeline->Exec->raster.rasterdata[COLORTYPE_COLOR] = ColorImageData;
+            raster->rastersize[COLORTYPE_COLOR] = m_job_attributes.media_attributes.printable_width * 3;
+            raster->rasterdata[COLORTYPE_COLOR] = ColorImageData;
         }
         else
         {
-            m_pPipeline->Exec->raster.rastersize[COLORTYPE_COLOR] = 0;
-            m_pPipeline->Exec->raster.rasterdata[COLORTYPE_COLOR] = NULL;
+            raster->rastersize[COLORTYPE_COLOR] = 0;
+            raster->rasterdata[COLORTYPE_COLOR] = NULL;
         }
-        err = m_pPipeline->Execute(&(m_pPipeline->Exec->raster));
+        if (m_iStages > 0)
+            err = m_pStages[0]->Push(raster);
+        else
+            err = m_pPipeline->Execute(raster);
     }
 
     return err;
@@ -219,13 +233,17 @@ DRIVER_ERROR Job::SendRasters(BYTE* BlackImageData, BYTE* ColorImageData)
 DRIVER_ERROR Job::NewPage()
 {
     DRIVER_ERROR err;
+
+//  SetLastBand may change compressor state, so every raster sent so far has to be through first
+    err = drainStages();
+    ERRCHECK;
     m_pEncap->SetLastBand();
 
     if (!m_bDataSent && skipcount > 0) {
         skipcount = 0;
         SendRasters(NULL, m_pBlankRaster);
     }
-    m_pPipeline->Flush();
+    flushPipeline();
     err = m_pEncap->FormFeed();
     ERRCHECK;
 
@@ -264,9 +282,82 @@ DRIVER_ERROR Job::Configure()
     else {
         m_pPipeline = p;
     }
+
+    if (m_job_attributes.pipeline_threads > 0) {
+        return startStages();
+    }
    return NO_ERROR;
 } //Configure
 
+/*
+ *  Split the pipeline into stages that run on their own threads, with a
+ *  RasterQueue in front of each. The first stage takes rasters from the filter
+ *  thread; further stages start at the earliest phases that can be cut.
+ *  Everything after a processor the encapsulator reads from stays on the
+ *  encapsulator's thread.
+ */
+
+DRIVER_ERROR Job::startStages()
+{
+    DRIVER_ERROR    err = NO_ERROR;
+    Pipeline        *p;
+    bool            bShared = false;
+    int             threads = m_job_attributes.pipeline_threads;
+
+    if (threads > MAX_PIPELINE_THREADS) {
+        threads = MAX_PIPELINE_THREADS;
+    }
+
+    m_pStages[m_iStages] = new RasterQueue(m_pPipeline);
+    NEWCHECK(m_pStages[m_iStages]);
+    m_iStages++;
+
+    for (p = m_pPipeline; p->next && m_iStages < threads; p = p->next) {
+        bShared = bShared || p->Exec->sharedstate;
+        if (bShared || !p->next->Exec->CanStartStage()) {
+            continue;
+        }
+        p->handoff = new RasterQueue(p->next);
+        NEWCHECK(p->handoff);
+        m_pStages[m_iStages++] = p->handoff;
+    }
+
+    for (int i = 0; i < m_iStages; i++) {
+        err = m_pStages[i]->Start();
+        ERRCHECK;
+    }
+    dbglog("DEBUG: Job - raster pipeline running in %d stages\n", m_iStages);
+    return err;
+} //startStages
+
+/*
+ *  Wait for all queued rasters to go through. Each queue is drained after the
+ *  one feeding it, so nothing can be left in flight.
+ */
+
+DRIVER_ERROR Job::drainStages()
+{
+    DRIVER_ERROR    err = NO_ERROR;
+    DRIVER_ERROR    stage_err;
+    for (int i = 0; i < m_iStages; i++) {
+        stage_err = m_pStages[i]->Drain();
+        if (err == NO_ERROR) {
+            err = stage_err;
+        }
+    }
+    return err;
+} //drainStages
+
+DRIVER_ERROR Job::flushPipeline()
+{
+    if (m_iStages == 0) {
+        return m_pPipeline->Flush();
+    }
+    DRIVER_ERROR    err = m_pStages[0]->Flush();
+    ERRCHECK;
+    return drainStages();
+} //flushPipeline
+
 DRIVER_ERROR Job::setBlackRaster()
 {
     if (!m_pBlackRaster) {
@@ -38,6 +38,7 @@
 #include "Mode9.h"
 #include "Mode10.h"
 #include "RasterSender.h"
+#include "RasterQueue.h"
 class Job
 {
 public:
@@ -65,11 +66,17 @@ private:
     DRIVER_ERROR Configure();
     DRIVER_ERROR setBlankRaster();
     DRIVER_ERROR setBlackRaster();
+    DRIVER_ERROR startStages();
+    DRIVER_ERROR drainStages();
+    DRIVER_ERROR flushPipeline();
     int     m_iRaster;
     int     m_iBandNum;
     int     m_iBlanks;
     int     m_resolution_ratio;
     int     m_row_number;
+    RasterQueue *m_pStages[MAX_PIPELINE_THREADS];
+    int     m_iStages;
+    RASTERDATA  m_InputRaster;
 }; // Job
 
 #endif // JOB_H
@@ -131,6 +131,7 @@ DRIVER_ERROR LJColor::Configure(Pipeline **pipeline)
         m_pMode3 = new Mode3(width * 3);
         head = new Pipeline(m_pMode3);
         m_pMode3->myplane = COLORTYPE_COLOR;
+        m_pMode3->sharedstate = true;
     }
 
     *pipeline = head;
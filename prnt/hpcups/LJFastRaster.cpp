@@ -115,6 +115,7 @@ DRIVER_ERROR LJFastRaster::Configure(Pipeline **pipeline)
     p = new Pipeline(m_pModeDeltaPlus);
     head->AddPhase(p);
     m_pModeDeltaPlus->myplane = COLORTYPE_COLOR;
+    m_pModeDeltaPlus->sharedstate = true;
     err = m_pModeDeltaPlus->Init();
 
     *pipeline = head;
@@ -115,6 +115,7 @@ DRIVER_ERROR LJMono::Configure(Pipeline **pipeline)
     pColorMatcher = new ColorMatcher(m_PM.cmap, m_PM.dyeCount, width);
     head = new Pipeline(pColorMatcher);
     m_pHalftoner = new Halftoner (&m_PM, width, iRows, uiResBoost, m_PM.eHT == MATRIX);
+    m_pHalftoner->sharedstate = true;    // LastPlane() is read by Encapsulate
     p = new Pipeline(m_pHalftoner);
     head->AddPhase(p);
     pMode2 = new Mode2(width);
@@ -158,6 +158,7 @@ DRIVER_ERROR LJZjStream::Configure(Pipeline **pipeline)
     p = new Pipeline(m_pModeJbig);
     head->AddPhase(p);
     m_pModeJbig->myplane = COLORTYPE_COLOR;
+    m_pModeJbig->sharedstate = true;
 
     m_iPlanes = 1;
     m_iBpp = 1;
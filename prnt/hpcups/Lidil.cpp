@@ -38,6 +38,7 @@
 #include "ColorMaps.h"
 #include "LidilPrintModes.h"
 #include "PrinterCommands.h"
+#include "Utils.h"
 
 typedef union
 {
@@ -1008,26 +1009,28 @@ DRIVER_ERROR Lidil::allocateSwathBuffers()
     return NO_ERROR;
 }
 
+/*
+ *  Width is one past the rightmost non zero byte in the swath. Each row only
+ *  needs to be scanned to the right of the widest row found so far.
+ */
+
 unsigned int Lidil::getSwathWidth (int iStart, int iLast, int iWidth)
 {
-    int k;
-    int i, j;
-    for (i = iWidth - 1; i > -1; i--)
+    int    iRows = m_iRasterCount / m_pPM->dyeCount;
+    int    iSwathWidth = 0;
+    for (int j = iStart; j < iLast; j++)
     {
-        for (j = iStart; j < iLast; j++)
+        for (int k = 0; k < iRows; k++)
         {
-            for (k = m_iRasterCount / m_pPM->dyeCount-1; k >= 0; k--)
+            iSwathWidth += FindLastInk (m_SwathData[j][k] + iSwathWidth, iWidth - iSwathWidth, 0);
+            if (iSwathWidth >= iWidth)
             {
-
-                if (m_SwathData[j][k][i])
-                {
-                    return (i+1);
-                }
+                return iWidth;
             }
         }
     }
 
-    return 0;
+    return iSwathWidth;
 }
 
 DRIVER_ERROR Lidil::processSwath()
@@ -29,6 +29,7 @@
 \*****************************************************************************/
 
 #include "Mode10.h"
+#include "Utils.h"
 
 Mode10::Mode10 (unsigned int PlaneSize) : Compressor (PlaneSize, true)
 {
@@ -175,8 +176,13 @@ This function compresses a single row per call.
         unsigned char CMDByte = 0;
         int replacementCount;
 
-        // Find seedRowPixelCopyCount for upcoming copy
+        // Find seedRowPixelCopyCount for upcoming copy. Skip the byte-identical
+        // run (white margins, repeated rows) a word at a time first; the sentinel
+        // guarantees a difference by lastPixel.
         seedRowPixelCopyCount = curPixel;
+        curPixel += FindFirstDifference (seedRowPtr + curPixel * BYTES_PER_PIXEL,
+                                         curRowPtr + curPixel * BYTES_PER_PIXEL,
+                                         (lastPixel + 1 - curPixel) * BYTES_PER_PIXEL) / BYTES_PER_PIXEL;
         while (getPixel (seedRowPtr, curPixel) == getPixel (curRowPtr, curPixel))
         {
             curPixel++;
@@ -43,6 +43,7 @@ public:
     bool Process(RASTERDATA* input);
     bool NextOutputRaster (RASTERDATA& next_raster);
     void Flush();
+    bool CanStartStage() { return false; }  // seed row depends on prev->Exec->iRastersDelivered
     bool ResetSeedRow;
 	bool m_bPackedBits;
 }; // Mode9
@@ -59,6 +59,11 @@ ModeJpeg::ModeJpeg(unsigned int raster_width) : Compressor (raster_width, false)
     m_pbyInputBuffer    = NULL;
     m_hHPLibHandle      = NULL;
     compressBuf         = NULL;
+    m_pbyBlankBand      = NULL;
+    m_uiBlankBandSize   = 0;
+    m_uiBlankGrayscaleOffset = 0;
+    m_uiBlankQFactor    = 0;
+    m_byBlankValue      = 0;
 
 //  Don't need originalKData buffer allocate by Compressor, delete it
     if (originalKData)
@@ -132,6 +137,10 @@ ModeJpeg::~ModeJpeg()
     {
         delete [] m_pbyInputBuffer;
     }
+    if (m_pbyBlankBand)
+    {
+        delete [] m_pbyBlankBand;
+    }
 }
 
 void ModeJpeg::Flush()
@@ -341,12 +350,59 @@ void ModeJpeg::jpegCompressForQuickConnect()
     return;
 }
 
+/*
+ *  Margins and the gaps between text lines give many bands with nothing but
+ *  one value in them. These compress to the same strip every time, so the
+ *  last one is kept and sent again instead of running the JPEG encoder.
+ */
+
+bool ModeJpeg::reuseBlankBand()
+{
+    if (m_pbyBlankBand == NULL || m_byBlankValue != m_pbyInputBuffer[0] ||
+        m_uiBlankQFactor != m_pQTableInfo->qFactor)
+    {
+        return false;
+    }
+    memcpy(compressBuf, m_pbyBlankBand, m_uiBlankBandSize);
+    compressedsize = m_uiBlankBandSize;
+    m_uiGrayscaleOffset = m_uiBlankGrayscaleOffset;
+    return true;
+}
+
+void ModeJpeg::saveBlankBand()
+{
+    if (compressedsize == 0 || compressedsize > m_max_file_size)
+    {
+        return;
+    }
+    if (m_pbyBlankBand == NULL)
+    {
+        m_pbyBlankBand = new BYTE[m_max_file_size];
+        if (m_pbyBlankBand == NULL)
+        {
+            return;
+        }
+    }
+    memcpy(m_pbyBlankBand, compressBuf, compressedsize);
+    m_uiBlankBandSize = compressedsize;
+    m_uiBlankGrayscaleOffset = m_uiGrayscaleOffset;
+    m_uiBlankQFactor = m_pQTableInfo->qFactor;
+    m_byBlankValue = m_pbyInputBuffer[0];
+}
+
 void ModeJpeg::jpegCompressForJetReady()
 {
     struct jpeg_compress_struct cinfo;
     struct jpeg_error_mgr       jerr;
     jmp_buf                     setjmp_buffer;
 
+    int    row_width = (m_iColorMode == 0) ? m_iRowWidth : m_iRowWidth / 3;
+    int    band_size = row_width * m_iBandHeight;
+    bool   bBlank = (FindFirstInk(m_pbyInputBuffer, band_size, m_pbyInputBuffer[0]) == band_size);
+    if (bBlank && reuseBlankBand())
+    {
+        return;
+    }
 
 //  Use the modified Mojave CSC table
     hp_rgb_ycc_setup (1);
@@ -456,10 +512,8 @@ void ModeJpeg::jpegCompressForJetReady()
 
     jpeg_buffer_dest (&cinfo, (JOCTET *) this, (void *) (output_buffer_callback));
 
-    int    row_width = m_iRowWidth;
     if (m_iColorMode != 0)
     {
-        row_width = m_iRowWidth / 3;
         cinfo.write_JFIF_header = FALSE;
         cinfo.write_Adobe_marker = FALSE;
         jpeg_suppress_tables(&cinfo, TRUE);
@@ -518,6 +572,10 @@ void ModeJpeg::jpegCompressForJetReady()
             m_uiGrayscaleOffset = l + 10;
         }
     }
+    if (bBlank)
+    {
+        saveBlankBand();
+    }
 }
 
 void ModeJpeg::taosCompressForJetReady()
@@ -56,6 +56,8 @@ private:
     void    jpegCompressForJetReady();
     void    taosCompressForJetReady();
     void    rgbToGray(BYTE *rgbData, int iNumBytes);
+    bool    reuseBlankBand();
+    void    saveBlankBand();
     int     m_iRowWidth;
     int     m_iRowNumber;
     int     m_iBandHeight;
@@ -66,6 +68,13 @@ private:
     BYTE               *m_pbyInputBuffer;
     QTableInfo         *m_pQTableInfo;
     void               *m_hHPLibHandle;
+
+//  Compressed copy of the last blank (single valued) band, blank strips are sent as is
+    BYTE               *m_pbyBlankBand;
+    unsigned int       m_uiBlankBandSize;
+    int                m_uiBlankGrayscaleOffset;
+    unsigned int       m_uiBlankQFactor;
+    BYTE               m_byBlankValue;
 };
 
 #endif // MODE_JPEG_H
@@ -90,6 +90,7 @@ DRIVER_ERROR Pcl3::Configure(Pipeline **pipeline)
     pColorMatcher = new ColorMatcher(m_pPM->cmap, m_pPM->dyeCount, width);
     head = new Pipeline(pColorMatcher);
     m_pHalftoner = new Halftoner (m_pPM, width, iRows, uiResBoost, m_pPM->eHT == MATRIX);
+    m_pHalftoner->sharedstate = true;    // LastPlane() is read by Encapsulate
     p = new Pipeline(m_pHalftoner);
     head->AddPhase(p);
     pMode9 = new Mode9(width, false);
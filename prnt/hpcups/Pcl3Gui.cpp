@@ -91,6 +91,7 @@ DRIVER_ERROR Pcl3Gui::Configure(Pipeline **pipeline)
     head = new Pipeline(pColorMatcher);
 
     m_pHalftoner = new Halftoner (m_pPM, width, iRows, uiResBoost, m_pPM->eHT == MATRIX);
+    m_pHalftoner->sharedstate = true;    // LastPlane() is read by Encapsulate
     p = new Pipeline(m_pHalftoner);
     head->AddPhase(p);
 
@@ -35,6 +35,7 @@
  */
 
 #include "Pipeline.h"
+#include "RasterQueue.h"
 bool Pipeline::NextOutputRaster(RASTERDATA& next_raster)
 {
     return Exec->NextOutputRaster(next_raster);
@@ -48,9 +49,15 @@ unsigned int Pipeline::GetMaxOutputWidth()
 // Pipeline management
 Pipeline::Pipeline (Processor *E) :
     next(NULL),
-    prev(NULL) {
+    prev(NULL),
+    handoff(NULL) {
     Exec = E;
     Exec->myphase = this;
+    for (int i = COLORTYPE_COLOR; i < MAX_COLORTYPE; i++)
+    {
+        handoff_raster.rasterdata[i] = NULL;
+        handoff_raster.rastersize[i] = 0;
+    }
 } //Pipeline
 
 void Pipeline::AddPhase (Pipeline *newp) {
@@ -78,7 +85,10 @@ DRIVER_ERROR Pipeline::Execute (RASTERDATA *InputRaster)
     err = NO_ERROR;
     if (Process (InputRaster)        // true if output ready; may set err
         && (err == NO_ERROR)) {
-        if (next) {
+        if (handoff) {
+            err = HandOff();
+        }
+        else if (next) {
             while ( NextOutputRaster( next->Exec->raster ) ) {
                 err = next->Execute(&(next->Exec->raster));
                 ERRCHECK;
@@ -95,7 +105,13 @@ DRIVER_ERROR Pipeline::Flush ()
 
     Exec->Flush ();
 
-    if (next && (err == NO_ERROR)) {
+    if (handoff && (err == NO_ERROR)) {
+        err = HandOff();
+        ERRCHECK;
+        // the flush continues downstream on the next stage's thread
+        err = handoff->Flush ();
+    }
+    else if (next && (err == NO_ERROR)) {
         while ( NextOutputRaster( next->Exec->raster ) ) {
             err = next->Execute(&(next->Exec->raster));
             ERRCHECK;
@@ -106,3 +122,18 @@ DRIVER_ERROR Pipeline::Flush ()
     return err;
 } //Flush
 
+
+
+/*
+ *  Queue this phase's output for the next stage. handoff_raster stands in for
+ *  next->Exec->raster, which belongs to the other thread.
+ */
+
+DRIVER_ERROR Pipeline::HandOff ()
+{
+    while ( NextOutputRaster( handoff_raster ) ) {
+        err = handoff->Push(&handoff_raster);
+        ERRCHECK;
+    }
+    return err;
+} //HandOff
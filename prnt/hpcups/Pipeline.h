@@ -35,6 +35,7 @@
 #include "Processor.h"
 
 class Processor;
+class RasterQueue;
  
 class Pipeline
     {
@@ -55,6 +56,10 @@ class Pipeline
         Processor* Exec;
         
         DRIVER_ERROR err;
+
+        RasterQueue* handoff;       // set when next runs on its own thread
+        RASTERDATA handoff_raster;
+        DRIVER_ERROR HandOff();
         
 }; // Pipeline
 
@@ -30,7 +30,7 @@
 
 #include "Processor.h"
 
-Processor::Processor() : iRastersReady(0), iRastersDelivered(0), myphase(NULL), myplane(COLORTYPE_BOTH)
+Processor::Processor() : iRastersReady(0), iRastersDelivered(0), myphase(NULL), myplane(COLORTYPE_BOTH), sharedstate(false)
 {
     for (int i = COLORTYPE_COLOR; i < MAX_COLORTYPE; i++)
     {
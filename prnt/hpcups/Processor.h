@@ -43,11 +43,13 @@ public:
     virtual void Flush()=0;     // take any concluding actions based on internal state
     virtual bool NextOutputRaster(RASTERDATA& next_raster)=0;
     virtual unsigned int GetMaxOutputWidth() = 0;// in bytes, not pixels
+    virtual bool CanStartStage() { return true; }   // false if Process reads the previous phase's state
 
     unsigned int iRastersReady, iRastersDelivered;
     Pipeline* myphase;
     COLORTYPE myplane;
     RASTERDATA  raster;
+    bool sharedstate;   // set by the encapsulator if it reads this processor's state
 }; // Processor
 
 #endif // PROCESSOR_H
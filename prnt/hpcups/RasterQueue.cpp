@@ -0,0 +1,237 @@
+/*****************************************************************************\
+  RasterQueue.cpp : Implementation of RasterQueue class
+
+  Copyright (c) 1996 - 2015, HP Co.
+  All rights reserved.
+
+  Redistribution and use in source and binary forms, with or without
+  modification, are permitted provided that the following conditions
+  are met:
+  1. Redistributions of source code must retain the above copyright
+     notice, this list of conditions and the following disclaimer.
+  2. Redistributions in binary form must reproduce the above copyright
+     notice, this list of conditions and the following disclaimer in the
+     documentation and/or other materials provided with the distribution.
+  3. Neither the name of HP nor the names of its
+     contributors may be used to endorse or promote products derived
+     from this software without specific prior written permission.
+
+  THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+  WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+  MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.  IN
+  NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+  TO, PATENT INFRINGEMENT; PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS
+  OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+  ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+  THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+\*****************************************************************************/
+
+#include "RasterQueue.h"
+#include "Pipeline.h"
+
+RasterQueue::RasterQueue(Pipeline *consumer) :
+    m_pConsumer(consumer),
+    m_uiHead(0),
+    m_uiCount(0),
+    m_bBusy(false),
+    m_bStop(false),
+    m_bStarted(false),
+    m_err(NO_ERROR)
+{
+    memset(m_Slots, 0, sizeof(m_Slots));
+    pthread_mutex_init(&m_mutex, NULL);
+    pthread_cond_init(&m_not_empty, NULL);
+    pthread_cond_init(&m_not_full, NULL);
+    pthread_cond_init(&m_idle, NULL);
+}
+
+RasterQueue::~RasterQueue()
+{
+    Stop();
+    for (int i = 0; i < RASTER_QUEUE_DEPTH; i++)
+    {
+        for (int j = COLORTYPE_COLOR; j < MAX_COLORTYPE; j++)
+        {
+            if (m_Slots[i].buffer[j])
+            {
+                delete [] m_Slots[i].buffer[j];
+            }
+        }
+    }
+    pthread_cond_destroy(&m_idle);
+    pthread_cond_destroy(&m_not_full);
+    pthread_cond_destroy(&m_not_empty);
+    pthread_mutex_destroy(&m_mutex);
+}
+
+DRIVER_ERROR RasterQueue::Start()
+{
+    if (pthread_create(&m_thread, NULL, threadMain, this) != 0)
+    {
+        dbglog("DEBUG: RasterQueue - unable to start pipeline thread\n");
+        return SYSTEM_ERROR;
+    }
+    m_bStarted = true;
+    return NO_ERROR;
+}
+
+void RasterQueue::Stop()
+{
+    if (!m_bStarted)
+    {
+        return;
+    }
+
+//  The worker finishes whatever is still queued before it exits
+    pthread_mutex_lock(&m_mutex);
+    m_bStop = true;
+    pthread_cond_signal(&m_not_empty);
+    pthread_mutex_unlock(&m_mutex);
+
+    pthread_join(m_thread, NULL);
+    m_bStarted = false;
+}
+
+DRIVER_ERROR RasterQueue::waitForSlot(QueueSlot **slot)
+{
+    DRIVER_ERROR    err;
+    pthread_mutex_lock(&m_mutex);
+    while (m_uiCount == RASTER_QUEUE_DEPTH)
+    {
+        pthread_cond_wait(&m_not_full, &m_mutex);
+    }
+    err = m_err;
+    *slot = &m_Slots[(m_uiHead + m_uiCount) % RASTER_QUEUE_DEPTH];
+    pthread_mutex_unlock(&m_mutex);
+    return err;
+}
+
+void RasterQueue::commitSlot()
+{
+    pthread_mutex_lock(&m_mutex);
+    m_uiCount++;
+    pthread_cond_signal(&m_not_empty);
+    pthread_mutex_unlock(&m_mutex);
+}
+
+/*
+ *  There is only one producer, and the worker never touches the slot at the
+ *  tail while it is free, so the copy is done without holding the lock.
+ */
+
+DRIVER_ERROR RasterQueue::Push(RASTERDATA *raster)
+{
+    QueueSlot       *slot;
+    DRIVER_ERROR    err = waitForSlot(&slot);
+    ERRCHECK;
+
+    slot->flush = false;
+    for (int i = COLORTYPE_COLOR; i < MAX_COLORTYPE; i++)
+    {
+        slot->raster.rastersize[i] = raster->rastersize[i];
+        slot->raster.rasterdata[i] = raster->rasterdata[i];
+        if (raster->rasterdata[i] == NULL || raster->rastersize[i] <= 0)
+        {
+            continue;
+        }
+        if (slot->buffer_size[i] < (unsigned int) raster->rastersize[i])
+        {
+            if (slot->buffer[i])
+            {
+                delete [] slot->buffer[i];
+            }
+            slot->buffer_size[i] = 0;
+            slot->buffer[i] = new BYTE[raster->rastersize[i]];
+            NEWCHECK(slot->buffer[i]);
+            slot->buffer_size[i] = raster->rastersize[i];
+        }
+        memcpy(slot->buffer[i], raster->rasterdata[i], raster->rastersize[i]);
+        slot->raster.rasterdata[i] = slot->buffer[i];
+    }
+    commitSlot();
+    return NO_ERROR;
+}
+
+DRIVER_ERROR RasterQueue::Flush()
+{
+    QueueSlot       *slot;
+    DRIVER_ERROR    err = waitForSlot(&slot);
+    ERRCHECK;
+
+    slot->flush = true;
+    commitSlot();
+    return NO_ERROR;
+}
+
+DRIVER_ERROR RasterQueue::Drain()
+{
+    DRIVER_ERROR    err;
+    pthread_mutex_lock(&m_mutex);
+    while (m_uiCount > 0 || m_bBusy)
+    {
+        pthread_cond_wait(&m_idle, &m_mutex);
+    }
+    err = m_err;
+    pthread_mutex_unlock(&m_mutex);
+    return err;
+}
+
+void *RasterQueue::threadMain(void *arg)
+{
+    ((RasterQueue *) arg)->run();
+    return NULL;
+}
+
+void RasterQueue::run()
+{
+    DRIVER_ERROR    err;
+    QueueSlot       *slot;
+
+    pthread_mutex_lock(&m_mutex);
+    for (;;)
+    {
+        while (m_uiCount == 0 && !m_bStop)
+        {
+            pthread_cond_wait(&m_not_empty, &m_mutex);
+        }
+        if (m_uiCount == 0)
+        {
+            break;
+        }
+        slot = &m_Slots[m_uiHead];
+        m_bBusy = true;
+        err = m_err;
+        pthread_mutex_unlock(&m_mutex);
+
+//      After an error the rest of the queue is dropped, the serial pipeline would have stopped here
+        if (err == NO_ERROR)
+        {
+            if (slot->flush)
+            {
+                err = m_pConsumer->Flush();
+            }
+            else
+            {
+                m_pConsumer->Exec->raster = slot->raster;
+                err = m_pConsumer->Execute(&(m_pConsumer->Exec->raster));
+            }
+        }
+
+        pthread_mutex_lock(&m_mutex);
+        if (m_err == NO_ERROR)
+        {
+            m_err = err;
+        }
+        m_uiHead = (m_uiHead + 1) % RASTER_QUEUE_DEPTH;
+        m_uiCount--;
+        m_bBusy = false;
+        pthread_cond_signal(&m_not_full);
+        if (m_uiCount == 0)
+        {
+            pthread_cond_broadcast(&m_idle);
+        }
+    }
+    pthread_mutex_unlock(&m_mutex);
+}
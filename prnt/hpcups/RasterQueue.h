@@ -0,0 +1,88 @@
+/*****************************************************************************\
+  RasterQueue.h : Interface for the RasterQueue class
+
+  Copyright (c) 1996 - 2015, HP Co.
+  All rights reserved.
+
+  Redistribution and use in source and binary forms, with or without
+  modification, are permitted provided that the following conditions
+  are met:
+  1. Redistributions of source code must retain the above copyright
+     notice, this list of conditions and the following disclaimer.
+  2. Redistributions in binary form must reproduce the above copyright
+     notice, this list of conditions and the following disclaimer in the
+     documentation and/or other materials provided with the distribution.
+  3. Neither the name of HP nor the names of its
+     contributors may be used to endorse or promote products derived
+     from this software without specific prior written permission.
+
+  THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+  WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+  MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.  IN
+  NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+  TO, PATENT INFRINGEMENT; PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS
+  OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+  ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+  THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+\*****************************************************************************/
+
+#ifndef RASTERQUEUE_H
+#define RASTERQUEUE_H
+
+#include <pthread.h>
+#include "CommonDefinitions.h"
+
+#define MAX_PIPELINE_THREADS    4
+#define RASTER_QUEUE_DEPTH      64
+
+class Pipeline;
+
+/*
+ *  Bounded queue between two pipeline stages. The producer pushes copies of
+ *  its output rasters; a worker thread feeds them, in order, to the consumer
+ *  phase and everything after it up to the next queue.
+ */
+
+class RasterQueue
+{
+public:
+    RasterQueue(Pipeline *consumer);
+    ~RasterQueue();
+
+    DRIVER_ERROR Start();
+    DRIVER_ERROR Push(RASTERDATA *raster);  // copies the raster data
+    DRIVER_ERROR Flush();                   // queues a Flush of the consumer
+    DRIVER_ERROR Drain();                   // waits until the consumer is idle
+    void Stop();
+private:
+    typedef struct
+    {
+        RASTERDATA      raster;
+        BYTE            *buffer[MAX_COLORTYPE];
+        unsigned int    buffer_size[MAX_COLORTYPE];
+        bool            flush;
+    } QueueSlot;
+
+    static void *threadMain(void *arg);
+    void run();
+    DRIVER_ERROR waitForSlot(QueueSlot **slot);
+    void commitSlot();
+
+    Pipeline        *m_pConsumer;
+    QueueSlot       m_Slots[RASTER_QUEUE_DEPTH];
+    unsigned int    m_uiHead;
+    unsigned int    m_uiCount;
+    bool            m_bBusy;
+    bool            m_bStop;
+    bool            m_bStarted;
+    DRIVER_ERROR    m_err;
+    pthread_t       m_thread;
+    pthread_mutex_t m_mutex;
+    pthread_cond_t  m_not_empty;
+    pthread_cond_t  m_not_full;
+    pthread_cond_t  m_idle;
+}; // RasterQueue
+
+#endif // RASTERQUEUE_H
@@ -30,6 +30,7 @@
 
 #include "CommonDefinitions.h"
 #include "utils.h"
+#include "Utils.h"
 
 int SendChunkHeader (BYTE *szStr, DWORD dwSize, DWORD dwChunkType, DWORD dwNumItems)
 {
@@ -92,3 +93,76 @@ int SendIntItem (BYTE *szStr, int iItem, int iItemType, int iItemValue)
     return i;
 }
 
+
+/*
+ *  The raster scans below compare a machine word at a time. Words are loaded
+ *  with memcpy, so the rasters need not be aligned; the compiler turns it into
+ *  a plain (unaligned) load.
+ */
+
+typedef unsigned long    SCANWORD;
+
+static inline SCANWORD loadWord (const BYTE *p)
+{
+    SCANWORD    w;
+    memcpy (&w, p, sizeof (w));
+    return w;
+}
+
+/*
+ *  Returns the index of the first byte that is not cWhite, iLength if there is none.
+ */
+
+int FindFirstInk (const BYTE *pRaster, int iLength, BYTE cWhite)
+{
+    SCANWORD    white;
+    int         i = 0;
+    memset (&white, cWhite, sizeof (white));
+    while (i + (int) sizeof (SCANWORD) <= iLength && loadWord (pRaster + i) == white)
+    {
+        i += sizeof (SCANWORD);
+    }
+    while (i < iLength && pRaster[i] == cWhite)
+    {
+        i++;
+    }
+    return i;
+}
+
+/*
+ *  Returns one past the index of the last byte that is not cWhite, 0 if there is none.
+ */
+
+int FindLastInk (const BYTE *pRaster, int iLength, BYTE cWhite)
+{
+    SCANWORD    white;
+    int         i = iLength;
+    memset (&white, cWhite, sizeof (white));
+    while (i >= (int) sizeof (SCANWORD) && loadWord (pRaster + i - sizeof (SCANWORD)) == white)
+    {
+        i -= sizeof (SCANWORD);
+    }
+    while (i > 0 && pRaster[i-1] == cWhite)
+    {
+        i--;
+    }
+    return i;
+}
+
+/*
+ *  Returns the index of the first byte that differs, iLength if the rasters match.
+ */
+
+int FindFirstDifference (const BYTE *pRaster1, const BYTE *pRaster2, int iLength)
+{
+    int    i = 0;
+    while (i + (int) sizeof (SCANWORD) <= iLength && loadWord (pRaster1 + i) == loadWord (pRaster2 + i))
+    {
+        i += sizeof (SCANWORD);
+    }
+    while (i < iLength && pRaster1[i] == pRaster2[i])
+    {
+        i++;
+    }
+    return i;
+}
@@ -33,3 +33,8 @@ int SendItem (BYTE *szStr, BYTE cType, WORD wItem, DWORD dwValue);
 int SendItemExtra (BYTE *szStr, BYTE cType, WORD wItem, DWORD dwValue, DWORD dwExtra);
 int SendIntItem (BYTE *szStr, int iItem, int iItemType, int iItemValue);
 
+// Word at a time raster scans, used to find white margins and blank bands
+int FindFirstInk (const BYTE *pRaster, int iLength, BYTE cWhite);
+int FindLastInk (const BYTE *pRaster, int iLength, BYTE cWhite);
+int FindFirstDifference (const BYTE *pRaster1, const BYTE *pRaster2, int iLength);
+
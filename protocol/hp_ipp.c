@@ -567,6 +567,51 @@ int getCupsPrinters(printer_t **printer_list)
 }
 
 
+/*
+ * 'getCupsPrinterChangeTimes()' - Get the change times of installed cups printers.
+ *
+ * This function sends a CUPS_GET_PRINTERS request for just the printer names
+ * and their state and configuration change times. It is a cheap way to find
+ * out whether the printer list has changed since it was last read.
+ *
+ */
+ipp_t * getCupsPrinterChangeTimes()
+{
+    ipp_t *request = NULL;  /* IPP request object */
+    ipp_t *response = NULL; /* IPP response object */
+
+    static const char * attrs[] =         /* Requested attributes */
+    {
+        "printer-name",
+        "printer-state-change-time",
+        "printer-config-change-time",
+    };
+
+    /* Connect to the HTTP server */
+    if (acquireCupsInstance() == NULL)
+    {
+        goto abort;
+    }
+
+    /* Assemble the IPP request */
+    request = ippNewRequest(CUPS_GET_PRINTERS);
+
+    if (request == NULL)
+        goto abort;
+
+    ippAddStrings( request, IPP_TAG_OPERATION, IPP_TAG_KEYWORD,
+                   "requested-attributes", sizeof( attrs ) / sizeof( attrs[ 0 ] ),
+                   NULL, attrs );
+
+    /* Send the request and get a response. */
+    response = cupsDoRequest( http, request, "/" );
+
+abort:
+
+    return response;
+}
+
+
 /*
  * 'initializeIPPRequest()' - Initialize request with those attributes which 
  * are common for all requests .
@@ -162,6 +162,7 @@ ipp_t * usbDoRequest(ipp_t *request, char* device_uri);
 ipp_t * networkDoRequest(ipp_t *request, char* device_uri);
 ipp_t * getDeviceStatusAttributes(char* device_uri, int *count);
 int     getCupsPrinters(printer_t **printer_list);
+ipp_t * getCupsPrinterChangeTimes();
 
 HPIPP_RESULT parseResponseHeader(char* header, int *content_length, int *chunked, int* header_size);
 HPIPP_RESULT prepend_http_header(raw_ipp *raw_request);
@@ -44,7 +44,7 @@ from base.g import *
 from base.sixext import PY3
 from base import tui, device, module, utils, os_utils
 from prnt import cups
-from scan import sane
+from scan import sane, imageproc
 
 
 username = prop.username
@@ -985,7 +985,16 @@ try:
                     if lines == -1 or total_read != expected_bytes:
                         lines = int(total_read / bytes_per_line)
 
-                    if scan_mode in ('color', 'gray'):
+                    # Single page JPEG files are encoded straight from the scan
+                    # buffer by the image processor, without loading the page in PIL.
+                    stream_encode = not adf and 'file' in dest and 'pdf' not in dest and \
+                        imageproc.canEncode(output_type, scan_mode, resize)
+
+                    if stream_encode:
+                        im = None
+                        if scan_mode == 'lineart':
+                            pixels_per_line = bytes_per_line * 8
+                    elif scan_mode in ('color', 'gray'):
                         try:
                             im = Image.frombuffer('RGBA', (pixels_per_line, lines), buffer.read(),
                                 'raw', 'RGBA', 0, 1)
@@ -1062,9 +1071,9 @@ try:
             os_utils.execute(cmd)
             sys.exit(0)
 
-        if resize != 100:
-            if resize < 1 or resize > 400:
-                log.error("Resize parameter is incorrect. Resize must be 0% < resize < 400%.")
+        if resize != 100 and im is not None:
+            if resize < imageproc.MIN_RESIZE or resize > imageproc.MAX_RESIZE:
+                log.error("Resize parameter is incorrect. Resize must be 0% < resize <= 400%.")
                 log.error("Using resize value of 100%.")
             else:
                 new_w = int(pixels_per_line * resize / 100)
@@ -1078,7 +1087,12 @@ try:
             log.info("Saving to file %s" % output)
 
             try:
-                im.save(output)
+                if im is None:
+                    if resize != 100:
+                        log.info("Resizing image from %dx%d by %d%%..." % (pixels_per_line, lines, resize))
+                    imageproc.encodeScan(buffer, output, pixels_per_line, lines, res, scan_mode, resize)
+                else:
+                    im.save(output)
             except IOError as e:
                 log.error("Error saving file: %s (I/O)" % e)
                 try:
@@ -1086,6 +1100,13 @@ try:
                 except OSError:
                     pass
                 sys.exit(1)
+            except imageproc.error as e:
+                log.error("Error saving file: %s (image processor)" % e)
+                try:
+                    os.remove(output)
+                except OSError:
+                    pass
+                sys.exit(1)
             except ValueError as e:
                 log.error("Error saving file: %s (PIL)" % e)
                 try:
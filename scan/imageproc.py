@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Copyright 2015 HP Development Company, L.P.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+#
+# Streaming scan post-processing on top of the HP image processor (hpipext).
+#
+# Pages are resized, converted and compressed a strip at a time as the raw
+# RGBA data is read, so memory use does not grow with the page size.
+#
+
+# Local
+try:
+    import hpipext
+except ImportError:
+    hpipext = None
+
+
+class error(Exception):
+    pass
+
+if hpipext is not None:
+    error = hpipext.error
+
+
+# hp-scan --resize values, in percent, the same with or without hpipext
+MIN_RESIZE = 1
+MAX_RESIZE = 400
+
+# X_SCALE limit for gray and color data, in percent. Pages made smaller
+# than this are resized by PIL.
+MIN_SCALE = 25
+
+STRIP_ROWS = 64
+
+
+def fixed_8_24(factor):
+    return int(factor * (1 << 24)) & 0xffffffff
+
+
+def canEncode(output_type, scan_mode, resize=100):
+    return hpipext is not None and output_type == 'jpeg' and \
+        scan_mode in ('color', 'gray', 'lineart') and MIN_SCALE <= resize <= MAX_RESIZE
+
+
+
+class ScanEncoder(object):
+    """Encodes RGBA scanlines to JPEG. write() returns the output produced so far."""
+
+    def __init__(self, pixels_per_line, lines, res, scan_mode, resize=100, quality=0):
+        xforms = []
+
+        if scan_mode in ('gray', 'lineart'):
+            # The scan buffer is always RGBA, grayscale is R=G=B
+            xforms.append((hpipext.X_CHANGE_BPP, (8,)))
+
+        if resize != 100:
+            f = fixed_8_24(resize / 100.0)
+            xforms.append((hpipext.X_SCALE, (f, f, 0)))
+
+        xforms.append((hpipext.X_JPG_ENCODE, (quality,)))
+
+        self.pixels_per_line = pixels_per_line
+        self.pipeline = hpipext.open(xforms, (pixels_per_line, 24, 3, res, res,
+                                     lines if lines > 0 else -1), 1)
+
+
+    def write(self, data):
+        return self.pipeline.convert(data)
+
+
+    def close(self):
+        """Returns (data, seeks). seeks is [(file_pos, data), ...] to be applied after data is written."""
+        try:
+            data = self.pipeline.flush()
+            return data, self.pipeline.getSeeks()
+        finally:
+            self.pipeline.close()
+
+
+
+def encodeScan(buffer, output, pixels_per_line, lines, res, scan_mode, resize=100):
+    """Encode a completed RGBA scan buffer to output. Returns the (width, height) written."""
+    enc = ScanEncoder(pixels_per_line, lines, res, scan_mode, resize)
+    strip = pixels_per_line * 4 * STRIP_ROWS
+
+    buffer.seek(0)
+    f = open(output, 'wb')
+    try:
+        while True:
+            data = buffer.read(strip)
+            if not data:
+                break
+            f.write(enc.write(data))
+
+        data, seeks = enc.close()
+        f.write(data)
+        for pos, data in seeks:
+            f.seek(pos)
+            f.write(data)
+    finally:
+        f.close()
+
+    return int(pixels_per_line * resize / 100), int(lines * resize / 100)
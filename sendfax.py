@@ -40,7 +40,7 @@ import subprocess
 # Local
 from base.g import *
 import base.utils as utils
-from base import device, tui, module
+from base import device, tui, module, jobmonitor
 from base.sixext import to_unicode, to_string_utf8
 username = prop.username
 faxnum_list = []
@@ -358,11 +358,21 @@ else: # NON_INTERACTIVE_MODE
 
             file_list = []
 
-            for f in mod.args:
+            #
+            # Submit the files to CUPS for rendering by hpijsfax, all at once
+            #
+            cups_printers = cups.getPrinters()
+            printer_state = cups.IPP_PRINTER_STATE_STOPPED
+            for p in cups_printers:
+                if p.name == printer_name:
+                    printer_state = p.state
+
+            log.debug("Printer state = %d" % printer_state)
 
-                #
-                # Submit each file to CUPS for rendering by hpijsfax
-                #
+            scheduler = fax.RenderScheduler(service, device_uri, printer_name)
+            rendered = [] # (index in file_list, path, mime_type)
+
+            for f in mod.args:
                 path = os.path.realpath(f)
                 log.debug(path)
                 mime_type = magic.mime_type(path)
@@ -383,82 +393,34 @@ else: # NON_INTERACTIVE_MODE
                     file_list.append((f, mime_type, "", "", pages))
 
                 else:
-                    all_pages = True
-                    page_range = ''
-                    page_set = 0
-                    nup = 1
-
-                    cups.resetOptions()
-
-                    if mime_type in ["application/x-cshell",
-                                     "application/x-perl",
-                                     "application/x-python",
-                                     "application/x-shell",
-                                     "text/plain",] and prettyprint:
-
-                        cups.addOption('prettyprint')
-
-                    if nup > 1:
-                        cups.addOption('number-up=%d' % nup)
-
-                    while True:
-
-                        cups_printers = cups.getPrinters()
-                        printer_state = cups.IPP_PRINTER_STATE_STOPPED
-                        for p in cups_printers:
-                            if p.name == printer_name:
-                                printer_state = p.state
-
-                        log.debug("Printer state = %d" % printer_state)
-
-                        if printer_state == cups.IPP_PRINTER_STATE_IDLE:
-                            log.debug("Printer name = %s file = %s" % (printer_name, path))
-                            path = to_unicode(path, 'utf-8')
-
-                            sent_job_id = cups.printFile(printer_name, path, os.path.basename(path))
-                            log.info("\nRendering file '%s' (job %d)..." % (path, sent_job_id))
-                            log.debug("Job ID=%d" % sent_job_id)
-                            break
-                        elif printer_state == cups.IPP_PRINTER_STATE_PROCESSING:
-                            log.debug("Waiting for CUPS queue '%s' to become idle." % printer_name)
-                        else:
-                            log.error("The CUPS queue for '%s' is in a stopped or busy state (%d). Please check the queue and try again." % (printer_name, printer_state))
-                            sys.exit(1)
-
-                    cups.resetOptions()
-
-                    #
-                    # Wait for fax to finish rendering
-                    #
-
-                    end_time = time.time() + 120.0
-                    while time.time() < end_time:
-                        log.debug("Waiting for fax...")
-                        try:
-                            result = list(service.CheckForWaitingFax(device_uri, prop.username, sent_job_id))
-                            log.debug(repr(result))
-
-                        except dbus.exceptions.DBusException:
-                            log.error("Cannot communicate with hp-systray. Canceling...")
-                            cups.cancelJob(sent_job_id)
-                            sys.exit(1)
-
-                        fax_file = str(result[7])
-                        log.info(fax_file)
-
-                        if fax_file:
-                            log.debug("Fax file=%s" % fax_file)
-                            #title = str(result[5])
-                            title = result[5]
-                            break
-
-                        time.sleep(1)
-
-                    else:
-                        log.error("Timeout waiting for rendering. Canceling job #%d..." % sent_job_id)
-                        cups.cancelJob(sent_job_id)
+                    if printer_state not in (cups.IPP_PRINTER_STATE_IDLE, cups.IPP_PRINTER_STATE_PROCESSING):
+                        log.error("The CUPS queue for '%s' is in a stopped or busy state (%d). Please check the queue and try again." % (printer_name, printer_state))
+                        sys.exit(1)
+
+                    log.debug("Printer name = %s file = %s" % (printer_name, path))
+                    path = to_unicode(path, 'utf-8')
+
+                    sent_job_id = scheduler.submit(path, os.path.basename(path), mime_type, prettyprint)
+                    if sent_job_id <= 0:
+                        sys.exit(1)
+
+                    log.info("\nRendering file '%s' (job %d)..." % (path, sent_job_id))
+                    rendered.append((len(file_list), path, mime_type))
+                    file_list.append(None)
+
+            #
+            # Wait for the faxes to finish rendering
+            #
+            if rendered:
+                results, canceled = scheduler.wait(120.0)
+
+                for (i, path, mime_type), (fax_file, title) in zip(rendered, results):
+                    if not fax_file:
+                        log.error("Rendering '%s' failed." % path)
                         sys.exit(1)
 
+                    log.debug("Fax file=%s" % fax_file)
+
                     # open the rendered file to read the file header
                     f = open(fax_file, 'rb')
                     header = f.read(fax.FILE_HEADER_SIZE)
@@ -474,7 +436,7 @@ else: # NON_INTERACTIVE_MODE
                     log.debug("Magic=%s Ver=%d Pages=%d hDPI=%d vDPI=%d Size=%d Res=%d Enc=%d" %
                               (mg, version, total_pages, hort_dpi, vert_dpi, page_size, resolution, encoding))
 
-                    file_list.append((fax_file, mime_type, "", title, total_pages))
+                    file_list[i] = (fax_file, mime_type, "", title, total_pages)
                     f.close()
 
             #
@@ -514,7 +476,7 @@ else: # NON_INTERACTIVE_MODE
                 service.SendEvent(device_uri, printer_name, EVENT_START_FAX_JOB, prop.username, 0, '')
 
                 update_queue = queue.Queue()
-                event_queue = queue.Queue()
+                event_queue = jobmonitor.EventQueue()
 
                 log.info("\nSending fax...")
 
@@ -21,7 +21,7 @@
 
 # Local
 from base.g import *
-from base import utils, pml
+from base import utils, pml, jobmonitor
 from copier import copier
 from base.sixext.moves import queue
 
@@ -48,7 +48,7 @@ class ScrollCopyView(ScrollView):
         self.fit_to_page = fit_to_page
 
         self.update_queue = queue.Queue() # UI updates from copy thread
-        self.event_queue = queue.Queue() # UI events to copy thread
+        self.event_queue = jobmonitor.EventQueue() # UI events to copy thread
 
     def getDeviceSettings(self):
         QApplication.setOverrideCursor(QApplication.waitCursor)
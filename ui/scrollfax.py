@@ -21,7 +21,7 @@
 
 # Local
 from base.g import *
-from base import utils, magic, pml, os_utils
+from base import utils, magic, pml, os_utils, jobmonitor
 from base.sixext import  to_unicode
 from prnt import cups
 from .ui_utils import load_pixmap
@@ -126,7 +126,7 @@ class ScrollFaxView(ScrollView):
         self.cover_page_re = ''
         self.cover_page_name = ''
         self.update_queue = queue.Queue() # UI updates from send thread
-        self.event_queue = queue.Queue() # UI events (cancel) to send thread
+        self.event_queue = jobmonitor.EventQueue() # UI events (cancel) to send thread
         self.prev_selected_file_path = ''
         self.prev_selected_recipient = ''
         self.preserve_formatting = False
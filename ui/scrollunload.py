@@ -21,7 +21,7 @@
 
 # Local
 from base.g import *
-from base import utils, magic
+from base import utils, magic, exif
 from base.sixext import  to_unicode
 from pcard import photocard
 from .ui_utils import load_pixmap
@@ -268,7 +268,7 @@ class ScrollUnloadView(ScrollView):
         if item is not None and \
             item.mime_type == 'image' and \
             item.mime_subtype == 'jpeg' and \
-            self.pc.get_exif_path(item.path) and \
+            self.pc.get_exif_path(item.path, exif.BROWSE_TAGS) and \
             not item.thumbnail_set:
 
             popup.insertItem(self.__tr("Show Thumbnail"), self.showThumbNail)
@@ -322,7 +322,7 @@ class ScrollUnloadView(ScrollView):
 
     def showThumbNail(self):
         item = self.IconView.currentItem()
-        exif_info = self.pc.get_exif_path(item.path)
+        exif_info = self.pc.get_exif_path(item.path, ('JPEGThumbnail',))
 
         if len(exif_info) > 0:
             if 'JPEGThumbnail' in exif_info:
@@ -400,7 +400,7 @@ class ScrollUnloadView(ScrollView):
 
         if not self.first_load and typ == 'image' and subtyp == 'jpeg':
 
-            exif_info = self.pc.get_exif_path(path)
+            exif_info = self.pc.get_exif_path(path, ('JPEGThumbnail',))
             if len(exif_info) > 0:
 
                 if 'JPEGThumbnail' in exif_info:
@@ -30,7 +30,7 @@ import time
 
 # Local
 from base.g import *
-from base import device, utils
+from base import device, utils, ipc
 from .ui_utils import load_pixmap
 
 # Qt
@@ -391,8 +391,7 @@ class SystemTrayApp(QApplication):
         QApplication.__init__(self, args)
 
         self.read_pipe = read_pipe
-        self.fmt = "80s80sI32sI80sf"
-        self.fmt_size = struct.calcsize(self.fmt)
+        self.reader = ipc.FrameReader(read_pipe)
         
         self.user_settings = utils.UserSettings()
         self.user_settings.load()
@@ -505,14 +504,15 @@ class SystemTrayApp(QApplication):
 
 
     def notifier_activated(self, s):
-        m = ''
         while True:
             ready = select.select([self.read_pipe], [], [], 1.0)
 
             if ready[0]:
-                m = ''.join([m, os.read(self.read_pipe, self.fmt_size)])
-                if len(m) == self.fmt_size:
-                    event = device.Event(*struct.unpack(self.fmt, m))
+                if not self.reader.read():
+                    break
+
+                for msg_type, payload in self.reader.frames():
+                    event = device.Event(*ipc.unpackEvent(payload))
 
                     if event.event_code > EVENT_MAX_USER_EVENT:
                         continue
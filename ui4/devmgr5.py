@@ -124,6 +124,38 @@ class DeviceViewItem(QListWidgetItem):
 
 # XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 
+DEVICE_LOADER_BATCH = 16
+
+class DeviceLoader(QThread):
+    """ Creates the device.Device() objects for newly found device URIs off the GUI thread.
+        Emits devicesLoaded([(device_uri, dev), ...]) every DEVICE_LOADER_BATCH devices,
+        dev is None if the URI could not be used. """
+    def __init__(self, parent, device_uris, service):
+        QThread.__init__(self, parent)
+        self.device_uris = device_uris
+        self.service = service
+
+
+    def run(self):
+        devs = []
+        for d in self.device_uris:
+            # Note: Do not perform any I/O with this device.
+            try:
+                dev = device.Device(d, service=self.service, disable_dbus=False)
+            except Error as e:
+                log.error("Unable to create device %s: %s" % (d, e.msg))
+                dev = None
+
+            devs.append((d, dev))
+            if len(devs) == DEVICE_LOADER_BATCH:
+                self.emit(SIGNAL("devicesLoaded"), devs)
+                devs = []
+
+        if devs:
+            self.emit(SIGNAL("devicesLoaded"), devs)
+
+# XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+
 class PluginInstall(QObject):
     def __init__(self, parent, plugin_type, plugin_installed):
         self.parent = parent
@@ -181,6 +213,9 @@ class DevMgr5(QMainWindow,  Ui_MainWindow):
         self.cur_device = None
         self.cur_printer = None
         self.updating = False
+        self.device_items = {} # { Device_URI : DeviceViewItem, ... }
+        self.device_loader = None
+        self.refresh_callbacks = [] # called once the running device list refresh is done
         self.init_failed = False
         self.service = None
         self.Is_autoInstaller_distro = False            # True-->tier1(supports auto installation). False--> tier2(manual installation)
@@ -241,6 +276,7 @@ class DevMgr5(QMainWindow,  Ui_MainWindow):
         self.func_icons_cached = False
         self.func_icons = {}
         self.device_icons = {}
+        self.device_status_icons = {} # { (icon, device type, tech type, error state) : QPixmap, ... }
 
          # Application icon
         self.setWindowIcon(QIcon(load_pixmap('hp_logo', '128x128')))
@@ -340,8 +376,11 @@ class DevMgr5(QMainWindow,  Ui_MainWindow):
             self.close()
             return
 
+        self.refresh_callbacks.append(self.initialUpdateFinished)
         self.rescanDevices()
 
+
+    def initialUpdateFinished(self):
         cont = True
         if self.initial_device_uri is not None:
             if not self.activateDevice(self.initial_device_uri):
@@ -360,21 +399,13 @@ class DevMgr5(QMainWindow,  Ui_MainWindow):
 
     def activateDevice(self, device_uri):
         log.debug(log.bold("Activate: %s %s %s" % ("*"*20, device_uri, "*"*20)))
-        index = 0
-        d = self.DeviceList.item(index) #firstItem()
-        found = False
-
-        while d is not None:
-            if d.device_uri == device_uri:
-                found = True
-                self.DeviceList.setSelected(d, True)
-                self.DeviceList.setCurrentItem(d)
-                break
-
-            index += 1
-            d = self.DeviceList.item(index)
+        d = self.device_items.get(device_uri)
+        if d is None:
+            return False
 
-        return found
+        self.DeviceList.setSelected(d, True)
+        self.DeviceList.setCurrentItem(d)
+        return True
 
 
 
@@ -577,19 +608,26 @@ class DevMgr5(QMainWindow,  Ui_MainWindow):
             self.device_icons[dev.icon] = load_pixmap(dev.icon, 'devices')
 
         pix = self.device_icons[dev.icon]
-
-        w, h = pix.width(), pix.height()
         error_state = dev.error_state
-        icon = QPixmap(w, h)
-        p = QPainter(icon)
-        p.eraseRect(0, 0, icon.width(), icon.height())
-        p.drawPixmap(0, 0, pix)
 
         try:
             tech_type = dev.tech_type
         except AttributeError:
             tech_type = TECH_TYPE_NONE
 
+        # Devices of the same model and state share one icon
+        key = (dev.icon, dev.device_type, tech_type, error_state)
+        try:
+            return self.device_status_icons[key]
+        except KeyError:
+            pass
+
+        w, h = pix.width(), pix.height()
+        icon = QPixmap(w, h)
+        p = QPainter(icon)
+        p.eraseRect(0, 0, icon.width(), icon.height())
+        p.drawPixmap(0, 0, pix)
+
         if dev.device_type == DEVICE_TYPE_FAX:
             p.drawPixmap(w - self.fax_icon.width(), 0, self.fax_icon)
 
@@ -603,168 +641,180 @@ class DevMgr5(QMainWindow,  Ui_MainWindow):
                 p.drawPixmap(0, 0, status_icon)
 
         p.end()
+        self.device_status_icons[key] = icon
         return icon
 
 
     def refreshDeviceList(self):
-        global devices
         log.debug("Rescanning device list...")
 
-        if 1:
-            beginWaitCursor()
-            self.updating = True
+        beginWaitCursor()
+        self.updating = True
 
-            self.setWindowTitle(self.__tr("Refreshing Device List - HP Device Manager"))
-            self.statusBar().showMessage(self.__tr("Refreshing device list..."))
+        self.setWindowTitle(self.__tr("Refreshing Device List - HP Device Manager"))
+        self.statusBar().showMessage(self.__tr("Refreshing device list..."))
 
+        try:
             self.cups_devices = device.getSupportedCUPSDevices(['hp', 'hpfax'])
 
-            current = None
+            cups_devices = set(self.cups_devices)
+            adds = [d for d in self.cups_devices if d not in device_list]
+            removals = [d for d in device_list if d not in cups_devices]
+            updates = [d for d in device_list if d in cups_devices]
 
-            try:
-                adds = []
-                for d in self.cups_devices:
-                    if d not in device_list:
-                        adds.append(d)
+            log.debug("Adds: %s" % ','.join(adds))
+            log.debug("Removals: %s" % ','.join(removals))
+            log.debug("Updates: %s" % ','.join(updates))
 
-                log.debug("Adds: %s" % ','.join(adds))
-
-                removals = []
-                for d in device_list:
-                    if d not in self.cups_devices:
-                        removals.append(d)
-
-                log.debug("Removals (1): %s" % ','.join(removals))
-
-                updates = []
-                for d in device_list:
-                    if d not in adds and d not in removals:
-                        updates.append(d)
-
-                log.debug("Updates: %s" % ','.join(updates))
-
-                for d in adds:
-                    log.debug("adding: %s" % d)
-                    # Note: Do not perform any I/O with this device.
-                    dev = device.Device(d, service=self.service, disable_dbus=False)
+            self.DeviceList.setUpdatesEnabled(False)
+            try:
+                for d in removals:
+                    log.debug("removing: %s" % d)
+                    self.removeDeviceItem(d)
+            finally:
+                self.DeviceList.setUpdatesEnabled(True)
+
+            for d in updates:
+                self.requestDeviceUpdate(device_list[d])
+
+            if adds:
+                # device.Device() objects are created on a loader thread, the rows
+                # are added in batches as they come in (see DeviceLoader_devicesLoaded())
+                self.device_loader = DeviceLoader(self, adds, self.service)
+                self.connect(self.device_loader, SIGNAL("devicesLoaded"), self.DeviceLoader_devicesLoaded)
+                self.connect(self.device_loader, SIGNAL("finished()"), self.DeviceLoader_finished)
+                self.device_loader.start()
+                return
+
+        except Exception:
+            self.updating = False
+            endWaitCursor()
+            raise
 
-                    if not dev.supported:
-                        log.debug("Unsupported model - removing device.")
-                        removals.append(d)
-                        continue
+        self.finishRefreshDeviceList()
 
-                    icon = self.createDeviceIcon(dev)
 
-                    if dev.device_type == DEVICE_TYPE_FAX:
-                        DeviceViewItem(self.DeviceList,  self.__tr("%s (Fax)"%dev.model_ui),
-                            icon, d)
-                    else:
-                        if dev.fax_type:
-                            DeviceViewItem(self.DeviceList, self.__tr("%s (Printer)"%dev.model_ui),
-                                icon, d)
-                        else:
-                            DeviceViewItem(self.DeviceList, dev.model_ui,
-                                icon, d)
+    def DeviceLoader_devicesLoaded(self, devs):
+        self.DeviceList.setUpdatesEnabled(False)
+        try:
+            for d, dev in devs:
+                if dev is None or not dev.supported:
+                    log.debug("Unsupported model - removing device %s." % d)
+                    continue
 
-                    device_list[d] = dev
+                log.debug("adding: %s" % d)
+                device_list[d] = dev
+                self.addDeviceItem(dev)
+        finally:
+            self.DeviceList.setUpdatesEnabled(True)
 
-                log.debug("Removals (2): %s" % ','.join(removals))
-                removed_device=None
-                for d in removals:
-                    removed_device = d
-                    index = self.DeviceList.count()-1
-                    item = self.DeviceList.item(index)
-                    log.debug("removing: %s" % d)
+        for d, dev in devs:
+            if d in device_list:
+                self.requestDeviceUpdate(dev)
 
-                    try:
-                        del device_list[d]
-                    except KeyError:
-                        pass
 
-                    while index >= 0 and item is not None:
-                        if item.device_uri == d:
-                            self.DeviceList.takeItem(index)
-                            break
+    def DeviceLoader_finished(self):
+        self.device_loader = None
+        self.finishRefreshDeviceList()
 
-                        index -= 1
-                        item = self.DeviceList.item(index)
 
-                    qApp.processEvents()
+    def addDeviceItem(self, dev):
+        d = dev.device_uri
+        icon = self.createDeviceIcon(dev)
 
-                self.DeviceList.updateGeometry()
-                qApp.processEvents()
+        if dev.device_type == DEVICE_TYPE_FAX:
+            item = DeviceViewItem(self.DeviceList,  self.__tr("%s (Fax)"%dev.model_ui),
+                icon, d)
+        else:
+            if dev.fax_type:
+                item = DeviceViewItem(self.DeviceList, self.__tr("%s (Printer)"%dev.model_ui),
+                    icon, d)
+            else:
+                item = DeviceViewItem(self.DeviceList, dev.model_ui,
+                    icon, d)
 
-                if len(device_list):
-                    for tab in self.TabIndex:
-                        self.Tabs.setTabEnabled(tab, True)
+        self.device_items[d] = item
 
-                    if self.cur_device_uri:
-                        index = 0
-                        item = first_item = self.DeviceList.item(index)
 
-                        while item is not None:
-                            qApp.processEvents()
-                            if item.device_uri == self.cur_device_uri:
-                                current = item
-                                self.statusBar().showMessage(self.cur_device_uri)
-                                break
+    def removeDeviceItem(self, device_uri):
+        try:
+            del device_list[device_uri]
+        except KeyError:
+            pass
 
-                            index += 1
-                            item = self.DeviceList.item(index)
+        item = self.device_items.pop(device_uri, None)
+        if item is not None:
+            self.DeviceList.takeItem(self.DeviceList.row(item))
 
-                        else:
-                            self.cur_device = None
-                            self.cur_device_uri = ''
 
-                    if self.cur_device is None:
-                        i = self.DeviceList.item(0)
-                        if i is not None:
-                            self.cur_device_uri = i.device_uri
-                            self.cur_device = device_list[self.cur_device_uri]
-                            current = i
+    def finishRefreshDeviceList(self):
+        current = None
 
-                    self.updatePrinterCombos()
+        try:
+            self.DeviceList.updateGeometry()
 
-                    if self.cur_device_uri:
-                        #user_conf.set('last_used', 'device_uri',self.cur_device_uri)
-                        self.user_settings.last_used_device_uri = self.cur_device_uri
-                        self.user_settings.save()
+            if len(device_list):
+                for tab in self.TabIndex:
+                    self.Tabs.setTabEnabled(tab, True)
 
-                    for d in updates + adds:
-                        if d not in removals:
-                            self.requestDeviceUpdate(device_list[d])
+                if self.cur_device_uri:
+                    current = self.device_items.get(self.cur_device_uri)
+                    if current is not None:
+                        self.statusBar().showMessage(self.cur_device_uri)
+                    else:
+                        self.cur_device = None
+                        self.cur_device_uri = ''
+
+                if self.cur_device is None:
+                    i = self.DeviceList.item(0)
+                    if i is not None:
+                        self.cur_device_uri = i.device_uri
+                        self.cur_device = device_list[self.cur_device_uri]
+                        current = i
+
+                self.updatePrinterCombos()
+
+                if self.cur_device_uri:
+                    #user_conf.set('last_used', 'device_uri',self.cur_device_uri)
+                    self.user_settings.last_used_device_uri = self.cur_device_uri
+                    self.user_settings.save()
+
+            else: # no devices
+                self.cur_device = None
+                self.DeviceRefreshAction.setEnabled(False)
+                self.RemoveDeviceAction.setEnabled(False)
+                self.DiagnoseQueueAction.setEnabled(False)
+                self.updating = False
+                self.statusBar().showMessage(self.__tr("Press F6 to refresh."))
 
-                else: # no devices
-                    self.cur_device = None
-                    self.DeviceRefreshAction.setEnabled(False)
-                    self.RemoveDeviceAction.setEnabled(False)
-                    self.DiagnoseQueueAction.setEnabled(False)
-                    self.updating = False
-                    self.statusBar().showMessage(self.__tr("Press F6 to refresh."))
+                for tab in self.TabIndex:
+                    self.Tabs.setTabEnabled(tab, False)
 
-                    for tab in self.TabIndex:
-                        self.Tabs.setTabEnabled(tab, False)
+                endWaitCursor()
 
-                    endWaitCursor()
+                dlg = NoDevicesDialog(self)
+                dlg.exec_()
 
-                    dlg = NoDevicesDialog(self)
-                    dlg.exec_()
+        finally:
+            self.updating = False
+            endWaitCursor()
 
-            finally:
-                self.updating = False
-                endWaitCursor()
+        if current is not None:
+            self.DeviceList.setCurrentItem(current)
 
-            if current is not None:
-                self.DeviceList.setCurrentItem(current)
+        self.DeviceRefreshAction.setEnabled(True)
+        self.RefreshAllAction.setEnabled(True)
 
-            self.DeviceRefreshAction.setEnabled(True)
+        if self.cur_device is not None:
+            self.RemoveDeviceAction.setEnabled(True)
+            self.DiagnoseQueueAction.setEnabled(True)
 
-            if self.cur_device is not None:
-                self.RemoveDeviceAction.setEnabled(True)
-                self.DiagnoseQueueAction.setEnabled(True)
+            self.statusBar().showMessage(self.cur_device_uri)
+            self.updateWindowTitle()
 
-                self.statusBar().showMessage(self.cur_device_uri)
-                self.updateWindowTitle()
+        callbacks, self.refresh_callbacks = self.refresh_callbacks, []
+        for f in callbacks:
+            f()
 
 
     def updateWindowTitle(self):
@@ -829,15 +879,7 @@ class DevMgr5(QMainWindow,  Ui_MainWindow):
 
 
     def findItemByURI(self, device_uri):
-        index = 0
-        item = self.DeviceList.item(index)
-
-        while item is not None:
-            if item.device_uri == device_uri:
-                return item
-
-            index += 1
-            item = self.DeviceList.item(index)
+        return self.device_items.get(device_uri)
 
 
     def findDeviceByURI(self, device_uri):
@@ -865,9 +907,12 @@ class DevMgr5(QMainWindow,  Ui_MainWindow):
         if not self.updating:
             self.RefreshAllAction.setEnabled(False)
             try:
+                cups.invalidatePrinters()
                 self.refreshDeviceList()
             finally:
-                self.RefreshAllAction.setEnabled(True)
+                # Still loading devices, finishRefreshDeviceList() enables it
+                if not self.updating:
+                    self.RefreshAllAction.setEnabled(True)
 
 
     def callback(self):
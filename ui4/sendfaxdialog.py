@@ -28,7 +28,7 @@ import signal
 
 # Local
 from base.g import *
-from base import device, utils, pml
+from base import device, utils, pml, jobmonitor
 from prnt import cups
 from base.codes import *
 from .ui_utils import *
@@ -709,7 +709,7 @@ class SendFaxDialog(QDialog, Ui_Dialog):
         self.error_icon = QIcon(load_pixmap("error", "16x16"))
         self.busy_icon = QIcon(load_pixmap("busy", "16x16"))
         self.update_queue = queue.Queue() # UI updates from send thread
-        self.event_queue = queue.Queue() # UI events (cancel) to send thread
+        self.event_queue = jobmonitor.EventQueue() # UI events (cancel) to send thread
         self.send_fax_active = False
 
 
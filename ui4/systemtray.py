@@ -30,8 +30,9 @@ import time
 
 # Local
 from base.g import *
-from base import device, utils, models
+from base import device, utils, models, ipc
 from base.codes import *
+from prnt import cups
 from .ui_utils import *
 
 # PyQt
@@ -305,8 +306,7 @@ class SystemTrayApp(QApplication):
 
         self.menu = None
         self.read_pipe = read_pipe
-        self.fmt = "80s80sI32sI80sf"
-        self.fmt_size = struct.calcsize(self.fmt)
+        self.reader = ipc.FrameReader(read_pipe)
         self.timer_active = False
         self.active_icon = False
         self.user_settings = UserSettings()
@@ -643,7 +643,6 @@ class SystemTrayApp(QApplication):
 
 
     def notifierActivated(self, s):
-        m = ''
         while True:
             try:
                 r, w, e = select.select([self.read_pipe], [], [self.read_pipe], 1.0)
@@ -656,11 +655,11 @@ class SystemTrayApp(QApplication):
                 break
 
             if r:
-                #m = ''.join([m, os.read(self.read_pipe, self.fmt_size)])
-                m = os.read(self.read_pipe, self.fmt_size)
-                while len(m) >= self.fmt_size:
-                    event = device.Event(*[x.rstrip(b'\x00').decode('utf-8') if isinstance(x, bytes) else x for x in struct.unpack(self.fmt, m[:self.fmt_size])])
-                    m = m[self.fmt_size:]                   
+                if not self.reader.read():
+                    break
+
+                for msg_type, payload in self.reader.frames():
+                    event = device.Event(*ipc.unpackEvent(payload))
 
                     if event.event_code == EVENT_ERROR_NO_PROBED_DEVICES_FOUND:
                         newmsg = "HPLIP cannot detect devices in your network. This may be due to existing firewall settings blocking the required ports like (5353/udp). When you are in a trusted network environment, you may open the ports for network services like mdns and slp in the firewall. For detailed steps follow the link.\n\n http://hplipopensource.com/node/375"
@@ -668,6 +667,7 @@ class SystemTrayApp(QApplication):
                         continue
                     
                     if event.event_code == EVENT_CUPS_QUEUES_REMOVED or event.event_code == EVENT_CUPS_QUEUES_ADDED:
+                        cups.invalidatePrinters()
                         self.resetDevice()
                         for d in device.getSupportedCUPSDevices(back_end_filter=['hp', 'hpfax']):
                             self.addDevice(d)
@@ -263,11 +263,12 @@ class Console(cmd.Cmd):
 
 
     def cp_status_callback(self, src, trg, size):
-        if size == 1:
+        if size == 0:
             print()
             print(log.bold("Copying %s..." % src))
         else:
-            print("\nCopied %s to %s (%s)..." % (src, trg, utils.format_bytes(size)))
+            print("\nCopied %s to %s (%s, %s/sec)..." % (src, trg, utils.format_bytes(size),
+                                                       utils.format_bytes(int(self.pc.unload_rate()))))
 
     def rm_status_callback(self, src):
         print("Removing %s..." % src)
@@ -287,8 +288,7 @@ class Console(cmd.Cmd):
         if len(matched_files) == 0:
             print("ERROR: File(s) not found.")
         else:
-            for f in matched_files:
-                self.pc.rm(f, False)
+            self.pc.rm_multiple(matched_files)
 
         self.pc.ls()
 
@@ -421,8 +421,9 @@ class Console(cmd.Cmd):
 
 
     def do_reset(self, args):
-        """Reset the cache."""
+        """Reset the cache and the directory index."""
         self.pc.cache_reset()
+        self.pc.index_reset()
 
 
     def do_card(self, args):
@@ -487,7 +488,7 @@ class Console(cmd.Cmd):
             typ, subtyp = self.pc.classify_file(args).split('/')
 
             if typ == 'image' and subtyp in ('jpeg', 'tiff'):
-                exif_info = self.pc.get_exif(args)
+                exif_info = self.pc.get_exif(args, ('JPEGThumbnail', 'TIFFThumbnail'))
 
                 dir_name, file_name=os.path.split(args)
                 photo_name, photo_ext=os.path.splitext(args)
@@ -568,11 +569,12 @@ class Console(cmd.Cmd):
 
 
 def status_callback(src, trg, size):
-    if size == 1:
+    if size == 0:
         print()
         print(log.bold("Copying %s..." % src))
     else:
-        print("\nCopied %s to %s (%s)..." % (src, trg, utils.format_bytes(size)))
+        print("\nCopied %s to %s (%s, %s/sec)..." % (src, trg, utils.format_bytes(size),
+                                                   utils.format_bytes(int(pc.unload_rate()))))
 
 
 